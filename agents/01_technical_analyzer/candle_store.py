@@ -0,0 +1,246 @@
+"""
+In-memory OHLCV candle store for the technical analyzer.
+
+Keeps one ring buffer of raw Bybit kline rows per (symbol, interval):
+- First request seeds the buffer with a full kline fetch
+- Later requests only fetch bars from the last stored (live) bar onwards,
+  replacing the live bar and appending newly opened ones
+- Refreshes within CANDLE_STORE_REFRESH_SECONDS are served from memory
+- Falls back to a full reseed when the gap is larger than one kline page,
+  or when the fetched bars do not continue from the last stored one
+- Optionally persists each series to CANDLE_CACHE_DIR so a restart resumes
+  from disk and only fetches the bars it missed (no repeated backfill)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+# Raw kline row as returned by Bybit: [ts, open, high, low, close, vol, turnover]
+KlineRow = List[str]
+
+# Fetch function: (symbol, bybit_interval, limit, start_ms) -> rows newest-first, or None on error
+FetchFn = Callable[[str, str, int, Optional[int]], Optional[List[KlineRow]]]
+
+CANDLE_STORE_CAPACITY = int(os.getenv("CANDLE_STORE_CAPACITY", "1000"))
+CANDLE_STORE_REFRESH_SECONDS = float(os.getenv("CANDLE_STORE_REFRESH_SECONDS", "5"))
+# Empty = in-memory only
+CANDLE_CACHE_DIR = os.getenv("CANDLE_CACHE_DIR", "").strip()
+
+# Bybit kline page limit
+MAX_KLINE_LIMIT = 1000
+
+BYBIT_INTERVAL_MS = {
+    "1": 60_000,
+    "5": 5 * 60_000,
+    "15": 15 * 60_000,
+    "60": 60 * 60_000,
+    "240": 4 * 60 * 60_000,
+    "D": 24 * 60 * 60_000,
+}
+
+
+class _Series:
+    """Ring buffer and bookkeeping for one (symbol, interval) pair."""
+
+    __slots__ = ("rows", "lock", "last_refresh", "exhausted", "loaded")
+
+    def __init__(self, capacity: int):
+        self.rows: Deque[KlineRow] = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.last_refresh = 0.0
+        # True when the exchange returned fewer bars than requested (no deeper history)
+        self.exhausted = False
+        # True once the on-disk cache has been checked
+        self.loaded = False
+
+
+class CandleStore:
+    """
+    Shared candle cache with incremental refresh.
+
+    Args:
+        fetch_fn: Callable returning raw kline rows (newest-first) or None on error
+        capacity: Max bars kept per (symbol, interval)
+        refresh_seconds: Min seconds between exchange refreshes of the same series
+        clock: Time source in seconds (overridable for tests)
+        cache_dir: Directory for persisted series (None/empty = in-memory only)
+    """
+
+    def __init__(
+        self,
+        fetch_fn: FetchFn,
+        capacity: int = CANDLE_STORE_CAPACITY,
+        refresh_seconds: float = CANDLE_STORE_REFRESH_SECONDS,
+        clock: Callable[[], float] = time.time,
+        cache_dir: Optional[str] = CANDLE_CACHE_DIR,
+    ):
+        self.fetch_fn = fetch_fn
+        self.capacity = max(1, int(capacity))
+        self.refresh_seconds = refresh_seconds
+        self.clock = clock
+        self.cache_dir = cache_dir or None
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._lock = threading.Lock()
+
+    def _get_series(self, symbol: str, interval: str) -> _Series:
+        key = (symbol, interval)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = _Series(self.capacity)
+                self._series[key] = series
+            return series
+
+    def get_rows(self, symbol: str, interval: str, limit: int) -> List[KlineRow]:
+        """
+        Return up to `limit` rows oldest-first, refreshing the buffer if needed.
+
+        Args:
+            symbol: Bybit symbol (e.g. "BTCUSDT")
+            interval: Bybit interval code (e.g. "15", "240", "D")
+            limit: Number of most recent bars wanted
+
+        Returns:
+            List of raw kline rows ordered oldest-first (empty if unavailable)
+        """
+        limit = max(1, min(int(limit), self.capacity))
+        series = self._get_series(symbol, interval)
+
+        with series.lock:
+            if not series.loaded:
+                self._load(series, symbol, interval)
+            now = self.clock()
+            needs_seed = not series.rows or (len(series.rows) < limit and not series.exhausted)
+
+            if needs_seed:
+                self._seed(series, symbol, interval, limit)
+            elif now - series.last_refresh >= self.refresh_seconds:
+                self._refresh(series, symbol, interval, limit, now)
+
+            if not series.rows:
+                return []
+            return list(series.rows)[-limit:]
+
+    def _seed(self, series: _Series, symbol: str, interval: str, limit: int) -> None:
+        seed_limit = min(max(limit, len(series.rows)), MAX_KLINE_LIMIT)
+        rows = self.fetch_fn(symbol, interval, seed_limit, None)
+        if not rows:
+            return
+        series.rows.clear()
+        series.rows.extend(reversed(rows))
+        series.exhausted = len(rows) < seed_limit
+        series.last_refresh = self.clock()
+        self._persist(series, symbol, interval)
+
+    def _refresh(self, series: _Series, symbol: str, interval: str, limit: int, now: float) -> None:
+        interval_ms = BYBIT_INTERVAL_MS.get(interval)
+        last_ts = int(series.rows[-1][0])
+        if interval_ms is None:
+            self._seed(series, symbol, interval, limit)
+            return
+
+        # Bars opened since the live bar, plus the live bar itself
+        missing = int((now * 1000 - last_ts) // interval_ms) + 1
+        if missing + 1 > MAX_KLINE_LIMIT or missing >= self.capacity:
+            self._seed(series, symbol, interval, limit)
+            return
+
+        rows = self.fetch_fn(symbol, interval, missing + 1, last_ts)
+        if not rows:
+            # Keep serving the cached series; next call retries
+            print(f"⚠️ Candle refresh failed for {symbol} {interval}, serving cached bars")
+            return
+
+        appended = self._merge(series, rows, interval_ms)
+        if appended is None:
+            print(f"⚠️ Candle refresh for {symbol} {interval} skipped bars, reseeding")
+            self._seed(series, symbol, interval, limit)
+            return
+        series.last_refresh = self.clock()
+        # Persist only when a bar closed; live-bar ticks stay in memory
+        if appended:
+            self._persist(series, symbol, interval)
+
+    @staticmethod
+    def _merge(series: _Series, rows_newest_first: List[KlineRow], interval_ms: int) -> Optional[int]:
+        """Append bars after the live one; None (series untouched) if they would leave a gap."""
+        last_ts = int(series.rows[-1][0])
+        rows = [r for r in reversed(rows_newest_first) if int(r[0]) >= last_ts]
+        expected = last_ts
+        for row in rows:
+            ts = int(row[0])
+            if ts > expected + interval_ms:
+                return None
+            expected = max(expected, ts)
+
+        appended = 0
+        for row in rows:
+            ts = int(row[0])
+            if ts == last_ts:
+                series.rows[-1] = row
+            elif ts > last_ts:
+                series.rows.append(row)
+                last_ts = ts
+                appended += 1
+        return appended
+
+    # -----------------------------------------------------------------------
+    # Disk cache
+    # -----------------------------------------------------------------------
+
+    def _cache_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.cache_dir, f"{symbol}_{interval}.json")
+
+    def _load(self, series: _Series, symbol: str, interval: str) -> None:
+        series.loaded = True
+        if not self.cache_dir:
+            return
+        path = self._cache_path(symbol, interval)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            rows = (data.get("rows") or [])[-self.capacity:]
+            interval_ms = BYBIT_INTERVAL_MS.get(interval)
+            if interval_ms and any(int(b[0]) - int(a[0]) != interval_ms for a, b in zip(rows, rows[1:])):
+                print(f"⚠️ Candle cache for {symbol} {interval} has missing bars, reseeding")
+                return
+            series.rows.extend(rows)
+            series.exhausted = bool(data.get("exhausted", False))
+            # Force an incremental refresh on first use
+            series.last_refresh = 0.0
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"⚠️ Candle cache unreadable for {symbol} {interval}: {e}")
+            series.rows.clear()
+
+    def _persist(self, series: _Series, symbol: str, interval: str) -> None:
+        if not self.cache_dir:
+            return
+        path = self._cache_path(symbol, interval)
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump({"rows": list(series.rows), "exhausted": series.exhausted}, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"⚠️ Candle cache write failed for {symbol} {interval}: {e}")
+
+    def clear(self, symbol: Optional[str] = None) -> None:
+        """Drop cached series (all, or only those for `symbol`)."""
+        with self._lock:
+            if symbol is None:
+                self._series.clear()
+            else:
+                for key in [k for k in self._series if k[0] == symbol]:
+                    del self._series[key]
+
+    def get_stats(self) -> Dict[str, int]:
+        """Return cached bar count per 'symbol:interval'."""
+        with self._lock:
+            return {f"{s}:{i}": len(series.rows) for (s, i), series in self._series.items()}
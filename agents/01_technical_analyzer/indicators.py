@@ -1,61 +1,132 @@
+import os
+import time
 import pandas as pd
+import requests
 import ta
 from datetime import datetime, timezone
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from pybit.unified_trading import HTTP
 
+from candle_store import BYBIT_INTERVAL_MS, CandleStore
+from incremental import IndicatorEngine
+
 INTERVAL_TO_BYBIT = {
     "1m": "1", "5m": "5", "15m": "15", "1h": "60", "4h": "240", "1d": "D"
 }
 
+# Bars of history for the indicator timeframes: enough to warm EMA200 (backfilled once per
+# symbol/timeframe by the candle store, then only new bars are fetched)
+INDICATOR_HISTORY_BARS = int(os.getenv("TECH_INDICATOR_HISTORY_BARS", "1000"))
+# Rebuild indicator state when the buffer evicts its seed bar (exact `ta` parity on the frame,
+# one full rebuild per closed bar); off = carry the longer history (see incremental.py)
+INDICATOR_RESEED_ON_EVICT = os.getenv("TECH_INDICATOR_RESEED_ON_EVICT", "false").lower() == "true"
+
+# Local market-data stream service (02_market_data); empty = Bybit REST only
+MARKET_DATA_URL = os.getenv("MARKET_DATA_URL", "").strip().rstrip("/")
+# Stream klines are rejected (REST fallback) when the newest bar opened more than one interval
+# plus this grace ago, or the series has had no update for this long (stalled feed)
+MARKET_DATA_STALE_GRACE_SEC = float(os.getenv("MARKET_DATA_STALE_GRACE_SEC", "60"))
+
 class CryptoTechnicalAnalysisBybit:
     def __init__(self):
         self.session = HTTP()
+        self.candle_store = CandleStore(self._fetch_kline_rows)
+        self.indicator_engine = IndicatorEngine(reseed_on_evict=INDICATOR_RESEED_ON_EVICT)
 
-    def fetch_ohlcv(self, coin: str, interval: str, limit: int = 200) -> pd.DataFrame:
-        if interval not in INTERVAL_TO_BYBIT: interval = "15m"
-        bybit_interval = INTERVAL_TO_BYBIT[interval]
-        
-        symbol = coin.replace("-", "").upper()
-        if "USDT" not in symbol: symbol += "USDT"
+    def _fetch_stream_kline_rows(self, symbol: str, bybit_interval: str, limit: int,
+                                 start: Optional[int] = None) -> Optional[List[list]]:
+        """Kline rows from the local market-data stream service, or None if not covered."""
+        try:
+            params = {"symbol": symbol, "interval": bybit_interval, "limit": limit}
+            if start is not None:
+                params["start"] = start
+            resp = requests.get(f"{MARKET_DATA_URL}/klines", params=params, timeout=2).json()
+            if resp.get("retCode") != 0:
+                return None
+            result = resp.get("result") or {}
+            rows = result.get("list") or None
+            if rows and self._stream_klines_stale(symbol, bybit_interval, rows, result.get("ageMs")):
+                return None
+            return rows
+        except Exception:
+            return None
+
+    def _stream_klines_stale(self, symbol: str, bybit_interval: str, rows: List[list],
+                             age_ms: Optional[int]) -> bool:
+        """True if the stream's newest bar is older than one interval + grace, or the series stopped updating."""
+        grace_ms = MARKET_DATA_STALE_GRACE_SEC * 1000
+        newest_age_ms = time.time() * 1000 - int(rows[0][0])
+        interval_ms = BYBIT_INTERVAL_MS.get(bybit_interval, 0)
+        if newest_age_ms > interval_ms + grace_ms or (age_ms is not None and age_ms > grace_ms):
+            print(f"⚠️ Stale stream klines for {symbol} {bybit_interval} "
+                  f"(newest bar {newest_age_ms / 1000:.0f}s old, last update {age_ms}ms ago): using REST")
+            return True
+        return False
 
+    def _fetch_kline_rows(self, symbol: str, bybit_interval: str, limit: int,
+                          start: Optional[int] = None) -> Optional[List[list]]:
+        """Fetch raw kline rows (newest-first), stream service first, then Bybit REST; None on error."""
+        if MARKET_DATA_URL:
+            rows = self._fetch_stream_kline_rows(symbol, bybit_interval, limit, start)
+            if rows:
+                return rows
         try:
-            resp = self.session.get_kline(category="linear", symbol=symbol, interval=bybit_interval, limit=limit)
+            params = {"category": "linear", "symbol": symbol, "interval": bybit_interval, "limit": limit}
+            if start is not None:
+                params["start"] = start
+            resp = self.session.get_kline(**params)
             
             # Safely check response code
             ret_code = resp.get('retCode')
             if ret_code is None:
                 print(f"Error fetching {symbol}: Missing retCode in response")
-                return pd.DataFrame()
+                return None
             
             if ret_code != 0:
                 ret_msg = resp.get('retMsg', 'Unknown error')
                 print(f"Error fetching {symbol}: API returned code {ret_code}, message: {ret_msg}")
-                return pd.DataFrame()
+                return None
             
             # Safely extract result data
             result = resp.get('result')
             if not result:
                 print(f"Error fetching {symbol}: Missing result in response")
-                return pd.DataFrame()
+                return None
             
             raw_data = result.get('list')
             if not raw_data or not isinstance(raw_data, list) or len(raw_data) == 0:
                 print(f"Error fetching {symbol}: No data in result.list")
+                return None
+            
+            return raw_data
+        except KeyError as e:
+            print(f"Error fetching {symbol}: Missing key in response - {e}")
+            return None
+        except Exception as e:
+            print(f"Error fetching {symbol}: {e}")
+            return None
+
+    def fetch_ohlcv(self, coin: str, interval: str, limit: int = 200) -> pd.DataFrame:
+        if interval not in INTERVAL_TO_BYBIT: interval = "15m"
+        bybit_interval = INTERVAL_TO_BYBIT[interval]
+        
+        symbol = coin.replace("-", "").upper()
+        if "USDT" not in symbol: symbol += "USDT"
+
+        try:
+            # Served from the shared candle store: seeded once, then refreshed incrementally
+            rows = self.candle_store.get_rows(symbol, bybit_interval, limit)
+            if not rows:
                 return pd.DataFrame()
             
-            df = pd.DataFrame(raw_data, columns=['ts', 'open', 'high', 'low', 'close', 'vol', 'turnover'])
+            df = pd.DataFrame(rows, columns=['ts', 'open', 'high', 'low', 'close', 'vol', 'turnover'])
             
             for col in ['open', 'high', 'low', 'close', 'vol']:
                 df[col] = df[col].astype(float)
             
             df['timestamp'] = pd.to_datetime(pd.to_numeric(df['ts']), unit='ms', utc=True)
             df.rename(columns={'vol': 'volume'}, inplace=True)
-            df = df.iloc[::-1].reset_index(drop=True)
             return df
-        except KeyError as e:
-            print(f"Error fetching {symbol}: Missing key in response - {e}")
-            return pd.DataFrame()
         except Exception as e:
             print(f"Error fetching {symbol}: {e}")
             return pd.DataFrame()
@@ -276,6 +347,51 @@ class CryptoTechnicalAnalysisBybit:
                 "pivot_pp": round(pp["pp"], 2)
             }
         }
+    # Public field name -> (incremental engine key, rounding)
+    INDICATOR_FIELDS = {
+        "ema_20": ("ema_20", 2),
+        "ema_50": ("ema_50", 2),
+        "ema_200": ("ema_200", 2),
+        "rsi": ("rsi_14", 2),
+        "atr": ("atr_14", 4),
+        "adx": ("adx_14", 2),
+        "macd": ("macd_line", 4),
+        "macd_signal": ("macd_signal", 4),
+        "macd_hist": ("macd_hist", 4),
+    }
+
+    def get_indicators(self, ticker: str, timeframe: str, fields: List[str]) -> Dict:
+        """
+        Requested indicators on a single timeframe (lightweight alternative to
+        get_multi_tf_analysis: one kline series, incremental update only).
+        
+        Args:
+            ticker: Symbol (e.g. "BTCUSDT")
+            timeframe: One of INTERVAL_TO_BYBIT keys
+            fields: Subset of INDICATOR_FIELDS (unknown names are ignored)
+        
+        Returns:
+            Dict with symbol, timeframe, price and the requested fields; empty dict on failure
+        """
+        if timeframe not in INTERVAL_TO_BYBIT:
+            return {}
+        df = self.fetch_ohlcv(ticker, timeframe, limit=INDICATOR_HISTORY_BARS)
+        if df.empty:
+            return {}
+        
+        ind = self.indicator_engine.sync(ticker, timeframe, df)
+        result = {
+            "symbol": ticker,
+            "timeframe": timeframe,
+            "price": round(float(df.iloc[-1]["close"]), 2),
+        }
+        for field in fields:
+            spec = self.INDICATOR_FIELDS.get(field)
+            if spec:
+                key, digits = spec
+                result[field] = round(float(ind[key]), digits)
+        return result
+
     def get_multi_tf_analysis(self, ticker: str) -> Dict:
         """Analisi su 4 timeframe: 15m, 1H, 4H, 1D"""
         timeframes = ["15m", "1h", "4h", "1d"]
@@ -286,24 +402,19 @@ class CryptoTechnicalAnalysisBybit:
         
         for tf in timeframes:
             try:
-                df = self.fetch_ohlcv(ticker, tf, limit=100)
+                df = self.fetch_ohlcv(ticker, tf, limit=INDICATOR_HISTORY_BARS)
                 if df.empty:
                     continue
                 
-                df["ema_20"] = self.calculate_ema(df["close"], 20)
-                df["ema_50"] = self.calculate_ema(df["close"], 50)
-                df["ema_200"] = self.calculate_ema(df["close"], 200)
-                macd_line, macd_sig, macd_hist = self.calculate_macd(df["close"])
-                df["rsi_14"] = self.calculate_rsi(df["close"], 14)
-                df["atr_14"] = self.calculate_atr(df["high"], df["low"], df["close"], 14)
-                df["adx_14"] = self.calculate_adx(df["high"], df["low"], df["close"], 14)
+                # EMA/MACD/RSI/ATR/ADX from the incremental engine (only new bars are processed)
+                ind = self.indicator_engine.sync(ticker, tf, df)
                 
                 last = df.iloc[-1]
-                trend = "BULLISH" if last["close"] > last["ema_50"] else "BEARISH"
-                macd_trend = "POSITIVE" if macd_line.iloc[-1] > macd_sig.iloc[-1] else "NEGATIVE"
+                trend = "BULLISH" if last["close"] > ind["ema_50"] else "BEARISH"
+                macd_trend = "POSITIVE" if ind["macd_line"] > ind["macd_signal"] else "NEGATIVE"
                 
-                if len(macd_hist) >= 3:
-                    macd_momentum = "RISING" if macd_hist.iloc[-1] > macd_hist.iloc[-3] else "FALLING"
+                if len(df) >= 3:
+                    macd_momentum = "RISING" if ind["macd_hist"] > ind["macd_hist_prev2"] else "FALLING"
                 else: 
                     macd_momentum = "NEUTRAL"
                 
@@ -354,14 +465,14 @@ class CryptoTechnicalAnalysisBybit:
                 result["timeframes"][tf] = {
                     "price": round(float(last["close"]), 2),
                     "trend":  trend,
-                    "rsi": round(float(last["rsi_14"]), 2),
+                    "rsi": round(float(ind["rsi_14"]), 2),
                     "macd": macd_trend,
                     "macd_momentum": macd_momentum,
-                    "ema_20": round(float(last["ema_20"]), 2),
-                    "ema_50": round(float(last["ema_50"]), 2),
-                    "ema_200": round(float(last["ema_200"]), 2),
-                    "atr":  round(float(last["atr_14"]), 4),
-                    "adx": round(float(last["adx_14"]), 2),
+                    "ema_20": round(float(ind["ema_20"]), 2),
+                    "ema_50": round(float(ind["ema_50"]), 2),
+                    "ema_200": round(float(ind["ema_200"]), 2),
+                    "atr":  round(float(ind["atr_14"]), 4),
+                    "adx": round(float(ind["adx_14"]), 2),
                     **crash_metrics,  # Include crash guard metrics
                     **range_metrics,  # Include range metrics
                     **bb_metrics      # Include Bollinger Bands metrics
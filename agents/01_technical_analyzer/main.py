@@ -1,4 +1,7 @@
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
 from fastapi import FastAPI
 from pydantic import BaseModel
 from indicators import CryptoTechnicalAnalysisBybit
@@ -6,9 +9,21 @@ from indicators import CryptoTechnicalAnalysisBybit
 app = FastAPI()
 analyzer = CryptoTechnicalAnalysisBybit()
 
+# Worker pool for batch analysis (fetch + indicators per symbol run concurrently)
+BATCH_MAX_WORKERS = int(os.getenv("TECH_BATCH_MAX_WORKERS", "8"))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix="tech-batch")
+
 class TechRequest(BaseModel):
     symbol: str
 
+class TechBatchRequest(BaseModel):
+    symbols: List[str]
+
+class IndicatorsRequest(BaseModel):
+    symbol: str
+    timeframe: str = "4h"
+    fields: List[str] = ["atr"]
+
 def sanitize_floats(obj):
     """Converte NaN e Infinity in None per compatibilità JSON"""
     if isinstance(obj, float):
@@ -21,12 +36,36 @@ def sanitize_floats(obj):
         return [sanitize_floats(item) for item in obj]
     return obj
 
+def analyze_symbol(symbol: str) -> dict:
+    """Analisi multi-timeframe di un simbolo, con fallback di errore"""
+    try:
+        data = analyzer.get_multi_tf_analysis(symbol)
+    except Exception as e:
+        print(f"Error analyzing {symbol}: {e}")
+        data = None
+    if not data or not data.get("timeframes"):
+        return {"symbol": symbol, "error": "Multi-TF Analysis Failed", "timeframes": {}}
+    return sanitize_floats(data)
+
 @app.post("/analyze_multi_tf")
 def analyze_endpoint(req: TechRequest):
     """Endpoint per analisi multi-timeframe"""
-    data = analyzer.get_multi_tf_analysis(req.symbol)
-    if not data or not data.get("timeframes"):
-        return {"symbol": req.symbol, "error": "Multi-TF Analysis Failed", "timeframes": {}}
+    return analyze_symbol(req.symbol)
+
+@app.post("/analyze_multi_tf_batch")
+def analyze_batch_endpoint(req: TechBatchRequest):
+    """Endpoint per analisi multi-timeframe di più simboli in una sola risposta"""
+    # Dedup preservando l'ordine
+    symbols = list(dict.fromkeys(s for s in req.symbols if s))
+    results = dict(zip(symbols, batch_executor.map(analyze_symbol, symbols)))
+    return {"results": results, "count": len(results)}
+
+@app.post("/indicators")
+def indicators_endpoint(req: IndicatorsRequest):
+    """Endpoint leggero: solo gli indicatori richiesti su un singolo timeframe"""
+    data = analyzer.get_indicators(req.symbol, req.timeframe, req.fields)
+    if not data:
+        return {"symbol": req.symbol, "timeframe": req.timeframe, "error": "Indicators Failed"}
     return sanitize_floats(data)
 
 @app.get("/health")
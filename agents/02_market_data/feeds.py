@@ -0,0 +1,137 @@
+"""
+Market data feeds for the ingestion service.
+
+- BybitWebSocketFeed: live public streams (kline, tickers, orderbook) via pybit
+- ReplayFeed: replays a recorded JSONL file for offline runs and tests
+- MessageRecorder: wraps a handler and records every message to JSONL
+
+Every feed delivers raw Bybit v5 messages to a handler callable, so the
+store cannot tell a live feed from a replayed one.
+"""
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+logger = logging.getLogger("MarketData")
+
+Handler = Callable[[dict], None]
+
+
+class MessageRecorder:
+    """Forward messages to `handler` and append them to a JSONL recording."""
+
+    def __init__(self, handler: Handler, path: str):
+        self.handler = handler
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, message: dict) -> None:
+        try:
+            line = json.dumps({"recv_ts": time.time(), "msg": message})
+            with self._lock, open(self.path, "a") as f:
+                f.write(line + "\n")
+        except Exception as e:
+            logger.warning(f"⚠️ Recording failed: {e}")
+        self.handler(message)
+
+
+class ReplayFeed:
+    """
+    Replay a JSONL recording ({"recv_ts": float, "msg": {...}} per line,
+    or bare messages) into a handler.
+
+    Args:
+        path: Recording file
+        speed: 0 = as fast as possible, 1.0 = real time, 10.0 = 10x, ...
+        loop: Restart from the beginning when the file ends
+    """
+
+    def __init__(self, path: str, speed: float = 0.0, loop: bool = False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _read(self) -> Iterable[tuple]:
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"⚠️ Skipping malformed replay line: {line[:80]}")
+                    continue
+                if "msg" in entry:
+                    yield entry.get("recv_ts"), entry["msg"]
+                else:
+                    yield None, entry
+
+    def run(self, handler: Handler) -> int:
+        """Replay synchronously; returns number of messages delivered."""
+        delivered = 0
+        while not self._stop.is_set():
+            prev_ts = None
+            for recv_ts, msg in self._read():
+                if self._stop.is_set():
+                    break
+                if self.speed > 0 and recv_ts is not None and prev_ts is not None:
+                    delay = (recv_ts - prev_ts) / self.speed
+                    if delay > 0:
+                        self._stop.wait(delay)
+                prev_ts = recv_ts if recv_ts is not None else prev_ts
+                handler(msg)
+                delivered += 1
+            if not self.loop:
+                break
+        return delivered
+
+    def start(self, handler: Handler) -> None:
+        self._thread = threading.Thread(target=self.run, args=(handler,), daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class BybitWebSocketFeed:
+    """
+    Live Bybit v5 public linear streams.
+
+    Args:
+        symbols: Symbols to subscribe
+        intervals: Kline intervals (Bybit codes, e.g. ["1", "5", "15", "60", "240", "D"])
+        orderbook_depth: Order book depth (1 = top of book)
+        testnet: Use testnet endpoints
+    """
+
+    def __init__(self, symbols: List[str], intervals: List[str],
+                 orderbook_depth: int = 1, testnet: bool = False):
+        self.symbols = symbols
+        self.intervals = intervals
+        self.orderbook_depth = orderbook_depth
+        self.testnet = testnet
+        self.ws = None
+
+    def start(self, handler: Handler) -> None:
+        from pybit.unified_trading import WebSocket
+
+        self.ws = WebSocket(testnet=self.testnet, channel_type="linear")
+        for interval in self.intervals:
+            self.ws.kline_stream(interval=interval, symbol=self.symbols, callback=handler)
+        self.ws.ticker_stream(symbol=self.symbols, callback=handler)
+        self.ws.orderbook_stream(depth=self.orderbook_depth, symbol=self.symbols, callback=handler)
+        logger.info(f"📡 Subscribed {len(self.symbols)} symbols: klines {self.intervals}, "
+                    f"tickers, orderbook.{self.orderbook_depth}")
+
+    def stop(self) -> None:
+        if self.ws is not None:
+            try:
+                self.ws.exit()
+            except Exception as e:
+                logger.warning(f"⚠️ WebSocket exit error: {e}")
@@ -0,0 +1,104 @@
+"""
+Market Data Ingestion Service
+
+Subscribes to Bybit public streams (kline, tickers, orderbook) and serves
+the in-memory candles / top-of-book to the other agents over HTTP:
+- GET /klines        Bybit REST-compatible kline response (drop-in for get_kline,
+                     plus updatedAt / ageMs of the series)
+- GET /ticker/{sym}  Latest ticker + age
+- GET /orderbook/{sym} Top of book + age
+- GET /health        Feed stats
+
+MARKET_DATA_REPLAY_FILE switches to a recorded feed (offline / tests);
+MARKET_DATA_RECORD_FILE records the live feed for later replay.
+"""
+
+import logging
+import os
+from typing import Optional
+
+from fastapi import FastAPI
+
+from feeds import BybitWebSocketFeed, MessageRecorder, ReplayFeed
+from market_store import MarketDataStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("MarketData")
+
+DEFAULT_SYMBOLS = "BTCUSDT,ETHUSDT,SOLUSDT,BNBUSDT,XRPUSDT,AVAXUSDT,DOGEUSDT,LINKUSDT,ADAUSDT,SUIUSDT,PEPEUSDT,PAXGUSDT"
+MARKET_DATA_SYMBOLS = [s.strip().upper() for s in os.getenv("MARKET_DATA_SYMBOLS", DEFAULT_SYMBOLS).split(",") if s.strip()]
+MARKET_DATA_INTERVALS = [s.strip() for s in os.getenv("MARKET_DATA_INTERVALS", "1,5,15,60,240,D").split(",") if s.strip()]
+MARKET_DATA_CANDLE_CAPACITY = int(os.getenv("MARKET_DATA_CANDLE_CAPACITY", "1000"))
+MARKET_DATA_ORDERBOOK_DEPTH = int(os.getenv("MARKET_DATA_ORDERBOOK_DEPTH", "1"))
+MARKET_DATA_REPLAY_FILE = os.getenv("MARKET_DATA_REPLAY_FILE", "").strip()
+MARKET_DATA_REPLAY_SPEED = float(os.getenv("MARKET_DATA_REPLAY_SPEED", "0"))
+MARKET_DATA_RECORD_FILE = os.getenv("MARKET_DATA_RECORD_FILE", "").strip()
+BYBIT_TESTNET = os.getenv("BYBIT_TESTNET", "false").lower() == "true"
+
+app = FastAPI()
+store = MarketDataStore(candle_capacity=MARKET_DATA_CANDLE_CAPACITY)
+feed = None
+
+
+def build_feed():
+    """Replay feed if MARKET_DATA_REPLAY_FILE is set, otherwise live WebSocket."""
+    if MARKET_DATA_REPLAY_FILE:
+        logger.info(f"🔁 Replaying market data from {MARKET_DATA_REPLAY_FILE} (speed={MARKET_DATA_REPLAY_SPEED})")
+        return ReplayFeed(MARKET_DATA_REPLAY_FILE, speed=MARKET_DATA_REPLAY_SPEED)
+    return BybitWebSocketFeed(MARKET_DATA_SYMBOLS, MARKET_DATA_INTERVALS,
+                              orderbook_depth=MARKET_DATA_ORDERBOOK_DEPTH, testnet=BYBIT_TESTNET)
+
+
+@app.on_event("startup")
+def start_feed():
+    global feed
+    handler = store.apply
+    if MARKET_DATA_RECORD_FILE and not MARKET_DATA_REPLAY_FILE:
+        logger.info(f"⏺️ Recording market data to {MARKET_DATA_RECORD_FILE}")
+        handler = MessageRecorder(handler, MARKET_DATA_RECORD_FILE)
+    feed = build_feed()
+    try:
+        feed.start(handler)
+    except Exception as e:
+        logger.error(f"❌ Market data feed failed to start: {e}")
+
+
+@app.on_event("shutdown")
+def stop_feed():
+    if feed is not None:
+        feed.stop()
+
+
+@app.get("/klines")
+def klines(symbol: str, interval: str, limit: int = 200, start: Optional[int] = None):
+    """Kline rows newest-first, same shape as Bybit /v5/market/kline (plus updatedAt / ageMs)."""
+    klines = store.get_klines(symbol.upper(), interval, limit=limit, start=start)
+    if klines is None:
+        return {"retCode": 10001, "retMsg": "Not covered by market data stream", "result": {}}
+    rows, updated_at = klines
+    return {"retCode": 0, "retMsg": "OK",
+            "result": {"category": "linear", "symbol": symbol.upper(), "list": rows,
+                       "updatedAt": int(updated_at * 1000),
+                       "ageMs": int((store.clock() - updated_at) * 1000)}}
+
+
+@app.get("/ticker/{symbol}")
+def ticker(symbol: str):
+    data = store.get_ticker(symbol.upper())
+    if data is None:
+        return {"symbol": symbol.upper(), "error": "No ticker data"}
+    return data
+
+
+@app.get("/orderbook/{symbol}")
+def orderbook(symbol: str):
+    data = store.get_top_of_book(symbol.upper())
+    if data is None:
+        return {"symbol": symbol.upper(), "error": "No orderbook data"}
+    return data
+
+
+@app.get("/health")
+def health():
+    return {"status": "active", "source": "replay" if MARKET_DATA_REPLAY_FILE else "websocket",
+            **store.get_stats()}
@@ -0,0 +1,219 @@
+"""
+In-memory market data store fed by Bybit v5 public stream messages.
+
+Keeps, per symbol:
+- Candles per interval (ring buffer, REST kline row format)
+- Latest ticker (snapshot + delta merge)
+- Order book levels and derived top-of-book
+
+Messages are applied exactly as delivered by the WebSocket (or a replayed
+recording), so live and offline runs share the same code path.
+
+A kline series only ever holds consecutive bars: when a bar arrives more than
+one interval after the last one (messages lost across a reconnect), the series
+restarts from that bar, so requests reaching back past the gap fall back to REST.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+DEFAULT_CANDLE_CAPACITY = 1000
+
+# Bybit interval code -> bar length in ms ("M" has no fixed length and is not gap-checked)
+INTERVAL_MS = {
+    "1": 60_000, "3": 3 * 60_000, "5": 5 * 60_000, "15": 15 * 60_000, "30": 30 * 60_000,
+    "60": 60 * 60_000, "120": 2 * 60 * 60_000, "240": 4 * 60 * 60_000, "360": 6 * 60 * 60_000,
+    "720": 12 * 60 * 60_000, "D": 24 * 60 * 60_000, "W": 7 * 24 * 60 * 60_000,
+}
+
+
+class MarketDataStore:
+    """
+    Thread-safe store for candles, tickers and order books.
+
+    Args:
+        candle_capacity: Max candles kept per (symbol, interval)
+        clock: Time source in seconds (overridable for tests)
+    """
+
+    def __init__(self, candle_capacity: int = DEFAULT_CANDLE_CAPACITY, clock=time.time):
+        self.candle_capacity = candle_capacity
+        self.clock = clock
+        self._lock = threading.Lock()
+        # (symbol, interval) -> deque of [start, open, high, low, close, volume, turnover]
+        self._candles: Dict[Tuple[str, str], Deque[List[str]]] = {}
+        # (symbol, interval) -> clock() of the last kline message applied
+        self._candles_updated_at: Dict[Tuple[str, str], float] = {}
+        # (symbol, interval) -> number of times the series restarted after missing bars
+        self._candle_gaps: Dict[Tuple[str, str], int] = {}
+        self._tickers: Dict[str, dict] = {}
+        # symbol -> {"bids": {price: size}, "asks": {price: size}, "ts": ..., "updated_at": ...}
+        self._books: Dict[str, dict] = {}
+        self.message_count = 0
+        self.last_message_at: Optional[float] = None
+
+    # -----------------------------------------------------------------------
+    # Message ingestion
+    # -----------------------------------------------------------------------
+
+    def apply(self, message: dict) -> None:
+        """Apply one Bybit v5 public stream message (kline / tickers / orderbook)."""
+        topic = message.get("topic", "") if isinstance(message, dict) else ""
+        if not topic:
+            return  # subscription acks, pongs, etc.
+
+        with self._lock:
+            self.message_count += 1
+            self.last_message_at = self.clock()
+            if topic.startswith("kline."):
+                self._apply_kline(topic, message.get("data") or [])
+            elif topic.startswith("tickers."):
+                self._apply_ticker(message.get("type", "snapshot"), message.get("data") or {})
+            elif topic.startswith("orderbook."):
+                self._apply_orderbook(message.get("type", "snapshot"), message.get("data") or {},
+                                      message.get("ts"))
+
+    def _apply_kline(self, topic: str, bars: List[dict]) -> None:
+        # topic: kline.{interval}.{symbol}
+        _, interval, symbol = topic.split(".", 2)
+        buf = self._candles.get((symbol, interval))
+        if buf is None:
+            buf = deque(maxlen=self.candle_capacity)
+            self._candles[(symbol, interval)] = buf
+        interval_ms = INTERVAL_MS.get(interval)
+
+        for bar in bars:
+            start = int(bar["start"])
+            row = [str(start), str(bar["open"]), str(bar["high"]), str(bar["low"]),
+                   str(bar["close"]), str(bar.get("volume", "0")), str(bar.get("turnover", "0"))]
+            if buf and int(buf[-1][0]) == start:
+                buf[-1] = row
+            elif not buf or start > int(buf[-1][0]):
+                if buf and interval_ms and start - int(buf[-1][0]) > interval_ms:
+                    buf.clear()  # bars missing in between: restart the series here
+                    self._candle_gaps[(symbol, interval)] = self._candle_gaps.get((symbol, interval), 0) + 1
+                buf.append(row)
+            # Older bars (late/out-of-order) are ignored
+        if bars:
+            self._candles_updated_at[(symbol, interval)] = self.clock()
+
+    def _apply_ticker(self, msg_type: str, data: dict) -> None:
+        symbol = data.get("symbol")
+        if not symbol:
+            return
+        if msg_type == "snapshot" or symbol not in self._tickers:
+            ticker = dict(data)
+        else:
+            ticker = self._tickers[symbol]
+            ticker.update(data)
+        ticker["updated_at"] = self.clock()
+        self._tickers[symbol] = ticker
+
+    def _apply_orderbook(self, msg_type: str, data: dict, ts) -> None:
+        symbol = data.get("s")
+        if not symbol:
+            return
+        book = self._books.get(symbol)
+        if msg_type == "snapshot" or book is None:
+            book = {"bids": {}, "asks": {}}
+            self._books[symbol] = book
+
+        for side_key, levels in (("bids", data.get("b") or []), ("asks", data.get("a") or [])):
+            side = book[side_key]
+            for price, size in levels:
+                if float(size) == 0:
+                    side.pop(price, None)
+                else:
+                    side[price] = size
+
+        book["ts"] = ts
+        book["update_id"] = data.get("u")
+        book["updated_at"] = self.clock()
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def get_klines(self, symbol: str, interval: str, limit: int = 200,
+                   start: Optional[int] = None) -> Optional[Tuple[List[List[str]], float]]:
+        """
+        Return kline rows newest-first (Bybit REST format) with their freshness,
+        or None if the store does not cover the request (caller should fall back to REST).
+
+        Args:
+            symbol: e.g. "BTCUSDT"
+            interval: Bybit interval code ("1", "5", "15", "60", "240", "D")
+            limit: Max rows
+            start: Only rows with start >= this ms timestamp
+
+        Returns:
+            (rows, updated_at): updated_at is the clock() time of the last kline
+            message for the series, so callers can reject a stalled feed
+        """
+        with self._lock:
+            buf = self._candles.get((symbol, interval))
+            if not buf:
+                return None
+            rows = list(buf)
+            updated_at = self._candles_updated_at[(symbol, interval)]
+
+        if start is not None:
+            if int(rows[0][0]) > start:
+                return None  # history before our first bar is missing
+            rows = [r for r in rows if int(r[0]) >= start]
+        elif len(rows) < limit:
+            return None
+
+        return list(reversed(rows[-limit:])), updated_at
+
+    def get_ticker(self, symbol: str) -> Optional[dict]:
+        """Latest merged ticker with its age in ms."""
+        with self._lock:
+            ticker = self._tickers.get(symbol)
+            if ticker is None:
+                return None
+            out = dict(ticker)
+        out["age_ms"] = int((self.clock() - out["updated_at"]) * 1000)
+        return out
+
+    def get_top_of_book(self, symbol: str) -> Optional[dict]:
+        """Best bid/ask with sizes, mid, spread and age in ms."""
+        with self._lock:
+            book = self._books.get(symbol)
+            if not book or not book["bids"] or not book["asks"]:
+                return None
+            bid_px = max(book["bids"], key=float)
+            ask_px = min(book["asks"], key=float)
+            bid_sz, ask_sz = book["bids"][bid_px], book["asks"][ask_px]
+            updated_at, ts = book["updated_at"], book.get("ts")
+
+        bid, ask = float(bid_px), float(ask_px)
+        mid = (bid + ask) / 2
+        return {
+            "symbol": symbol,
+            "bid": bid,
+            "bid_size": float(bid_sz),
+            "ask": ask,
+            "ask_size": float(ask_sz),
+            "mid": mid,
+            "spread_pct": ((ask - bid) / mid) * 100 if mid > 0 else 0.0,
+            "exchange_ts": ts,
+            "age_ms": int((self.clock() - updated_at) * 1000),
+        }
+
+    def get_stats(self) -> dict:
+        """Summary for /health."""
+        with self._lock:
+            return {
+                "messages": self.message_count,
+                "last_message_age_ms": (
+                    int((self.clock() - self.last_message_at) * 1000)
+                    if self.last_message_at is not None else None
+                ),
+                "candle_series": {f"{s}:{i}": len(b) for (s, i), b in self._candles.items()},
+                "candle_gaps": {f"{s}:{i}": n for (s, i), n in self._candle_gaps.items()},
+                "tickers": sorted(self._tickers),
+                "orderbooks": sorted(self._books),
+            }
@@ -0,0 +1,161 @@
+"""
+Async client for OpenAI-compatible chat completion APIs (DeepSeek).
+
+Keeps the uvicorn event loop free while the LLM thinks:
+- one pooled httpx.AsyncClient (keep-alive connections reused across requests)
+- per-request timeout
+- bounded concurrency (asyncio.Semaphore)
+- retry with exponential backoff + jitter on timeouts, transport errors,
+  429 and 5xx (Retry-After honoured)
+
+base_url can point at a local stub server for tests.
+"""
+
+import asyncio
+import logging
+import random
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger("MasterAI")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """LLM call failed (non-retryable response or retries exhausted)."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMResponse:
+    """Content and token usage of one chat completion."""
+
+    __slots__ = ("content", "prompt_tokens", "completion_tokens", "attempts")
+
+    def __init__(self, content: str, prompt_tokens: int = 0, completion_tokens: int = 0, attempts: int = 1):
+        self.content = content
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.attempts = attempts
+
+
+class AsyncLLMClient:
+    """
+    Pooled, rate-limited async chat completion client.
+
+    Args:
+        api_key: Bearer token
+        base_url: API root, e.g. "https://api.deepseek.com" (POST {base_url}/chat/completions)
+        model: Default model name
+        timeout: Default per-request timeout in seconds
+        max_concurrency: Max in-flight requests
+        max_retries: Retries after the first attempt
+        backoff_base: First backoff delay in seconds (doubles each retry)
+        backoff_max: Backoff cap in seconds
+        max_connections: httpx pool size
+    """
+
+    def __init__(self, api_key: Optional[str], base_url: str, model: str = "deepseek-chat",
+                 timeout: float = 60.0, max_concurrency: int = 4, max_retries: int = 2,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, max_connections: int = 10):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_connections = max_connections
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._http: Optional[httpx.AsyncClient] = None
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "in_flight": 0}
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            headers = {"Content-Type": "application/json"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._http
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    async def chat_json(self, messages: List[Dict[str, str]], temperature: float = 0.3,
+                        model: Optional[str] = None, timeout: Optional[float] = None) -> LLMResponse:
+        """Chat completion with response_format=json_object."""
+        return await self.chat(messages, temperature=temperature, model=model, timeout=timeout,
+                               response_format={"type": "json_object"})
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3,
+                   model: Optional[str] = None, timeout: Optional[float] = None,
+                   **extra: Any) -> LLMResponse:
+        """
+        POST /chat/completions and return the first choice.
+
+        Raises:
+            LLMError: on non-retryable errors or when retries are exhausted
+        """
+        payload = {"model": model or self.model, "messages": messages, "temperature": temperature, **extra}
+        req_timeout = self.timeout if timeout is None else timeout
+        last_error = "unknown error"
+        last_status = None
+
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    retry_after = None
+                    try:
+                        resp = await self._client().post("/chat/completions", json=payload, timeout=req_timeout)
+                        if resp.status_code == 200:
+                            data = resp.json()
+                            usage = data.get("usage") or {}
+                            return LLMResponse(
+                                content=data["choices"][0]["message"]["content"],
+                                prompt_tokens=int(usage.get("prompt_tokens", 0) or 0),
+                                completion_tokens=int(usage.get("completion_tokens", 0) or 0),
+                                attempts=attempt + 1,
+                            )
+                        last_status = resp.status_code
+                        last_error = f"HTTP {resp.status_code}: {resp.text[:200]}"
+                        if resp.status_code not in RETRYABLE_STATUS:
+                            break
+                        retry_after = resp.headers.get("Retry-After")
+                    except httpx.TimeoutException:
+                        last_error = f"timeout after {req_timeout}s"
+                    except httpx.TransportError as e:
+                        last_error = f"transport error: {e}"
+
+                    if attempt < self.max_retries:
+                        delay = self._backoff(attempt, retry_after)
+                        self.stats["retries"] += 1
+                        logger.warning(f"⚠️ LLM call failed ({last_error}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                        await asyncio.sleep(delay)
+            finally:
+                self.stats["in_flight"] -= 1
+
+        self.stats["failures"] += 1
+        raise LLMError(last_error, status_code=last_status)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
@@ -7,15 +7,42 @@ from datetime import datetime, timedelta
 from fastapi import FastAPI
 from pydantic import BaseModel
 from typing import Dict, Any, Optional, List
-from openai import OpenAI
 from threading import Lock
 
+from shared.decision_journal import journal_from_env
+from llm_client import AsyncLLMClient
+from shared.trade_store import TradeStore
+from wyckoff_cache import ResponseCache, wyckoff_fingerprint
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("MasterAI")
 
 app = FastAPI()
 DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
-client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com").strip()
+LLM_TIMEOUT_SEC = float(os.getenv("LLM_TIMEOUT_SEC", "60"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+llm = AsyncLLMClient(
+    api_key=DEEPSEEK_API_KEY,
+    base_url=DEEPSEEK_BASE_URL,
+    model="deepseek-chat",
+    timeout=LLM_TIMEOUT_SEC,
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES,
+)
+
+
+# Wyckoff response cache: same quantized inputs within the TTL -> no LLM call
+WYCKOFF_CACHE_TTL_SEC = float(os.getenv("WYCKOFF_CACHE_TTL_SEC", "300"))
+WYCKOFF_CACHE_MAX_ENTRIES = int(os.getenv("WYCKOFF_CACHE_MAX_ENTRIES", "256"))
+WYCKOFF_CACHE_PRICE_STEP = float(os.getenv("WYCKOFF_CACHE_PRICE_STEP", "0.0015"))  # 0.15% price buckets
+wyckoff_cache = ResponseCache(max_entries=WYCKOFF_CACHE_MAX_ENTRIES, ttl_seconds=WYCKOFF_CACHE_TTL_SEC)
+
+
+@app.on_event("shutdown")
+async def close_llm_client():
+    await llm.aclose()
 
 # Agent URLs for reverse analysis
 AGENT_URLS = {
@@ -30,9 +57,11 @@ LEARNING_AGENT_URL = "http://10_learning_agent:8000"
 
 EVOLVED_PARAMS_FILE = "/data/evolved_params.json"
 API_COSTS_FILE = "/data/api_costs.json"
-AI_DECISIONS_FILE = "/data/ai_decisions.json"
+decision_journal = journal_from_env()
 RECENT_CLOSES_FILE = "/data/recent_closes.json"
-TRADING_HISTORY_FILE = "/data/trading_history.json"
+TRADING_HISTORY_FILE = "/data/trading_history.json"  # legacy, until the learning agent migrates it
+TRADING_HISTORY_DB = os.getenv("TRADING_HISTORY_DB", "/data/trading_history.db")
+_trade_store: Optional[TradeStore] = None
 
 COOLDOWN_MINUTES = 15
 
@@ -124,22 +153,11 @@ def log_api_call(tokens_in: int, tokens_out: int):
 
 def save_ai_decision(decision_data):
     try:
-        decisions = []
-        if os.path.exists(AI_DECISIONS_FILE):
-            with open(AI_DECISIONS_FILE, 'r') as f:
-                decisions = json.load(f)
-
-        decisions.append({
+        decision_journal.append({
             'timestamp': datetime.now().isoformat(),
             **decision_data
         })
 
-        decisions = decisions[-100:]
-
-        os.makedirs(os.path.dirname(AI_DECISIONS_FILE), exist_ok=True)
-        with open(AI_DECISIONS_FILE, 'w') as f:
-            json.dump(decisions, f, indent=2)
-
         logger.info(f"AI decision saved: {decision_data.get('source', 'wyckoff')}")
     except Exception as e:
         logger.error(f"Error saving AI decision: {e}")
@@ -151,13 +169,17 @@ def save_ai_decision(decision_data):
 
 def get_journal_for_llm(symbol: str = None, limit: int = 20) -> list:
     """Prepare trading journal for LLM context. Compact format."""
-    history = load_json_file(TRADING_HISTORY_FILE, [])
-
-    if symbol:
-        coin = symbol.replace("USDT", "")
-        relevant = [t for t in history if t.get("symbol") == coin]
+    global _trade_store
+    coin = symbol.replace("USDT", "") if symbol else None
+
+    if os.path.exists(TRADING_HISTORY_DB):
+        # Indexed query on the learning agent's trade store
+        if _trade_store is None:
+            _trade_store = TradeStore(TRADING_HISTORY_DB)
+        relevant = _trade_store.latest(limit, symbol=coin)
     else:
-        relevant = history
+        history = load_json_file(TRADING_HISTORY_FILE, [])
+        relevant = [t for t in history if t.get("symbol") == coin] if coin else history
 
     return [
         {
@@ -314,22 +336,28 @@ async def analyze_wyckoff(request: WyckoffRequest):
             journal = get_journal_for_llm(request.symbol, limit=20)
         prompt_data["trading_journal"] = journal
 
+        cache_key = None
+        if WYCKOFF_CACHE_TTL_SEC > 0:
+            cache_key = wyckoff_fingerprint(prompt_data, rel_step=WYCKOFF_CACHE_PRICE_STEP)
+            cached = wyckoff_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Wyckoff cache hit for {request.symbol}: {cached['market_phase']} / {cached['trade_proposal']['direction']}")
+                cached["cached"] = True
+                return cached
+
         user_content = f"ANALIZZA: {json.dumps(prompt_data, indent=2)}"
 
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
+        response = await llm.chat_json(
+            [
                 {"role": "system", "content": WYCKOFF_SYSTEM_PROMPT},
                 {"role": "user", "content": user_content},
             ],
-            response_format={"type": "json_object"},
             temperature=0.3,
         )
 
-        if hasattr(response, 'usage') and response.usage:
-            log_api_call(response.usage.prompt_tokens, response.usage.completion_tokens)
+        log_api_call(response.prompt_tokens, response.completion_tokens)
 
-        content = response.choices[0].message.content
+        content = response.content
         logger.info(f"Wyckoff analysis for {request.symbol}: {content[:300]}")
 
         result = json.loads(content)
@@ -368,6 +396,9 @@ async def analyze_wyckoff(request: WyckoffRequest):
             "reasoning": trade_proposal.get("reasoning", "")[:200],
         })
 
+        if cache_key is not None:
+            wyckoff_cache.put(cache_key, validated_result, response.prompt_tokens, response.completion_tokens)
+
         return validated_result
 
     except Exception as e:
@@ -466,20 +497,17 @@ Recovery size calcolato: {recovery_size_pct:.2f} ({recovery_size_pct*100:.1f}%)
 
 Analizza TUTTI gli indicatori e decidi: HOLD, CLOSE o REVERSE."""
 
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
+        response = await llm.chat_json(
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
-            response_format={"type": "json_object"},
             temperature=0.3
         )
 
-        if hasattr(response, 'usage') and response.usage:
-            log_api_call(response.usage.prompt_tokens, response.usage.completion_tokens)
+        log_api_call(response.prompt_tokens, response.completion_tokens)
 
-        content = response.choices[0].message.content
+        content = response.content
         logger.info(f"Reverse analysis response for {symbol}: {content}")
 
         decision = json.loads(content)
@@ -524,6 +552,40 @@ Analizza TUTTI gli indicatori e decidi: HOLD, CLOSE o REVERSE."""
 # /manage_critical_positions - KEPT (fast path for critical losses)
 # ---------------------------------------------------------------------------
 
+async def fetch_tech_data_map(http_client: httpx.AsyncClient, symbols: List[str]) -> Dict[str, dict]:
+    """
+    Multi-TF technical analysis for several symbols via /analyze_multi_tf_batch.
+
+    Falls back to one /analyze_multi_tf_full call per symbol when the batch
+    request fails (e.g. a technical analyzer without the batch endpoint).
+
+    Returns:
+        {symbol: analysis} with {} for symbols that could not be analyzed
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    try:
+        resp = await http_client.post(f"{AGENT_URLS['technical']}/analyze_multi_tf_batch", json={"symbols": symbols})
+        resp.raise_for_status()
+        results = resp.json().get("results") or {}
+        return {sym: results.get(sym) or {} for sym in symbols}
+    except Exception as e:
+        logger.warning(f"Tech batch failed ({e}), falling back to per-symbol calls")
+
+    tech_results = await asyncio.gather(
+        *(http_client.post(f"{AGENT_URLS['technical']}/analyze_multi_tf_full", json={"symbol": sym}) for sym in symbols),
+        return_exceptions=True,
+    )
+    tech_data_map = {}
+    for sym, res in zip(symbols, tech_results):
+        try:
+            tech_data_map[sym] = {} if isinstance(res, Exception) else res.json()
+        except Exception:
+            tech_data_map[sym] = {}
+    return tech_data_map
+
+
 @app.post("/manage_critical_positions")
 async def manage_critical_positions(request: ManageCriticalPositionsRequest):
     """
@@ -544,25 +606,9 @@ async def manage_critical_positions(request: ManageCriticalPositionsRequest):
             "evolved_at": learning_params.get("evolved_at") if isinstance(learning_params, dict) else None,
         }
 
-        # Fast path: tech data in parallel
+        # Fast path: tech data for all positions in one call
         async with httpx.AsyncClient(timeout=10.0) as http_client:
-            tech_tasks = [
-                http_client.post(
-                    f"{AGENT_URLS['technical']}/analyze_multi_tf_full",
-                    json={"symbol": pos.symbol}
-                )
-                for pos in request.positions
-            ]
-            tech_results = await asyncio.gather(*tech_tasks, return_exceptions=True)
-            tech_data_map = {}
-            for i, pos in enumerate(request.positions):
-                if isinstance(tech_results[i], Exception):
-                    tech_data_map[pos.symbol] = {}
-                else:
-                    try:
-                        tech_data_map[pos.symbol] = tech_results[i].json()
-                    except Exception:
-                        tech_data_map[pos.symbol] = {}
+            tech_data_map = await fetch_tech_data_map(http_client, [pos.symbol for pos in request.positions])
 
         for pos in request.positions:
             entry = pos.entry_price
@@ -647,25 +693,22 @@ DECIDI: HOLD, CLOSE o REVERSE"""
             decision_rationale = "Timeout/error LLM, fallback CLOSE"
 
             try:
-                async def call_llm():
-                    return await asyncio.to_thread(
-                        lambda: client.chat.completions.create(
-                            model="deepseek-chat",
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_prompt}
-                            ],
-                            response_format={"type": "json_object"},
-                            temperature=0.3
-                        )
-                    )
-
-                response = await asyncio.wait_for(call_llm(), timeout=20.0)
-
-                if hasattr(response, 'usage') and response.usage:
-                    log_api_call(response.usage.prompt_tokens, response.usage.completion_tokens)
-
-                content = response.choices[0].message.content
+                # 20s budget for the whole call, retries included
+                response = await asyncio.wait_for(
+                    llm.chat_json(
+                        [
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_prompt}
+                        ],
+                        temperature=0.3,
+                        timeout=15.0,
+                    ),
+                    timeout=20.0,
+                )
+
+                log_api_call(response.prompt_tokens, response.completion_tokens)
+
+                content = response.content
                 decision_data = json.loads(content)
 
                 decision_action = decision_data.get("action", "CLOSE").upper()
@@ -771,4 +814,4 @@ DECIDI: HOLD, CLOSE o REVERSE"""
 
 @app.get("/health")
 def health():
-    return {"status": "active"}
+    return {"status": "active", "llm": dict(llm.stats), "wyckoff_cache": wyckoff_cache.get_stats()}
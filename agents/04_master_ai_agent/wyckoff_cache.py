@@ -0,0 +1,126 @@
+"""
+Response cache for /analyze_wyckoff.
+
+The orchestrator asks for the same symbol every cycle with near-identical
+inputs. Inputs are quantized into a fingerprint (prices to a relative
+bucket, RSI / imbalance / funding to fixed steps) so that small jitter maps
+to the same key; a TTL + LRU cache then serves the previous phase/direction
+without a DeepSeek call until the market state materially moves.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Absolute steps for bounded / near-zero fields (matched on key substring)
+DEFAULT_ABS_STEPS = {
+    "rsi": 2.5,
+    "imbalance": 0.05,
+    "funding": 0.00005,
+    "confidence": 5.0,
+}
+
+
+def _rel_bucket(x: float, rel_step: float) -> int:
+    """Log bucket: values within ~rel_step of each other share a bucket."""
+    if x == 0:
+        return 0
+    return int(math.copysign(round(math.log(abs(x)) / math.log1p(rel_step)), x))
+
+
+def quantize(value: Any, rel_step: float, abs_steps: Dict[str, float], key: str = "") -> Any:
+    """Recursively quantize a JSON-like structure for fingerprinting."""
+    if isinstance(value, dict):
+        return {k: quantize(v, rel_step, abs_steps, str(k).lower()) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [quantize(v, rel_step, abs_steps, key) for v in value]
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        x = float(value)
+        if not math.isfinite(x):
+            return str(x)
+        for name, step in abs_steps.items():
+            if name in key:
+                return round(x / step)
+        return _rel_bucket(x, rel_step)
+    return str(value)
+
+
+def wyckoff_fingerprint(prompt_data: dict, rel_step: float = 0.0015,
+                        abs_steps: Optional[Dict[str, float]] = None) -> str:
+    """
+    Stable key for a /analyze_wyckoff prompt.
+
+    Args:
+        prompt_data: Dict sent to the LLM (symbol, ohlcv_summary, order_book, ...)
+        rel_step: Relative bucket width for prices / sizes (0.0015 = 0.15%)
+        abs_steps: Per-key absolute steps (defaults to DEFAULT_ABS_STEPS)
+    """
+    q = quantize(prompt_data, rel_step, abs_steps or DEFAULT_ABS_STEPS)
+    blob = json.dumps(q, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Thread-safe TTL + LRU cache of LLM results.
+
+    Args:
+        max_entries: LRU capacity
+        ttl_seconds: Entry lifetime
+        clock: Time source in seconds (overridable for tests)
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 300.0, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        # key -> (stored_at, result, tokens_in, tokens_out)
+        self._entries: "OrderedDict[str, Tuple[float, dict, int, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.tokens_saved = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.clock() - entry[0] > self.ttl_seconds:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.tokens_saved += entry[2] + entry[3]
+            return json.loads(json.dumps(entry[1]))  # callers may mutate
+
+    def put(self, key: str, result: dict, tokens_in: int = 0, tokens_out: int = 0) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock(), json.loads(json.dumps(result)), tokens_in, tokens_out)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "tokens_saved": self.tokens_saved,
+            }
@@ -9,6 +9,7 @@ import time
 import requests
 import httpx
 import uuid
+from dataclasses import replace
 from decimal import Decimal, ROUND_DOWN
 from datetime import datetime, timedelta
 from typing import Optional, Any, Dict, Tuple
@@ -17,7 +18,11 @@ from hyperliquid_trader import HyperLiquidTrader
 from pydantic import BaseModel
 from threading import Thread, Lock
 import sys
-from shared.trading_state import get_trading_state, OrderIntent, OrderStatus, PositionMetadata, Cooldown
+from shared.trading_state import (get_trading_state, OrderIntent, OrderStatus, PositionMetadata, Cooldown,
+                                  TRADING_STATE_PERSIST_MODE, TRADING_STATE_SNAPSHOT_SEC)
+from shared.decision_journal import journal_from_env
+from position_stream import BybitPrivateFeed, EventDrivenMonitor, PositionStreamState, ReplayFeed as PositionReplayFeed
+from stop_batcher import StopUpdate, StopUpdateBatcher
 app = FastAPI()
 
 # =========================================================
@@ -60,6 +65,7 @@ ATR_MULTIPLIERS = {
     "PEPE": 4.0,
 }
 TECHNICAL_ANALYZER_URL = os.getenv("TECHNICAL_ANALYZER_URL", "http://01_technical_analyzer:8000").strip()
+ATR_CACHE_TTL_SEC = float(os.getenv("ATR_CACHE_TTL_SEC", "60"))  # 4h ATR barely moves within a minute
 FALLBACK_TRAILING_PCT = float(os.getenv("FALLBACK_TRAILING_PCT", "0.0040"))  # 0.40% raw fallback (scalping)
 DEFAULT_INITIAL_SL_PCT = float(os.getenv("DEFAULT_INITIAL_SL_PCT", "0.04"))  # 4%
 
@@ -68,6 +74,8 @@ MIN_SL_MOVE_BTC = float(os.getenv("MIN_SL_MOVE_BTC", "15.0"))
 MIN_SL_MOVE_ETH = float(os.getenv("MIN_SL_MOVE_ETH", "0.8"))
 MIN_SL_MOVE_SOL = float(os.getenv("MIN_SL_MOVE_SOL", "0.05"))
 MIN_SL_MOVE_DEFAULT = float(os.getenv("MIN_SL_MOVE_DEFAULT", "0.001"))
+# --- STOP UPDATE BATCHING (one submission per monitor tick) ---
+STOP_UPDATE_MAX_WORKERS = int(os.getenv("STOP_UPDATE_MAX_WORKERS", "4"))  # concurrent trading_stop calls
 # --- BREAK-EVEN PROTECTION ---
 BREAKEVEN_ACTIVATION_RAW_PCT = float(os.getenv("BREAKEVEN_ACTIVATION_RAW_PCT", "0.03"))  # 1.5% ROI (leveraged)
 BREAKEVEN_MARGIN_PCT = float(os.getenv("BREAKEVEN_MARGIN_PCT", "0.001"))  # 0.1% margin
@@ -78,9 +86,11 @@ WARNING_THRESHOLD = float(os.getenv("WARNING_THRESHOLD", "-0.10"))
 AI_REVIEW_THRESHOLD = float(os.getenv("AI_REVIEW_THRESHOLD", "-0.10"))  # -8% triggers AI review
 REVERSE_THRESHOLD = float(os.getenv("REVERSE_THRESHOLD", "-0.15"))  # -10% triggers reverse consideration
 HARD_STOP_THRESHOLD = float(os.getenv("HARD_STOP_THRESHOLD", "-0.25"))  # -20% triggers immediate close
+HARD_STOP_RETRY_SEC = float(os.getenv("HARD_STOP_RETRY_SEC", "15"))  # one close per symbol while the fill arrives
 REVERSE_COOLDOWN_MINUTES = int(os.getenv("REVERSE_COOLDOWN_MINUTES", "30"))
 REVERSE_LEVERAGE = float(os.getenv("REVERSE_LEVERAGE", "5.0"))
 reverse_cooldown_tracker: Dict[str, float] = {}
+hard_stop_tracker: Dict[str, float] = {}
 # --- COOLDOWN CONFIGURATION ---
 COOLDOWN_MINUTES = int(os.getenv("COOLDOWN_MINUTES", "5"))
 COOLDOWN_FILE = os.getenv("COOLDOWN_FILE", "/data/closed_cooldown.json")
@@ -91,7 +101,7 @@ STRICT_ENTRY_TYPE = os.getenv("STRICT_ENTRY_TYPE", "0") == "1"
 # Default time in trade limit for scalping mode (20-60 minutes)
 DEFAULT_TIME_IN_TRADE_LIMIT_SEC = int(os.getenv("DEFAULT_TIME_IN_TRADE_LIMIT_SEC", "7200"))  # 2 hours default - let trades develop
 # --- AI DECISIONS FILE ---
-AI_DECISIONS_FILE = os.getenv("AI_DECISIONS_FILE", "/data/ai_decisions.json")
+decision_journal = journal_from_env()  # append-only, shared with orchestrator / Master AI
 # --- TRAILING STATE FILE (prevents SL regression) ---
 TRAILING_STATE_FILE = os.getenv("TRAILING_STATE_FILE", "/data/trailing_state.json")
 # --- LEARNING AGENT ---
@@ -456,16 +466,95 @@ if EXCHANGE == "hyperliquid":
         except Exception as e:
             print(f"⚠️ Errore connessione Hyperliquid: {e}")
 
+# =========================================================
+# EXCHANGE SNAPSHOT (positions + balance + open orders, fetched once per tick)
+# =========================================================
+EXCHANGE_SNAPSHOT_TTL_SEC = float(os.getenv("EXCHANGE_SNAPSHOT_TTL_SEC", "5"))
+
+
+class ExchangeSnapshot:
+    """Point-in-time view of the Bybit account shared by all monitor checks and read endpoints."""
+
+    def __init__(self, positions: list, balance: dict, open_orders: list, fetched_at: float,
+                 requested_at: Optional[float] = None):
+        self.positions = positions or []
+        self.balance = balance or {}
+        self.open_orders = open_orders or []  # raw Bybit v5 order dicts
+        self.fetched_at = fetched_at
+        self.requested_at = fetched_at if requested_at is None else requested_at  # before fetch_positions
+
+    def age(self) -> float:
+        return time.time() - self.fetched_at
+
+    def positions_for(self, symbol: str) -> list:
+        sym_id = bybit_symbol_id(symbol)
+        return [p for p in self.positions if bybit_symbol_id(p.get("symbol", "")) == sym_id]
+
+    def open_order_by_link_id(self, order_link_id: str) -> Optional[dict]:
+        for o in self.open_orders:
+            if o.get("orderLinkId") == order_link_id:
+                return o
+        return None
+
+
+_snapshot_lock = Lock()
+_monitor_lock = Lock()  # serializes polling and event-driven runs of the checks
+_last_snapshot: Optional[ExchangeSnapshot] = None
+
+
+def get_exchange_snapshot(max_age: float = EXCHANGE_SNAPSHOT_TTL_SEC) -> Optional[ExchangeSnapshot]:
+    """
+    Return a snapshot no older than max_age seconds (max_age=0 forces a refresh).
+    Returns None if the exchange is unavailable or positions/balance cannot be fetched.
+    """
+    global _last_snapshot
+    if not exchange:
+        return None
+    with _snapshot_lock:
+        if _last_snapshot is not None and _last_snapshot.age() < max_age:
+            return _last_snapshot
+        requested_at = time.time()
+        try:
+            positions = exchange.fetch_positions(None, params={"category": "linear"})
+            balance = exchange.fetch_balance(params={"type": "swap"})
+        except Exception as e:
+            print(f"⚠️ Exchange snapshot fetch failed: {e}")
+            return None
+        open_orders = []
+        try:
+            resp = exchange.private_get_v5_order_realtime({
+                "category": "linear",
+                "settleCoin": "USDT",
+                "limit": 50,
+            })
+            if resp and str(resp.get("retCode")) == "0":
+                open_orders = (resp.get("result", {}) or {}).get("list", []) or []
+        except Exception as e:
+            print(f"⚠️ Snapshot open orders fetch failed: {e}")
+        _last_snapshot = ExchangeSnapshot(positions, balance, open_orders, time.time(), requested_at)
+        return _last_snapshot
+
+
+def invalidate_exchange_snapshot() -> None:
+    """Drop the cached snapshot after actions that change positions or balance."""
+    global _last_snapshot
+    with _snapshot_lock:
+        _last_snapshot = None
+
+
 # =========================================================
 # PENDING ENTRY ORDER MANAGEMENT
 # =========================================================
-def check_pending_entry_orders():
+def check_pending_entry_orders(snapshot: Optional[ExchangeSnapshot] = None):
     """
     Check pending LIMIT entry orders and handle their lifecycle:
     - Detect fills and set SL post-fill
     - Cancel expired orders (TTL)
     - Handle cancelled/rejected states
     - Ignore non-entry orders (StopLoss/TP/conditional)
+    
+    If a snapshot is given, still-open orders and positions are read from it
+    instead of querying the exchange per intent.
     """
     if not exchange:
         return
@@ -473,12 +562,8 @@ def check_pending_entry_orders():
     try:
         trading_state = get_trading_state()
         
-        # Find all pending LIMIT intents
-        pending_intents = []
-        for intent_id, intent_data in trading_state._state.get("intents", {}).items():
-            intent = OrderIntent.from_dict(intent_data)
-            if intent.status == OrderStatus.PENDING and intent.entry_type == "LIMIT":
-                pending_intents.append(intent)
+        # Find all pending LIMIT intents (status + entry_type index)
+        pending_intents = trading_state.get_intents(status=OrderStatus.PENDING, entry_type="LIMIT")
         
         if not pending_intents:
             return
@@ -494,9 +579,13 @@ def check_pending_entry_orders():
                 # Try by orderLinkId first (most reliable), fallback to orderId
                 order_data = None
                 
+                # Method 0: still-open order already in the tick snapshot
+                if snapshot is not None:
+                    order_data = snapshot.open_order_by_link_id(intent.exchange_order_link_id or intent_id)
+                
                 # Method 1: Query by orderLinkId (intent_id)
                 try:
-                    if intent.exchange_order_link_id or intent_id:
+                    if not order_data and (intent.exchange_order_link_id or intent_id):
                         link_id = intent.exchange_order_link_id or intent_id
                         resp = exchange.private_get_v5_order_realtime({
                             "category": "linear",
@@ -533,7 +622,10 @@ def check_pending_entry_orders():
                     # === FALLBACK: order not found, but position may be open (Bybit realtime order can disappear) ===
                     try:
                         sym_ccxt_f = ccxt_symbol_from_id(exchange, sym_id) or sym_id
-                        pos_list = exchange.fetch_positions([sym_ccxt_f], params={"category": "linear"})
+                        if snapshot is not None:
+                            pos_list = snapshot.positions_for(sym_id)
+                        else:
+                            pos_list = exchange.fetch_positions([sym_ccxt_f], params={"category": "linear"})
                         # Find matching position with contracts > 0
                         for p in pos_list or []:
                             contracts = to_float(p.get("contracts"), 0.0)
@@ -887,6 +979,22 @@ def state_cleanup_loop():
         # Run every hour
         time.sleep(3600)
 Thread(target=state_cleanup_loop, daemon=True).start()
+
+
+def state_flush_loop():
+    """
+    Write-behind persistence: coalesce logged TradingState mutations into an
+    atomic snapshot every TRADING_STATE_SNAPSHOT_SEC, even when no new mutation
+    arrives to trigger it.
+    """
+    while True:
+        time.sleep(TRADING_STATE_SNAPSHOT_SEC)
+        try:
+            get_trading_state().flush_if_due()
+        except Exception as e:
+            print(f"⚠️ State flush error: {e}")
+if TRADING_STATE_PERSIST_MODE == "write_behind":
+    Thread(target=state_flush_loop, daemon=True).start()
 # =========================================================
 # BACKGROUND: EQUITY HISTORY LOOP
 # =========================================================
@@ -894,10 +1002,14 @@ def record_equity_loop():
     while True:
         if exchange:
             try:
-                bal = exchange.fetch_balance(params={"type": "swap"})
+                snapshot = get_exchange_snapshot()
+                if snapshot is not None:
+                    bal, pos = snapshot.balance, snapshot.positions
+                else:
+                    bal = exchange.fetch_balance(params={"type": "swap"})
+                    pos = exchange.fetch_positions(None, params={"category": "linear"})
                 usdt = bal.get("USDT", {}) or {}
                 real_bal = to_float(usdt.get("total", 0), 0.0)
-                pos = exchange.fetch_positions(None, params={"category": "linear"})
                 upnl = sum([to_float(p.get("unrealizedPnl"), 0.0) for p in pos])
                 hist = load_json(HISTORY_FILE, default=[])
                 hist.append({
@@ -915,7 +1027,7 @@ Thread(target=record_equity_loop, daemon=True).start()
 # =========================================================
 # BACKGROUND: POSITION MONITORING LOOP (TRAILING + REVERSE + TIME-BASED EXIT)
 # =========================================================
-def check_time_based_exits():
+def check_time_based_exits(snapshot: Optional[ExchangeSnapshot] = None):
     """
     Check for positions that have exceeded their time_in_trade_limit and close them.
     This implements the scalping time-based exit feature with ADX-aware extension.
@@ -961,18 +1073,12 @@ def check_time_based_exits():
             adx_value = None
             
             try:
-                # Fetch ADX from technical analyzer
-                sym_id = bybit_symbol_id(symbol)
-                with httpx.Client(timeout=5.0) as client:
-                    r = client.post(f"{TECHNICAL_ANALYZER_URL}/analyze_multi_tf", json={"symbol": sym_id})
-                    if r.status_code == 200:
-                        data = r.json()
-                        tf_15m = data.get("timeframes", {}).get("15m", {})
-                        adx_value = tf_15m.get("adx")
-                        
-                        if adx_value is not None and adx_value > adx_threshold:
-                            should_extend = True
-                            print(f"   📊 ADX={adx_value:.1f} > {adx_threshold} - TREND detected, extending position")
+                # Fetch 15m ADX only (lightweight indicators endpoint)
+                adx_value = fetch_indicators(symbol, "15m", ["adx"]).get("adx")
+                
+                if adx_value is not None and adx_value > adx_threshold:
+                    should_extend = True
+                    print(f"   📊 ADX={adx_value:.1f} > {adx_threshold} - TREND detected, extending position")
             except Exception as e:
                 print(f"   ⚠️ Failed to fetch ADX for {symbol}: {e}")
             
@@ -981,7 +1087,7 @@ def check_time_based_exits():
                 try:
                     # Update position metadata with extended time
                     new_limit = limit_sec + extension_time_sec
-                    pos_metadata.time_in_trade_limit_sec = new_limit
+                    pos_metadata = replace(pos_metadata, time_in_trade_limit_sec=new_limit)
                     trading_state.add_position(pos_metadata)  # Re-save with updated limit
                     
                     print(f"   ⏱️ Position extended: new limit = {new_limit}s (added {extension_time_sec}s)")
@@ -1019,8 +1125,8 @@ def check_time_based_exits():
             max_loss_lev_pct = float(os.getenv("TIME_EXIT_MAX_LOSS_ROI_LEV_PCT", "-3.0"))
             max_extensions = int(os.getenv("TIME_EXIT_MAX_EXTENSIONS", "3"))
 
-            # Track extensions on metadata (best-effort)
-            extensions_used = int(getattr(pos_metadata, "time_exit_extensions", 0) or 0)
+            # Extensions granted so far (persisted on the position metadata)
+            extensions_used = int(pos_metadata.time_exit_extensions or 0)
             print(f"   🔁 TIME-EXIT EXTENSIONS {symbol} {side}: used={extensions_used}/{max_extensions} limit_sec={limit_sec}")
 
             roi_lev_pct = None
@@ -1028,7 +1134,10 @@ def check_time_based_exits():
                 if exchange:
                     sym_id = bybit_symbol_id(symbol)
                     sym_ccxt = ccxt_symbol_from_id(exchange, sym_id) or symbol
-                    positions = exchange.fetch_positions([sym_ccxt], params={"category": "linear"})
+                    if snapshot is not None:
+                        positions = snapshot.positions_for(sym_id)
+                    else:
+                        positions = exchange.fetch_positions([sym_ccxt], params={"category": "linear"})
                     pos = None
                     for p0 in positions:
                         if to_float(p0.get("contracts"), 0.0) > 0:
@@ -1058,8 +1167,8 @@ def check_time_based_exits():
                 if extensions_used < max_extensions:
                     try:
                         new_limit = limit_sec + extension_time_sec
-                        pos_metadata.time_in_trade_limit_sec = new_limit
-                        setattr(pos_metadata, "time_exit_extensions", extensions_used + 1)
+                        pos_metadata = replace(pos_metadata, time_in_trade_limit_sec=new_limit,
+                                               time_exit_extensions=extensions_used + 1)
                         trading_state.add_position(pos_metadata)
                         print(f"   ⏱️ Flat ROI - extending position: new limit={new_limit}s (extensions {extensions_used+1}/{max_extensions})")
                         # Record extension event
@@ -1333,11 +1442,15 @@ def position_monitor_loop():
     while True:
         if exchange:
             try:
-                check_pending_entry_orders()
-                check_recent_closes_and_save_cooldown()
-                check_and_update_trailing_stops()
-                check_smart_reverse()
-                check_time_based_exits()
+                with _monitor_lock:
+                    # One fresh account snapshot per tick, shared by every check
+                    snapshot = get_exchange_snapshot(max_age=0)
+                    reconcile_position_stream(snapshot)
+                    check_pending_entry_orders(snapshot)
+                    check_recent_closes_and_save_cooldown()
+                    check_and_update_trailing_stops(snapshot)
+                    check_smart_reverse(snapshot)
+                    check_time_based_exits(snapshot)
             except Exception as e:
                 print(f"Position monitor loop error: {e}")
         elif hl_bot:
@@ -1348,6 +1461,126 @@ def position_monitor_loop():
 
         time.sleep(30)
 Thread(target=position_monitor_loop, daemon=True).start()
+
+# =========================================================
+# EVENT-DRIVEN POSITION MONITOR (private streams, polling stays as fallback)
+# =========================================================
+POSITION_EVENT_MODE = os.getenv("POSITION_EVENT_MODE", "off").strip().lower()  # off | websocket | replay
+POSITION_EVENT_REPLAY_FILE = os.getenv("POSITION_EVENT_REPLAY_FILE", "").strip()
+POSITION_EVENT_MIN_INTERVAL_SEC = float(os.getenv("POSITION_EVENT_MIN_INTERVAL_SEC", "0.5"))
+
+position_stream_state = PositionStreamState(
+    symbol_mapper=lambda sym_id: (ccxt_symbol_from_id(exchange, sym_id) if exchange else None) or sym_id
+)
+position_event_monitor: Optional[EventDrivenMonitor] = None
+
+
+def stream_snapshot() -> ExchangeSnapshot:
+    """Snapshot built from stream state only (no REST); balance falls back to the last REST snapshot."""
+    balance = position_stream_state.balance()
+    last = _last_snapshot
+    if balance is None:
+        balance = last.balance if last is not None else {}
+    return ExchangeSnapshot(
+        position_stream_state.positions(),
+        balance,
+        last.open_orders if last is not None else [],
+        time.time(),
+    )
+
+
+def _raw_bybit_position(pos: dict) -> dict:
+    """Bybit v5 position row of a ccxt position (its info, rebuilt from ccxt fields if missing)."""
+    info = pos.get("info") or {}
+    if info.get("symbol") and "size" in info:
+        return info
+    side = (pos.get("side") or "").lower()
+    return {
+        "symbol": bybit_symbol_id(pos.get("symbol", "")),
+        "side": "Buy" if side == "long" else "Sell" if side == "short" else "",
+        "size": pos.get("contracts") or 0,
+        "avgPrice": pos.get("entryPrice"),
+        "markPrice": pos.get("markPrice"),
+        "leverage": pos.get("leverage"),
+        "stopLoss": pos.get("stopLoss"),
+        "positionIdx": info.get("positionIdx", 0),
+    }
+
+
+def reconcile_position_stream(snapshot: Optional[ExchangeSnapshot]) -> None:
+    """Align the stream's open positions with a REST snapshot and watch the mark price of added ones."""
+    if position_event_monitor is None or snapshot is None:
+        return
+    added, dropped = position_stream_state.reconcile(
+        [_raw_bybit_position(p) for p in snapshot.positions], snapshot.requested_at)
+    for sym in sorted(added):
+        if position_event_monitor.watch_symbol:
+            position_event_monitor.watch_symbol(sym)
+    if added or dropped:
+        print(f"🔁 Position stream reconciled with REST: +{sorted(added)} -{sorted(dropped)}")
+
+
+def on_stream_mark_change():
+    """Re-evaluate trailing stops, break-even and hard stops on every mark price change."""
+    if not exchange:
+        return
+    with _monitor_lock:
+        snapshot = stream_snapshot()
+        check_and_update_trailing_stops(snapshot)
+        check_smart_reverse(snapshot, hard_stop_only=True)
+
+
+def on_stream_order_update():
+    """Order reached a final status or filled: resolve pending intents immediately."""
+    if not exchange:
+        return
+    invalidate_exchange_snapshot()
+    with _monitor_lock:
+        check_pending_entry_orders(get_exchange_snapshot(max_age=0))
+
+
+def start_position_event_monitor():
+    global position_event_monitor
+    if POSITION_EVENT_MODE == "off":
+        return
+    if POSITION_EVENT_MODE == "replay":
+        if not POSITION_EVENT_REPLAY_FILE:
+            print("⚠️ POSITION_EVENT_MODE=replay ma POSITION_EVENT_REPLAY_FILE mancante")
+            return
+        feed = PositionReplayFeed(POSITION_EVENT_REPLAY_FILE)
+    elif POSITION_EVENT_MODE == "websocket":
+        if not (API_KEY and API_SECRET) or EXCHANGE == "hyperliquid":
+            print("⚠️ Event-driven monitor richiede credenziali Bybit: resto in polling")
+            return
+        feed = BybitPrivateFeed(API_KEY, API_SECRET, testnet=IS_TESTNET)
+    else:
+        print(f"⚠️ POSITION_EVENT_MODE sconosciuto: {POSITION_EVENT_MODE}")
+        return
+
+    position_event_monitor = EventDrivenMonitor(
+        position_stream_state,
+        on_mark=on_stream_mark_change,
+        on_orders=on_stream_order_update,
+        min_interval=POSITION_EVENT_MIN_INTERVAL_SEC,
+        watch_symbol=feed.watch_symbol,
+    )
+    # The private stream sends no snapshot on subscribe: seed positions already open from REST
+    seed = get_exchange_snapshot(max_age=0) if exchange else None
+    if seed is not None:
+        position_stream_state.reconcile([_raw_bybit_position(p) for p in seed.positions], seed.requested_at)
+    position_event_monitor.start()
+    try:
+        feed.start(position_event_monitor.handle)
+        for sym in position_stream_state.open_symbols():
+            feed.watch_symbol(sym)  # ticker subscriptions need the started feed
+        print(f"⚡ Event-driven position monitor attivo ({POSITION_EVENT_MODE}), polling 30s come fallback")
+    except Exception as e:
+        position_event_monitor.stop()
+        position_event_monitor = None
+        print(f"❌ Event-driven monitor non avviato: {e}")
+
+
+start_position_event_monitor()
 # =========================================================
 # MODELS
 # =========================================================
@@ -1448,24 +1681,44 @@ def record_trade_for_learning(
 # =========================================================
 # ATR FUNCTIONS
 # =========================================================
-def get_atr_for_symbol(symbol: str) -> Tuple[Optional[float], Optional[float]]:
+_atr_cache: Dict[str, Tuple[float, float, float]] = {}  # {symbol_id: (fetched_at, atr, price)}
+_atr_cache_lock = Lock()
+
+
+def fetch_indicators(symbol: str, timeframe: str, fields: list, timeout: float = 5.0) -> Dict[str, Any]:
+    """Fetch only the requested indicators for one timeframe from the technical analyzer."""
     try:
-        clean_id = bybit_symbol_id(symbol)  # BTCUSDT
-        with httpx.Client(timeout=5.0) as client:
-            r = client.post(f"{TECHNICAL_ANALYZER_URL}/analyze_multi_tf", json={"symbol": clean_id})
+        with httpx.Client(timeout=timeout) as client:
+            r = client.post(
+                f"{TECHNICAL_ANALYZER_URL}/indicators",
+                json={"symbol": bybit_symbol_id(symbol), "timeframe": timeframe, "fields": fields},
+            )
             if r.status_code == 200:
-                d = r.json()
-                # Prefer 4h ATR for less noise (intra-day), fallback to 15m
-                tfs = d.get("timeframes", {}) or {}
-                tf_4h = tfs.get("4h", {}) or {}
-                tf_15m = tfs.get("15m", {}) or {}
-                src = tf_4h if (tf_4h.get("atr") and tf_4h.get("price")) else tf_15m
-                atr = src.get("atr")
-                price = src.get("price")
-                if atr and price:
-                    return float(atr), float(price)
+                d = r.json() or {}
+                if not d.get("error"):
+                    return d
     except Exception:
         pass
+    return {}
+
+
+def get_atr_for_symbol(symbol: str) -> Tuple[Optional[float], Optional[float]]:
+    clean_id = bybit_symbol_id(symbol)  # BTCUSDT
+    now = time.time()
+    with _atr_cache_lock:
+        cached = _atr_cache.get(clean_id)
+    if cached and (now - cached[0]) < ATR_CACHE_TTL_SEC:
+        return cached[1], cached[2]
+
+    # Prefer 4h ATR for less noise (intra-day), fallback to 15m
+    for tf in ("4h", "15m"):
+        d = fetch_indicators(clean_id, tf, ["atr"])
+        atr = d.get("atr")
+        price = d.get("price")
+        if atr and price:
+            with _atr_cache_lock:
+                _atr_cache[clean_id] = (now, float(atr), float(price))
+            return float(atr), float(price)
     return None, None
 def get_trailing_distance_pct(symbol: str, mark_price: float, leverage: float, aggressive: bool = False) -> float:
     """Return trailing distance as RAW fraction of price (e.g. 0.002 = 0.2%).
@@ -1557,13 +1810,26 @@ def compute_entry_sl_pct(symbol: str, order) -> float:
     return sl_pct
 
 
-def check_and_update_trailing_stops():
+def new_stop_batcher() -> StopUpdateBatcher:
+    """Collects one monitor tick's SL moves (see stop_batcher.py)."""
+    return StopUpdateBatcher(
+        exchange,
+        min_move=min_sl_move_for_symbol,
+        symbol_id=bybit_symbol_id,
+        max_workers=STOP_UPDATE_MAX_WORKERS,
+    )
+
+def check_and_update_trailing_stops(snapshot: Optional[ExchangeSnapshot] = None):
     if not exchange:
         return
     try:
         trailing_state = _load_trailing_state()
         profit_lock_state = _load_profit_lock_state()
-        positions = exchange.fetch_positions(None, params={"category": "linear"})
+        stop_batcher = new_stop_batcher()
+        if snapshot is not None:
+            positions = snapshot.positions
+        else:
+            positions = exchange.fetch_positions(None, params={"category": "linear"})
         for p in positions:
             qty = to_float(p.get("contracts"), 0.0)
             if qty == 0:
@@ -1891,70 +2157,29 @@ def check_and_update_trailing_stops():
                 f"entry={entry_price:.4f} mark={mark_price:.4f} "
                 f"SL(cur={sl_current}) -> {price_str} (dist={trailing_distance*100:.2f}%) idx={position_idx}"
             )
-            try:
-                # Min-step guard to reduce Bybit 'not modified' spam
-                baseline_for_step = sl_current if sl_current and sl_current > 0.0 else to_float(st.get("last_sl"), 0.0)
-                min_step = float(min_sl_move_for_symbol(symbol))
-                if baseline_for_step and baseline_for_step > 0:
-                    if abs(float(new_sl_price) - float(baseline_for_step)) < min_step:
-                        if sym_id_dbg in DEBUG_SYMBOLS:
-                            print(
-                                f"🧱 Skip SL update (min-step): {symbol} "
-                                f"new={new_sl_price:.4f} baseline={baseline_for_step:.4f} "
-                                f"Δ={abs(new_sl_price-baseline_for_step):.4f} < {min_step}"
-                            )
-                        continue
-
-                # USE_TRAILING_EXIT_ORDER: Bybit does not allow stopLoss for short below MarkPrice.
-                # For profit-lock trailing we use a reduce-only conditional StopOrder (Market).
-                use_exit = False
-                try:
-                    if side.lower() == "short" and float(new_sl_price) < float(mark_price):
-                        use_exit = True
-                    if side.lower() == "long" and float(new_sl_price) > float(mark_price):
-                        use_exit = True
-                except Exception:
-                    use_exit = False
-
-                if use_exit:
-                    try:
-                        _upsert_trailing_exit_order(
-                            exchange,
-                            symbol=symbol,
-                            position_side=side,
-                            position_idx=position_idx,
-                            qty=float(size),
-                            trigger_price=float(new_sl_price),
-                            trigger_by="MarkPrice",
-                        )
-                    except Exception as e:
-                        print(f"⚠️ Trailing-exit order error for {symbol}: {e}")
-                    continue
-
-                req = {
-                    "category": "linear",
-                    "symbol": bybit_symbol_id(symbol),
-                    "tpslMode": "Full",
-                    "stopLoss": price_str,
-                    "slTriggerBy": "MarkPrice",
-                    "positionIdx": position_idx,
-                }
-                resp = exchange.private_post_v5_position_trading_stop(req)
-                if isinstance(resp, dict):
-                    print(f"✅ SL updated via trading_stop retCode={resp.get('retCode')} retMsg={resp.get('retMsg')}")
-                else:
-                    print("✅ SL updated via trading_stop")
-            except Exception as api_err:
-                print(f"❌ Errore API Bybit (trading_stop): {api_err}")
+            # Min-step guard (reduces Bybit 'not modified' spam) is applied by the batcher
+            baseline_for_step = sl_current if sl_current and sl_current > 0.0 else to_float(st.get("last_sl"), 0.0)
+            queued = stop_batcher.add(StopUpdate(
+                symbol=symbol,
+                side=side_dir,
+                position_idx=position_idx,
+                stop_loss=float(new_sl_price),
+                current_sl=float(baseline_for_step or 0.0),
+            ))
+            if not queued and sym_id_dbg in DEBUG_SYMBOLS:
+                print(
+                    f"🧱 Skip SL update (min-step): {symbol} "
+                    f"new={new_sl_price:.4f} baseline={baseline_for_step:.4f} "
+                    f"Δ={abs(new_sl_price-baseline_for_step):.4f} < {min_sl_move_for_symbol(symbol)}"
+                )
+        stop_batcher.flush()
         _save_trailing_state(trailing_state)
         _save_profit_lock_state(profit_lock_state)
     except Exception as e:
         print(f"⚠️ Trailing logic error: {e}")
 def save_ai_decision(decision_data: dict):
     try:
-        ensure_parent_dir(AI_DECISIONS_FILE)
-        decisions = load_json(AI_DECISIONS_FILE, default=[])
-        decisions.append({
+        decision_journal.append({
             "timestamp": datetime.now().isoformat(),
             "symbol": decision_data.get("symbol"),
             "action": decision_data.get("action"),
@@ -1965,8 +2190,6 @@ def save_ai_decision(decision_data: dict):
             "roi_pct": decision_data.get("roi_pct", 0),
             "source": "position_manager",
         })
-        decisions = decisions[-100:]
-        save_json(AI_DECISIONS_FILE, decisions)
     except Exception as e:
         print(f"⚠️ Error saving AI decision: {e}")
 def request_reverse_analysis(symbol: str, position_data: dict) -> Optional[dict]:
@@ -2106,6 +2329,7 @@ def execute_close_position(symbol: str, exit_reason: str = "manual") -> bool:
         if HEDGE_MODE:
             params["positionIdx"] = position_idx
         exchange.create_order(sym_ccxt, "market", close_side, size, params=params)
+        invalidate_exchange_snapshot()
         
         # Calculate PnL in dollars (unrealized PnL from position)
         pnl_dollars = to_float(position.get("unrealizedPnl"), 0.0)
@@ -2233,6 +2457,7 @@ def execute_reverse(symbol: str, current_side_raw: str, recovery_size_pct: float
         if HEDGE_MODE:
             params["positionIdx"] = pos_idx
         res = exchange.create_order(sym_ccxt, "market", new_side, final_qty, params=params)
+        invalidate_exchange_snapshot()
         print(f"✅ Reverse eseguito con successo: {res.get('id')}")
         return True
     except Exception as e:
@@ -2343,13 +2568,21 @@ def check_recent_closes_and_save_cooldown():
 # =========================================================
 # SMART REVERSE SYSTEM
 # =========================================================
-def check_smart_reverse():
+def check_smart_reverse(snapshot: Optional[ExchangeSnapshot] = None, hard_stop_only: bool = False):
+    """
+    Hard stop / AI-confirmed reverse on losing positions.
+    hard_stop_only skips the AI reverse branch (used on every stream mark tick,
+    where asking the AI each time would flood it).
+    """
     if not ENABLE_AI_REVIEW or not exchange:
         return
     try:
         trailing_state = _load_trailing_state()
-        positions = exchange.fetch_positions(None, params={"category": "linear"})
-        wallet_bal = exchange.fetch_balance(params={"type": "swap"})
+        if snapshot is not None:
+            positions, wallet_bal = snapshot.positions, snapshot.balance
+        else:
+            positions = exchange.fetch_positions(None, params={"category": "linear"})
+            wallet_bal = exchange.fetch_balance(params={"type": "swap"})
         wallet_balance = to_float((wallet_bal.get("USDT", {}) or {}).get("total", 0.0), 0.0)
         if wallet_balance <= 0:
             return
@@ -2369,8 +2602,15 @@ def check_smart_reverse():
             roi = roi_raw * leverage  # fraction (e.g. -0.12 => -12%)
             sym_id = bybit_symbol_id(symbol)
             if roi <= HARD_STOP_THRESHOLD:
+                # Stream mark ticks keep arriving until the close fills: send it once per retry window
+                now = time.time()
+                if (now - hard_stop_tracker.get(sym_id, 0.0)) < HARD_STOP_RETRY_SEC:
+                    continue
+                hard_stop_tracker[sym_id] = now
                 print(f"🛑 HARD STOP: {symbol} {side_dir.upper()} ROI={roi*100:.2f}% - Chiusura immediata!")
-                execute_close_position(symbol)
+                execute_close_position(symbol, exit_reason="stop_loss")
+                continue
+            if hard_stop_only:
                 continue
             if roi <= REVERSE_THRESHOLD:
                 print(f"⚠️ REVERSE THRESHOLD REACHED: {symbol} {side_dir.upper()} ROI={roi*100:.2f}% <= {REVERSE_THRESHOLD*100:.2f}%")
@@ -2421,7 +2661,7 @@ def check_smart_reverse():
                     # FALLBACK: AI non disponibile - implementa sicurezza
                     if roi <= HARD_STOP_THRESHOLD:
                         print(f"🛑 AI non disponibile + perdita critica ({roi*100:.2f}% <= {HARD_STOP_THRESHOLD*100:.2f}%) - CHIUSURA DI SICUREZZA per {symbol}")
-                        execute_close_position(symbol)
+                        execute_close_position(symbol, exit_reason="stop_loss")
                     else:
                         print(f"⚠️ AI non disponibile per {symbol} (ROI: {roi*100:.2f}%) - Mantengo posizione ma continuo monitoraggio")
                 continue
@@ -2525,7 +2765,8 @@ def get_balance():
         }
     
     try:
-        bal = exchange.fetch_balance(params={"type": "swap"})
+        snapshot = get_exchange_snapshot()
+        bal = snapshot.balance if snapshot else exchange.fetch_balance(params={"type": "swap"})
         u = bal.get("USDT", {}) or {}
         
         equity = to_float(u.get("total"), 0.0)
@@ -2633,7 +2874,8 @@ def get_positions():
     if not exchange:
         return {"active": [], "details": []}
     try:
-        raw = exchange.fetch_positions(None, params={"category": "linear"})
+        snapshot = get_exchange_snapshot()
+        raw = snapshot.positions if snapshot else exchange.fetch_positions(None, params={"category": "linear"})
         active = []
         details = []
         for p in raw:
@@ -2761,21 +3003,19 @@ def get_pending_intents_endpoint():
         trading_state = get_trading_state()
         pending_intents = []
         
-        for intent_id, intent_data in trading_state._state.get("intents", {}).items():
-            intent = OrderIntent.from_dict(intent_data)
-            if intent.status == OrderStatus.PENDING:
-                pending_intents.append({
-                    "intent_id": intent.intent_id,
-                    "symbol": intent.symbol,
-                    "side": intent.side,
-                    "entry_type": intent.entry_type,
-                    "entry_price": intent.entry_price,
-                    "entry_expires_at": intent.entry_expires_at,
-                    "status": intent.status.value,
-                    "created_at": intent.created_at,
-                    "exchange_order_id": intent.exchange_order_id,
-                    "exchange_order_link_id": intent.exchange_order_link_id
-                })
+        for intent in trading_state.get_intents(status=OrderStatus.PENDING):
+            pending_intents.append({
+                "intent_id": intent.intent_id,
+                "symbol": intent.symbol,
+                "side": intent.side,
+                "entry_type": intent.entry_type,
+                "entry_price": intent.entry_price,
+                "entry_expires_at": intent.entry_expires_at,
+                "status": intent.status.value,
+                "created_at": intent.created_at,
+                "exchange_order_id": intent.exchange_order_id,
+                "exchange_order_link_id": intent.exchange_order_link_id
+            })
         
         return {"intents": pending_intents, "count": len(pending_intents)}
     except Exception as e:
@@ -2790,13 +3030,11 @@ def cancel_intent_endpoint(request: dict):
             return {"status": "error", "msg": "intent_id required"}
         
         trading_state = get_trading_state()
-        intent_data = trading_state._state.get("intents", {}).get(intent_id)
+        intent = trading_state.get_intent(intent_id)
         
-        if not intent_data:
+        if not intent:
             return {"status": "error", "msg": f"Intent {intent_id} not found"}
         
-        intent = OrderIntent.from_dict(intent_data)
-        
         # Only cancel if PENDING
         if intent.status != OrderStatus.PENDING:
             return {"status": "error", "msg": f"Intent {intent_id} is not PENDING (status={intent.status})"}
@@ -2963,7 +3201,8 @@ def open_position(order: OrderRequest):
         # Calculate expiry for LIMIT orders
         if new_intent.entry_type == "LIMIT":
             ttl_sec = order.entry_ttl_sec or 3600  # Default 1 hour
-            new_intent.entry_expires_at = (datetime.now() + timedelta(seconds=ttl_sec)).isoformat()
+            new_intent = replace(new_intent,
+                                 entry_expires_at=(datetime.now() + timedelta(seconds=ttl_sec)).isoformat())
         
         trading_state.add_intent(new_intent)
         print(f"📝 Intent registered: {_truncate_id(intent_id)} for {sym_id} {requested_dir} type={new_intent.entry_type}")
@@ -3142,6 +3381,7 @@ def open_position(order: OrderRequest):
             print(f"📋 LIMIT ENTRY: {sym_ccxt} side={requested_side} qty={final_qty} price={limit_price_str} orderLinkId={_truncate_id(intent_id)}")
             
             res = exchange.create_order(sym_ccxt, "limit", requested_side, final_qty, limit_price, params=params)
+            invalidate_exchange_snapshot()
             exchange_order_id = res.get("id")
             
             # Extract actual Bybit orderId from response info
@@ -3178,6 +3418,7 @@ def open_position(order: OrderRequest):
         trading_state.update_intent_status(intent_id, OrderStatus.EXECUTING)
         
         res = exchange.create_order(sym_ccxt, "market", requested_side, final_qty, params=params)
+        invalidate_exchange_snapshot()
         exchange_order_id = res.get("id")
         
         # Extract actual Bybit orderId from response info
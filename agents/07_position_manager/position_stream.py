@@ -0,0 +1,432 @@
+"""
+Event-driven position updates for the position manager.
+
+- PositionStreamState: positions, mark prices and USDT wallet built from
+  Bybit v5 private (position / order / execution / wallet) and public
+  (tickers) stream messages
+- BybitPrivateFeed: live private + public WebSocket streams via pybit
+- ReplayFeed: replays a recorded JSONL file (local stand-in / tests)
+- EventDrivenMonitor: re-runs the trailing / exit checks on a worker thread
+  whenever a mark price or position changes, coalescing bursts
+
+The polling loop in main.py keeps running as a fallback; this only makes
+the reaction time track the stream instead of the 30 s poll interval.
+Bybit sends no position snapshot on subscribe and nothing replays messages
+lost during a reconnect, so the state is seeded from REST at startup and
+reconciled against every polling snapshot (PositionStreamState.reconcile).
+"""
+
+import json
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+Handler = Callable[[dict], None]
+
+FINAL_ORDER_STATUSES = {"Filled", "Cancelled", "Rejected", "Deactivated", "PartiallyFilledCanceled"}
+
+
+def _side_to_dir(side: str) -> Optional[str]:
+    s = (side or "").lower()
+    if s in ("buy", "long"):
+        return "long"
+    if s in ("sell", "short"):
+        return "short"
+    return None
+
+
+def _f(x, default: float = 0.0) -> float:
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return default
+
+
+class PositionStreamState:
+    """
+    Thread-safe account view maintained from stream messages.
+
+    Positions are exposed in the same ccxt-like shape fetch_positions()
+    returns, so the existing checks can consume them unchanged.
+
+    Args:
+        symbol_mapper: Maps a Bybit id ("BTCUSDT") to the symbol the checks
+            expect (e.g. ccxt "BTC/USDT:USDT"); identity if None
+        clock: Time source in seconds (overridable for tests)
+    """
+
+    def __init__(self, symbol_mapper: Optional[Callable[[str], str]] = None, clock=time.time):
+        self.symbol_mapper = symbol_mapper or (lambda s: s)
+        self.clock = clock
+        self._lock = threading.Lock()
+        # (symbol, positionIdx) -> raw Bybit position dict
+        self._positions: Dict[Tuple[str, int], dict] = {}
+        self._touched: Dict[Tuple[str, int], float] = {}  # last stream update per key (open or close)
+        self._marks: Dict[str, float] = {}
+        self._wallet_usdt: Optional[dict] = None
+        self.last_message_at: Optional[float] = None
+        self.message_count = 0
+
+    # -----------------------------------------------------------------------
+    # Message ingestion
+    # -----------------------------------------------------------------------
+
+    def apply(self, message: dict) -> Set[str]:
+        """
+        Apply one stream message.
+
+        Returns:
+            Event kinds it produced: "mark" (mark price of an open position
+            moved), "position", "order_final", "execution", "wallet"
+        """
+        topic = message.get("topic", "") if isinstance(message, dict) else ""
+        if not topic:
+            return set()
+
+        data = message.get("data")
+        with self._lock:
+            self.message_count += 1
+            self.last_message_at = self.clock()
+            if topic.startswith("tickers."):
+                return self._apply_ticker(data or {})
+            if topic == "position" or topic.startswith("position."):
+                return self._apply_positions(data or [])
+            if topic == "order" or topic.startswith("order."):
+                if any(o.get("orderStatus") in FINAL_ORDER_STATUSES for o in data or []):
+                    return {"order_final"}
+                return set()
+            if topic == "execution" or topic.startswith("execution."):
+                return {"execution"} if data else set()
+            if topic == "wallet":
+                return self._apply_wallet(data or [])
+        return set()
+
+    def _apply_ticker(self, data: dict) -> Set[str]:
+        symbol = data.get("symbol")
+        mark = _f(data.get("markPrice"))
+        if not symbol or mark <= 0 or self._marks.get(symbol) == mark:
+            return set()
+        self._marks[symbol] = mark
+        if any(sym == symbol for sym, _ in self._positions):
+            return {"mark"}
+        return set()
+
+    def _apply_positions(self, rows: List[dict]) -> Set[str]:
+        for row in rows:
+            symbol = row.get("symbol")
+            if not symbol:
+                continue
+            key = (symbol, int(_f(row.get("positionIdx"), 0)))
+            self._touched[key] = self.last_message_at
+            if _f(row.get("size")) == 0 or not _side_to_dir(row.get("side")):
+                self._positions.pop(key, None)
+            else:
+                self._positions[key] = dict(row)
+            mark = _f(row.get("markPrice"))
+            if mark > 0 and symbol not in self._marks:
+                self._marks[symbol] = mark
+        return {"position"}
+
+    def reconcile(self, rows: List[dict], fetched_at: float) -> Tuple[Set[str], Set[str]]:
+        """
+        Align open positions with a REST snapshot (raw Bybit v5 position rows).
+
+        Keys REST no longer reports are dropped (close missed during a
+        reconnect) and keys it reports are added (open before the stream
+        started); keys the stream updated after fetched_at are left alone.
+
+        Args:
+            rows: Raw position rows (ccxt position["info"]), zero-size rows ignored
+            fetched_at: When the REST request was sent (clock seconds)
+
+        Returns:
+            (symbols added, symbols dropped)
+        """
+        rest = {}
+        for row in rows:
+            symbol = row.get("symbol")
+            if symbol and _f(row.get("size")) != 0 and _side_to_dir(row.get("side")):
+                rest[(symbol, int(_f(row.get("positionIdx"), 0)))] = dict(row)
+
+        added, dropped = set(), set()
+        with self._lock:
+            for key in list(self._positions):
+                if key not in rest and self._touched.get(key, 0.0) <= fetched_at:
+                    del self._positions[key]
+                    dropped.add(key[0])
+            for key, row in rest.items():
+                if key in self._positions or self._touched.get(key, 0.0) > fetched_at:
+                    continue
+                self._positions[key] = row
+                added.add(key[0])
+                mark = _f(row.get("markPrice"))
+                if mark > 0 and key[0] not in self._marks:
+                    self._marks[key[0]] = mark
+        return added, dropped
+
+    def _apply_wallet(self, rows: List[dict]) -> Set[str]:
+        for account in rows:
+            for coin in account.get("coin", []) or []:
+                if coin.get("coin") == "USDT":
+                    self._wallet_usdt = dict(coin)
+                    return {"wallet"}
+        return set()
+
+    # -----------------------------------------------------------------------
+    # Queries
+    # -----------------------------------------------------------------------
+
+    def open_symbols(self) -> List[str]:
+        with self._lock:
+            return sorted({sym for sym, _ in self._positions})
+
+    def positions(self) -> List[dict]:
+        """Open positions in fetch_positions() shape, marked to the latest ticker."""
+        with self._lock:
+            rows = [(dict(r), self._marks.get(sym)) for (sym, _), r in self._positions.items()]
+
+        out = []
+        for raw, live_mark in rows:
+            mark = live_mark if live_mark else _f(raw.get("markPrice"))
+            entry = _f(raw.get("avgPrice") or raw.get("entryPrice"))
+            size = _f(raw.get("size"))
+            side = _side_to_dir(raw.get("side"))
+            upnl = (mark - entry) * size if side == "long" else (entry - mark) * size
+            out.append({
+                "symbol": self.symbol_mapper(raw["symbol"]),
+                "side": side,
+                "contracts": size,
+                "entryPrice": entry,
+                "markPrice": mark,
+                "leverage": _f(raw.get("leverage"), 1.0),
+                "unrealizedPnl": upnl,
+                "stopLoss": raw.get("stopLoss"),
+                "info": raw,
+            })
+        return out
+
+    def balance(self) -> Optional[dict]:
+        """USDT balance in fetch_balance() shape, or None before the first wallet message."""
+        with self._lock:
+            coin = dict(self._wallet_usdt) if self._wallet_usdt else None
+        if coin is None:
+            return None
+        return {"USDT": {"total": _f(coin.get("walletBalance")), "free": _f(coin.get("availableToWithdraw"), None)},
+                "info": {"result": {"list": [{"coin": [coin]}]}}}
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last stream message (None if nothing received)."""
+        if self.last_message_at is None:
+            return None
+        return self.clock() - self.last_message_at
+
+
+class ReplayFeed:
+    """
+    Replay a JSONL recording ({"recv_ts": float, "msg": {...}} per line, or
+    bare messages) into a handler. Local stand-in for the private stream.
+
+    Args:
+        path: Recording file
+        speed: 0 = as fast as possible, 1.0 = real time, 10.0 = 10x, ...
+    """
+
+    def __init__(self, path: str, speed: float = 0.0):
+        self.path = path
+        self.speed = speed
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _read(self) -> Iterable[tuple]:
+        with open(self.path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"⚠️ Skipping malformed replay line: {line[:80]}")
+                    continue
+                if "msg" in entry:
+                    yield entry.get("recv_ts"), entry["msg"]
+                else:
+                    yield None, entry
+
+    def run(self, handler: Handler) -> int:
+        """Replay synchronously; returns number of messages delivered."""
+        delivered = 0
+        prev_ts = None
+        for recv_ts, msg in self._read():
+            if self._stop.is_set():
+                break
+            if self.speed > 0 and recv_ts is not None and prev_ts is not None:
+                delay = (recv_ts - prev_ts) / self.speed
+                if delay > 0:
+                    self._stop.wait(delay)
+            prev_ts = recv_ts if recv_ts is not None else prev_ts
+            handler(msg)
+            delivered += 1
+        return delivered
+
+    def start(self, handler: Handler) -> None:
+        self._thread = threading.Thread(target=self.run, args=(handler,), daemon=True)
+        self._thread.start()
+
+    def watch_symbol(self, symbol: str) -> None:
+        pass  # recordings already contain the tickers they need
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class BybitPrivateFeed:
+    """
+    Live Bybit v5 streams: private position/order/execution/wallet plus
+    public linear tickers (mark price) for symbols with open positions.
+
+    Args:
+        api_key, api_secret: Bybit credentials
+        testnet: Use testnet endpoints
+    """
+
+    def __init__(self, api_key: str, api_secret: str, testnet: bool = False):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.testnet = testnet
+        self.private_ws = None
+        self.public_ws = None
+        self._handler: Optional[Handler] = None
+        self._watched: Set[str] = set()
+        self._watch_lock = threading.Lock()
+
+    def start(self, handler: Handler) -> None:
+        from pybit.unified_trading import WebSocket
+
+        self._handler = handler
+        self.private_ws = WebSocket(testnet=self.testnet, channel_type="private",
+                                    api_key=self.api_key, api_secret=self.api_secret)
+        self.private_ws.position_stream(callback=handler)
+        self.private_ws.order_stream(callback=handler)
+        self.private_ws.execution_stream(callback=handler)
+        self.private_ws.wallet_stream(callback=handler)
+        self.public_ws = WebSocket(testnet=self.testnet, channel_type="linear")
+        print("📡 Private streams subscribed: position, order, execution, wallet")
+
+    def watch_symbol(self, symbol: str) -> None:
+        """Subscribe the mark-price ticker for a symbol (once)."""
+        with self._watch_lock:
+            if symbol in self._watched or self.public_ws is None:
+                return
+            self._watched.add(symbol)
+        try:
+            self.public_ws.ticker_stream(symbol=symbol, callback=self._handler)
+            print(f"📡 Mark price stream subscribed: {symbol}")
+        except Exception as e:
+            with self._watch_lock:
+                self._watched.discard(symbol)
+            print(f"⚠️ Ticker subscribe failed for {symbol}: {e}")
+
+    def stop(self) -> None:
+        for ws in (self.private_ws, self.public_ws):
+            if ws is not None:
+                try:
+                    ws.exit()
+                except Exception as e:
+                    print(f"⚠️ WebSocket exit error: {e}")
+
+
+class EventDrivenMonitor:
+    """
+    Feed stream messages into PositionStreamState and run callbacks on a
+    single worker thread (never on the WebSocket thread).
+
+    Events arriving while a callback runs are coalesced into one follow-up
+    run; min_interval rate-limits evaluation during fast markets.
+
+    Args:
+        state: PositionStreamState to update
+        on_mark: Called on mark price / position / wallet changes (trailing, hard stops)
+        on_orders: Called when an order reaches a final status or a fill arrives
+        min_interval: Minimum seconds between two on_mark runs
+        watch_symbol: Called with each symbol that gets an open position
+    """
+
+    def __init__(self, state: PositionStreamState, on_mark: Callable[[], None],
+                 on_orders: Optional[Callable[[], None]] = None, min_interval: float = 0.5,
+                 watch_symbol: Optional[Callable[[str], None]] = None):
+        self.state = state
+        self.on_mark = on_mark
+        self.on_orders = on_orders
+        self.min_interval = min_interval
+        self.watch_symbol = watch_symbol
+        self._pending: Set[str] = set()
+        self._cond = threading.Condition()
+        self._stop = False
+        self._last_mark_run = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self.runs = {"mark": 0, "orders": 0}
+
+    def handle(self, message: dict) -> None:
+        """Stream callback: update state and schedule evaluation."""
+        try:
+            events = self.state.apply(message)
+        except Exception as e:
+            print(f"⚠️ Position stream message error: {e}")
+            return
+        if not events:
+            return
+        if "position" in events and self.watch_symbol:
+            for sym in self.state.open_symbols():
+                self.watch_symbol(sym)
+        kinds = set()
+        if events & {"mark", "position", "wallet"}:
+            kinds.add("mark")
+        if events & {"order_final", "execution"}:
+            kinds.add("orders")
+        if kinds:
+            with self._cond:
+                self._pending |= kinds
+                self._cond.notify()
+
+    def run_pending(self) -> Set[str]:
+        """Run callbacks for pending events once (worker body; also used by tests)."""
+        with self._cond:
+            kinds, self._pending = self._pending, set()
+        if "orders" in kinds and self.on_orders:
+            self.runs["orders"] += 1
+            self._safe(self.on_orders)
+        if "mark" in kinds:
+            self._last_mark_run = time.time()
+            self.runs["mark"] += 1
+            self._safe(self.on_mark)
+        return kinds
+
+    @staticmethod
+    def _safe(fn: Callable[[], None]) -> None:
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠️ Event-driven check error: {e}")
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                wait = self.min_interval - (time.time() - self._last_mark_run)
+                only_mark = self._pending == {"mark"}
+            if only_mark and wait > 0:
+                time.sleep(wait)  # coalesce ticks arriving within min_interval
+            self.run_pending()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
@@ -0,0 +1,148 @@
+"""
+Per-tick batching of stop-loss / take-profit updates for the position manager.
+
+The trailing check used to call the exchange once per position as soon as
+it computed a new SL. StopUpdateBatcher collects the moves of one monitor
+tick instead and submits them together:
+
+- moves smaller than the per-symbol minimum step are dropped up front
+- a later move of the same position replaces an earlier one
+- position TP/SL (v5/position/trading-stop has no batch variant) are sent
+  concurrently on a bounded thread pool
+
+Round-trips per tick still grow with the number of positions that actually
+moved, but the wall time of the tick stays near a single request.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class StopUpdate:
+    """Desired SL/TP of one position for this tick."""
+    symbol: str
+    side: str  # long / short
+    position_idx: int
+    stop_loss: Optional[float] = None
+    take_profit: Optional[float] = None
+    current_sl: float = 0.0  # SL on the exchange / last sent (0 = none)
+    current_tp: float = 0.0
+    trigger_by: str = "MarkPrice"
+
+    @property
+    def key(self) -> Tuple[str, str, int]:
+        return self.symbol, self.side, int(self.position_idx)
+
+
+class StopUpdateBatcher:
+    """
+    Collects one tick's SL/TP moves and submits them in as few requests as possible.
+
+    Args:
+        exchange: ccxt bybit instance
+        min_move: Symbol -> smallest SL/TP change worth sending
+        symbol_id: ccxt symbol -> Bybit id ("BTC/USDT:USDT" -> "BTCUSDT")
+        max_workers: Concurrent trading_stop requests
+    """
+
+    def __init__(self, exchange, min_move: Callable[[str], float], symbol_id: Callable[[str], str],
+                 max_workers: int = 4):
+        self.exchange = exchange
+        self.min_move = min_move
+        self.symbol_id = symbol_id
+        self.max_workers = max(1, int(max_workers))
+        self._pending: Dict[tuple, StopUpdate] = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {"queued": 0, "skipped": 0, "requests": 0, "failed": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[name] += n
+
+    # --- Collect ---
+    def _moves(self, new: Optional[float], current: float, step: float) -> bool:
+        if new is None or new <= 0:
+            return False
+        return not current or current <= 0 or abs(float(new) - float(current)) >= step
+
+    def add(self, update: StopUpdate) -> bool:
+        """
+        Queue a position's SL/TP for this tick (a later update of the same position replaces it).
+
+        Returns:
+            False if every requested move is below the minimum step (nothing queued)
+        """
+        step = float(self.min_move(update.symbol))
+        if not self._moves(update.stop_loss, update.current_sl, step):
+            update.stop_loss = None
+        if not self._moves(update.take_profit, update.current_tp, step):
+            update.take_profit = None
+        if update.stop_loss is None and update.take_profit is None:
+            self._count("skipped")
+            return False
+        self._pending[update.key] = update
+        return True
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    # --- Submit ---
+    def _price(self, symbol: str, price: float) -> str:
+        try:
+            return self.exchange.price_to_precision(symbol, float(price))
+        except Exception:
+            return str(price)
+
+    def _run_concurrently(self, jobs: List[Callable[[], None]]) -> None:
+        if len(jobs) <= 1 or self.max_workers == 1:
+            for job in jobs:
+                job()
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            for future in [pool.submit(job) for job in jobs]:
+                future.result()
+
+    def _trading_stop_job(self, update: StopUpdate) -> Callable[[], None]:
+        req = {
+            "category": "linear",
+            "symbol": self.symbol_id(update.symbol),
+            "tpslMode": "Full",
+            "positionIdx": update.position_idx,
+        }
+        if update.stop_loss is not None:
+            req["stopLoss"] = self._price(update.symbol, update.stop_loss)
+            req["slTriggerBy"] = update.trigger_by
+        if update.take_profit is not None:
+            req["takeProfit"] = self._price(update.symbol, update.take_profit)
+            req["tpTriggerBy"] = update.trigger_by
+
+        def job():
+            self._count("requests")
+            try:
+                resp = self.exchange.private_post_v5_position_trading_stop(req)
+                if isinstance(resp, dict):
+                    print(f"✅ SL/TP updated via trading_stop {req['symbol']} retCode={resp.get('retCode')} retMsg={resp.get('retMsg')}")
+                else:
+                    print(f"✅ SL/TP updated via trading_stop {req['symbol']}")
+            except Exception as api_err:
+                self._count("failed")
+                print(f"❌ Errore API Bybit (trading_stop) {req['symbol']}: {api_err}")
+        return job
+
+    def flush(self) -> dict:
+        """
+        Submit everything queued this tick and reset the queue.
+
+        Returns:
+            Counters: queued, skipped (below min step), requests (exchange round-trips), failed
+        """
+        pending, self._pending = list(self._pending.values()), {}
+        self._count("queued", len(pending))
+        if pending:
+            self._run_concurrently([self._trading_stop_job(u) for u in pending])
+            print(f"🧮 Stop updates: {len(pending)} position(s) in {self.stats['requests']} request(s), "
+                  f"{self.stats['skipped']} below min step")
+        return dict(self.stats)
@@ -0,0 +1,916 @@
+"""
+Vectorized replay backtester for the orchestrator's entry pipeline.
+
+Replays stored 15m OHLCV through the same steps the orchestrator runs live,
+computed with NumPy over every bar and symbol at once:
+- Technical fields of /analyze_multi_tf_full (EMA/MACD/RSI/ATR/ADX, volume
+  spike / z-score, returns) on 15m, plus the 1h/4h/1d frames aggregated from
+  15m with the forming higher-timeframe bar previewed exactly like the
+  incremental engine does
+- Fibonacci levels of /analyze_fib (200 x 4h swing range)
+- calculate_confluence_both (5 dimensions, same thresholds and rounding)
+- Risk gates: threshold/direction pick, best symbol per cycle, correlation
+  guard, cooldown, crash guard
+- calculate_limit_price entries filled within the limit TTL, then the ATR
+  SL/TP exits (optionally a trailing stop like the position manager's)
+
+Only the path-dependent part (slots, cooldowns, fills, exits) walks bars
+with a signal; everything else is array math. Fields the replay cannot see
+are approximated from 15m: the 5m crash-guard return and 5m volume spike use
+the 15m bar, and the Wyckoff LLM is assumed to agree with confluence unless
+`min_score_without_llm` is set.
+
+Keep the scoring in sync with agents/orchestrator/confluence.py
+(test_vectorized_backtester.py checks parity).
+"""
+
+import json
+import math
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+BAR_MS = 15 * 60_000
+TF_MS = {"1h": 60 * 60_000, "4h": 4 * 60 * 60_000, "1d": 24 * 60 * 60_000}
+
+# Same names / ratios as the Fibonacci agent (level names drive the scoring)
+FIB_LEVELS = (
+    ("0.0 (Low)", 0.0),
+    ("0.236", 0.236),
+    ("0.382", 0.382),
+    ("0.5 (Mid)", 0.5),
+    ("0.618 (Golden)", 0.618),
+    ("0.786", 0.786),
+    ("1.0 (High)", 1.0),
+)
+FIB_SWING_BARS = 200  # 4h bars, including the forming one
+
+# History a symbol needs before its features are complete: the EMA50 trend of
+# the 1d frame (50 days) outlasts the 200 x 4h Fibonacci swing (~33 days) and
+# ADX(14) (27 bars per frame). Entries are not replayed inside the warm-up.
+WARMUP_MS = max(50 * TF_MS["1d"], (2 * 14 - 1) * TF_MS["1d"], FIB_SWING_BARS * TF_MS["4h"])
+WARMUP_BARS = WARMUP_MS // BAR_MS
+
+# Orchestrator defaults (agents/orchestrator/main.py)
+DEFAULT_CONFIG = {
+    "confluence_threshold": 65.0,
+    "max_positions": 10,
+    "max_same_direction": 6,
+    "correlated_pairs": {"BTCUSDT": "ETHUSDT", "ETHUSDT": "BTCUSDT"},
+    "crash_guard_long_block_pct": 0.6,
+    "crash_guard_short_block_pct": 0.6,
+    "cooldown_seconds": 900,
+    "pending_order_ttl_seconds": 600,
+    "sniper_buffer_pct": 0.0008,
+    "limit_order_ttl_seconds": 300,
+    "max_limit_resubmissions": 2,
+    "atr_sl_multiplier": 1.5,
+    "atr_tp_multiplier": 4.5,
+    "min_leverage": 2,
+    "max_leverage": 4,
+    "min_size_pct": 0.06,
+    "max_size_pct": 0.10,
+    # None = Wyckoff assumed to agree; e.g. 75 = replay the "LLM uncertain" rule
+    "min_score_without_llm": None,
+    # Per side, on notional (0 = PnL as the position manager records it)
+    "fee_pct": 0.0,
+    # None = hold until SL/TP or end of data
+    "max_hold_bars": None,
+    # Position-manager style trailing stop (raw fractions); None = disabled
+    "trailing_activation_raw_pct": None,
+    "trailing_distance_raw_pct": 0.010,
+}
+
+# Learning-agent parameter names -> backtest config keys
+PARAM_ALIASES = {
+    "atr_multiplier_sl": "atr_sl_multiplier",
+    "atr_multiplier_tp": "atr_tp_multiplier",
+}
+
+
+def _round(x, digits: int) -> np.ndarray:
+    """np.round with Python round() semantics (exact decimal value) on near-half cases."""
+    x = np.asarray(x, dtype=float)
+    scale = 10.0 ** digits
+    scaled = x * scale
+    out = np.rint(scaled) / scale
+    with np.errstate(invalid="ignore"):
+        ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    if len(ties):
+        flat_out, flat_x = out.reshape(-1), x.reshape(-1)
+        for i in ties:
+            flat_out[i] = round(float(flat_x[i]), digits)
+    return out
+
+
+def config_from_params(params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Backtest config from DEFAULT_CONFIG overridden by (evolved) strategy params."""
+    config = dict(DEFAULT_CONFIG)
+    for key, value in (params or {}).items():
+        key = PARAM_ALIASES.get(key, key)
+        if key in config:
+            config[key] = value
+    return config
+
+
+# ---------------------------------------------------------------------------
+# Recursions (same seeding / warm-up as the `ta` library and incremental.py)
+# ---------------------------------------------------------------------------
+
+def _ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    """y0 = x0, y_t = (1 - alpha) * y_(t-1) + alpha * x_t."""
+    if len(x) == 0:
+        return np.asarray(x, dtype=float)
+    return pd.Series(x, dtype=float).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+
+def _seeded_ewm(x: np.ndarray, seed_idx: int, seed: float, alpha: float) -> np.ndarray:
+    """Recursion seeded with `seed` at seed_idx (NaN before), over x[seed_idx + 1:]."""
+    out = np.full(len(x), np.nan)
+    if seed_idx < len(x):
+        out[seed_idx:] = _ewm(np.concatenate(([seed], x[seed_idx + 1:])), alpha)
+    return out
+
+
+def _ema_raw(close: np.ndarray, period: int) -> np.ndarray:
+    """EMA recursion without the warm-up mask (state used for live previews)."""
+    return _ewm(close, 2.0 / (period + 1))
+
+
+def _warm(values: np.ndarray, period: int) -> np.ndarray:
+    out = values.copy()
+    out[:period - 1] = np.nan
+    return out
+
+
+def _macd(close: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """MACD(12, 26, 9); the signal EMA starts at the first valid MACD value."""
+    line = _warm(_ema_raw(close, 12), 12) - _warm(_ema_raw(close, 26), 26)
+    signal = np.full(len(close), np.nan)
+    first = 25
+    if len(close) > first:
+        signal[first:] = _warm(_ema_raw(line[first:], 9), 9)
+    return line, signal, line - signal
+
+
+def _rsi_state(close: np.ndarray, period: int = 14) -> Tuple[np.ndarray, np.ndarray]:
+    """Wilder-smoothed up / down moves (first bar seeds both with 0)."""
+    diff = np.diff(close, prepend=close[:1])
+    up = np.where(diff > 0, diff, 0.0)
+    dn = np.where(diff < 0, -diff, 0.0)
+    return _ewm(up, 1.0 / period), _ewm(dn, 1.0 / period)
+
+
+def _rsi_value(ema_up: np.ndarray, ema_dn: np.ndarray, count: np.ndarray, period: int = 14) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(ema_dn == 0, 100.0, 100.0 - 100.0 / (1.0 + ema_up / ema_dn))
+    return np.where(count >= period, rsi, np.nan)
+
+
+def _true_range(high, low, prev_close):
+    return np.maximum(high, prev_close) - np.minimum(low, prev_close)
+
+
+def _atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """ATR: 0 during warm-up, SMA seed of the first n TRs, then Wilder smoothing."""
+    n = period
+    tr = np.empty(len(close))
+    if len(close) == 0:
+        return tr
+    tr[0] = high[0] - low[0]
+    tr[1:] = _true_range(high[1:], low[1:], close[:-1])
+    if len(close) < n:
+        return np.zeros(len(close))
+    atr = _seeded_ewm(tr, n - 1, tr[:n].mean(), 1.0 / n)
+    atr[:n - 1] = 0.0
+    return atr
+
+
+def _wilder_sum(x: np.ndarray, n: int) -> np.ndarray:
+    """S_t = sum(x[1..t]) for t <= n, then S_t = S_(t-1) - S_(t-1) / n + x_t."""
+    s = np.cumsum(x)
+    if len(x) > n:
+        s[n:] = n * _seeded_ewm(x, n, s[n] / n, 1.0 / n)[n:]
+    return s
+
+
+def _dm(high, low, prev_high, prev_low):
+    up = high - prev_high
+    down = prev_low - low
+    pos = np.where((up > down) & (up > 0), up, 0.0)
+    neg = np.where((down > up) & (down > 0), down, 0.0)
+    return pos, neg
+
+
+def _dx(trs, dip, din):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        di_pos = np.where(trs != 0, 100 * dip / trs, 0.0)
+        di_neg = np.where(trs != 0, 100 * din / trs, 0.0)
+        total = di_pos + di_neg
+        return np.where(total != 0, 100 * np.abs((di_pos - di_neg) / total), 0.0)
+
+
+def _adx_state(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> Dict[str, np.ndarray]:
+    """
+    ADX as ta.trend.ADXIndicator, plus the per-bar state needed to preview a forming bar.
+
+    Bars 1..n seed the TR/+DM/-DM sums; ADX is 0 until bar 2n-1 (mean of the
+    first n DX values), then Wilder-smoothed.
+    """
+    n = period
+    size = len(close)
+    tr = np.zeros(size)
+    pos = np.zeros(size)
+    neg = np.zeros(size)
+    if size > 1:
+        tr[1:] = _true_range(high[1:], low[1:], close[:-1])
+        pos[1:], neg[1:] = _dm(high[1:], low[1:], high[:-1], low[:-1])
+    trs, dip, din = _wilder_sum(tr, n), _wilder_sum(pos, n), _wilder_sum(neg, n)
+    dx = _dx(trs, dip, din)
+    dx[:n] = 0.0
+    dx_sum = np.cumsum(dx)  # sum of dx[n..t]
+    adx = np.zeros(size)
+    if size > 2 * n - 1:
+        seed = dx_sum[2 * n - 1] / n
+        adx[2 * n - 1:] = _seeded_ewm(dx, 2 * n - 1, seed, 1.0 / n)[2 * n - 1:]
+    return {"trs": trs, "dip": dip, "din": din, "dx_sum": dx_sum, "adx": adx}
+
+
+# ---------------------------------------------------------------------------
+# Higher timeframes: closed bars from 15m, forming bar previewed per 15m bar
+# ---------------------------------------------------------------------------
+
+def _resample(ts, o, h, l, c, v, tf_ms: int) -> Dict[str, np.ndarray]:
+    """Closed higher-TF bars and, per 15m bar, its bucket and the forming bar so far."""
+    bucket = ts // tf_ms
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    group = np.cumsum(np.r_[False, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    frame = pd.DataFrame({"g": group, "h": h, "l": l, "v": v})
+    by = frame.groupby("g", sort=False)
+    live_h = by["h"].cummax().to_numpy()
+    live_l = by["l"].cummin().to_numpy()
+    live_v = by["v"].cumsum().to_numpy()
+    return {
+        "group": group,
+        "H": live_h[ends], "L": live_l[ends], "C": c[ends], "V": live_v[ends],
+        "live_h": live_h, "live_l": live_l, "live_c": c, "live_v": live_v,
+    }
+
+
+def _prev(arr: np.ndarray, group: np.ndarray, fill: float = np.nan) -> np.ndarray:
+    """Value of the last closed higher-TF bar for each 15m bar (fill for the first bucket)."""
+    out = np.full(len(group), fill)
+    has = group > 0
+    out[has] = arr[group[has] - 1]
+    return out
+
+
+def _live_tf_fields(tf: Dict[str, np.ndarray], period: int = 14, zscore: bool = False) -> Dict[str, np.ndarray]:
+    """trend / rsi / adx (and volume z-score) of the forming higher-TF bar at each 15m bar."""
+    g = tf["group"]
+    count = g + 1  # bars in the frame, forming bar included
+    c = tf["live_c"]
+    H, L, C = tf["H"], tf["L"], tf["C"]
+
+    # EMA50 trend
+    a50 = 2.0 / 51
+    ema_prev = _prev(_ema_raw(C, 50), g)
+    ema50 = np.where(g > 0, (1 - a50) * ema_prev + a50 * c, c)
+    ema50 = np.where(count >= 50, ema50, np.nan)
+    with np.errstate(invalid="ignore"):
+        trend = np.where(c > ema50, 1.0, -1.0)
+
+    # RSI(14)
+    up_prev, dn_prev = _rsi_state(C, period)
+    a = 1.0 / period
+    diff = c - _prev(C, g, 0.0)
+    up = np.where((g > 0) & (diff > 0), diff, 0.0)
+    dn = np.where((g > 0) & (diff < 0), -diff, 0.0)
+    eu = np.where(g > 0, (1 - a) * _prev(up_prev, g, 0.0) + a * up, 0.0)
+    ed = np.where(g > 0, (1 - a) * _prev(dn_prev, g, 0.0) + a * dn, 0.0)
+    rsi = _rsi_value(eu, ed, count, period)
+
+    # ADX(14)
+    n = period
+    st = _adx_state(H, L, C, n)
+    ph, pl, pc = _prev(H, g), _prev(L, g), _prev(C, g)
+    tr = _true_range(tf["live_h"], tf["live_l"], pc)
+    pos, neg = _dm(tf["live_h"], tf["live_l"], ph, pl)
+
+    def smooth(state, x):
+        prev = _prev(state, g, 0.0)
+        return np.where(g <= n, prev + x, prev - prev / float(n) + x)
+
+    dx = _dx(smooth(st["trs"], tr), smooth(st["dip"], pos), smooth(st["din"], neg))
+    adx = np.where(g == 2 * n - 1, (_prev(st["dx_sum"], g, 0.0) + dx) / n,
+                   (_prev(st["adx"], g, 0.0) * (n - 1) + dx) / float(n))
+    adx = np.where((g > 0) & (g >= 2 * n - 1), adx, 0.0)
+
+    out = {"trend": trend, "rsi": _round(rsi, 2), "adx": _round(adx, 2)}
+
+    if zscore:
+        # 20-bar window: 19 closed bars + the forming one
+        V = tf["V"]
+        s1 = pd.Series(V).rolling(19, min_periods=19).sum().to_numpy()
+        s2 = pd.Series(V * V).rolling(19, min_periods=19).sum().to_numpy()
+        v = tf["live_v"]
+        mean = (_prev(s1, g) + v) / 20
+        var = (_prev(s2, g) + v * v - 20 * mean * mean) / 19
+        std = np.sqrt(np.maximum(var, 0.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(std > 0, (v - mean) / std, 0.0)
+        z = np.where(count >= 20, _round(np.clip(z, -5.0, 5.0), 3), np.nan)
+        out["volume_zscore"] = z
+    return out
+
+
+def _rolling_zscore(v: np.ndarray, window: int = 20) -> np.ndarray:
+    s = pd.Series(v)
+    mean = s.rolling(window).mean().to_numpy()
+    std = s.rolling(window).std().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std > 0, (v - mean) / std, 0.0)
+    return np.where(np.isnan(mean), np.nan, _round(np.clip(z, -5.0, 5.0), 3))
+
+
+# ---------------------------------------------------------------------------
+# Features per symbol (one value per 15m bar)
+# ---------------------------------------------------------------------------
+
+FEATURE_KEYS = (
+    "close", "high", "low", "open",
+    "price", "ema_20", "ema_50", "atr", "trend_15m", "macd_pos", "macd_rising",
+    "volume_spike", "zscore_15m", "return_5m",
+    "trend_1h", "rsi_1h", "adx_1h", "zscore_1h",
+    "trend_4h", "adx_4h", "trend_1d",
+) + tuple(f"fib_{i}" for i in range(len(FIB_LEVELS)))
+
+
+def compute_features(ohlcv: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Tech / fib fields for every 15m bar, as the orchestrator would see them at that bar's close.
+
+    Args:
+        ohlcv: Arrays ts (ms), open, high, low, close, volume; oldest first, 15m bars
+
+    Returns:
+        Dict of FEATURE_KEYS -> float arrays (rounded like the analyzer's JSON)
+    """
+    ts = np.asarray(ohlcv["ts"], dtype=np.int64)
+    o, h, l, c, v = (np.asarray(ohlcv[k], dtype=float) for k in ("open", "high", "low", "close", "volume"))
+    size = len(c)
+
+    ema20 = _warm(_ema_raw(c, 20), 20)
+    ema50 = _warm(_ema_raw(c, 50), 50)
+    line, signal, hist = _macd(c)
+    hist_prev2 = np.r_[np.full(min(2, size), np.nan), hist[:-2]] if size > 2 else np.full(size, np.nan)
+    atr = _atr(h, l, c)
+
+    avg20 = pd.Series(v).rolling(20).mean().to_numpy()
+    ret = np.zeros(size)  # summary default when the return is missing
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spike = np.where(avg20 > 0, _round(v / avg20, 3), np.nan)
+        if size > 1:
+            prev = c[:-1]
+            ret[1:] = np.where(prev > 0, _round((c[1:] - prev) / prev * 100, 3), 0.0)
+
+    with np.errstate(invalid="ignore"):
+        feats = {
+            "open": o, "high": h, "low": l, "close": c,
+            "price": _round(c, 2),
+            "ema_20": _round(ema20, 2),
+            "ema_50": _round(ema50, 2),
+            "atr": _round(atr, 4),
+            "trend_15m": np.where(c > ema50, 1.0, -1.0),
+            "macd_pos": (line > signal).astype(float),
+            "macd_rising": (hist > hist_prev2).astype(float),
+            "volume_spike": spike,
+            "zscore_15m": _rolling_zscore(v),
+            "return_5m": ret,
+        }
+
+    tf_1h = _live_tf_fields(_resample(ts, o, h, l, c, v, TF_MS["1h"]), zscore=True)
+    feats.update(trend_1h=tf_1h["trend"], rsi_1h=tf_1h["rsi"], adx_1h=tf_1h["adx"],
+                 zscore_1h=tf_1h["volume_zscore"])
+
+    r4h = _resample(ts, o, h, l, c, v, TF_MS["4h"])
+    tf_4h = _live_tf_fields(r4h)
+    feats.update(trend_4h=tf_4h["trend"], adx_4h=tf_4h["adx"])
+    feats["trend_1d"] = _live_tf_fields(_resample(ts, o, h, l, c, v, TF_MS["1d"]))["trend"]
+
+    # Fibonacci: swing range of the last 200 4h bars (forming bar included)
+    g = r4h["group"]
+    closed = FIB_SWING_BARS - 1
+    hi = _prev(pd.Series(r4h["H"]).rolling(closed, min_periods=1).max().to_numpy(), g)
+    lo = _prev(pd.Series(r4h["L"]).rolling(closed, min_periods=1).min().to_numpy(), g)
+    swing_high = np.fmax(hi, r4h["live_h"])
+    swing_low = np.fmin(lo, r4h["live_l"])
+    diff = swing_high - swing_low
+    for i, (_, ratio) in enumerate(FIB_LEVELS):
+        feats[f"fib_{i}"] = _round(swing_low + diff * ratio, 2)
+    return feats
+
+
+# ---------------------------------------------------------------------------
+# Vectorized calculate_confluence_both
+# ---------------------------------------------------------------------------
+
+_LONG_FIBS = ("0.382", "0.5", "0.618")
+_SHORT_FIBS = ("0.618", "0.786", "1.0")
+
+
+def _gt0(x):
+    return np.nan_to_num(x, nan=0.0) > 0
+
+
+def score_trend_alignment(f: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    sign = 1.0 if direction == "long" else -1.0
+    raw = np.zeros_like(f["price"])
+    for key, w in (("trend_15m", 5), ("trend_1h", 8), ("trend_4h", 10), ("trend_1d", 7)):
+        tv = f[key] * sign
+        raw += np.where(tv > 0, w, np.where(tv < 0, -w * 0.5, 0.0))
+    raw = np.maximum(raw, 0.0)
+
+    price, ema50, atr = f["price"], f["ema_50"], f["atr"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        approx = np.where(_gt0(price) & _gt0(ema50) & _gt0(atr),
+                          np.minimum(50, np.abs(price - ema50) / atr * 10), 15.0)
+    adx_1h = np.nan_to_num(f["adx_1h"], nan=0.0)
+    adx_4h = np.nan_to_num(f["adx_4h"], nan=0.0)
+    adx = np.where(adx_1h > 0, adx_1h, np.where(adx_4h > 0, adx_4h, approx))
+    score = raw * np.maximum(0.4, np.minimum(adx / 18.0, 1.0))
+
+    conflict = (f["trend_1h"] != 0) & (f["trend_4h"] != 0) & (f["trend_1h"] != f["trend_4h"])
+    score = np.where(conflict, np.minimum(score, 15.0), score)
+    return _round(np.minimum(30.0, np.maximum(0.0, score)), 2)
+
+
+def score_momentum(f: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    pos = f["macd_pos"] > 0
+    rising = f["macd_rising"] > 0
+    if direction == "long":
+        macd = np.select([pos & rising, pos, rising], [10.0, 6.0, 4.0], 0.0)
+    else:
+        macd = np.select([~pos & ~rising, ~pos, ~rising], [10.0, 6.0, 4.0], 0.0)
+
+    rsi = np.where(np.isnan(f["rsi_1h"]), 50.0, f["rsi_1h"])  # NaN is served as null -> default 50
+    with np.errstate(invalid="ignore"):
+        if direction == "long":
+            rsi_score = np.select(
+                [(35 <= rsi) & (rsi <= 55), (25 <= rsi) & (rsi < 35), (55 < rsi) & (rsi <= 65), rsi > 70],
+                [10.0, 7.0, 5.0, 0.0], 3.0)
+        else:
+            rsi_score = np.select(
+                [(45 <= rsi) & (rsi <= 65), (65 < rsi) & (rsi <= 75), (35 <= rsi) & (rsi < 45), rsi < 30],
+                [10.0, 7.0, 5.0, 0.0], 3.0)
+    return _round(np.minimum(20.0, macd + rsi_score), 2)
+
+
+def score_mean_reversion(f: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    price, ema20, atr = f["price"], f["ema_20"], f["atr"]
+    valid = _gt0(price) & _gt0(ema20) & _gt0(atr)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d = np.where(valid, (price - ema20) / np.where(valid, atr, 1.0), 0.0)
+    if direction == "long":
+        score = np.select(
+            [(-2.0 <= d) & (d <= -0.3), (-0.3 < d) & (d <= 0.3), (0.3 < d) & (d <= 1.0), d > 1.0, d < -2.0],
+            [15.0 + np.minimum(5.0, np.abs(d) * 5), 13.0, 7.0, 3.0, 8.0], 0.0)
+    else:
+        score = np.select(
+            [(0.3 <= d) & (d <= 2.0), (-0.3 <= d) & (d < 0.3), (-1.0 <= d) & (d < -0.3), d < -1.0, d > 2.0],
+            [15.0 + np.minimum(5.0, d * 5), 13.0, 7.0, 3.0, 8.0], 0.0)
+    return np.where(valid, _round(np.minimum(20.0, np.maximum(0.0, score)), 2), 0.0)
+
+
+def score_volume(f: Dict[str, np.ndarray]) -> np.ndarray:
+    spike = np.nan_to_num(f["volume_spike"], nan=0.0)
+    z15 = np.nan_to_num(f["zscore_15m"], nan=0.0)
+    zscore = np.where(z15 <= 0, np.nan_to_num(f["zscore_1h"], nan=0.0), z15)
+    spike_score = np.select([spike >= 2.0, spike >= 1.5, spike >= 1.0, spike >= 0.5, spike >= 0.3],
+                            [15.0, 12.0, 10.0, 7.0, 4.0], 0.0)
+    z_score = np.select([zscore >= 2.0, zscore >= 1.0, zscore >= 0.5, zscore >= 0.0],
+                        [12.0, 8.0, 5.0, 3.0], 0.0)
+    return np.minimum(15.0, np.maximum(spike_score, z_score))
+
+
+def score_key_levels(f: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    price, atr = f["price"], f["atr"]
+    valid = _gt0(price) & _gt0(atr)
+    prox = atr * 2
+    score = np.zeros_like(price)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for key in ("ema_20", "ema_50"):
+            ema = f[key]
+            dist = price - ema if direction == "long" else ema - price
+            has = _gt0(ema)
+            score += np.where(has & (0 <= dist) & (dist <= prox), 4.0,
+                              np.where(has & (-prox <= dist) & (dist < 0), 3.0, 0.0))
+
+        names = _LONG_FIBS if direction == "long" else _SHORT_FIBS
+        for i, (name, _) in enumerate(FIB_LEVELS):
+            if not any(k in name for k in names):
+                continue
+            lp = f[f"fib_{i}"]
+            near = _gt0(lp) & (np.abs(price - lp) / price <= 0.005)
+            good = price >= lp if direction == "long" else price <= lp
+            score += np.where(near, np.where(good, 5.0, 3.0), 0.0)
+    return np.where(valid, _round(np.minimum(15.0, score), 2), 0.0)
+
+
+def calculate_confluence_arrays(f: Dict[str, np.ndarray], direction: str) -> Dict[str, np.ndarray]:
+    """calculate_confluence over arrays of features (any shape)."""
+    out = {
+        "trend_alignment": score_trend_alignment(f, direction),
+        "momentum": score_momentum(f, direction),
+        "mean_reversion": score_mean_reversion(f, direction),
+        "volume": score_volume(f),
+        "key_levels": score_key_levels(f, direction),
+    }
+    total = out["trend_alignment"] + out["momentum"] + out["mean_reversion"] + out["volume"] + out["key_levels"]
+    out["total"] = _round(np.minimum(100.0, total), 2)
+    return out
+
+
+def calculate_limit_price_arrays(f: Dict[str, np.ndarray], direction: str,
+                                 sniper_buffer_pct: float = 0.0008) -> np.ndarray:
+    """calculate_limit_price over arrays: fib within 0.3%, else EMA20 within 0.2%, else buffer."""
+    price = f["price"]
+    best = np.full(price.shape, np.nan)
+    best_dist = np.full(price.shape, np.inf)
+    names = _LONG_FIBS if direction == "long" else _SHORT_FIBS
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i, (name, _) in enumerate(FIB_LEVELS):
+            lp = f[f"fib_{i}"]
+            dist = np.abs(price - lp) / price
+            side_ok = lp < price if direction == "long" else lp > price
+            ok = _gt0(lp) & (dist <= 0.003) & side_ok & (dist < best_dist)
+            if not any(k in name for k in names):
+                ok &= np.isnan(best)  # other levels only while nothing is selected
+            best = np.where(ok, lp, best)
+            best_dist = np.where(ok, dist, best_dist)
+
+        ema20 = f["ema_20"]
+        ema_ok = _gt0(ema20) & (np.abs(price - ema20) / price <= 0.002)
+        ema_ok &= ema20 < price if direction == "long" else ema20 > price
+    fallback = price * (1 - sniper_buffer_pct) if direction == "long" else price * (1 + sniper_buffer_pct)
+    return _round(np.where(~np.isnan(best), best, np.where(ema_ok, ema20, fallback)), 8)
+
+
+# ---------------------------------------------------------------------------
+# Market: features and scores aligned on one 15m grid (symbols x bars)
+# ---------------------------------------------------------------------------
+
+class ReplayMarket:
+    """
+    Features and both-direction confluence for all symbols, computed once
+    and reused for every parameter set.
+
+    Args:
+        ohlcv_by_symbol: {symbol: {"ts", "open", "high", "low", "close", "volume"}}
+        warmup_ms: No entries within this long of each symbol's first bar (e.g. WARMUP_MS)
+    """
+
+    def __init__(self, ohlcv_by_symbol: Dict[str, Dict[str, np.ndarray]], warmup_ms: int = 0):
+        self.symbols = list(ohlcv_by_symbol)
+        grids = [np.asarray(ohlcv_by_symbol[s]["ts"], dtype=np.int64) for s in self.symbols]
+        self.ts = np.unique(np.concatenate(grids)) if grids else np.zeros(0, dtype=np.int64)
+        shape = (len(self.symbols), len(self.ts))
+
+        self.features: Dict[str, np.ndarray] = {k: np.full(shape, np.nan) for k in FEATURE_KEYS}
+        for row, (sym, sym_ts) in enumerate(zip(self.symbols, grids)):
+            cols = np.searchsorted(self.ts, sym_ts)
+            for key, values in compute_features(ohlcv_by_symbol[sym]).items():
+                self.features[key][row, cols] = values
+        self.available = ~np.isnan(self.features["close"])
+        if warmup_ms > 0:
+            for row, sym_ts in enumerate(grids):
+                if len(sym_ts):
+                    self.available[row, self.ts < sym_ts.min() + warmup_ms] = False
+
+        self.long = calculate_confluence_arrays(self.features, "long")
+        self.short = calculate_confluence_arrays(self.features, "short")
+
+    @property
+    def bars(self) -> int:
+        return len(self.ts)
+
+    def tech_snapshot(self, sym_idx: int, bar: int) -> Tuple[dict, dict]:
+        """(tech, fib) dicts shaped like /analyze_multi_tf_full and /analyze_fib for one bar."""
+        f = {k: float(v[sym_idx, bar]) for k, v in self.features.items()}
+
+        def trend(x):
+            return "BULLISH" if x > 0 else "BEARISH"
+
+        def opt(x):
+            return None if math.isnan(x) else x
+
+        tech = {
+            "timeframes": {
+                "15m": {
+                    "price": f["price"], "trend": trend(f["trend_15m"]),
+                    "macd": "POSITIVE" if f["macd_pos"] else "NEGATIVE",
+                    "macd_momentum": "RISING" if f["macd_rising"] else "FALLING",
+                    "ema_20": opt(f["ema_20"]), "ema_50": opt(f["ema_50"]), "atr": f["atr"],
+                    "volume_spike_15m": opt(f["volume_spike"]), "volume_zscore": opt(f["zscore_15m"]),
+                },
+                "1h": {"trend": trend(f["trend_1h"]), "rsi": opt(f["rsi_1h"]), "adx": f["adx_1h"],
+                       "volume_zscore": opt(f["zscore_1h"])},
+                "4h": {"trend": trend(f["trend_4h"]), "adx": f["adx_4h"]},
+                "1d": {"trend": trend(f["trend_1d"])},
+            },
+            "summary": {"return_5m": f["return_5m"], "volume_spike_5m": opt(f["volume_spike"])},
+        }
+        fib = {"fib_levels": {name: f[f"fib_{i}"] for i, (name, _) in enumerate(FIB_LEVELS)}}
+        return tech, fib
+
+
+# ---------------------------------------------------------------------------
+# Simulation (walks only bars with a candidate)
+# ---------------------------------------------------------------------------
+
+def deterministic_leverage(score: float) -> int:
+    if score >= 80:
+        return 4
+    if score >= 70:
+        return 3
+    return 2
+
+
+def deterministic_size(score: float) -> float:
+    if score >= 85:
+        return 0.10
+    if score >= 75:
+        return 0.08
+    return 0.06
+
+
+def _scan_exit(high: np.ndarray, low: np.ndarray, open_: np.ndarray, fill_bar: int, end: int,
+               entry: float, sl_price: float, tp_price: float,
+               trail_act: Optional[float], trail_dist: float) -> Tuple[int, float, str]:
+    """
+    First exit of a long position filled at fill_bar (pass negated, swapped prices for shorts).
+
+    The SL can trigger on the fill bar, TP / trailing stop from the next bar; the stop
+    wins a tie. Once the best price of the previous bars is trail_act (raw) beyond entry,
+    the stop trails it at trail_dist, never below the initial SL. The window grows
+    geometrically so short trades only touch a few bars.
+
+    Returns:
+        (exit_bar, exit_price, closed_by); exit_bar is -1 if still open at `end`
+    """
+    if low[fill_bar] <= sl_price:
+        return fill_bar, sl_price, "stop_loss"
+    best_before = entry
+    lo, step = fill_bar + 1, 64
+    while lo < end:
+        hi = min(end, lo + step)
+        h, l = high[lo:hi], low[lo:hi]
+        stop = np.full(hi - lo, sl_price)
+        if trail_act is not None:
+            best = np.maximum.accumulate(np.r_[best_before, h[:-1]])
+            armed = best - entry >= trail_act * abs(entry)
+            stop = np.where(armed, np.maximum(sl_price, best - trail_dist * np.abs(best)), sl_price)
+            best_before = max(best_before, float(h.max()))
+        hits = np.flatnonzero((l <= stop) | (h >= tp_price))
+        if len(hits):
+            k = int(hits[0])
+            bar = lo + k
+            if l[k] <= stop[k]:
+                closed_by = "trailing_stop" if stop[k] > sl_price else "stop_loss"
+                return bar, min(float(stop[k]), float(open_[bar])), closed_by
+            return bar, tp_price, "take_profit"
+        lo = hi
+        step *= 4
+    return -1, 0.0, ""
+
+
+def simulate(market: ReplayMarket, config: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Replay the entry gates, limit fills and SL/TP exits.
+
+    Args:
+        market: Prepared ReplayMarket
+        config: Backtest config (see DEFAULT_CONFIG / config_from_params)
+
+    Returns:
+        Closed trades (dicts shaped like the position manager's trade records), by entry time
+    """
+    cfg = dict(DEFAULT_CONFIG)
+    cfg.update(config or {})
+    f = market.features
+    n_sym, n_bars = f["close"].shape
+    if n_sym == 0 or n_bars == 0:
+        return []
+
+    threshold = float(cfg["confluence_threshold"])
+    long_total, short_total = market.long["total"], market.short["total"]
+    is_long = (long_total >= threshold) & (long_total > short_total)
+    is_short = (short_total >= threshold) & (short_total > long_total)
+    score = np.where(is_long, long_total, np.where(is_short, short_total, 0.0))
+    if cfg["min_score_without_llm"] is not None:
+        score = np.where(score >= float(cfg["min_score_without_llm"]), score, 0.0)
+    score = np.where(market.available, score, 0.0)
+    candidate_bars = np.flatnonzero((score > 0).any(axis=0))
+
+    limit_long = calculate_limit_price_arrays(f, "long", cfg["sniper_buffer_pct"])
+    limit_short = calculate_limit_price_arrays(f, "short", cfg["sniper_buffer_pct"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        atr_ok = _gt0(f["atr"]) & _gt0(f["price"])
+        sl_pct = np.where(atr_ok, cfg["atr_sl_multiplier"] * f["atr"] / f["price"], 0.02)
+        tp_pct = np.where(atr_ok, cfg["atr_tp_multiplier"] * f["atr"] / f["price"], 0.03)
+    ret5 = np.nan_to_num(f["return_5m"], nan=0.0)
+    crash_long = ret5 <= -cfg["crash_guard_long_block_pct"]
+    crash_short = ret5 >= cfg["crash_guard_short_block_pct"]
+
+    ttl_total = cfg["limit_order_ttl_seconds"] * (1 + cfg["max_limit_resubmissions"])
+    fill_bars = max(1, int(math.ceil(ttl_total * 1000 / BAR_MS)))
+    max_hold = cfg["max_hold_bars"]
+    cooldown_ms = cfg["cooldown_seconds"] * 1000
+    pending_ms = cfg["pending_order_ttl_seconds"] * 1000
+    fee = float(cfg["fee_pct"])
+    sym_index = {s: i for i, s in enumerate(market.symbols)}
+    correlated = {sym_index[a]: sym_index[b] for a, b in cfg["correlated_pairs"].items()
+                  if a in sym_index and b in sym_index}
+
+    high, low, opn, close = f["high"], f["low"], f["open"], f["close"]
+    neg_high, neg_low, neg_open = -low, -high, -opn
+    trail_act = cfg["trailing_activation_raw_pct"]
+    trail_dist = float(cfg["trailing_distance_raw_pct"])
+    decision_ms = market.ts + BAR_MS  # decisions at bar close
+
+    busy_until = np.full(n_sym, -1)       # bar from which the symbol can be scanned again
+    pending_until_ms = np.full(n_sym, -1)  # unfilled order blocks scanning until this time
+    last_close_ms = {}                     # (sym, dir) -> exit time
+    open_trades: List[Dict[str, Any]] = []
+    trades: List[Dict[str, Any]] = []
+
+    for t in candidate_bars:
+        now_ms = decision_ms[t]
+        open_trades = [tr for tr in open_trades if tr["_exit_bar"] > t]
+        if len(open_trades) >= cfg["max_positions"]:
+            continue
+
+        free = (busy_until <= t) & (pending_until_ms < now_ms)
+        row = np.where(free, score[:, t], 0.0)
+        if not row.any():
+            continue
+
+        # Best symbol (ties -> first listed) that passes the correlation guard
+        open_dirs = {tr["_sym"]: tr["side"] for tr in open_trades}
+        same_dir = {"long": sum(1 for d in open_dirs.values() if d == "long"),
+                    "short": sum(1 for d in open_dirs.values() if d == "short")}
+        best = -1
+        for s in np.argsort(-row, kind="stable"):
+            if row[s] <= 0:
+                break
+            direction = "long" if is_long[s, t] else "short"
+            if same_dir[direction] >= cfg["max_same_direction"]:
+                continue
+            peer = correlated.get(int(s))
+            if peer is not None and open_dirs.get(peer) == direction:
+                continue
+            best = int(s)
+            break
+        if best < 0:
+            continue
+
+        s = best
+        direction = "long" if is_long[s, t] else "short"
+        last = last_close_ms.get((s, direction))
+        if last is not None and now_ms - last < cooldown_ms:
+            continue
+        if (crash_long if direction == "long" else crash_short)[s, t]:
+            continue
+
+        # Limit entry: fills if price trades through it within the TTL window
+        limit = float((limit_long if direction == "long" else limit_short)[s, t])
+        w_end = min(n_bars, t + 1 + fill_bars)
+        if direction == "long":
+            touched = np.flatnonzero(low[s, t + 1:w_end] <= limit)
+        else:
+            touched = np.flatnonzero(high[s, t + 1:w_end] >= limit)
+        if len(touched) == 0:
+            busy_until[s] = w_end - 1  # expired by the close of the last window bar
+            pending_until_ms[s] = now_ms + pending_ms
+            continue
+        fb = t + 1 + int(touched[0])
+        entry = min(limit, opn[s, fb]) if direction == "long" else max(limit, opn[s, fb])
+
+        conf = float(score[s, t])
+        leverage = max(cfg["min_leverage"], min(cfg["max_leverage"], deterministic_leverage(conf)))
+        size_pct = max(cfg["min_size_pct"], min(cfg["max_size_pct"], deterministic_size(conf)))
+        sl, tp = float(sl_pct[s, t]), float(tp_pct[s, t])
+        if direction == "long":
+            sl_price, tp_price = entry * (1 - sl), entry * (1 + tp)
+        else:
+            sl_price, tp_price = entry * (1 + sl), entry * (1 - tp)
+
+        # Exits (shorts scan negated prices so one routine serves both sides)
+        end = n_bars if max_hold is None else min(n_bars, fb + 1 + int(max_hold))
+        sign = 1.0 if direction == "long" else -1.0
+        hs, ls, os_ = (high[s], low[s], opn[s]) if direction == "long" else (neg_high[s], neg_low[s], neg_open[s])
+        exit_bar, exit_price, closed_by = _scan_exit(
+            hs, ls, os_, fb, end, sign * entry, sign * sl_price, sign * tp_price,
+            trail_act, trail_dist)
+        if exit_bar >= 0:
+            exit_price *= sign
+        else:
+            exit_bar = end - 1
+            exit_price = float(close[s, exit_bar])
+            closed_by = "end_of_data" if max_hold is None or end == n_bars else "max_hold"
+
+        raw = (exit_price - entry) / entry if direction == "long" else (entry - exit_price) / entry
+        pnl_pct = (raw - 2 * fee) * leverage * 100.0
+        trade = {
+            "timestamp": datetime.fromtimestamp(market.ts[fb] / 1000, tz=timezone.utc).isoformat(),
+            "symbol": market.symbols[s],
+            "side": direction,
+            "entry_price": round(entry, 8),
+            "exit_price": round(float(exit_price), 8),
+            "pnl_pct": round(pnl_pct, 4),
+            "leverage": leverage,
+            "size_pct": size_pct,
+            "duration_minutes": int((market.ts[exit_bar] - market.ts[fb]) / 60_000) + 15,
+            "confluence_score": conf,
+            "sl_pct": sl,
+            "tp_pct": tp,
+            "market_conditions": {"closed_by": closed_by, "replay": True},
+            "_sym": s, "_exit_bar": exit_bar,
+        }
+        trades.append(trade)
+        open_trades.append(trade)
+        busy_until[s] = exit_bar
+        last_close_ms[(s, direction)] = decision_ms[exit_bar]
+
+    for trade in trades:
+        trade.pop("_sym")
+        trade.pop("_exit_bar")
+    return trades
+
+
+def run_backtest(ohlcv_by_symbol: Dict[str, Dict[str, np.ndarray]],
+                 params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """One-shot helper: build the market and simulate with config_from_params(params)."""
+    return simulate(ReplayMarket(ohlcv_by_symbol), config_from_params(params))
+
+
+# ---------------------------------------------------------------------------
+# Stored OHLCV
+# ---------------------------------------------------------------------------
+
+def load_candle_cache(cache_dir: str, interval: str = "15", symbols: Optional[List[str]] = None,
+                      min_bars: int = 0) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Load the technical analyzer's persisted candle series (CANDLE_CACHE_DIR).
+
+    Args:
+        cache_dir: Directory with <SYMBOL>_<interval>.json files
+        interval: Bybit interval code ("15" = 15m)
+        symbols: Restrict to these symbols (default: every cached symbol)
+        min_bars: Skip series shorter than this
+
+    Returns:
+        {symbol: {"ts", "open", "high", "low", "close", "volume"}} oldest first
+    """
+    out: Dict[str, Dict[str, np.ndarray]] = {}
+    try:
+        names = sorted(os.listdir(cache_dir))
+    except FileNotFoundError:
+        return out
+    suffix = f"_{interval}.json"
+    for name in names:
+        if not name.endswith(suffix):
+            continue
+        symbol = name[:-len(suffix)]
+        if symbols is not None and symbol not in symbols:
+            continue
+        try:
+            with open(os.path.join(cache_dir, name), "r") as fh:
+                rows = json.load(fh).get("rows") or []
+            arr = np.asarray([r[:6] for r in rows], dtype=float)
+        except Exception as e:
+            print(f"⚠️ Skipping unreadable candle cache {name}: {e}")
+            continue
+        if len(arr) < max(1, min_bars):
+            continue
+        out[symbol] = ohlcv_from_rows(arr)
+    return out
+
+
+def ohlcv_from_rows(arr: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    [ts, open, high, low, close, volume] rows in any order -> OHLCV arrays oldest first.
+
+    Duplicate bars keep the row written last.
+    """
+    ts = arr[:, 0].astype(np.int64)
+    order = np.argsort(ts, kind="stable")
+    arr, ts = arr[order], ts[order]
+    keep = np.r_[ts[1:] != ts[:-1], True]  # last write wins on duplicate bars
+    arr, ts = arr[keep], ts[keep]
+    return {"ts": ts, "open": arr[:, 1], "high": arr[:, 2], "low": arr[:, 3],
+            "close": arr[:, 4], "volume": arr[:, 5]}
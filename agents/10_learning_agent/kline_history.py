@@ -0,0 +1,185 @@
+"""
+Append-only kline history for the replay backtester.
+
+The technical analyzer's candle cache is a ring buffer (CANDLE_STORE_CAPACITY
+bars, ~10 days of 15m), shorter than the indicator warm-up of the replay
+(backtester.WARMUP_MS). KlineHistory backfills closed bars from Bybit
+/v5/market/kline instead, 1000 bars per request paging backwards with `end`,
+and appends them to one CSV file per symbol (ts,open,high,low,close,volume):
+
+- a backfill only requests what is missing: bars after the newest stored one
+  and, when the wanted span grows, bars before the oldest
+- rows are never rewritten; the loader sorts and drops duplicate bars
+- a torn last line (crash mid-append) is skipped on load
+
+Gaps inside the stored range (exchange outage) are not re-requested.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backtester import ohlcv_from_rows
+
+DAY_MS = 24 * 60 * 60_000
+BYBIT_INTERVAL_MS = {"15": 15 * 60_000, "60": 60 * 60_000, "240": 4 * 60 * 60_000, "D": DAY_MS}
+PAGE_LIMIT = 1000  # Bybit maximum per kline request
+
+# (symbol, interval, start_ms, end_ms, limit) -> raw rows newest-first, None on error
+FetchPage = Callable[[str, str, int, int, int], Optional[List[list]]]
+
+
+def bybit_fetch_page(testnet: bool = False) -> FetchPage:
+    """Bybit public kline endpoint (pybit HTTP, no API key needed)."""
+    from pybit.unified_trading import HTTP
+    session = HTTP(testnet=testnet)
+
+    def fetch(symbol: str, interval: str, start_ms: int, end_ms: int, limit: int) -> Optional[List[list]]:
+        try:
+            resp = session.get_kline(category="linear", symbol=symbol, interval=interval,
+                                     start=start_ms, end=end_ms, limit=limit)
+        except Exception as e:
+            print(f"⚠️ Kline backfill request failed for {symbol}: {e}")
+            return None
+        if resp.get("retCode") != 0:
+            print(f"⚠️ Kline backfill for {symbol}: retCode={resp.get('retCode')} retMsg={resp.get('retMsg')}")
+            return None
+        return (resp.get("result") or {}).get("list") or []
+    return fetch
+
+
+class KlineHistory:
+    """
+    Per-symbol append-only kline files, backfilled page by page.
+
+    Args:
+        directory: Where <SYMBOL>_<interval>.csv files live
+        interval: Bybit interval code ("15" = 15m)
+        fetch_page: Page fetcher (default: Bybit mainnet REST, created on first backfill)
+    """
+
+    def __init__(self, directory: str, interval: str = "15", fetch_page: Optional[FetchPage] = None):
+        self.directory = directory
+        self.interval = interval
+        self.interval_ms = BYBIT_INTERVAL_MS[interval]
+        self._fetch_page = fetch_page
+        self._spans: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, symbol: str) -> str:
+        return os.path.join(self.directory, f"{symbol}_{self.interval}.csv")
+
+    def symbols(self) -> List[str]:
+        suffix = f"_{self.interval}.csv"
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(n[:-len(suffix)] for n in names if n.endswith(suffix))
+
+    # --- Read ---
+    def _read_rows(self, symbol: str) -> np.ndarray:
+        rows = []
+        try:
+            with open(self.path(symbol), "r") as fh:
+                for line in fh:
+                    parts = line.rstrip("\n").split(",")
+                    if len(parts) != 6:
+                        continue  # torn append
+                    try:
+                        rows.append([float(x) for x in parts])
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            pass
+        return np.asarray(rows, dtype=float).reshape(-1, 6)
+
+    def span(self, symbol: str) -> Optional[Tuple[int, int]]:
+        """(first, last) stored bar open time, None if nothing is stored."""
+        if symbol not in self._spans:
+            ts = self._read_rows(symbol)[:, 0]
+            self._spans[symbol] = (int(ts.min()), int(ts.max())) if len(ts) else None
+        return self._spans[symbol]
+
+    def load(self, symbols: Optional[List[str]] = None, min_bars: int = 0,
+             since_ms: Optional[int] = None) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Stored bars in load_candle_cache's shape.
+
+        Args:
+            symbols: Restrict to these symbols (default: every stored symbol)
+            min_bars: Skip series with fewer bars (after since_ms)
+            since_ms: Drop bars that opened before this time
+
+        Returns:
+            {symbol: {"ts", "open", "high", "low", "close", "volume"}} oldest first
+        """
+        out: Dict[str, Dict[str, np.ndarray]] = {}
+        for symbol in (symbols if symbols is not None else self.symbols()):
+            arr = self._read_rows(symbol)
+            if since_ms is not None:
+                arr = arr[arr[:, 0] >= since_ms]
+            if len(arr) == 0:
+                continue
+            ohlcv = ohlcv_from_rows(arr)
+            if len(ohlcv["ts"]) >= max(1, min_bars):
+                out[symbol] = ohlcv
+        return out
+
+    # --- Backfill ---
+    def _append(self, symbol: str, rows: List[Tuple[int, float, float, float, float, float]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(symbol), "a") as fh:
+            fh.write("".join(f"{ts},{o!r},{h!r},{l!r},{c!r},{v!r}\n" for ts, o, h, l, c, v in rows))
+            fh.flush()
+            os.fsync(fh.fileno())
+        first, last = rows[0][0], rows[-1][0]
+        span = self._spans.get(symbol)
+        self._spans[symbol] = (min(first, span[0]), max(last, span[1])) if span else (first, last)
+
+    def _fill(self, symbol: str, start_ms: int, end_ms: int) -> int:
+        """Page backwards from end_ms to start_ms (bar open times, inclusive)."""
+        appended = 0
+        end = end_ms
+        while end >= start_ms:
+            raw = self._fetch_page(symbol, self.interval, start_ms, end, PAGE_LIMIT)
+            if not raw:
+                break
+            try:
+                page = sorted({int(r[0]): (int(r[0]), float(r[1]), float(r[2]), float(r[3]),
+                                           float(r[4]), float(r[5])) for r in raw}.values())
+            except (TypeError, ValueError, IndexError) as e:
+                print(f"⚠️ Malformed kline page for {symbol}: {e}")
+                break
+            rows = [r for r in page if start_ms <= r[0] <= end]
+            if rows:
+                self._append(symbol, rows)
+                appended += len(rows)
+            oldest = page[0][0]
+            if len(raw) < PAGE_LIMIT or oldest > end:
+                break  # range (or the listing) exhausted
+            end = oldest - self.interval_ms
+        return appended
+
+    def backfill(self, symbol: str, days: float, now_ms: Optional[int] = None) -> int:
+        """
+        Make the stored history of a symbol cover the last `days` up to the newest closed bar.
+
+        Returns:
+            Bars appended (0 when already up to date or the exchange failed)
+        """
+        with self._lock:
+            if self._fetch_page is None:
+                self._fetch_page = bybit_fetch_page()
+            now_ms = int(time.time() * 1000) if now_ms is None else int(now_ms)
+            newest_closed = (now_ms // self.interval_ms - 1) * self.interval_ms
+            wanted_start = (int(now_ms - days * DAY_MS) // self.interval_ms) * self.interval_ms
+            span = self.span(symbol)
+            if span is None:
+                segments = [(wanted_start, newest_closed)]
+            else:
+                segments = [(span[1] + self.interval_ms, newest_closed), (wanted_start, span[0] - self.interval_ms)]
+            return sum(self._fill(symbol, start, end) for start, end in segments if start <= end)
@@ -1,13 +1,19 @@
 import os
 import json
 import logging
+import math
 import asyncio
-from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
 from fastapi import FastAPI
 from pydantic import BaseModel, ConfigDict
 from openai import OpenAI
 
+from shared.trade_store import TradeStore
+from backtester import WARMUP_BARS, WARMUP_MS, ReplayMarket, config_from_params, load_candle_cache, simulate
+from kline_history import DAY_MS, KlineHistory
+from param_sweep import METHODS as SWEEP_METHODS, SweepCache, run_sweep
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("LearningAgent")
 
@@ -21,12 +27,31 @@ MAX_STRATEGY_ARCHIVE = int(os.getenv("MAX_STRATEGY_ARCHIVE", "20"))
 
 DATA_DIR = "/data"
 EVOLVED_PARAMS_FILE = f"{DATA_DIR}/evolved_params.json"
-TRADING_HISTORY_FILE = f"{DATA_DIR}/trading_history.json"
+TRADING_HISTORY_FILE = f"{DATA_DIR}/trading_history.json"  # legacy, migrated once into the DB
+TRADING_HISTORY_DB = os.getenv("TRADING_HISTORY_DB", f"{DATA_DIR}/trading_history.db")
 EVOLUTION_LOG_FILE = f"{DATA_DIR}/evolution_log.json"
 STRATEGY_ARCHIVE_DIR = f"{DATA_DIR}/strategy_archive"
 API_COSTS_FILE = f"{DATA_DIR}/api_costs.json"
 
 EVENTS_LOG_FILE = os.getenv("EVENTS_LOG_FILE", f"{DATA_DIR}/events_log.json")
+
+# Replay backtest on 15m klines backfilled from Bybit into KLINE_HISTORY_DIR (append-only);
+# the technical analyzer's candle cache only serves symbols it already covers in full
+CANDLE_CACHE_DIR = os.getenv("CANDLE_CACHE_DIR", f"{DATA_DIR}/candle_cache")
+KLINE_HISTORY_DIR = os.getenv("KLINE_HISTORY_DIR", f"{DATA_DIR}/kline_history")
+BACKTEST_SYMBOLS = [s.strip() for s in os.getenv("BACKTEST_SYMBOLS", "").split(",") if s.strip()]  # empty = cached symbols
+BACKTEST_EVAL_DAYS = float(os.getenv("BACKTEST_EVAL_DAYS", "60"))  # replayed span after the warm-up
+BACKTEST_MIN_BARS = WARMUP_BARS + int(BACKTEST_EVAL_DAYS * DAY_MS) // (15 * 60_000)
+KLINE_BACKFILL_INTERVAL_MIN = int(os.getenv("KLINE_BACKFILL_INTERVAL_MIN", "60"))  # 0 = disabled
+
+# Evolution: "llm" = one DeepSeek proposal, "sweep" = parallel parameter sweep on the replay
+EVOLUTION_MODE = os.getenv("EVOLUTION_MODE", "llm").lower()
+SWEEP_METHOD = os.getenv("SWEEP_METHOD", "bayes").lower()
+SWEEP_CANDIDATES = int(os.getenv("SWEEP_CANDIDATES", "200"))
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", "0")) or None  # 0 = all CPUs
+SWEEP_DRAWDOWN_WEIGHT = float(os.getenv("SWEEP_DRAWDOWN_WEIGHT", "0.5"))
+SWEEP_MIN_TRADES = int(os.getenv("SWEEP_MIN_TRADES", "20"))
+SWEEP_CACHE_FILE = os.getenv("SWEEP_CACHE_FILE", f"{DATA_DIR}/sweep_cache.json")
 # Default parameters
 DEFAULT_PARAMS = {
     "rsi_overbought": 70,
@@ -146,21 +171,26 @@ def load_current_params() -> Dict[str, Any]:
     return data.get("params", DEFAULT_PARAMS.copy())
 
 
+_trade_store: Optional[TradeStore] = None
+
+
+def get_trade_store() -> TradeStore:
+    """Trade history store (created on first use, legacy JSON migrated once)"""
+    global _trade_store
+    if _trade_store is None:
+        _trade_store = TradeStore(TRADING_HISTORY_DB)
+        try:
+            imported = _trade_store.migrate_json(TRADING_HISTORY_FILE)
+            if imported:
+                logger.info(f"📦 Migrated {imported} trades from {TRADING_HISTORY_FILE} to {TRADING_HISTORY_DB}")
+        except Exception as e:
+            logger.error(f"Error migrating {TRADING_HISTORY_FILE}: {e}")
+    return _trade_store
+
+
 def get_recent_trades(hours: int = 48) -> List[Dict[str, Any]]:
     """Get trades from the last N hours"""
-    all_trades = load_json_file(TRADING_HISTORY_FILE, [])
-    cutoff_time = datetime.now() - timedelta(hours=hours)
-    
-    recent_trades = []
-    for trade in all_trades:
-        try:
-            trade_time = datetime.fromisoformat(trade.get('timestamp', ''))
-            if trade_time >= cutoff_time:
-                recent_trades.append(trade)
-        except (ValueError, TypeError):
-            continue
-    
-    return recent_trades
+    return get_trade_store().recent(hours)
 
 
 def calculate_performance(trades: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -283,12 +313,94 @@ def parse_suggestions(suggestions_json: str) -> Dict[str, Any]:
         return DEFAULT_PARAMS.copy()
 
 
+_kline_history: Optional[KlineHistory] = None
+
+
+def get_kline_history() -> KlineHistory:
+    global _kline_history
+    if _kline_history is None or _kline_history.directory != KLINE_HISTORY_DIR:
+        _kline_history = KlineHistory(KLINE_HISTORY_DIR, interval="15")
+    return _kline_history
+
+
+def backtest_symbols() -> List[str]:
+    """BACKTEST_SYMBOLS, else every symbol in the candle cache or the kline history."""
+    if BACKTEST_SYMBOLS:
+        return list(BACKTEST_SYMBOLS)
+    cached = load_candle_cache(CANDLE_CACHE_DIR, interval="15")
+    return sorted(set(cached) | set(get_kline_history().symbols()))
+
+
+def backfill_klines() -> int:
+    """Extend the kline history to warm-up + evaluation span (blocking; run it in a thread)."""
+    history = get_kline_history()
+    days = WARMUP_MS / DAY_MS + BACKTEST_EVAL_DAYS + 1
+    appended = 0
+    for symbol in backtest_symbols():
+        appended += history.backfill(symbol, days)
+    return appended
+
+
+def load_backtest_ohlcv() -> Dict[str, Dict[str, Any]]:
+    """
+    15m OHLCV of the last BACKTEST_MIN_BARS bars (warm-up + evaluation span).
+
+    Kline history first, the candle cache for symbols the history lacks;
+    symbols that do not cover the span in full are left out.
+    """
+    ohlcv = get_kline_history().load(min_bars=BACKTEST_MIN_BARS)
+    for symbol, data in load_candle_cache(CANDLE_CACHE_DIR, interval="15", min_bars=BACKTEST_MIN_BARS).items():
+        ohlcv.setdefault(symbol, data)
+    if not ohlcv:
+        return {}
+    since_ms = max(int(d["ts"][-1]) for d in ohlcv.values()) - (BACKTEST_MIN_BARS - 1) * 15 * 60_000
+    out = {}
+    for symbol, data in ohlcv.items():
+        keep = data["ts"] >= since_ms
+        if keep.sum() >= BACKTEST_MIN_BARS:
+            out[symbol] = {k: v[keep] for k, v in data.items()}
+    return out
+
+
+def replay_backtest(new_params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Replay stored 15m OHLCV through the orchestrator pipeline for the current and new params.
+
+    Returns:
+        Performance of new_params with the current params' replay under "baseline",
+        or None when no symbol has BACKTEST_MIN_BARS (warm-up + evaluation span) of history
+    """
+    ohlcv = load_backtest_ohlcv()
+    if not ohlcv:
+        return None
+
+    market = ReplayMarket(ohlcv, warmup_ms=WARMUP_MS)
+    baseline_trades = simulate(market, config_from_params(load_current_params()))
+    new_trades = simulate(market, config_from_params(new_params))
+
+    performance = calculate_performance(new_trades)
+    performance["method"] = "replay"
+    performance["baseline"] = calculate_performance(baseline_trades)
+    performance["symbols"] = len(market.symbols)
+    performance["bars"] = market.bars
+    return performance
+
+
 def backtest_strategy(trades: List[Dict[str, Any]], new_params: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Simple backtest: simulate how trades would have performed with new parameters.
-    This is a simplified version - in practice, you'd re-evaluate entry/exit decisions.
+    Backtest new parameters.
+
+    Uses the replay backtester when candles are cached (compare against
+    result["baseline"]); otherwise rescales the recorded trades' PnL by the
+    leverage / size ratios.
     """
-    # For simplicity, we'll adjust the PnL based on leverage and size changes
+    try:
+        replay = replay_backtest(new_params)
+        if replay is not None:
+            return replay
+    except Exception as e:
+        logger.error(f"Replay backtest failed, falling back to PnL rescaling: {e}", exc_info=True)
+
     current_params = load_current_params()
     
     adjusted_trades = []
@@ -308,9 +420,49 @@ def backtest_strategy(trades: List[Dict[str, Any]], new_params: Dict[str, Any])
         total_pnl += adjusted_pnl
     
     performance = calculate_performance(adjusted_trades)
+    performance["method"] = "rescale"
     return performance
 
 
+_sweep_cache: Optional[SweepCache] = None
+
+
+def sweep_strategy(current_params: Dict[str, Any], method: Optional[str] = None,
+                   n_candidates: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Parallel parameter sweep on the cached candles (blocking; run it in a thread).
+
+    Returns:
+        run_sweep() result without the per-candidate list (top 10 under "top";
+        best_score None if no candidate traded enough), or None without BACKTEST_MIN_BARS of history
+    """
+    global _sweep_cache
+    ohlcv = load_backtest_ohlcv()
+    if not ohlcv:
+        return None
+    if _sweep_cache is None:
+        _sweep_cache = SweepCache(SWEEP_CACHE_FILE)
+
+    result = run_sweep(
+        ReplayMarket(ohlcv, warmup_ms=WARMUP_MS),
+        base_params=current_params,
+        method=method or SWEEP_METHOD,
+        n_candidates=n_candidates or SWEEP_CANDIDATES,
+        workers=SWEEP_WORKERS,
+        cache=_sweep_cache,
+        drawdown_weight=SWEEP_DRAWDOWN_WEIGHT,
+        min_trades=SWEEP_MIN_TRADES,
+    )
+    # -inf = below SWEEP_MIN_TRADES; None keeps the result JSON-serializable
+    def finite(score):
+        return score if math.isfinite(score) else None
+
+    result["best_score"] = finite(result["best_score"])
+    result["top"] = [{"params": p, "summary": s, "score": finite(score)}
+                     for p, s, score in result.pop("results")[:10]]
+    return result
+
+
 def save_evolved_params(new_params: Dict[str, Any], current_perf: Dict[str, Any], 
                         backtest_perf: Dict[str, Any], mutation_log: str = ""):
     """Save evolved parameters to file"""
@@ -380,33 +532,12 @@ def log_evolution(status: str, details: Dict[str, Any]):
         logger.error(f"Error logging evolution: {e}")
 
 
-async def profit_evolution_cycle():
-    """Main ProFiT evolution cycle - runs every 48 hours"""
-    logger.info("🧬 PROFIT EVOLUTION START")
+async def suggest_params_llm(trades: List[Dict[str, Any]], current_performance: Dict[str, Any],
+                             current_params: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Ask DeepSeek for one parameter set; returns (params, reasoning)"""
+    logger.info("🤖 Asking DeepSeek for improvements...")
     
-    try:
-        # 1. Collect recent trades
-        trades = get_recent_trades(hours=EVOLUTION_INTERVAL_HOURS)
-        logger.info(f"📊 Analyzing last {EVOLUTION_INTERVAL_HOURS} hours: {len(trades)} trades")
-        
-        if len(trades) < MIN_TRADES_FOR_EVOLUTION:
-            logger.info(f"⏸️ Not enough trades for evolution (need {MIN_TRADES_FOR_EVOLUTION}, got {len(trades)}), skipping")
-            log_evolution("skipped", {"reason": "insufficient_trades", "count": len(trades)})
-            return
-        
-        # 2. Calculate current performance
-        current_performance = calculate_performance(trades)
-        current_params = load_current_params()
-        
-        logger.info(f"📈 Current performance:")
-        logger.info(f"   - Win rate: {current_performance['win_rate']*100:.1f}%")
-        logger.info(f"   - Total PnL: {current_performance['total_pnl']:.2f}%")
-        logger.info(f"   - Max drawdown: {current_performance['max_drawdown']:.2f}%")
-        
-        # 3. Ask DeepSeek for analysis and improvements
-        logger.info("🤖 Asking DeepSeek for improvements...")
-        
-        analysis_prompt = f"""
+    analysis_prompt = f"""
 Analyze these trading performance metrics and propose improvements to the parameters.
 
 Performance over last {EVOLUTION_INTERVAL_HOURS} hours:
@@ -446,34 +577,81 @@ Respond ONLY with valid JSON in this format:
   "reasoning": "Brief explanation of changes"
 }}
 """
+    
+    suggestions = await call_deepseek(analysis_prompt)
+    new_params = parse_suggestions(suggestions)
+    
+    # Extract reasoning
+    try:
+        suggestion_data = json.loads(suggestions)
+        reasoning = suggestion_data.get("reasoning", "No reasoning provided")
+    except (json.JSONDecodeError, TypeError):
+        reasoning = "Could not parse reasoning"
+    
+    return new_params, reasoning
+
+
+async def profit_evolution_cycle():
+    """Main ProFiT evolution cycle - runs every 48 hours"""
+    logger.info("🧬 PROFIT EVOLUTION START")
+    
+    try:
+        # 1. Collect recent trades
+        trades = get_recent_trades(hours=EVOLUTION_INTERVAL_HOURS)
+        logger.info(f"📊 Analyzing last {EVOLUTION_INTERVAL_HOURS} hours: {len(trades)} trades")
         
-        suggestions = await call_deepseek(analysis_prompt)
-        new_params = parse_suggestions(suggestions)
+        if len(trades) < MIN_TRADES_FOR_EVOLUTION:
+            logger.info(f"⏸️ Not enough trades for evolution (need {MIN_TRADES_FOR_EVOLUTION}, got {len(trades)}), skipping")
+            log_evolution("skipped", {"reason": "insufficient_trades", "count": len(trades)})
+            return
         
-        # Extract reasoning
-        try:
-            suggestion_data = json.loads(suggestions)
-            reasoning = suggestion_data.get("reasoning", "No reasoning provided")
-        except (json.JSONDecodeError, TypeError):
-            reasoning = "Could not parse reasoning"
+        # 2. Calculate current performance
+        current_performance = calculate_performance(trades)
+        current_params = load_current_params()
         
-        logger.info(f"💡 DeepSeek suggests:")
+        logger.info(f"📈 Current performance:")
+        logger.info(f"   - Win rate: {current_performance['win_rate']*100:.1f}%")
+        logger.info(f"   - Total PnL: {current_performance['total_pnl']:.2f}%")
+        logger.info(f"   - Max drawdown: {current_performance['max_drawdown']:.2f}%")
+        
+        # 3. Propose new parameters: sweep on the replay, or ask DeepSeek
+        sweep = None
+        if EVOLUTION_MODE == "sweep":
+            logger.info(f"🔬 Sweeping {SWEEP_CANDIDATES} parameter sets ({SWEEP_METHOD})...")
+            sweep = await asyncio.to_thread(sweep_strategy, current_params)
+            if sweep is None:
+                logger.info("⚠️ Not enough cached candles for a sweep, asking DeepSeek instead")
+        if sweep is not None and sweep["best_score"] is None:
+            logger.info(f"⏸️ No sweep candidate reached {SWEEP_MIN_TRADES} replay trades, keeping current params")
+            log_evolution("rejected", {"reason": "no_viable_candidate", "evaluated": sweep["evaluated"]})
+            return
+        if sweep is not None:
+            new_params = sweep["best_params"]
+            reasoning = (f"Best of {sweep['evaluated']} {sweep['method']} sweep candidates "
+                         f"(score {sweep['best_score']:.2f}, {sweep['cache_hits']} cached)")
+        else:
+            new_params, reasoning = await suggest_params_llm(trades, current_performance, current_params)
+        
+        logger.info(f"💡 Proposed params:")
         for key, value in new_params.items():
-            if key in current_params and current_params[key] != value:
-                logger.info(f"   - {key}: {current_params[key]} → {value}")
+            if current_params.get(key) != value:
+                logger.info(f"   - {key}: {current_params.get(key)} → {value}")
         logger.info(f"   Reasoning: {reasoning}")
         
         # 4. Backtest with new parameters
         logger.info("🧪 Backtesting new strategy...")
-        backtest_result = backtest_strategy(trades, new_params)
+        backtest_result = await asyncio.to_thread(backtest_strategy, trades, new_params)
+        # Replay compares against the current params on the same candles, rescaling against live trades
+        baseline = backtest_result.get('baseline', current_performance)
         
-        logger.info(f"📊 Backtest result:")
-        logger.info(f"   - Win rate: {backtest_result['win_rate']*100:.1f}% ({(backtest_result['win_rate']-current_performance['win_rate'])*100:+.1f}%)")
-        logger.info(f"   - Total PnL: {backtest_result['total_pnl']:.2f}% ({backtest_result['total_pnl']-current_performance['total_pnl']:+.2f}%)")
+        logger.info(f"📊 Backtest result ({backtest_result.get('method')}):")
+        logger.info(f"   - Trades: {backtest_result['total_trades']} (baseline {baseline['total_trades']})")
+        logger.info(f"   - Win rate: {backtest_result['win_rate']*100:.1f}% ({(backtest_result['win_rate']-baseline['win_rate'])*100:+.1f}%)")
+        logger.info(f"   - Total PnL: {backtest_result['total_pnl']:.2f}% ({backtest_result['total_pnl']-baseline['total_pnl']:+.2f}%)")
         logger.info(f"   - Max drawdown: {backtest_result['max_drawdown']:.2f}%")
         
         # 5. Decide if new strategy is better
-        pnl_improvement = backtest_result['total_pnl'] - current_performance['total_pnl']
+        pnl_improvement = backtest_result['total_pnl'] - baseline['total_pnl']
         
         if pnl_improvement > BACKTEST_IMPROVEMENT_THRESHOLD:
             new_version = save_evolved_params(new_params, current_performance, backtest_result, reasoning)
@@ -518,15 +696,27 @@ async def evolution_loop():
             await asyncio.sleep(3600)  # Wait 1 hour on error
 
 
+async def kline_backfill_loop():
+    """Background task that keeps the backtest kline history current"""
+    logger.info(f"📥 Starting kline backfill (every {KLINE_BACKFILL_INTERVAL_MIN} min, "
+                f"{WARMUP_MS / DAY_MS:.0f}d warm-up + {BACKTEST_EVAL_DAYS:g}d evaluation)")
+    while True:
+        try:
+            appended = await asyncio.to_thread(backfill_klines)
+            if appended:
+                logger.info(f"📥 Kline history: {appended} new bars")
+        except Exception as e:
+            logger.error(f"Kline backfill error: {e}")
+        await asyncio.sleep(KLINE_BACKFILL_INTERVAL_MIN * 60)
+
+
 # API Endpoints
 
 @app.post("/record_trade")
 async def record_trade(trade: TradeRecord):
     """Record a completed trade for analysis"""
     try:
-        trades = load_json_file(TRADING_HISTORY_FILE, [])
-        trades.append(trade.model_dump())
-        save_json_file(TRADING_HISTORY_FILE, trades)
+        get_trade_store().record(trade.model_dump())
         
         logger.info(f"📝 Recorded trade: {trade.symbol} {trade.side} PnL: {trade.pnl_pct}%")
         
@@ -595,6 +785,21 @@ async def trigger_evolution():
         return {"status": "error", "message": str(e)}
 
 
+@app.post("/run_sweep")
+async def run_sweep_endpoint(method: Optional[str] = None, candidates: Optional[int] = None):
+    """Run a parameter sweep on the replay without applying the result"""
+    if method is not None and method not in SWEEP_METHODS:
+        return {"status": "error", "message": f"method must be one of {list(SWEEP_METHODS)}"}
+    try:
+        result = await asyncio.to_thread(sweep_strategy, load_current_params(), method, candidates)
+        if result is None:
+            return {"status": "error", "message": "not enough cached candles"}
+        return {"status": "success", "sweep": result}
+    except Exception as e:
+        logger.error(f"Error running sweep: {e}")
+        return {"status": "error", "message": str(e)}
+
+
 @app.get("/current_params")
 async def get_current_params():
     """Get current evolved parameters"""
@@ -654,7 +859,8 @@ def health():
     return {
         "status": "active",
         "evolution_interval_hours": EVOLUTION_INTERVAL_HOURS,
-        "min_trades_for_evolution": MIN_TRADES_FOR_EVOLUTION
+        "min_trades_for_evolution": MIN_TRADES_FOR_EVOLUTION,
+        "evolution_mode": EVOLUTION_MODE
     }
 
 
@@ -662,12 +868,17 @@ def health():
 async def startup_event():
     """Initialize on startup"""
     ensure_directories()
+    get_trade_store()
     logger.info("🚀 Learning Agent started")
     logger.info(f"📊 Configuration:")
     logger.info(f"   - Evolution interval: {EVOLUTION_INTERVAL_HOURS} hours")
     logger.info(f"   - Min trades for evolution: {MIN_TRADES_FOR_EVOLUTION}")
     logger.info(f"   - Improvement threshold: {BACKTEST_IMPROVEMENT_THRESHOLD}%")
     logger.info(f"   - Max strategy archive: {MAX_STRATEGY_ARCHIVE}")
+    logger.info(f"   - Evolution mode: {EVOLUTION_MODE}"
+                + (f" ({SWEEP_METHOD}, {SWEEP_CANDIDATES} candidates)" if EVOLUTION_MODE == "sweep" else ""))
     
     # Start evolution loop in background
     asyncio.create_task(evolution_loop())
+    if KLINE_BACKFILL_INTERVAL_MIN > 0:
+        asyncio.create_task(kline_backfill_loop())
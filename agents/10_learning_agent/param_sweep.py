@@ -0,0 +1,423 @@
+"""
+Parallel parameter sweep over the replay backtester.
+
+Evaluates hundreds of strategy parameter sets (confluence threshold, ATR
+SL/TP multipliers, cooldown, trailing activation / distance) against one
+ReplayMarket. Features and confluence are computed once in the parent and
+written to .npy files (in /dev/shm when available); the workers memory-map
+them, so each evaluation is only the path-dependent simulation and no large
+array is pickled. Workers come from a forkserver (spawn where it does not
+exist): the sweep runs in a worker thread of the uvicorn process, and
+forking a multi-threaded process can deadlock the child on a lock some
+other thread held at fork time.
+
+Search methods:
+- "grid":   evenly strided points of the full grid (all of it if it fits)
+- "random": uniform samples without repetition
+- "bayes":  tree-structured Parzen estimator over the discrete choices,
+            proposing batches of one candidate per worker slot
+
+Results are cached by a hash of the normalized params and a fingerprint of
+the replayed candles, persisted to a JSON file, so re-running a sweep on
+unchanged data only simulates new candidates.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backtester import ReplayMarket, config_from_params, simulate
+
+logger = logging.getLogger("ParamSweep")
+
+# Learning-agent param names (config_from_params maps the ATR aliases)
+DEFAULT_SPACE: Dict[str, List[Any]] = {
+    "confluence_threshold": [55, 60, 65, 70, 75, 80],
+    "atr_multiplier_sl": [1.0, 1.25, 1.5, 2.0, 2.5, 3.0],
+    "atr_multiplier_tp": [2.0, 3.0, 4.0, 4.5, 5.0, 6.0],
+    "cooldown_seconds": [0, 450, 900, 1800, 3600],
+    "trailing_activation_raw_pct": [None, 0.001, 0.003, 0.005, 0.01],
+    "trailing_distance_raw_pct": [0.005, 0.010, 0.015, 0.025],
+}
+
+METHODS = ("grid", "random", "bayes")
+
+DEFAULT_CACHE_MAX_ENTRIES = 20000
+
+
+# ---------------------------------------------------------------------------
+# Scoring
+# ---------------------------------------------------------------------------
+
+def summarize_trades(trades: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Total PnL / win rate / drawdown, same formulas as the learning agent's calculate_performance."""
+    pnls = np.array([t["pnl_pct"] for t in trades], dtype=float)
+    if len(pnls) == 0:
+        return {"total_trades": 0, "win_rate": 0.0, "total_pnl": 0.0, "max_drawdown": 0.0}
+    equity = np.cumsum(pnls)
+    drawdown = np.maximum.accumulate(np.maximum(equity, 0.0)) - equity
+    return {
+        "total_trades": int(len(pnls)),
+        "win_rate": round(float((pnls > 0).mean()), 4),
+        "total_pnl": round(float(pnls.sum()), 2),
+        "max_drawdown": round(float(drawdown.max()), 2),
+    }
+
+
+def objective(summary: Dict[str, Any], drawdown_weight: float = 0.5, min_trades: int = 20) -> float:
+    """PnL penalized by drawdown; -inf below min_trades (too few trades to trust)."""
+    if summary["total_trades"] < min_trades:
+        return float("-inf")
+    return summary["total_pnl"] - drawdown_weight * summary["max_drawdown"]
+
+
+# ---------------------------------------------------------------------------
+# Result cache
+# ---------------------------------------------------------------------------
+
+def market_fingerprint(market: ReplayMarket) -> str:
+    """Identity of the replayed data: symbols, bar grid and a close-price checksum."""
+    close = market.features["close"]
+    parts = {
+        "symbols": market.symbols,
+        "bars": market.bars,
+        "first": int(market.ts[0]) if market.bars else 0,
+        "last": int(market.ts[-1]) if market.bars else 0,
+        "close_sum": round(float(np.nansum(close)), 6),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def _normalize(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: round(float(v), 10) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+            for k, v in sorted(params.items())}
+
+
+def params_key(params: Dict[str, Any], fingerprint: str) -> str:
+    """Cache key: sha256 of the normalized params and the data fingerprint."""
+    payload = json.dumps({"params": _normalize(params), "data": fingerprint}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SweepCache:
+    """
+    LRU map of params hash -> summary, persisted atomically to a JSON file.
+
+    Args:
+        path: Cache file (None = in memory only)
+        max_entries: Oldest entries are evicted past this size
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self._entries.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Ignoring unreadable sweep cache {path}: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, summary: Dict[str, Any]) -> None:
+        self._entries[key] = summary
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Workers (memory-mapped market; nothing large is pickled)
+# ---------------------------------------------------------------------------
+
+_MARKET: Optional[ReplayMarket] = None
+
+
+def _shm_dir() -> Optional[str]:
+    return "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+
+def share_market(market: ReplayMarket, directory: str) -> Dict[str, Any]:
+    """Write the market's arrays to `directory` as .npy files; returns the spec attach_market() reads."""
+    arrays = {"ts": market.ts, "available": market.available}
+    for group in ("features", "long", "short"):
+        for key, values in getattr(market, group).items():
+            arrays[f"{group}.{key}"] = values
+    for name, values in arrays.items():
+        np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(values))
+    return {"directory": directory, "symbols": list(market.symbols), "arrays": sorted(arrays)}
+
+
+def attach_market(spec: Dict[str, Any]) -> ReplayMarket:
+    """Read-only ReplayMarket over the memory-mapped arrays of share_market()."""
+    market = ReplayMarket.__new__(ReplayMarket)
+    market.symbols = list(spec["symbols"])
+    market.features, market.long, market.short = {}, {}, {}
+    for name in spec["arrays"]:
+        values = np.load(os.path.join(spec["directory"], f"{name}.npy"), mmap_mode="r")
+        group, _, key = name.partition(".")
+        if key:
+            getattr(market, group)[key] = values
+        else:
+            setattr(market, group, values)
+    return market
+
+
+def _init_worker(spec: Dict[str, Any]) -> None:
+    global _MARKET
+    _MARKET = attach_market(spec)
+
+
+def _evaluate(params: Dict[str, Any]) -> Dict[str, Any]:
+    return summarize_trades(simulate(_MARKET, config_from_params(params)))
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class _Evaluator:
+    """Runs batches of params in a forkserver process pool (in-process when workers <= 1)."""
+
+    def __init__(self, market: ReplayMarket, workers: int):
+        global _MARKET
+        self._pool = None
+        self._dir = None
+        if workers <= 1:
+            _MARKET = market
+            return
+        self._dir = tempfile.mkdtemp(prefix="param_sweep_", dir=_shm_dir())
+        try:
+            spec = share_market(market, self._dir)
+            self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context(),
+                                             initializer=_init_worker, initargs=(spec,))
+        except Exception:
+            self.close()
+            raise
+
+    def map(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self._pool is None:
+            return [_evaluate(p) for p in batch]
+        return list(self._pool.map(_evaluate, batch))
+
+    def close(self) -> None:
+        global _MARKET
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+        _MARKET = None
+
+
+# ---------------------------------------------------------------------------
+# Candidate generation
+# ---------------------------------------------------------------------------
+
+def _decode(space: Dict[str, List[Any]], index: int) -> Dict[str, Any]:
+    """Mixed-radix index -> one grid point (last param varies fastest)."""
+    params = {}
+    for name in reversed(list(space)):
+        index, pos = divmod(index, len(space[name]))
+        params[name] = space[name][pos]
+    return {name: params[name] for name in space}
+
+
+def grid_candidates(space: Dict[str, List[Any]], n: int) -> List[Dict[str, Any]]:
+    """Full grid if it has <= n points, else n evenly strided points."""
+    total = math.prod(len(v) for v in space.values())
+    if total <= n:
+        return [dict(zip(space, combo)) for combo in itertools.product(*space.values())]
+    indices = np.unique(np.linspace(0, total - 1, n).round().astype(np.int64))
+    return [_decode(space, int(i)) for i in indices]
+
+
+def random_candidates(space: Dict[str, List[Any]], n: int, rng: random.Random,
+                      seen: Optional[set] = None) -> List[Dict[str, Any]]:
+    """Up to n distinct uniform samples not in `seen` (set of param tuples)."""
+    seen = set() if seen is None else seen
+    total = math.prod(len(v) for v in space.values())
+    out = []
+    while len(out) < n and len(seen) < total:
+        params = {name: rng.choice(choices) for name, choices in space.items()}
+        sig = tuple(params.values())
+        if sig not in seen:
+            seen.add(sig)
+            out.append(params)
+    return out
+
+
+def tpe_candidates(space: Dict[str, List[Any]], history: Sequence[Tuple[Dict[str, Any], float]], n: int,
+                   rng: random.Random, seen: set, gamma: float = 0.25,
+                   n_samples: int = 64) -> List[Dict[str, Any]]:
+    """
+    Propose n candidates with a tree-structured Parzen estimator.
+
+    History is split into the best `gamma` fraction ("good") and the rest;
+    per parameter, l(x) / g(x) are the choice frequencies in each group
+    (add-one smoothed). Each proposal draws n_samples points from l and keeps
+    the one maximizing prod l(x) / g(x).
+    """
+    ranked = sorted(history, key=lambda h: h[1], reverse=True)
+    n_good = max(1, int(math.ceil(gamma * len(ranked))))
+    good, bad = ranked[:n_good], ranked[n_good:]
+
+    def weights(group, name, choices):
+        counts = np.ones(len(choices))
+        for params, _ in group:
+            counts[choices.index(params[name])] += 1
+        return counts / counts.sum()
+
+    l_w = {name: weights(good, name, choices) for name, choices in space.items()}
+    g_w = {name: weights(bad, name, choices) for name, choices in space.items()}
+    ratio = {name: np.log(l_w[name]) - np.log(g_w[name]) for name in space}
+
+    out = []
+    total = math.prod(len(v) for v in space.values())
+    while len(out) < n and len(seen) < total:
+        best, best_score = None, float("-inf")
+        for _ in range(n_samples):
+            idx = {name: rng.choices(range(len(choices)), weights=l_w[name])[0]
+                   for name, choices in space.items()}
+            sig = tuple(space[name][i] for name, i in idx.items())
+            if sig in seen:
+                continue
+            score = sum(ratio[name][i] for name, i in idx.items())
+            if score > best_score:
+                best, best_score = sig, score
+        if best is None:
+            out.extend(random_candidates(space, n - len(out), rng, seen))
+            break
+        seen.add(best)
+        out.append(dict(zip(space, best)))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Sweep
+# ---------------------------------------------------------------------------
+
+def run_sweep(market: ReplayMarket,
+              base_params: Optional[Dict[str, Any]] = None,
+              space: Optional[Dict[str, List[Any]]] = None,
+              method: str = "bayes",
+              n_candidates: int = 200,
+              workers: Optional[int] = None,
+              cache: Optional[SweepCache] = None,
+              seed: int = 0,
+              drawdown_weight: float = 0.5,
+              min_trades: int = 20) -> Dict[str, Any]:
+    """
+    Evaluate up to n_candidates parameter sets and return the best.
+
+    Args:
+        market: Prepared replay (features / confluence computed once)
+        base_params: Params the candidates override (current evolved params)
+        space: {param: [choices]} (DEFAULT_SPACE if None)
+        method: "grid", "random" or "bayes"
+        n_candidates: Evaluation budget, cached results included
+        workers: Process count (os.cpu_count() if None, 1 = in-process)
+        cache: Result cache shared across sweeps
+        seed: RNG seed for random / bayes
+        drawdown_weight, min_trades: See objective()
+
+    Returns:
+        {"best_params", "best_summary", "best_score", "evaluated", "cache_hits",
+         "method", "results": [(params, summary, score)] best first}
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown sweep method {method!r} (expected one of {METHODS})")
+    space = {k: list(v) for k, v in (space or DEFAULT_SPACE).items()}
+    base_params = dict(base_params or {})
+    workers = max(1, workers or os.cpu_count() or 1)
+    cache = cache if cache is not None else SweepCache()
+    fingerprint = market_fingerprint(market)
+    rng = random.Random(seed)
+
+    history: List[Tuple[Dict[str, Any], Dict[str, Any], float]] = []
+    cache_hits = 0
+    evaluator = _Evaluator(market, workers)
+
+    def evaluate(batch: List[Dict[str, Any]]) -> None:
+        nonlocal cache_hits
+        full = [{**base_params, **p} for p in batch]
+        keys = [params_key(p, fingerprint) for p in full]
+        summaries: List[Optional[Dict[str, Any]]] = [cache.get(k) for k in keys]
+        cache_hits += sum(s is not None for s in summaries)
+        todo = [i for i, s in enumerate(summaries) if s is None]
+        for i, summary in zip(todo, evaluator.map([full[i] for i in todo])):
+            summaries[i] = summary
+            cache.put(keys[i], summary)
+        for params, summary in zip(batch, summaries):
+            history.append((params, summary, objective(summary, drawdown_weight, min_trades)))
+
+    try:
+        if method == "grid":
+            candidates = grid_candidates(space, n_candidates)
+            for start in range(0, len(candidates), workers * 4):
+                evaluate(candidates[start:start + workers * 4])
+        elif method == "random":
+            evaluate(random_candidates(space, n_candidates, rng))
+        else:
+            seen: set = set()
+            n_startup = min(n_candidates, max(2 * workers, n_candidates // 5))
+            evaluate(random_candidates(space, n_startup, rng, seen))
+            while len(history) < n_candidates:
+                scored = [(p, s) for p, _, s in history if s != float("-inf")] or \
+                         [(p, -i) for i, (p, _, _) in enumerate(history)]
+                batch = tpe_candidates(space, scored, min(workers, n_candidates - len(history)), rng, seen)
+                if not batch:
+                    break  # space exhausted
+                evaluate(batch)
+    finally:
+        evaluator.close()
+        try:
+            cache.save()
+        except OSError as e:
+            logger.error(f"Error saving sweep cache: {e}")
+
+    history.sort(key=lambda h: h[2], reverse=True)
+    best = history[0] if history else ({}, summarize_trades([]), float("-inf"))
+    return {
+        "method": method,
+        "evaluated": len(history),
+        "cache_hits": cache_hits,
+        "best_params": {**base_params, **best[0]},
+        "best_summary": best[1],
+        "best_score": best[2],
+        "results": history,
+    }
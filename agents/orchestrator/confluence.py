@@ -10,9 +10,15 @@ Dimensions:
   3. Mean Reversion   (0-20) - Bollinger Band position + EMA20 distance
   4. Volume Confirm   (0-15) - Volume Z-score confirmation
   5. Key Level Prox   (0-15) - Price near Fibonacci / EMA support-resistance
+
+calculate_confluence_both scores one symbol from its nested payloads;
+calculate_confluence_both_batch scores many symbols at once from a
+columnar view (build_confluence_columns) with identical results.
 """
 
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
 
 
 # ---------------------------------------------------------------------------
@@ -506,3 +512,223 @@ def calculate_limit_price(
         return round(price * (1 - sniper_buffer_pct), 8)
     else:
         return round(price * (1 + sniper_buffer_pct), 8)
+
+
+# ---------------------------------------------------------------------------
+# Batch scoring (columnar, one vectorized pass over all symbols)
+# ---------------------------------------------------------------------------
+
+# Columns read by the batch scorer; each is a float array with one entry per symbol.
+# Trends / MACD are encoded +1 / -1 / 0 (BULLISH|POSITIVE|RISING / BEARISH|NEGATIVE|FALLING / other).
+CONFLUENCE_COLUMNS = (
+    "trend_15m", "trend_1h", "trend_4h", "trend_1d", "adx_1h", "adx_4h",
+    "price", "ema_20", "ema_50", "atr", "macd", "macd_momentum", "rsi_1h",
+    "volume_spike_5m", "volume_spike_15m", "volume_spike_5m_tf", "volume_zscore_15m", "volume_zscore_1h",
+)
+_LONG_FIBS = ("0.382", "0.5", "0.618")
+_SHORT_FIBS = ("0.618", "0.786", "1.0")
+
+
+def _code(value, positive: str, negative: str) -> float:
+    v = (value or "").upper() if isinstance(value, str) else ""
+    return 1.0 if v == positive else -1.0 if v == negative else 0.0
+
+
+def build_confluence_columns(techs: Sequence[dict], fibs: Sequence[Optional[dict]]) -> Dict[str, np.ndarray]:
+    """
+    Columnar view of per-symbol payloads for calculate_confluence_both_batch.
+
+    Args:
+        techs: /analyze_multi_tf_full responses, one per symbol
+        fibs: /analyze_fib responses in the same order (None / {} if missing)
+
+    Returns:
+        {column: array(n)} for CONFLUENCE_COLUMNS, plus "fib_levels" (n x L
+        prices, 0 where a symbol lacks the level) and "fib_names" (L names)
+    """
+    n = len(techs)
+    cols = {k: np.zeros(n) for k in CONFLUENCE_COLUMNS}
+    fib_names: List[str] = []
+    fib_index: Dict[str, int] = {}
+    fib_rows: List[Dict[int, float]] = []
+
+    for i, (tech, fib) in enumerate(zip(techs, fibs)):
+        tfs = _safe(tech or {}, "timeframes", default={}) or {}
+        tf = {name: tfs.get(name) if isinstance(tfs.get(name), dict) else {}
+              for name in ("5m", "15m", "1h", "4h", "1d")}
+        for name in ("15m", "1h", "4h", "1d"):
+            cols[f"trend_{name}"][i] = _code(tf[name].get("trend"), "BULLISH", "BEARISH")
+        cols["adx_1h"][i] = _to_float(tf["1h"].get("adx"))
+        cols["adx_4h"][i] = _to_float(tf["4h"].get("adx"))
+        for key in ("price", "ema_20", "ema_50", "atr"):
+            cols[key][i] = _to_float(tf["15m"].get(key))
+        cols["macd"][i] = _code(tf["15m"].get("macd"), "POSITIVE", "NEGATIVE")
+        cols["macd_momentum"][i] = _code(tf["15m"].get("macd_momentum"), "RISING", "FALLING")
+        cols["rsi_1h"][i] = _to_float(tf["1h"].get("rsi"), 50)
+        cols["volume_spike_5m"][i] = _to_float(_safe(tech or {}, "summary", "volume_spike_5m"), 0)
+        cols["volume_spike_15m"][i] = _to_float(tf["15m"].get("volume_spike_15m"), 0)
+        cols["volume_spike_5m_tf"][i] = _to_float(tf["5m"].get("volume_spike_5m"), 0)
+        cols["volume_zscore_15m"][i] = _to_float(tf["15m"].get("volume_zscore"), 0)
+        cols["volume_zscore_1h"][i] = _to_float(tf["1h"].get("volume_zscore"), 0)
+
+        row = {}
+        for name, level in ((fib or {}).get("fib_levels") or {}).items():
+            if name not in fib_index:
+                fib_index[name] = len(fib_names)
+                fib_names.append(name)
+            row[fib_index[name]] = _to_float(level)
+        fib_rows.append(row)
+
+    levels = np.zeros((n, len(fib_names)))
+    for i, row in enumerate(fib_rows):
+        for j, value in row.items():
+            levels[i, j] = value
+    cols["fib_levels"] = levels
+    cols["fib_names"] = fib_names
+    return cols
+
+
+def _round(x, digits: int) -> np.ndarray:
+    """Elementwise round() with Python's semantics (np.round differs on some .5 cases)."""
+    x = np.asarray(x, dtype=float)
+    out = np.round(x, digits)
+    scale = 10.0 ** digits
+    frac = np.abs(x * scale - np.trunc(x * scale))
+    tie = np.isfinite(x) & (np.abs(frac - 0.5) < 1e-6)
+    for idx in zip(*np.nonzero(tie)):
+        out[idx] = round(float(x[idx]), digits)
+    return out
+
+
+def _batch_trend(c: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    sign = 1.0 if direction == "long" else -1.0
+    raw = np.zeros_like(c["price"])
+    for tf_name, w in (("15m", 5), ("1h", 8), ("4h", 10), ("1d", 7)):
+        tv = c[f"trend_{tf_name}"] * sign
+        raw += np.where(tv > 0, w, np.where(tv < 0, -w * 0.5, 0.0))
+    raw = np.maximum(raw, 0.0)
+
+    price, ema50, atr = c["price"], c["ema_50"], c["atr"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        approx = np.where((price > 0) & (ema50 > 0) & (atr > 0),
+                          np.minimum(50, np.abs(price - ema50) / atr * 10), 15.0)
+        # Fallback only when the previous ADX is <= 0 (a NaN ADX is kept, as in the scalar code)
+        adx = np.where(c["adx_4h"] <= 0, approx, c["adx_4h"])
+        adx = np.where(c["adx_1h"] <= 0, adx, c["adx_1h"])
+        factor = np.where(np.isnan(adx), 0.4, np.maximum(0.4, np.minimum(adx / 18.0, 1.0)))
+    score = raw * factor
+
+    tv_1h, tv_4h = c["trend_1h"], c["trend_4h"]
+    conflict = (tv_1h != 0) & (tv_4h != 0) & (tv_1h != tv_4h)
+    score = np.where(conflict, np.minimum(score, 15.0), score)
+    return _round(np.minimum(30.0, np.maximum(0.0, score)), 2)
+
+
+def _batch_momentum(c: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    macd, mom = c["macd"], c["macd_momentum"]
+    good = 1.0 if direction == "long" else -1.0
+    macd_score = np.select([(macd == good) & (mom == good), macd == good, mom == good], [10.0, 6.0, 4.0], 0.0)
+
+    rsi = c["rsi_1h"]
+    with np.errstate(invalid="ignore"):
+        if direction == "long":
+            rsi_score = np.select(
+                [(35 <= rsi) & (rsi <= 55), (25 <= rsi) & (rsi < 35), (55 < rsi) & (rsi <= 65), rsi > 70],
+                [10.0, 7.0, 5.0, 0.0], 3.0)
+        else:
+            rsi_score = np.select(
+                [(45 <= rsi) & (rsi <= 65), (65 < rsi) & (rsi <= 75), (35 <= rsi) & (rsi < 45), rsi < 30],
+                [10.0, 7.0, 5.0, 0.0], 3.0)
+    return _round(np.minimum(20.0, macd_score + rsi_score), 2)
+
+
+def _batch_mean_reversion(c: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    price, ema20, atr = c["price"], c["ema_20"], c["atr"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        valid = ~((price <= 0) | (ema20 <= 0) | (atr <= 0))  # negated like the scalar early return
+        d = (price - ema20) / np.where(valid, atr, 1.0)
+        if direction == "long":
+            score = np.select(
+                [(-2.0 <= d) & (d <= -0.3), (-0.3 < d) & (d <= 0.3), (0.3 < d) & (d <= 1.0), d > 1.0, d < -2.0],
+                [15.0 + np.minimum(5.0, np.abs(d) * 5), 13.0, 7.0, 3.0, 8.0], 0.0)
+        else:
+            score = np.select(
+                [(0.3 <= d) & (d <= 2.0), (-0.3 <= d) & (d < 0.3), (-1.0 <= d) & (d < -0.3), d < -1.0, d > 2.0],
+                [15.0 + np.minimum(5.0, d * 5), 13.0, 7.0, 3.0, 8.0], 0.0)
+    return np.where(valid, _round(np.minimum(20.0, np.maximum(0.0, score)), 2), 0.0)
+
+
+def _batch_volume(c: Dict[str, np.ndarray]) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        spike = c["volume_spike_5m"]
+        spike = np.where(spike <= 0, c["volume_spike_15m"], spike)
+        spike = np.where(spike <= 0, c["volume_spike_5m_tf"], spike)
+        zscore = c["volume_zscore_15m"]
+        zscore = np.where(zscore <= 0, c["volume_zscore_1h"], zscore)
+        spike_score = np.select([spike >= 2.0, spike >= 1.5, spike >= 1.0, spike >= 0.5, spike >= 0.3],
+                                [15.0, 12.0, 10.0, 7.0, 4.0], 0.0)
+        z_score = np.select([zscore >= 2.0, zscore >= 1.0, zscore >= 0.5, zscore >= 0.0],
+                            [12.0, 8.0, 5.0, 3.0], 0.0)
+    return np.minimum(15.0, np.maximum(spike_score, z_score))
+
+
+def _batch_key_levels(c: Dict[str, np.ndarray], direction: str) -> np.ndarray:
+    price, atr = c["price"], c["atr"]
+    prox = atr * 2
+    score = np.zeros_like(price)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Negated skip conditions, so NaN inputs behave exactly like the scalar code
+        valid = ~((price <= 0) | (atr <= 0))
+        for key in ("ema_20", "ema_50"):
+            ema = c[key]
+            dist = price - ema if direction == "long" else ema - price
+            has = ema > 0
+            score += np.where(has & (0 <= dist) & (dist <= prox), 4.0,
+                              np.where(has & (-prox <= dist) & (dist < 0), 3.0, 0.0))
+
+        names = _LONG_FIBS if direction == "long" else _SHORT_FIBS
+        levels = c["fib_levels"]
+        for j, name in enumerate(c["fib_names"]):
+            if not any(k in name for k in names):
+                continue
+            lp = levels[:, j]
+            near = (price > 0) & ~(lp <= 0) & ~(np.abs(price - lp) / price > 0.005)
+            good = price >= lp if direction == "long" else price <= lp
+            score += np.where(near, np.where(good, 5.0, 3.0), 0.0)
+    return np.where(valid, _round(np.minimum(15.0, score), 2), 0.0)
+
+
+def calculate_confluence_batch(columns: Dict[str, np.ndarray], direction: str) -> Dict[str, np.ndarray]:
+    """
+    calculate_confluence for every symbol of a columnar view at once.
+
+    Args:
+        columns: Output of build_confluence_columns (or arrays with the same keys)
+        direction: 'long' or 'short'
+
+    Returns:
+        {"total", "trend_alignment", "momentum", "mean_reversion", "volume", "key_levels"} arrays
+    """
+    out = {
+        "trend_alignment": _batch_trend(columns, direction),
+        "momentum": _batch_momentum(columns, direction),
+        "mean_reversion": _batch_mean_reversion(columns, direction),
+        "volume": _batch_volume(columns),
+        "key_levels": _batch_key_levels(columns, direction),
+    }
+    total = out["trend_alignment"] + out["momentum"] + out["mean_reversion"] + out["volume"] + out["key_levels"]
+    out["total"] = _round(np.minimum(100.0, total), 2)
+    return out
+
+
+def calculate_confluence_both_batch(columns: Dict[str, np.ndarray]) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Calculate confluence for both directions over all symbols, return (long, short) arrays.
+    """
+    return calculate_confluence_batch(columns, "long"), calculate_confluence_batch(columns, "short")
+
+
+def confluence_row(batch: Dict[str, np.ndarray], index: int, direction: str) -> dict:
+    """One symbol's batch result as the dict calculate_confluence returns."""
+    keys = ("total", "trend_alignment", "momentum", "mean_reversion", "volume", "key_levels")
+    return {**{k: float(batch[k][index]) for k in keys}, "direction": direction}
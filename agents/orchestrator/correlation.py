@@ -1,58 +1,292 @@
 """
 Correlation Risk Manager Module
 
-Manages symbol correlation risk to avoid overexposure to correlated assets.
-This is an MVP implementation with:
-- Placeholder correlation matrix (returns 0.0 for forward compatibility)
-- Basic framework for future correlation computation
-- Interface for correlation-based position limits
-
-Future enhancements can add:
-- Historical correlation computation from price data
-- Dynamic correlation tracking
-- Correlation-based portfolio risk limits
+Manages symbol correlation risk to avoid overexposure to correlated assets:
+- RollingCorrelation: N x N Pearson matrix over the last `window` bar returns,
+  updated per new bar in O(N^2) from running pairwise sums (no window rescans)
+- CandleCacheFeed: feeds closed bars from the technical analyzer's persisted
+  candle series (CANDLE_CACHE_DIR, shared /data volume) into the engine
+- Portfolio correlation risk for a candidate position against open positions
+
+Pairs the engine has no data for fall back to values set with
+update_correlation_matrix(), then to 0.0.
 """
 
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timedelta
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+CANDLE_CACHE_DIR = os.getenv("CANDLE_CACHE_DIR", "/data/candle_cache")
+CORRELATION_INTERVAL = os.getenv("CORRELATION_INTERVAL", "15")  # Bybit interval code: "15" or "60"
+CORRELATION_WINDOW_BARS = int(os.getenv("CORRELATION_WINDOW_BARS", "384"))  # 4 days of 15m
+CORRELATION_MIN_PERIODS = int(os.getenv("CORRELATION_MIN_PERIODS", "48"))
+# Same-direction correlation at or above this blocks a new position
+CORRELATION_BLOCK_THRESHOLD = float(os.getenv("CORRELATION_BLOCK_THRESHOLD", "0.85"))
 
-# Placeholder correlation matrix
-# In production, this would be computed from historical price data
+INTERVAL_MS = {"5": 5 * 60_000, "15": 15 * 60_000, "60": 60 * 60_000, "240": 4 * 60 * 60_000}
+
+# Manually set correlations (fallback for pairs without rolling data)
 _correlation_matrix: Dict[Tuple[str, str], float] = {}
 
 
+# ---------------------------------------------------------------------------
+# Rolling engine
+# ---------------------------------------------------------------------------
+
+class RollingCorrelation:
+    """
+    Rolling pairwise-complete Pearson correlation of bar returns.
+
+    Per pair (i, j) it keeps sums over the bars where both returns exist:
+    count K, sum of x_i (SX[i, j]), sum of x_i^2 (SXX[i, j]) and sum of
+    x_i * x_j (C). A new bar adds its outer products and the bar leaving the
+    window subtracts its own, so an update is O(N^2) whatever the window.
+    The sums are rebuilt from the ring buffer every `recompute_every`
+    updates to cancel floating-point drift.
+
+    Args:
+        window: Bars per window
+        min_periods: Joint observations needed before a pair reports a value
+        recompute_every: Updates between exact rebuilds (default: window)
+    """
+
+    def __init__(self, window: int = CORRELATION_WINDOW_BARS, min_periods: int = CORRELATION_MIN_PERIODS,
+                 recompute_every: Optional[int] = None):
+        self.window = max(2, int(window))
+        self.min_periods = max(2, int(min_periods))
+        self.recompute_every = recompute_every or self.window
+        self.symbols: List[str] = []
+        self._index: Dict[str, int] = {}
+        self._buf = np.full((self.window, 0), np.nan)
+        self._pos = 0
+        self._filled = 0
+        self._updates = 0
+        self._K = np.zeros((0, 0))
+        self._SX = np.zeros((0, 0))
+        self._SXX = np.zeros((0, 0))
+        self._C = np.zeros((0, 0))
+        self.last_ts: Optional[int] = None
+
+    def add_symbols(self, symbols: Iterable[str]) -> None:
+        """Grow the matrix for new symbols (no history: NaN returns in the buffer)."""
+        new = [s for s in dict.fromkeys(symbols) if s not in self._index]
+        if not new:
+            return
+        for s in new:
+            self._index[s] = len(self.symbols)
+            self.symbols.append(s)
+        n_old, n = self._K.shape[0], len(self.symbols)
+        self._buf = np.hstack([self._buf, np.full((self.window, n - n_old), np.nan)])
+        for name in ("_K", "_SX", "_SXX", "_C"):
+            grown = np.zeros((n, n))
+            grown[:n_old, :n_old] = getattr(self, name)
+            setattr(self, name, grown)
+
+    def _apply(self, r: np.ndarray, sign: float) -> None:
+        present = ~np.isnan(r)
+        m = present.astype(float)
+        x = np.where(present, r, 0.0)
+        self._K += sign * np.outer(m, m)
+        self._SX += sign * np.outer(x, m)
+        self._SXX += sign * np.outer(x * x, m)
+        self._C += sign * np.outer(x, x)
+
+    def _recompute(self) -> None:
+        rows = self._buf if self._filled == self.window else self._buf[:self._filled]
+        present = ~np.isnan(rows)
+        m = present.astype(float)
+        x = np.where(present, rows, 0.0)
+        self._K = m.T @ m
+        self._SX = x.T @ m
+        self._SXX = (x * x).T @ m
+        self._C = x.T @ x
+
+    def update(self, returns: Dict[str, float], ts: Optional[int] = None) -> None:
+        """
+        Push one bar of returns (symbols missing from the dict count as no observation).
+
+        Args:
+            returns: {symbol: return of this bar}
+            ts: Bar open time in ms (kept as last_ts)
+        """
+        self.add_symbols(returns)
+        r = np.full(len(self.symbols), np.nan)
+        for s, v in returns.items():
+            if v is not None:
+                r[self._index[s]] = v
+        if self._filled == self.window:
+            self._apply(self._buf[self._pos], -1.0)
+        self._buf[self._pos] = r
+        self._apply(r, 1.0)
+        self._pos = (self._pos + 1) % self.window
+        self._filled = min(self._filled + 1, self.window)
+        self._updates += 1
+        if self._updates % self.recompute_every == 0:
+            self._recompute()
+        if ts is not None:
+            self.last_ts = ts
+
+    def correlation(self, symbol1: str, symbol2: str) -> Optional[float]:
+        """Pearson correlation of the pair, None if unknown symbol / too few joint bars / flat series."""
+        i, j = self._index.get(symbol1), self._index.get(symbol2)
+        if i is None or j is None:
+            return None
+        if i == j:
+            return 1.0
+        n = self._K[i, j]
+        if n < self.min_periods:
+            return None
+        mx, my = self._SX[i, j] / n, self._SX[j, i] / n
+        vx = self._SXX[i, j] / n - mx * mx
+        vy = self._SXX[j, i] / n - my * my
+        if vx <= 1e-18 or vy <= 1e-18:
+            return None
+        cov = self._C[i, j] / n - mx * my
+        return float(max(-1.0, min(1.0, cov / np.sqrt(vx * vy))))
+
+    def matrix(self) -> np.ndarray:
+        """Full N x N matrix (NaN where correlation() would return None), order of self.symbols."""
+        n = np.where(self._K > 0, self._K, np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mx, my = self._SX / n, self._SX.T / n
+            vx = self._SXX / n - mx * mx
+            vy = self._SXX.T / n - my * my
+            corr = (self._C / n - mx * my) / np.sqrt(vx * vy)
+        corr = np.where((self._K >= self.min_periods) & (vx > 1e-18) & (vy > 1e-18), np.clip(corr, -1.0, 1.0), np.nan)
+        np.fill_diagonal(corr, 1.0)
+        return corr
+
+
+class CandleCacheFeed:
+    """
+    Feeds closed bars of the persisted candle series into a RollingCorrelation.
+
+    Files are re-read only when their mtime changes. Bars are applied in
+    timestamp order up to the newest bar every fresh series has closed, so
+    a symbol whose file is written a little later does not lose that bar;
+    series lagging more than two bars behind count as missing.
+
+    Args:
+        engine: Correlation engine to update
+        cache_dir: Directory with <SYMBOL>_<interval>.json files
+        interval: Bybit interval code of the series
+    """
+
+    def __init__(self, engine: RollingCorrelation, cache_dir: str = CANDLE_CACHE_DIR,
+                 interval: str = CORRELATION_INTERVAL):
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS.get(interval, 15 * 60_000)
+        self._mtimes: Dict[str, float] = {}
+        self._closes: Dict[str, Dict[int, float]] = {}
+
+    def _load(self, symbol: str, now_ms: int) -> None:
+        path = os.path.join(self.cache_dir, f"{symbol}_{self.interval}.json")
+        try:
+            mtime = os.path.getmtime(path)
+            if self._mtimes.get(symbol) == mtime:
+                return
+            with open(path, "r") as f:
+                rows = json.load(f).get("rows") or []
+        except (OSError, ValueError):
+            return
+        closes = {}
+        for row in rows[-(self.engine.window + 2):]:
+            try:
+                ts, close = int(row[0]), float(row[4])
+            except (IndexError, TypeError, ValueError):
+                continue
+            if ts + self.interval_ms <= now_ms and close > 0:  # closed bars only
+                closes[ts] = close
+        self._mtimes[symbol] = mtime
+        self._closes[symbol] = closes
+
+    def sync(self, symbols: Iterable[str], now_ms: Optional[int] = None) -> int:
+        """
+        Apply every newly closed bar of `symbols`.
+
+        Returns:
+            Number of bars pushed into the engine
+        """
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        symbols = list(dict.fromkeys(symbols))
+        for s in symbols:
+            self._load(s, now_ms)
+        latest = {s: max(self._closes[s]) for s in symbols if self._closes.get(s)}
+        if not latest:
+            return 0
+        self.engine.add_symbols(latest)
+        newest = max(latest.values())
+        fresh = [ts for ts in latest.values() if newest - ts <= 2 * self.interval_ms]
+        cutoff = min(fresh)
+
+        # Bootstrap (or after a long gap) with one full window, never older
+        start = cutoff - (self.engine.window - 1) * self.interval_ms
+        if self.engine.last_ts is not None:
+            start = max(start, self.engine.last_ts + self.interval_ms)
+        applied = 0
+        for ts in range(start, cutoff + 1, self.interval_ms):
+            returns = {}
+            for s in latest:
+                closes = self._closes[s]
+                cur, prev = closes.get(ts), closes.get(ts - self.interval_ms)
+                if cur is not None and prev is not None:
+                    returns[s] = cur / prev - 1
+            self.engine.update(returns, ts)
+            applied += 1
+        return applied
+
+
+_engine = RollingCorrelation()
+_feed = CandleCacheFeed(_engine)
+
+
+def refresh_correlations(symbols: Iterable[str], now_ms: Optional[int] = None) -> int:
+    """Update the shared engine from the candle cache; returns the number of new bars."""
+    return _feed.sync(symbols, now_ms)
+
+
+def get_correlation_engine() -> RollingCorrelation:
+    return _engine
+
+
+# ---------------------------------------------------------------------------
+# Lookups and risk
+# ---------------------------------------------------------------------------
+
+def _lookup(symbol1: str, symbol2: str) -> Tuple[Optional[float], str]:
+    """(correlation, source) with source 'rolling', 'manual' or 'none'."""
+    s1 = symbol1.upper()
+    s2 = symbol2.upper()
+    if s1 == s2:
+        return 1.0, "rolling"
+    rolling = _engine.correlation(s1, s2)
+    if rolling is not None:
+        return rolling, "rolling"
+    key = (s1, s2) if s1 <= s2 else (s2, s1)
+    if key in _correlation_matrix:
+        return _correlation_matrix[key], "manual"
+    return None, "none"
+
+
 def get_correlation(symbol1: str, symbol2: str) -> float:
     """
     Get correlation coefficient between two symbols.
-    
+
     Args:
         symbol1: First symbol
         symbol2: Second symbol
-    
+
     Returns:
-        Correlation coefficient (-1.0 to 1.0)
-        Currently returns 0.0 as placeholder for forward compatibility
+        Correlation coefficient (-1.0 to 1.0): rolling engine first, then
+        update_correlation_matrix() values, else 0.0
     """
-    # Normalize symbols
-    s1 = symbol1.upper()
-    s2 = symbol2.upper()
-    
-    # Same symbol = perfect correlation
-    if s1 == s2:
-        return 1.0
-    
-    # Check cache (order-independent)
-    key1 = (s1, s2)
-    key2 = (s2, s1)
-    
-    if key1 in _correlation_matrix:
-        return _correlation_matrix[key1]
-    if key2 in _correlation_matrix:
-        return _correlation_matrix[key2]
-    
-    # Placeholder: return 0.0 for forward compatibility
-    # Future: compute from historical price data
-    return 0.0
+    corr, _ = _lookup(symbol1, symbol2)
+    return 0.0 if corr is None else corr
 
 
 def calculate_portfolio_correlation_risk(
@@ -62,18 +296,18 @@ def calculate_portfolio_correlation_risk(
 ) -> Tuple[float, Dict[str, any]]:
     """
     Calculate portfolio correlation risk for adding a new position.
-    
+
     Args:
         existing_positions: List of current positions with symbol, side, size
         new_symbol: Symbol for new position
         new_side: Side for new position ("long" or "short")
-    
+
     Returns:
         Tuple of (risk_score, breakdown)
-        - risk_score: 0.0-1.0, higher means more correlation risk
+        - risk_score: 0.0-1.0, higher means more correlation risk;
+          1 - prod(1 - max(0, directional correlation)) over open positions,
+          so one position contributes its correlation and overlaps compound
         - breakdown: Dictionary with risk details
-    
-    Currently returns (0.0, {...}) as placeholder for forward compatibility.
     """
     breakdown = {
         "new_symbol": new_symbol,
@@ -81,34 +315,42 @@ def calculate_portfolio_correlation_risk(
         "existing_positions": len(existing_positions),
         "correlations": [],
         "risk_score": 0.0,
-        "status": "placeholder",
-        "note": "Correlation computation not yet implemented - returns 0.0 for forward compatibility"
+        "status": "computed",
     }
-    
-    # Placeholder: return 0.0 risk
-    # Future: compute actual correlation risk
+
+    survival = 1.0
+    known = 0
     for pos in existing_positions:
         pos_symbol = pos.get("symbol", "")
         pos_side = pos.get("side", "").lower()
-        
-        # Get correlation
-        corr = get_correlation(new_symbol, pos_symbol)
-        
+
+        corr, source = _lookup(new_symbol, pos_symbol)
+
         # Adjust for direction
         # Long-Long or Short-Short: positive correlation = risk
         # Long-Short or Short-Long: negative correlation = risk
         same_direction = (new_side.lower() == pos_side)
-        directional_corr = corr if same_direction else -corr
-        
+        if corr is not None:
+            known += 1
+            directional_corr = corr if same_direction else -corr
+            survival *= 1.0 - max(0.0, directional_corr)
+        else:
+            directional_corr = None
+
         breakdown["correlations"].append({
             "symbol": pos_symbol,
             "side": pos_side,
-            "correlation": corr,
-            "directional_correlation": directional_corr,
-            "same_direction": same_direction
+            "correlation": None if corr is None else round(corr, 4),
+            "directional_correlation": None if directional_corr is None else round(directional_corr, 4),
+            "same_direction": same_direction,
+            "source": source,
         })
-    
-    return 0.0, breakdown
+
+    risk_score = round(1.0 - survival, 4)
+    breakdown["risk_score"] = risk_score
+    if existing_positions and not known:
+        breakdown["status"] = "insufficient_data"
+    return risk_score, breakdown
 
 
 def update_correlation_matrix(
@@ -118,7 +360,7 @@ def update_correlation_matrix(
 ):
     """
     Update correlation matrix with a computed correlation value.
-    
+
     Args:
         symbol1: First symbol
         symbol2: Second symbol
@@ -126,11 +368,11 @@ def update_correlation_matrix(
     """
     s1 = symbol1.upper()
     s2 = symbol2.upper()
-    
+
     # Validate correlation range
     if not (-1.0 <= correlation <= 1.0):
         raise ValueError(f"Correlation must be between -1.0 and 1.0, got {correlation}")
-    
+
     # Store (use consistent ordering)
     if s1 <= s2:
         _correlation_matrix[(s1, s2)] = correlation
@@ -139,69 +381,84 @@ def update_correlation_matrix(
 
 
 def clear_correlation_cache():
-    """Clear the correlation matrix cache."""
-    global _correlation_matrix
+    """Clear the manual correlation matrix and reset the rolling engine."""
+    global _engine, _feed
     _correlation_matrix.clear()
+    _engine = RollingCorrelation(_engine.window, _engine.min_periods)
+    _feed = CandleCacheFeed(_engine, _feed.cache_dir, _feed.interval)
 
 
 def get_correlation_matrix_summary() -> Dict[str, any]:
     """
     Get summary of correlation matrix.
-    
+
     Returns:
         Dictionary with matrix statistics
     """
+    pairs = {}
+    corr = _engine.matrix()
+    for i, s1 in enumerate(_engine.symbols):
+        for j in range(i + 1, len(_engine.symbols)):
+            if not np.isnan(corr[i, j]):
+                pairs[tuple(sorted((s1, _engine.symbols[j])))] = ("rolling", float(corr[i, j]))
+    for key, value in _correlation_matrix.items():
+        pairs.setdefault(key, ("manual", value))
     return {
-        "total_pairs": len(_correlation_matrix),
+        "total_pairs": len(pairs),
+        "symbols": len(_engine.symbols),
+        "window_bars": _engine.window,
+        "last_bar": _engine.last_ts,
         "pairs": [
             {
                 "symbol1": s1,
                 "symbol2": s2,
-                "correlation": round(corr, 4)
+                "correlation": round(c, 4),
+                "source": source
             }
-            for (s1, s2), corr in _correlation_matrix.items()
+            for (s1, s2), (source, c) in pairs.items()
         ]
     }
 
 
-# Future implementation helpers
 def compute_correlation_from_returns(
     returns1: List[float],
     returns2: List[float]
 ) -> Optional[float]:
     """
     Compute Pearson correlation coefficient from return series.
-    
+
     Args:
         returns1: Return series for first symbol
         returns2: Return series for second symbol
-    
+
     Returns:
-        Correlation coefficient or None if insufficient data
-    
-    Note: This is a helper for future implementation.
+        Correlation coefficient or None if insufficient data / flat series
     """
     if len(returns1) != len(returns2) or len(returns1) < 2:
         return None
-    
-    # For now, return None to indicate not implemented
-    # Future: implement Pearson correlation calculation
-    return None
+
+    x = np.asarray(returns1, dtype=float)
+    y = np.asarray(returns2, dtype=float)
+    dx, dy = x - x.mean(), y - y.mean()
+    denom = np.sqrt((dx * dx).sum() * (dy * dy).sum())
+    if denom <= 0:
+        return None
+    return float(max(-1.0, min(1.0, (dx * dy).sum() / denom)))
 
 
 def get_correlation_risk_limits() -> Dict[str, any]:
     """
     Get correlation-based risk limits.
-    
+
     Returns:
         Dictionary with risk limit parameters
-    
+
     These limits can be used to prevent overexposure to correlated assets.
     """
     return {
         "max_high_correlation_positions": 2,  # Max positions with correlation > 0.7
         "max_portfolio_correlation_risk": 0.5,  # Max aggregate correlation risk score
         "min_diversification_score": 0.3,  # Min required diversification
-        "enabled": False,  # Correlation limits not yet enforced
-        "note": "Correlation limits are placeholder for forward compatibility"
+        "block_pair_correlation": CORRELATION_BLOCK_THRESHOLD,  # Same-direction pair blocked at/above this
+        "enabled": True,  # Orchestrator correlation guard enforces block_pair_correlation
     }
@@ -2,11 +2,15 @@
 Hyperliquid Market Data for Wyckoff Analysis
 
 Fetches order book L2, funding rates, and open interest
-from Hyperliquid for enhanced pattern recognition.
+from Hyperliquid for enhanced pattern recognition. The SDK is synchronous,
+so calls run in worker threads to keep the orchestrator's event loop free.
 """
 
+import asyncio
 import os
+import time
 import logging
+from typing import Dict, List, Optional, Set, Tuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("HLMarketData")
@@ -28,7 +32,124 @@ except ImportError:
     logger.warning("hyperliquid-python-sdk not installed, Wyckoff data unavailable")
 
 
-def get_wyckoff_data(symbol: str) -> dict:
+# metaAndAssetCtxs / allMids cover the whole universe: fetched at most once per
+# HL_CONTEXT_TTL_SEC and shared by every coin of the cycle
+HL_CONTEXT_TTL_SEC = float(os.getenv("HL_CONTEXT_TTL_SEC", "10"))
+
+
+class _UniverseContext:
+    """
+    Cached funding / OI / mid price snapshot of the whole Hyperliquid universe.
+
+    One refresh issues meta_and_asset_ctxs + all_mids in parallel worker
+    threads; concurrent callers share the in-flight refresh.
+    """
+
+    def __init__(self, ttl: float = HL_CONTEXT_TTL_SEC):
+        self.ttl = ttl
+        self.ctx_by_coin: Dict[str, dict] = {}
+        self.mids: Dict[str, str] = {}
+        self.at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        return self._lock
+
+    def fresh(self) -> bool:
+        return self.at > 0 and time.time() - self.at < self.ttl
+
+    async def refresh(self, force: bool = False) -> None:
+        async with self._get_lock():
+            if self.fresh() and not force:
+                return
+            meta, mids = await asyncio.gather(
+                asyncio.to_thread(info.meta_and_asset_ctxs),
+                asyncio.to_thread(info.all_mids),
+            )
+            ctx_by_coin = {}
+            if isinstance(meta, list) and len(meta) >= 2:
+                asset_ctxs = meta[1]
+                for i, asset_info in enumerate(meta[0].get("universe", [])[:len(asset_ctxs)]):
+                    ctx_by_coin[asset_info.get("name")] = asset_ctxs[i]
+            self.ctx_by_coin = ctx_by_coin
+            self.mids = mids or {}
+            self.at = time.time()
+
+    def lookup(self, coin: str) -> Tuple[float, float, float]:
+        """(funding_rate, open_interest, mark_price) of a coin, zeros if unknown."""
+        ctx = self.ctx_by_coin.get(coin) or {}
+        return (float(ctx.get("funding", 0)), float(ctx.get("openInterest", 0)),
+                float(self.mids.get(coin, 0)))
+
+
+_universe_ctx = _UniverseContext()
+
+
+def _order_book(l2: dict) -> dict:
+    bids = l2["levels"][0][:20]
+    asks = l2["levels"][1][:20]
+
+    bid_depth = sum(float(b["sz"]) for b in bids)
+    ask_depth = sum(float(a["sz"]) for a in asks)
+    total_depth = bid_depth + ask_depth
+    imbalance = bid_depth / total_depth if total_depth > 0 else 0.5
+
+    return {
+        "bids": [{"px": b["px"], "sz": b["sz"]} for b in bids[:10]],
+        "asks": [{"px": a["px"], "sz": a["sz"]} for a in asks[:10]],
+        "bid_depth": round(bid_depth, 4),
+        "ask_depth": round(ask_depth, 4),
+        "imbalance": round(imbalance, 4),
+    }
+
+
+async def get_wyckoff_data_batch(symbols: List[str]) -> Dict[str, dict]:
+    """
+    Fetch order book, funding, OI for several symbols at once.
+
+    The universe snapshot (funding / OI / mids) is refreshed at most once per
+    HL_CONTEXT_TTL_SEC and the per-coin L2 snapshots run concurrently.
+
+    Args:
+        symbols: Trading pairs like ['BTCUSDT', 'ETHUSDT']
+
+    Returns:
+        {symbol: dict with order_book, funding_rate, open_interest, mark_price}
+    """
+    if not HL_AVAILABLE or not symbols:
+        return {s: _empty_result() for s in symbols}
+
+    coins = {s: s.replace("USDT", "") for s in symbols}
+    ctx_task = _universe_ctx.refresh()
+    l2_tasks = [asyncio.to_thread(info.l2_snapshot, coin) for coin in coins.values()]
+    ctx_result, *l2_results = await asyncio.gather(ctx_task, *l2_tasks, return_exceptions=True)
+    if isinstance(ctx_result, Exception):
+        logger.warning(f"Hyperliquid context fetch failed: {ctx_result}")
+
+    results = {}
+    for (symbol, coin), l2 in zip(coins.items(), l2_results):
+        try:
+            if isinstance(l2, Exception):
+                raise l2
+            # A failed context refresh leaves the previous snapshot (or zeros)
+            funding, oi, mark_price = _universe_ctx.lookup(coin)
+            results[symbol] = {
+                "order_book": _order_book(l2),
+                "funding_rate": funding,
+                "open_interest": oi,
+                "mark_price": mark_price,
+            }
+        except Exception as e:
+            logger.warning(f"Hyperliquid data fetch failed for {symbol}: {e}")
+            results[symbol] = _empty_result()
+    return results
+
+
+async def get_wyckoff_data(symbol: str) -> dict:
     """
     Fetch order book, funding, OI for Wyckoff analysis.
 
@@ -38,61 +159,33 @@ def get_wyckoff_data(symbol: str) -> dict:
     Returns:
         dict with order_book, funding_rate, open_interest, mark_price
     """
-    if not HL_AVAILABLE:
-        return _empty_result()
+    return (await get_wyckoff_data_batch([symbol]))[symbol]
 
-    coin = symbol.replace("USDT", "")
 
-    try:
-        # L2 Order Book (top 20 levels)
-        l2 = info.l2_snapshot(coin)
-
-        bids = l2["levels"][0][:20]
-        asks = l2["levels"][1][:20]
-
-        bid_depth = sum(float(b["sz"]) for b in bids)
-        ask_depth = sum(float(a["sz"]) for a in asks)
-        total_depth = bid_depth + ask_depth
-        imbalance = bid_depth / total_depth if total_depth > 0 else 0.5
-
-        # Meta and asset contexts for funding + OI
-        meta = info.meta_and_asset_ctxs()
-
-        current_funding = 0.0
-        current_oi = 0.0
-
-        if isinstance(meta, list) and len(meta) >= 2:
-            universe = meta[0].get("universe", [])
-            asset_ctxs = meta[1]
-
-            for i, asset_info in enumerate(universe):
-                if asset_info.get("name") == coin:
-                    if i < len(asset_ctxs):
-                        ctx = asset_ctxs[i]
-                        current_funding = float(ctx.get("funding", 0))
-                        current_oi = float(ctx.get("openInterest", 0))
-                    break
-
-        # Current mid price
-        mids = info.all_mids()
-        mark_price = float(mids.get(coin, 0))
-
-        return {
-            "order_book": {
-                "bids": [{"px": b["px"], "sz": b["sz"]} for b in bids[:10]],
-                "asks": [{"px": a["px"], "sz": a["sz"]} for a in asks[:10]],
-                "bid_depth": round(bid_depth, 4),
-                "ask_depth": round(ask_depth, 4),
-                "imbalance": round(imbalance, 4),
-            },
-            "funding_rate": current_funding,
-            "open_interest": current_oi,
-            "mark_price": mark_price,
-        }
+TRADABLE_TTL_SEC = 3600
+_tradable_cache = {"coins": None, "at": 0.0}
+
 
+def get_tradable_coins() -> Optional[Set[str]]:
+    """
+    Perp coins listed (and not delisted) on Hyperliquid, cached for TRADABLE_TTL_SEC.
+
+    Returns:
+        Set of coin names like {'BTC', 'ETH'}, or None if the SDK / API is unavailable
+    """
+    if not HL_AVAILABLE:
+        return None
+    now = time.time()
+    if _tradable_cache["coins"] is not None and now - _tradable_cache["at"] < TRADABLE_TTL_SEC:
+        return _tradable_cache["coins"]
+    try:
+        universe = info.meta().get("universe", [])
+        coins = {a["name"] for a in universe if a.get("name") and not a.get("isDelisted")}
+        _tradable_cache.update(coins=coins, at=now)
+        return coins
     except Exception as e:
-        logger.warning(f"Hyperliquid data fetch failed for {symbol}: {e}")
-        return _empty_result()
+        logger.warning(f"Hyperliquid meta fetch failed: {e}")
+        return _tradable_cache["coins"]
 
 
 def _empty_result() -> dict:
@@ -1,7 +1,13 @@
 import asyncio, httpx, json, os, uuid
 from datetime import datetime
-from confluence import calculate_confluence_both, calculate_limit_price
-from hl_market_data import get_wyckoff_data
+from correlation import CORRELATION_BLOCK_THRESHOLD, calculate_portfolio_correlation_risk, refresh_correlations
+from confluence import (build_confluence_columns, calculate_confluence_both_batch, calculate_limit_price,
+                        confluence_row)
+from hl_market_data import get_tradable_coins, get_wyckoff_data_batch
+from prescreen import PRESCREEN_TOP_N, PreScreener
+from scanner import scan_symbols
+from shared.decision_journal import journal_from_env
+from wyckoff_prefetch import WyckoffPrefetch
 
 URLS = {
     "tech": "http://01_technical_analyzer:8000",
@@ -18,6 +24,18 @@ SYMBOLS = [
 DISABLED_SYMBOLS = os.getenv("DISABLED_SYMBOLS", "").split(",")
 DISABLED_SYMBOLS = [s.strip() for s in DISABLED_SYMBOLS if s.strip()]
 
+# Two-stage scan: rank the whole linear universe from bulk tickers, full analysis for the
+# top PRESCREEN_TOP_N only (SYMBOLS is the fallback when tickers are unavailable)
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "false").lower() == "true"
+prescreener = PreScreener(tradable_fn=get_tradable_coins)
+
+# Speculative Wyckoff prefetch (latency only): market data (and with WYCKOFF_PREFETCH_LLM
+# the LLM analysis) of the best candidate starts before the risk gates. A blocked gate
+# still means HOLD for the cycle; it cancels the prefetch locally, but an /analyze_wyckoff
+# call already sent is billed and journaled by Master AI anyway
+WYCKOFF_PREFETCH = os.getenv("WYCKOFF_PREFETCH", "false").lower() == "true"
+WYCKOFF_PREFETCH_LLM = os.getenv("WYCKOFF_PREFETCH_LLM", "false").lower() == "true"
+
 # --- CONFIGURATION ---
 MAX_POSITIONS = 10
 MAX_SAME_DIRECTION = 6
@@ -46,9 +64,12 @@ pending_critical_closes = {}
 MIN_LEVERAGE = 2
 MAX_LEVERAGE = 4
 
-AI_DECISIONS_FILE = "/data/ai_decisions.json"
+# Append-only decision journal (segments under /data/ai_decisions, shared with other agents)
+decision_journal = journal_from_env()
 
 # --- CORRELATION GUARD ---
+# Rolling return correlations (correlation.py) block same-direction pairs at/above
+# CORRELATION_BLOCK_THRESHOLD; these static pairs only apply while a pair has no data
 CORRELATED_PAIRS = {"BTCUSDT": "ETHUSDT", "ETHUSDT": "BTCUSDT"}
 
 # --- CRASH GUARD ---
@@ -108,12 +129,18 @@ def check_correlation_guard(symbol: str, direction: str, position_details: list)
         print(f"        CORRELATION GUARD: {same_dir_count} positions already {direction}, blocking {symbol}")
         return False
 
-    correlated = CORRELATED_PAIRS.get(symbol)
-    if correlated:
-        for pos in position_details:
-            if pos.get('symbol') == correlated and pos.get('side', '').lower() == direction:
-                print(f"        CORRELATION GUARD: {correlated} already {direction}, blocking correlated {symbol}")
+    _, breakdown = calculate_portfolio_correlation_risk(position_details, symbol, direction)
+    for entry in breakdown["correlations"]:
+        if not entry["same_direction"]:
+            continue
+        if entry["correlation"] is not None:
+            if entry["correlation"] >= CORRELATION_BLOCK_THRESHOLD:
+                print(f"        CORRELATION GUARD: {entry['symbol']} already {direction} "
+                      f"(corr {entry['correlation']:.2f}), blocking {symbol}")
                 return False
+        elif CORRELATED_PAIRS.get(symbol) == entry['symbol']:
+            print(f"        CORRELATION GUARD: {entry['symbol']} already {direction}, blocking correlated {symbol}")
+            return False
 
     return True
 
@@ -216,17 +243,7 @@ def append_ai_decision_event(event: dict) -> None:
     event = dict(event or {})
     event.setdefault("timestamp", datetime.utcnow().isoformat())
     try:
-        try:
-            with open(AI_DECISIONS_FILE, "r") as f:
-                data = json.load(f)
-            if not isinstance(data, list):
-                data = []
-        except (FileNotFoundError, Exception):
-            data = []
-        data.append(event)
-        data = data[-500:]
-        with open(AI_DECISIONS_FILE, "w") as f:
-            json.dump(data, f, indent=2)
+        decision_journal.append(event)
     except Exception as e:
         print(f"        Failed to write AI decision log: {e}")
 
@@ -262,11 +279,6 @@ def check_critical_close_confirmation(symbol: str, action_type: str) -> bool:
 
 def save_monitoring_decision(positions_count: int, max_positions: int, positions_details: list, reason: str):
     try:
-        decisions = []
-        if os.path.exists(AI_DECISIONS_FILE):
-            with open(AI_DECISIONS_FILE, 'r') as f:
-                decisions = json.load(f)
-
         positions_summary = []
         for p in positions_details:
             pnl_pct = (p.get('pnl', 0) / (p.get('entry_price', 1) * p.get('size', 1))) * 100 if p.get('entry_price') else 0
@@ -275,18 +287,13 @@ def save_monitoring_decision(positions_count: int, max_positions: int, positions
                 'pnl': p.get('pnl'), 'pnl_pct': round(pnl_pct, 2)
             })
 
-        decisions.append({
+        decision_journal.append({
             'timestamp': datetime.now().isoformat(),
             'symbol': 'PORTFOLIO', 'action': 'HOLD', 'leverage': 0, 'size_pct': 0,
             'rationale': reason,
             'analysis_summary': f"Monitoring: {positions_count}/{max_positions} positions",
             'positions': positions_summary
         })
-        decisions = decisions[-100:]
-
-        os.makedirs(os.path.dirname(AI_DECISIONS_FILE), exist_ok=True)
-        with open(AI_DECISIONS_FILE, 'w') as f:
-            json.dump(decisions, f, indent=2)
     except Exception as e:
         print(f"Error saving monitoring decision: {e}")
 
@@ -525,9 +532,23 @@ async def analysis_cycle():
         # CASE 2: Free slots - WYCKOFF + CONFLUENCE ANALYSIS
         print(f"        Free slot - running Wyckoff + Confluence analysis")
 
+        # Stage 1: pre-screen the universe (falls back to the static SYMBOLS list)
+        universe = SYMBOLS
+        if PRESCREEN_ENABLED:
+            pending = {s for s in list(_pending_orders) if has_pending_order(s)}
+            skip = set(active_symbols) | set(DISABLED_SYMBOLS) | pending
+            ranked = await prescreener.select(c, PRESCREEN_TOP_N, exclude=skip)
+            if ranked is None:
+                print("        Pre-screen unavailable, scanning static SYMBOLS")
+            else:
+                stats = prescreener.last_stats
+                print(f"        Pre-screen: {stats['universe']} tickers -> {stats['passed']} passed -> top {len(ranked)}: "
+                      f"{', '.join(r['symbol'] for r in ranked)}")
+                universe = [r['symbol'] for r in ranked]
+
         # Filter out symbols with open positions AND symbols with recent pending orders
         scan_list = []
-        for s in SYMBOLS:
+        for s in universe:
             if s in active_symbols:
                 continue
             if has_pending_order(s):
@@ -539,46 +560,47 @@ async def analysis_cycle():
             print("        No assets available for scan")
             return
 
+        # Advance the rolling correlation matrix with bars closed since the last cycle
+        try:
+            new_bars = await asyncio.to_thread(refresh_correlations, scan_list + list(active_symbols))
+            if new_bars:
+                print(f"        Correlation matrix: +{new_bars} bar(s)")
+        except Exception as e:
+            print(f"        Correlation refresh failed: {e}")
+
         # Check margin
         available_for_new = portfolio.get('available_for_new_trades', portfolio.get('available', 0))
         if available_for_new < 10.0:
             print(f"        BLOCKED: Insufficient margin: {available_for_new:.2f} USDT")
             return
 
-        # Fetch technical + fibonacci data for all candidates
+        # Fetch technical + fibonacci data for all candidates (bounded fan-out),
+        # then score every symbol in one vectorized pass
         tech_data_map = {}
         fib_data_map = {}
 
-        for s in scan_list:
-            try:
-                tech_resp, fib_resp = await asyncio.gather(
-                    c.post(f"{URLS['tech']}/analyze_multi_tf_full", json={"symbol": s}),
-                    c.post(f"{URLS['fib']}/analyze_fib", json={"symbol": s}),
-                    return_exceptions=True
-                )
-                if hasattr(tech_resp, 'json'):
-                    tech_data_map[s] = tech_resp.json()
-                if hasattr(fib_resp, 'json'):
-                    fib_data_map[s] = fib_resp.json()
-            except Exception as e:
-                print(f"        Data fetch failed for {s}: {e}")
+        def collect_symbol(sym: str, tech: dict, fib: dict):
+            if not tech.get("timeframes"):
+                return
+            tech_data_map[sym] = tech
+            fib_data_map[sym] = fib
+
+        scan_stats = await scan_symbols(c, scan_list, collect_symbol, URLS['tech'], URLS['fib'])
+        if scan_stats["timed_out"]:
+            print(f"        Scan deadline exceeded: {', '.join(scan_stats['timed_out'])}")
 
         if not tech_data_map:
             print("        No technical data available")
             return
 
-        # Calculate confluence scores for all candidates
-        best_candidate = None
-        best_score = 0
-
-        for sym in scan_list:
-            tech = tech_data_map.get(sym, {})
-            fib = fib_data_map.get(sym, {})
+        scored = [s for s in scan_list if s in tech_data_map]  # scan order: ties go to the symbol listed first
+        columns = build_confluence_columns([tech_data_map[s] for s in scored], [fib_data_map[s] for s in scored])
+        long_batch, short_batch = calculate_confluence_both_batch(columns)
 
-            if not tech.get("timeframes"):
-                continue
-
-            long_score, short_score = calculate_confluence_both(tech, fib)
+        qualified = []
+        for i, sym in enumerate(scored):
+            long_score = confluence_row(long_batch, i, "long")
+            short_score = confluence_row(short_batch, i, "short")
 
             print(f"        {sym}: LONG={long_score['total']:.1f} SHORT={short_score['total']:.1f}")
             print(f"           L: trend={long_score['trend_alignment']:.0f} mom={long_score['momentum']:.0f} mr={long_score['mean_reversion']:.0f} vol={long_score['volume']:.0f} lvl={long_score['key_levels']:.0f}")
@@ -590,20 +612,21 @@ async def analysis_cycle():
                 continue
 
             score = long_score if confluence_dir == "long" else short_score
+            qualified.append({
+                "symbol": sym,
+                "direction": confluence_dir,
+                "action": f"OPEN_{confluence_dir.upper()}",
+                "confluence": score,
+                "long_score": long_score,
+                "short_score": short_score,
+                "tech": tech_data_map[sym],
+                "fib": fib_data_map[sym]
+            })
 
-            if score['total'] > best_score:
-                if check_correlation_guard(sym, confluence_dir, position_details):
-                    best_candidate = {
-                        "symbol": sym,
-                        "direction": confluence_dir,
-                        "action": f"OPEN_{confluence_dir.upper()}",
-                        "confluence": score,
-                        "long_score": long_score,
-                        "short_score": short_score,
-                        "tech": tech,
-                        "fib": fib
-                    }
-                    best_score = score['total']
+        # Highest score first (stable: ties go to the symbol scanned first), correlation guard applied
+        qualified.sort(key=lambda cand: -cand["confluence"]["total"])
+        best_candidate = next((cand for cand in qualified
+                               if check_correlation_guard(cand["symbol"], cand["direction"], position_details)), None)
 
         if not best_candidate:
             print(f"        No symbol meets confluence threshold ({CONFLUENCE_THRESHOLD})")
@@ -620,10 +643,20 @@ async def analysis_cycle():
         tech = best_candidate["tech"]
         fib = best_candidate["fib"]
 
+        async def analyze_candidate(s: str, market_data: dict) -> dict:
+            return await request_wyckoff_analysis(c, s, tech, fib, market_data)
+
+        prefetch = WyckoffPrefetch([sym], get_wyckoff_data_batch, analyze_candidate,
+                                   prefetch_analysis=WYCKOFF_PREFETCH_LLM)
+        if WYCKOFF_PREFETCH:
+            prefetch.start()
+            print(f"        Prefetching Wyckoff {'data + analysis' if WYCKOFF_PREFETCH_LLM else 'data'} for {sym}")
+
         print(f"        BEST: {sym} {direction.upper()} score={confluence['total']:.1f}")
 
         # --- RISK GATE 1: Cooldown ---
         if not check_cooldown(sym, direction):
+            prefetch.cancel()
             append_ai_decision_event({
                 "type": "RISK_GATE_BLOCK", "symbol": sym, "action": "HOLD",
                 "gate": "COOLDOWN", "confluence_score": confluence['total']
@@ -632,6 +665,7 @@ async def analysis_cycle():
 
         # --- RISK GATE 2: Crash Guard ---
         if not check_crash_guard(tech, direction):
+            prefetch.cancel()
             append_ai_decision_event({
                 "type": "RISK_GATE_BLOCK", "symbol": sym, "action": "HOLD",
                 "gate": "CRASH_GUARD", "confluence_score": confluence['total']
@@ -640,8 +674,8 @@ async def analysis_cycle():
 
         # --- WYCKOFF ANALYSIS (LLM) ---
         print(f"        Requesting Wyckoff analysis for {sym}...")
-        wyckoff_data = get_wyckoff_data(sym)
-        wyckoff_result = await request_wyckoff_analysis(c, sym, tech, fib, wyckoff_data)
+        wyckoff_data = await prefetch.data(sym)
+        wyckoff_result = await prefetch.analysis(sym)
 
         llm_direction = wyckoff_result.get("trade_proposal", {}).get("direction", "NONE").lower()
         llm_phase = wyckoff_result.get("market_phase", "UNCERTAIN")
@@ -0,0 +1,208 @@
+"""
+Universe Pre-Screen (stage 1 of the scan)
+
+Ranks the whole Bybit linear USDT universe from ONE bulk tickers request
+so only the top-N candidates get the expensive stage-2 analysis
+(multi-TF technicals + Fibonacci + confluence):
+- Filters: USDT perps tradable on Hyperliquid, min 24h turnover, max spread
+- Score: cross-sectional percentile ranks of 24h turnover, |24h change| and
+  |5m return|, minus a spread penalty
+- 5m return comes from the tickers snapshots kept between cycles (the
+  bulk endpoint has no intraday change), neutral until 5 minutes of history exist
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+import numpy as np
+
+BYBIT_TICKERS_URL = os.getenv("BYBIT_TICKERS_URL", "https://api.bybit.com/v5/market/tickers")
+PRESCREEN_TOP_N = int(os.getenv("PRESCREEN_TOP_N", "12"))
+PRESCREEN_MIN_TURNOVER_USD = float(os.getenv("PRESCREEN_MIN_TURNOVER_USD", "5000000"))
+PRESCREEN_MAX_SPREAD_BPS = float(os.getenv("PRESCREEN_MAX_SPREAD_BPS", "15"))
+PRESCREEN_TIMEOUT = float(os.getenv("PRESCREEN_TIMEOUT", "5"))
+
+RETURN_WINDOW_SEC = 300
+
+# Score weights (percentile ranks in [0, 1])
+WEIGHTS = {"turnover": 0.35, "change_24h": 0.25, "return_5m": 0.40, "spread": 0.20}
+
+
+async def fetch_linear_tickers(c: httpx.AsyncClient, url: Optional[str] = None) -> List[dict]:
+    """
+    All Bybit linear tickers in one request.
+
+    Returns:
+        result.list of /v5/market/tickers (empty list on any error)
+    """
+    try:
+        resp = await c.get(url or BYBIT_TICKERS_URL, params={"category": "linear"}, timeout=PRESCREEN_TIMEOUT)
+        data = resp.json()
+        if data.get("retCode") != 0:
+            print(f"        Tickers error: {data.get('retMsg', 'unknown')}")
+            return []
+        return (data.get("result") or {}).get("list") or []
+    except Exception as e:
+        print(f"        Tickers fetch failed: {e}")
+        return []
+
+
+def _f(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class TickerHistory:
+    """
+    Last prices per symbol across cycles, for returns the tickers endpoint does not provide.
+
+    Args:
+        max_age_sec: Snapshots older than this are dropped
+    """
+
+    def __init__(self, max_age_sec: float = 2 * RETURN_WINDOW_SEC):
+        self.max_age_sec = max_age_sec
+        self._prices: Dict[str, Deque[Tuple[float, float]]] = {}
+
+    def record(self, tickers: Iterable[dict], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        for t in tickers:
+            price = _f(t.get("lastPrice"))
+            if not price > 0:
+                continue
+            hist = self._prices.setdefault(t.get("symbol", ""), deque())
+            hist.append((now, price))
+            while hist and now - hist[0][0] > self.max_age_sec:
+                hist.popleft()
+
+    def return_over(self, symbol: str, window_sec: float = RETURN_WINDOW_SEC,
+                    now: Optional[float] = None) -> Optional[float]:
+        """Return (%) from the newest snapshot at least window_sec old to the latest; None if too young."""
+        now = time.time() if now is None else now
+        hist = self._prices.get(symbol)
+        if not hist:
+            return None
+        base = None
+        for ts, price in hist:
+            if now - ts >= window_sec:
+                base = price
+            else:
+                break
+        if base is None:
+            return None
+        return (hist[-1][1] / base - 1) * 100
+
+
+def _pct_rank(x: np.ndarray) -> np.ndarray:
+    """Percentile rank in [0, 1] (ties share the average rank); NaN -> 0.5 (neutral)."""
+    out = np.full(len(x), 0.5)
+    ok = ~np.isnan(x)
+    n = int(ok.sum())
+    if n > 1:
+        vals = x[ok]
+        order = np.argsort(vals, kind="mergesort")
+        ranks = np.empty(n)
+        ranks[order] = np.arange(n)
+        # Average rank of ties
+        _, inverse, counts = np.unique(vals, return_inverse=True, return_counts=True)
+        sums = np.bincount(inverse, weights=ranks)
+        out[ok] = (sums / counts)[inverse] / (n - 1)
+    return out
+
+
+def screen_tickers(tickers: List[dict], history: Optional[TickerHistory] = None,
+                   tradable: Optional[Set[str]] = None, exclude: Iterable[str] = (),
+                   min_turnover: Optional[float] = None, max_spread_bps: Optional[float] = None,
+                   now: Optional[float] = None) -> List[dict]:
+    """
+    Filter and rank the universe.
+
+    Args:
+        tickers: Bybit linear tickers
+        history: Cross-cycle price history for the 5m return (None = no 5m signal)
+        tradable: Base coins tradable on the execution venue (None = no venue filter)
+        exclude: Symbols never returned (disabled, open positions, pending orders)
+        min_turnover: Min 24h turnover in USD (default PRESCREEN_MIN_TURNOVER_USD)
+        max_spread_bps: Max bid/ask spread in bps (default PRESCREEN_MAX_SPREAD_BPS)
+
+    Returns:
+        Rows {"symbol", "turnover_24h", "change_24h", "spread_bps", "return_5m", "score"}, best first
+    """
+    min_turnover = PRESCREEN_MIN_TURNOVER_USD if min_turnover is None else min_turnover
+    max_spread_bps = PRESCREEN_MAX_SPREAD_BPS if max_spread_bps is None else max_spread_bps
+    excluded = set(exclude)
+
+    rows = []
+    for t in tickers:
+        symbol = t.get("symbol", "")
+        if not symbol.endswith("USDT") or symbol in excluded:
+            continue
+        if tradable is not None and symbol[:-4] not in tradable:
+            continue
+        turnover = _f(t.get("turnover24h"))
+        bid, ask = _f(t.get("bid1Price")), _f(t.get("ask1Price"))
+        if not turnover >= min_turnover or not (bid > 0 and ask >= bid):
+            continue
+        spread_bps = (ask - bid) / ((ask + bid) / 2) * 10_000
+        if spread_bps > max_spread_bps:
+            continue
+        ret = history.return_over(symbol, now=now) if history is not None else None
+        rows.append({
+            "symbol": symbol,
+            "turnover_24h": turnover,
+            "change_24h": _f(t.get("price24hPcnt")) * 100,
+            "spread_bps": round(spread_bps, 3),
+            "return_5m": None if ret is None else round(ret, 4),
+        })
+    if not rows:
+        return []
+
+    def col(key):
+        return np.array([np.nan if r[key] is None else r[key] for r in rows], dtype=float)
+
+    score = (WEIGHTS["turnover"] * _pct_rank(np.log(col("turnover_24h")))
+             + WEIGHTS["change_24h"] * _pct_rank(np.abs(col("change_24h")))
+             + WEIGHTS["return_5m"] * _pct_rank(np.abs(col("return_5m")))
+             - WEIGHTS["spread"] * _pct_rank(col("spread_bps")))
+    for r, s in zip(rows, score):
+        r["score"] = round(float(s), 4)
+    # Stable sort: equal scores keep the exchange's order
+    return sorted(rows, key=lambda r: -r["score"])
+
+
+class PreScreener:
+    """
+    Stage 1 of the scan: one bulk tickers call per cycle, top-N symbols out.
+
+    Args:
+        tradable_fn: Returns the execution venue's base coins (or None if unknown)
+        tickers_url: Override of BYBIT_TICKERS_URL
+    """
+
+    def __init__(self, tradable_fn=None, tickers_url: Optional[str] = None):
+        self.tradable_fn = tradable_fn
+        self.tickers_url = tickers_url
+        self.history = TickerHistory()
+        self.last_stats: Dict[str, int] = {}
+
+    async def select(self, c: httpx.AsyncClient, top_n: Optional[int] = None,
+                     exclude: Iterable[str] = ()) -> Optional[List[dict]]:
+        """
+        Top-N ranked rows, or None when the tickers request failed (caller falls back to its static list).
+        """
+        top_n = PRESCREEN_TOP_N if top_n is None else top_n
+        tickers = await fetch_linear_tickers(c, self.tickers_url)
+        if not tickers:
+            return None
+        now = time.time()
+        self.history.record(tickers, now)
+        tradable = await asyncio.to_thread(self.tradable_fn) if self.tradable_fn else None
+        ranked = screen_tickers(tickers, self.history, tradable, exclude, now=now)
+        self.last_stats = {"universe": len(tickers), "passed": len(ranked), "selected": min(top_n, len(ranked))}
+        return ranked[:top_n]
@@ -0,0 +1,111 @@
+"""
+Candidate Scan Fan-Out
+
+Fetches technical + fibonacci data for every scan candidate concurrently:
+- Bounded concurrency (SCAN_CONCURRENCY symbols in flight at once)
+- Per-symbol deadline (SCAN_SYMBOL_TIMEOUT seconds for both requests)
+- Results are handed to a callback as they arrive (the orchestrator collects
+  them and scores every symbol in one batch pass)
+"""
+
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "6"))
+SCAN_SYMBOL_TIMEOUT = float(os.getenv("SCAN_SYMBOL_TIMEOUT", "20"))
+
+# Callback invoked per completed symbol: (symbol, tech, fib)
+OnResult = Callable[[str, dict, dict], None]
+
+
+async def fetch_symbol_data(c: httpx.AsyncClient, symbol: str,
+                            tech_url: str, fib_url: str) -> Tuple[dict, dict]:
+    """
+    Fetch technical and fibonacci analysis for one symbol in parallel.
+
+    Args:
+        c: Shared HTTP client
+        symbol: Trading pair like 'BTCUSDT'
+        tech_url: Base URL of the technical analyzer
+        fib_url: Base URL of the fibonacci agent
+
+    Returns:
+        (tech, fib) dicts; a failed request yields an empty dict
+    """
+    tech_resp, fib_resp = await asyncio.gather(
+        c.post(f"{tech_url}/analyze_multi_tf_full", json={"symbol": symbol}),
+        c.post(f"{fib_url}/analyze_fib", json={"symbol": symbol}),
+        return_exceptions=True
+    )
+    tech = tech_resp.json() if hasattr(tech_resp, 'json') else {}
+    fib = fib_resp.json() if hasattr(fib_resp, 'json') else {}
+    return tech, fib
+
+
+async def scan_symbols(
+    c: httpx.AsyncClient,
+    symbols: List[str],
+    on_result: OnResult,
+    tech_url: str,
+    fib_url: str,
+    concurrency: Optional[int] = None,
+    symbol_timeout: Optional[float] = None,
+) -> Dict[str, List[str]]:
+    """
+    Fan out data fetches over all symbols and score results as they arrive.
+
+    Args:
+        c: Shared HTTP client
+        symbols: Symbols to scan
+        on_result: Called with (symbol, tech, fib) for each completed fetch
+        tech_url: Base URL of the technical analyzer
+        fib_url: Base URL of the fibonacci agent
+        concurrency: Max symbols in flight (default SCAN_CONCURRENCY)
+        symbol_timeout: Per-symbol deadline in seconds (default SCAN_SYMBOL_TIMEOUT)
+
+    Returns:
+        Dict with 'completed', 'timed_out' and 'failed' symbol lists
+    """
+    concurrency = max(1, concurrency or SCAN_CONCURRENCY)
+    symbol_timeout = symbol_timeout if symbol_timeout is not None else SCAN_SYMBOL_TIMEOUT
+    sem = asyncio.Semaphore(concurrency)
+    stats: Dict[str, List[str]] = {"completed": [], "timed_out": [], "failed": []}
+
+    async def _one(sym: str):
+        async with sem:
+            try:
+                tech, fib = await asyncio.wait_for(
+                    fetch_symbol_data(c, sym, tech_url, fib_url), timeout=symbol_timeout
+                )
+                return sym, tech, fib, None
+            except asyncio.TimeoutError:
+                return sym, None, None, "timeout"
+            except Exception as e:
+                return sym, None, None, e
+
+    tasks = [asyncio.create_task(_one(s)) for s in symbols]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            sym, tech, fib, err = await fut
+            if err == "timeout":
+                print(f"        Data fetch timed out for {sym} (>{symbol_timeout:.0f}s)")
+                stats["timed_out"].append(sym)
+                continue
+            if err is not None:
+                print(f"        Data fetch failed for {sym}: {err}")
+                stats["failed"].append(sym)
+                continue
+            stats["completed"].append(sym)
+            try:
+                on_result(sym, tech, fib)
+            except Exception as e:
+                print(f"        Scoring failed for {sym}: {e}")
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+
+    return stats
@@ -0,0 +1,90 @@
+"""
+Speculative Wyckoff Prefetch
+
+Starts the Hyperliquid market-data fetch (and optionally the Wyckoff LLM
+analysis) for the best confluence candidate before the risk gates run, so
+its inputs are ready once the gates pass. It only saves latency: which
+symbol is traded, and the HOLD when a gate blocks, are unchanged.
+
+cancel() only cancels the local tasks. An /analyze_wyckoff request that has
+already reached Master AI still runs to completion there: the LLM call is
+billed and the decision is written to its journal.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+FetchBatch = Callable[[List[str]], Awaitable[Dict[str, dict]]]
+Analyze = Callable[[str, dict], Awaitable[dict]]
+
+
+class WyckoffPrefetch:
+    """
+    Market data + Wyckoff analysis for a ranked candidate list.
+
+    Args:
+        symbols: Candidates to prefetch
+        fetch_batch: Coroutine fn returning {symbol: wyckoff market data}
+        analyze: Coroutine fn (symbol, market data) -> Wyckoff analysis
+        prefetch_analysis: Also start the analysis of every candidate on start()
+    """
+
+    def __init__(self, symbols: Iterable[str], fetch_batch: FetchBatch, analyze: Analyze,
+                 prefetch_analysis: bool = False):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.fetch_batch = fetch_batch
+        self.analyze = analyze
+        self.prefetch_analysis = prefetch_analysis
+        self._data_task: Optional[asyncio.Task] = None
+        self._analysis_tasks: Dict[str, asyncio.Task] = {}
+        self.cancelled = 0
+
+    @property
+    def started(self) -> bool:
+        return self._data_task is not None
+
+    def start(self) -> None:
+        """Launch one batched market-data fetch (plus per-candidate analyses) in the background."""
+        if self.started or not self.symbols:
+            return
+        self._data_task = asyncio.ensure_future(self.fetch_batch(self.symbols))
+        if self.prefetch_analysis:
+            for symbol in self.symbols:
+                self._analysis_tasks[symbol] = asyncio.ensure_future(self._analyze(symbol))
+
+    async def _analyze(self, symbol: str) -> dict:
+        return await self.analyze(symbol, await self.data(symbol))
+
+    async def data(self, symbol: str) -> dict:
+        """Market data of a candidate (fetched on demand if not prefetched)."""
+        if self._data_task is None or symbol not in self.symbols:
+            return (await self.fetch_batch([symbol]))[symbol]
+        # Shielded: a cancelled analysis branch must not cancel the shared batch
+        return (await asyncio.shield(self._data_task))[symbol]
+
+    async def analysis(self, symbol: str) -> dict:
+        """Wyckoff analysis of a candidate (prefetched result, or run now)."""
+        task = self._analysis_tasks.get(symbol)
+        if task is not None:
+            return await task
+        return await self._analyze(symbol)
+
+    def cancel(self, keep: Optional[str] = None) -> int:
+        """
+        Cancel every branch except `keep` (None cancels everything).
+
+        Local only: an analysis request already sent is still processed by Master AI.
+
+        Returns:
+            Number of tasks cancelled
+        """
+        tasks = [t for s, t in self._analysis_tasks.items() if s != keep]
+        if keep is None and self._data_task is not None:
+            tasks.append(self._data_task)
+        count = 0
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+                count += 1
+        self.cancelled += count
+        return count
@@ -0,0 +1,192 @@
+"""
+Append-only AI decision journal shared by the agents through the /data volume.
+
+Replaces the read-modify-write of /data/ai_decisions.json: every writer
+(orchestrator, Master AI, position manager, dashboard) appends one JSON
+line to the active segment under an flock, so concurrent containers never
+overwrite each other and an append costs the same regardless of history
+size. Segments rotate at a size limit and only the newest N are kept.
+
+Readers skip a torn last line (crash mid-write), so the journal stays
+readable after a crash without any repair step.
+
+Layout:
+    <dir>/segment-00000001.jsonl
+    <dir>/segment-00000002.jsonl   <- active
+    <dir>/.lock
+
+The orchestrator, Master AI, position manager and dashboard import it as
+shared.decision_journal; their images copy agents/shared in as shared/
+(test_decision_journal.py checks the wiring).
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX dev machines: single-process use only
+    fcntl = None
+
+DEFAULT_JOURNAL_DIR = "/data/ai_decisions"
+DEFAULT_SEGMENT_MAX_BYTES = 1_000_000
+DEFAULT_RETAIN_SEGMENTS = 5
+
+_SEGMENT_RE = re.compile(r"^segment-(\d{8})\.jsonl$")
+
+
+class DecisionJournal:
+    """
+    Segmented JSONL journal.
+
+    Args:
+        directory: Journal directory (created on first append)
+        segment_max_bytes: Rotate to a new segment past this size
+        retain_segments: Number of segments kept (oldest deleted on rotation)
+    """
+
+    def __init__(self, directory: str = DEFAULT_JOURNAL_DIR,
+                 segment_max_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+                 retain_segments: int = DEFAULT_RETAIN_SEGMENTS):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.retain_segments = max(1, retain_segments)
+        self._lock_path = os.path.join(directory, ".lock")
+
+    # -----------------------------------------------------------------------
+    # Write
+    # -----------------------------------------------------------------------
+
+    def append(self, event: dict) -> dict:
+        """Append one event (adds "timestamp" if missing) and return it."""
+        event = dict(event or {})
+        event.setdefault("timestamp", datetime.now().isoformat())
+        line = (json.dumps(event, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                segments = self.segments()
+                seg = segments[-1] if segments else 1
+                path = self._segment_path(seg)
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if size and size + len(line) > self.segment_max_bytes:
+                    seg += 1
+                    path = self._segment_path(seg)
+                    segments.append(seg)
+                    for old in segments[:-self.retain_segments]:
+                        try:
+                            os.remove(self._segment_path(old))
+                        except FileNotFoundError:
+                            pass
+                fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    end = os.fstat(fd).st_size
+                    if end and os.pread(fd, 1, end - 1) != b"\n":
+                        line = b"\n" + line  # seal a torn line left by a crashed writer
+                    os.write(fd, line)  # single write: a line is never interleaved
+                finally:
+                    os.close(fd)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return event
+
+    # -----------------------------------------------------------------------
+    # Read
+    # -----------------------------------------------------------------------
+
+    def segments(self) -> List[int]:
+        """Segment numbers on disk, oldest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(m.group(1)) for m in map(_SEGMENT_RE.match, names) if m)
+
+    def _segment_path(self, seg: int) -> str:
+        return os.path.join(self.directory, f"segment-{seg:08d}.jsonl")
+
+    @staticmethod
+    def _parse_lines(data: bytes) -> Iterator[dict]:
+        for raw in data.splitlines():
+            if not raw.strip():
+                continue
+            try:
+                event = json.loads(raw)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                continue  # torn write
+            if isinstance(event, dict):
+                yield event
+
+    def _read_segment(self, seg: int, offset: int = 0) -> Tuple[bytes, int]:
+        """Complete lines of a segment from offset; returns (data, new_offset)."""
+        try:
+            with open(self._segment_path(seg), "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return b"", offset
+        end = data.rfind(b"\n") + 1  # leave a partially written last line for next time
+        return data[:end], offset + end
+
+    def tail(self, n: int = 100) -> List[dict]:
+        """Last n events, oldest first."""
+        out: List[dict] = []
+        for seg in reversed(self.segments()):
+            data, _ = self._read_segment(seg)
+            out = list(self._parse_lines(data)) + out
+            if len(out) >= n:
+                break
+        return out[-n:] if n > 0 else []
+
+    def read_since(self, cursor: Optional[str] = None) -> Tuple[List[dict], str]:
+        """
+        Events appended after cursor (all retained events if None).
+
+        Returns:
+            (events, new_cursor); pass new_cursor to the next call to read incrementally
+        """
+        segments = self.segments()
+        if not segments:
+            return [], cursor or "0:0"
+        cur_seg, cur_off = 0, 0
+        if cursor:
+            try:
+                s, o = cursor.split(":", 1)
+                cur_seg, cur_off = int(s), int(o)
+            except ValueError:
+                cur_seg, cur_off = 0, 0
+        if cur_seg < segments[0]:
+            cur_seg, cur_off = segments[0], 0  # older segments were rotated away
+
+        events: List[dict] = []
+        new_seg, new_off = cur_seg, cur_off
+        for seg in segments:
+            if seg < cur_seg:
+                continue
+            data, end = self._read_segment(seg, cur_off if seg == cur_seg else 0)
+            events.extend(self._parse_lines(data))
+            new_seg, new_off = seg, end
+        return events, f"{new_seg}:{new_off}"
+
+    def read_range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[dict]:
+        """Retained events with start <= timestamp < end (ISO strings)."""
+        events, _ = self.read_since(None)
+        return [e for e in events
+                if (start is None or str(e.get("timestamp", "")) >= start)
+                and (end is None or str(e.get("timestamp", "")) < end)]
+
+
+def journal_from_env() -> DecisionJournal:
+    """Journal configured from AI_DECISIONS_JOURNAL_DIR / _SEGMENT_BYTES / _RETAIN_SEGMENTS."""
+    return DecisionJournal(
+        directory=os.getenv("AI_DECISIONS_JOURNAL_DIR", DEFAULT_JOURNAL_DIR),
+        segment_max_bytes=int(os.getenv("AI_DECISIONS_SEGMENT_BYTES", str(DEFAULT_SEGMENT_MAX_BYTES))),
+        retain_segments=int(os.getenv("AI_DECISIONS_RETAIN_SEGMENTS", str(DEFAULT_RETAIN_SEGMENTS))),
+    )
@@ -15,14 +15,19 @@ import os
 from datetime import datetime
 from typing import Dict, Any, Optional
 from threading import Lock
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
 
 
 # Thread-safe lock for file operations
 _telemetry_lock = Lock()
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TradeRecord:
     """Structured trade record for telemetry"""
     timestamp: str
@@ -71,7 +76,23 @@ class TradeRecord:
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for JSON serialization"""
-        return asdict(self)
+        return {name: getattr(self, name) for name in _TRADE_RECORD_FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TradeRecord':
+        """Rebuild from a telemetry line (unknown keys ignored)"""
+        return cls(**{name: data[name] for name in _TRADE_RECORD_FIELDS if name in data})
+
+
+# All fields are scalars, so to_dict needs no deep copy
+_TRADE_RECORD_FIELDS = tuple(f.name for f in fields(TradeRecord))
+
+
+def _encode_line(obj: Dict[str, Any]) -> bytes:
+    """One JSONL line, UTF-8 encoded"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False) + "\n").encode("utf-8")
 
 
 class TelemetryLogger:
@@ -130,9 +151,8 @@ class TelemetryLogger:
                 self._check_rotation()
                 
                 # Append to JSONL
-                with open(self.filepath, 'a', encoding='utf-8') as f:
-                    json.dump(record.to_dict(), f, ensure_ascii=False)
-                    f.write('\n')
+                with open(self.filepath, 'ab') as f:
+                    f.write(_encode_line(record.to_dict()))
                 
                 # Optional: print summary for monitoring
                 print(
@@ -0,0 +1,205 @@
+"""
+Embedded SQLite store for closed-trade history.
+
+Replaces /data/trading_history.json (load everything, append, rewrite):
+inserts are a single indexed INSERT and the learning agent / Master AI
+query by time range and symbol through indexes instead of re-parsing the
+whole history.
+
+The database lives on the shared /data volume in WAL mode, so the learning
+agent (writer) and the Master AI (reader) can use it concurrently.
+
+The learning agent and Master AI import it as shared.trade_store; their
+images are built from ./agents and copy shared/ (test_trade_store.py checks
+the wiring).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+DEFAULT_DB_PATH = "/data/trading_history.db"
+
+_COLUMNS = ("timestamp", "intent_id", "symbol", "side", "entry_price", "exit_price",
+            "pnl_pct", "leverage", "size_pct", "duration_minutes")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    ts_epoch REAL,
+    intent_id TEXT,
+    symbol TEXT,
+    side TEXT,
+    entry_price REAL,
+    exit_price REAL,
+    pnl_pct REAL,
+    leverage REAL,
+    size_pct REAL,
+    duration_minutes INTEGER,
+    market_conditions TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades (ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_trades_symbol_ts ON trades (symbol, ts_epoch);
+CREATE INDEX IF NOT EXISTS idx_trades_side_ts ON trades (side, ts_epoch);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _epoch(timestamp: Any) -> Optional[float]:
+    try:
+        return datetime.fromisoformat(str(timestamp)).timestamp()
+    except (ValueError, TypeError):
+        return None
+
+
+class TradeStore:
+    """
+    Thread-safe trade history on SQLite.
+
+    Args:
+        db_path: Database file (created with its schema if missing)
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=10.0)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    # -----------------------------------------------------------------------
+    # Write
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _row_values(trade: Dict[str, Any]) -> tuple:
+        known = set(_COLUMNS) | {"market_conditions"}
+        extra = {k: v for k, v in trade.items() if k not in known}
+        return (
+            str(trade.get("timestamp") or datetime.now().isoformat()),
+            _epoch(trade.get("timestamp")),
+            trade.get("intent_id"),
+            trade.get("symbol"),
+            trade.get("side"),
+            trade.get("entry_price"),
+            trade.get("exit_price"),
+            trade.get("pnl_pct"),
+            trade.get("leverage"),
+            trade.get("size_pct"),
+            trade.get("duration_minutes"),
+            json.dumps(trade.get("market_conditions") or {}, default=str),
+            json.dumps(extra, default=str) if extra else None,
+        )
+
+    _INSERT = ("INSERT INTO trades (timestamp, ts_epoch, intent_id, symbol, side, entry_price, exit_price, "
+               "pnl_pct, leverage, size_pct, duration_minutes, market_conditions, extra) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+
+    def record(self, trade: Dict[str, Any]) -> int:
+        """Insert one trade; returns its row id."""
+        with self._lock, self._conn:
+            cur = self._conn.execute(self._INSERT, self._row_values(trade))
+            return cur.lastrowid
+
+    def migrate_json(self, json_path: str) -> int:
+        """
+        One-time import of the legacy trading_history.json.
+
+        Returns:
+            Number of trades imported (0 if already migrated or no file)
+        """
+        with self._lock:
+            done = self._conn.execute("SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+        if done or not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r") as f:
+            trades = json.load(f)
+        if not isinstance(trades, list):
+            trades = []
+        rows = [self._row_values(t) for t in trades if isinstance(t, dict)]
+        with self._lock, self._conn:
+            self._conn.executemany(self._INSERT, rows)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', ?)",
+                               (json.dumps({"path": json_path, "count": len(rows),
+                                            "at": datetime.now().isoformat()}),))
+        return len(rows)
+
+    # -----------------------------------------------------------------------
+    # Read
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        trade = {k: row[k] for k in _COLUMNS}
+        trade["market_conditions"] = json.loads(row["market_conditions"] or "{}")
+        if row["extra"]:
+            trade.update(json.loads(row["extra"]))
+        return trade
+
+    def _query(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def range(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+              symbol: Optional[str] = None, side: Optional[str] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Trades with start <= timestamp < end, optionally filtered, oldest first.
+        With limit, the newest `limit` matching trades are returned.
+        """
+        where, params = [], []
+        if start is not None:
+            where.append("ts_epoch >= ?")
+            params.append(start.timestamp())
+        if end is not None:
+            where.append("ts_epoch < ?")
+            params.append(end.timestamp())
+        if symbol is not None:
+            where.append("symbol = ?")
+            params.append(symbol)
+        if side is not None:
+            where.append("side = ?")
+            params.append(side)
+        sql = "SELECT * FROM trades"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if limit is not None:
+            sql = f"SELECT * FROM ({sql} ORDER BY ts_epoch DESC, id DESC LIMIT ?) ORDER BY ts_epoch, id"
+            params.append(int(limit))
+        else:
+            sql += " ORDER BY ts_epoch, id"
+        return self._query(sql, tuple(params))
+
+    def recent(self, hours: float, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Trades from the last N hours, oldest first."""
+        now = now or datetime.now()
+        return self.range(start=now - timedelta(hours=hours))
+
+    def latest(self, limit: int = 20, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Last `limit` trades in insertion order (optionally for one symbol), oldest first."""
+        if symbol is None:
+            sql = "SELECT * FROM (SELECT * FROM trades ORDER BY id DESC LIMIT ?) ORDER BY id"
+            return self._query(sql, (int(limit),))
+        sql = ("SELECT * FROM (SELECT * FROM trades WHERE symbol = ? ORDER BY id DESC LIMIT ?) "
+               "ORDER BY id")
+        return self._query(sql, (symbol, int(limit)))
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,46 @@
+"""
+Persistent trading state of the position manager: order intents, position
+metadata, cooldowns, trailing stops and closed trades in /data/trading_state.json.
+
+The file carries a schema_version; _migrate_state upgrades older files on
+load (STATE_SCHEMA_VERSION is bumped, and a migration added, whenever the
+layout changes), and the startup save writes them back in the current schema.
+
+The position manager imports it as shared.trading_state; its image is built
+from ./agents and copies shared/ (test_trading_state_schema.py checks the
+wiring).
+"""
+
 import os
+import copy
 import json
+import time
+import atexit
+import functools
+import heapq
 import threading
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields
 from enum import Enum
 
+try:
+    import orjson
+except ImportError:  # stdlib json: same files, slower encode/decode
+    orjson = None
+
 TRADING_STATE_FILE = os.getenv("TRADING_STATE_FILE", "/data/trading_state.json")
+STATE_SCHEMA_VERSION = 2
+
+# "sync": atomic snapshot after every mutation.
+# "write_behind": mutations are applied in memory and appended to an append-only
+# log (crash recovery); snapshots are coalesced to at most one per
+# TRADING_STATE_SNAPSHOT_SEC (or TRADING_STATE_LOG_MAX_RECORDS log records).
+TRADING_STATE_PERSIST_MODE = os.getenv("TRADING_STATE_PERSIST_MODE", "sync").lower()
+TRADING_STATE_LOG_FILE = os.getenv("TRADING_STATE_LOG_FILE",
+                                   os.path.splitext(TRADING_STATE_FILE)[0] + ".mutations.jsonl")
+TRADING_STATE_SNAPSHOT_SEC = float(os.getenv("TRADING_STATE_SNAPSHOT_SEC", "2"))
+TRADING_STATE_LOG_MAX_RECORDS = int(os.getenv("TRADING_STATE_LOG_MAX_RECORDS", "1000"))
 
 class OrderStatus(str, Enum):
     PENDING = "PENDING"
@@ -15,7 +49,59 @@ class OrderStatus(str, Enum):
     CANCELLED = "CANCELLED"
     FAILED = "FAILED"
 
-@dataclass
+
+# ---------------------------------------------------------------------------
+# Records
+# ---------------------------------------------------------------------------
+# Slotted and frozen: no per-instance __dict__, and a record read from the
+# state can't be changed without going back through TradingState. Derive a
+# modified copy with dataclasses.replace() and re-save it.
+
+_FIELD_NAMES: Dict[type, tuple] = {}
+
+
+def _field_names(cls) -> tuple:
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = _FIELD_NAMES[cls] = tuple(f.name for f in fields(cls))
+    return names
+
+
+def _record_to_dict(record) -> dict:
+    """Field dict of a record; like asdict() but only nested containers are deep-copied."""
+    out = {}
+    for name in _field_names(type(record)):
+        value = getattr(record, name)
+        if isinstance(value, Enum):
+            value = value.value
+        elif isinstance(value, (dict, list)):
+            value = copy.deepcopy(value) if value else type(value)()
+        out[name] = value
+    return out
+
+
+def _record_kwargs(cls, data: dict) -> dict:
+    """Constructor kwargs from a stored dict, unknown fields dropped."""
+    return {name: data[name] for name in _field_names(cls) if name in data}
+
+
+def _dumps(obj: Any, indent: bool = False) -> bytes:
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+
+def _loads(data):
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. NaN in a file written by the stdlib encoder
+    return json.loads(data)
+
+
+@dataclass(slots=True, frozen=True)
 class OrderIntent:
     intent_id: str
     symbol: str
@@ -28,6 +114,10 @@ class OrderIntent:
     executed_at: Optional[str] = None
     error_message: Optional[str] = None
     exchange_order_id: Optional[str] = None
+    exchange_order_link_id: Optional[str] = None  # Client order ID for reliable tracking
+    entry_type: str = "MARKET"  # MARKET or LIMIT
+    entry_price: Optional[float] = None  # For LIMIT orders
+    entry_expires_at: Optional[str] = None  # ISO timestamp for TTL expiry
     tp_pct: Optional[float] = None
     sl_pct: Optional[float] = None
     time_in_trade_limit_sec:  Optional[int] = None
@@ -35,23 +125,16 @@ class OrderIntent:
     features: dict = field(default_factory=dict)  # snapshot feature/indicatori all'ingresso
 
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d['status'] = self.status.value if isinstance(self.status, OrderStatus) else self.status
-        return d
+        return _record_to_dict(self)
 
     @classmethod
     def from_dict(cls, data: dict) -> 'OrderIntent': 
-        data = data.copy()
-        if 'status' in data:
-            data['status'] = OrderStatus(data['status']) if isinstance(data['status'], str) else data['status']
-        # Remove unknown fields
-        valid_fields = {'intent_id', 'symbol', 'side', 'leverage', 'size_pct', 'action', 'status',
-                       'created_at', 'executed_at', 'error_message', 'exchange_order_id',
-                       'tp_pct', 'sl_pct', 'time_in_trade_limit_sec', 'cooldown_sec'}
-        data = {k: v for k, v in data.items() if k in valid_fields}
+        data = _record_kwargs(cls, data)
+        if isinstance(data.get('status'), str):
+            data['status'] = OrderStatus(data['status'])
         return cls(**data)
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PositionMetadata:
     symbol:  str
     side: str
@@ -64,16 +147,16 @@ class PositionMetadata:
     time_in_trade_limit_sec: Optional[int] = None
     cooldown_sec: Optional[int] = None
     intent_id: Optional[str] = None
+    entry_type: Optional[str] = None  # MARKET or LIMIT
+    time_exit_extensions: int = 0  # flat time-exit extensions already granted
 
+    features: dict = field(default_factory=dict)
     def to_dict(self) -> dict:
-        return asdict(self)
+        return _record_to_dict(self)
 
     @classmethod
     def from_dict(cls, data:  dict) -> 'PositionMetadata':
-        valid_fields = {'symbol', 'side', 'entry_price', 'size', 'leverage', 'opened_at',
-                       'tp_pct', 'sl_pct', 'time_in_trade_limit_sec', 'cooldown_sec', 'intent_id'}
-        data = {k: v for k, v in data.items() if k in valid_fields}
-        return cls(**data)
+        return cls(**_record_kwargs(cls, data))
 
     def is_expired(self) -> bool:
         if not self.time_in_trade_limit_sec: 
@@ -81,33 +164,132 @@ class PositionMetadata:
         opened = datetime.fromisoformat(self.opened_at)
         return datetime.now() > opened + timedelta(seconds=self.time_in_trade_limit_sec)
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Cooldown:
-    def __init__(self, symbol: str, side: str, expires_at: str, reason: str = "position_closed"):
-        self.symbol = symbol
-        self.side = side
-        self.expires_at = expires_at
-        self.reason = reason
-    def __init__(self, symbol: str, side: str, expires_at: str, reason: str = "position_closed"):
-        self.symbol = symbol
-        self.side = side
-        self.expires_at = expires_at
-        self.reason = reason
     symbol: str
     side: str
     expires_at: str
     reason: str = "position_closed"
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        return _record_to_dict(self)
 
     @classmethod
     def from_dict(cls, data: dict) -> 'Cooldown':
-        return cls(**data)
+        return cls(**_record_kwargs(cls, data))
 
     def is_expired(self) -> bool:
         return datetime.now() > datetime.fromisoformat(self.expires_at)
 
+
+# ---------------------------------------------------------------------------
+# Schema migrations
+# ---------------------------------------------------------------------------
+
+def _fill_record_defaults(record_type, data: Any) -> Any:
+    """Add fields the stored dict predates (defaults); existing keys are kept as they are."""
+    if not isinstance(data, dict):
+        return data
+    try:
+        upgraded = record_type.from_dict(data).to_dict()
+    except (TypeError, ValueError):
+        return data  # incomplete record: leave it for the reader to skip
+    upgraded.update(data)
+    return upgraded
+
+
+def _migrate_v1(state: dict) -> dict:
+    """
+    1 -> 2: one schema for every container.
+
+    Version 1 files carry "version": "1.0.0" (or nothing). The agents/shared
+    copy named its sections "order_intents" / "position_metadata"; records
+    from either copy may lack exchange_order_link_id, entry_type, features, ...
+    """
+    state.pop("version", None)
+    for old, new in (("order_intents", "intents"), ("position_metadata", "positions")):
+        legacy = state.pop(old, None)
+        if isinstance(legacy, dict):
+            current = state.get(new)
+            state[new] = {**legacy, **(current if isinstance(current, dict) else {})}
+    for section, record_type in (("intents", OrderIntent), ("positions", PositionMetadata)):
+        records = state.get(section)
+        if isinstance(records, dict):
+            for key, data in records.items():
+                records[key] = _fill_record_defaults(record_type, data)
+    if isinstance(state.get("cooldowns"), list):
+        state["cooldowns"] = [_fill_record_defaults(Cooldown, c) for c in state["cooldowns"]]
+    return state
+
+
+# schema_version -> migration to schema_version + 1
+_MIGRATIONS = {
+    1: _migrate_v1,
+}
+
+
+def _migrate_state(state: Any) -> Any:
+    """Upgrade a loaded state dict to STATE_SCHEMA_VERSION (newer files are left untouched)."""
+    if not isinstance(state, dict):
+        return state
+    version = state.get("schema_version", 1)
+    if not isinstance(version, int) or version < 1:
+        version = 1
+    if version > STATE_SCHEMA_VERSION:
+        print(f"⚠️ Trading state schema v{version} is newer than v{STATE_SCHEMA_VERSION}; loading as-is")
+        return state
+    start = version
+    while version < STATE_SCHEMA_VERSION:
+        state = _MIGRATIONS[version](state)
+        version += 1
+        state["schema_version"] = version
+    if version != start:
+        print(f"🔄 Trading state migrated: schema v{start} -> v{version}")
+    return state
+
+
+def _apply_mutation(state: dict, op: dict):
+    """Replay one mutation-log operation onto a state dict."""
+    kind, section = op.get("op"), op.get("section")
+    if kind == "set":
+        state.setdefault(section, {})[op["key"]] = op["value"]
+    elif kind == "del":
+        state.get(section, {}).pop(op["key"], None)
+    elif kind == "append":
+        items = state.setdefault(section, [])
+        items.append(op["value"])
+        keep_last = op.get("keep_last")
+        if keep_last and len(items) > keep_last:
+            state[section] = items[-keep_last:]
+    elif kind == "replace":
+        state[section] = op["value"]
+
+
+def _position_deadline(data: dict) -> Optional[float]:
+    """Epoch seconds at which a position's time-in-trade limit runs out (None = no limit)."""
+    limit = data.get("time_in_trade_limit_sec")
+    if not limit:
+        return None
+    try:
+        return datetime.fromisoformat(data["opened_at"]).timestamp() + limit
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _locked(method):
+    """Run a TradingState method under the state lock.
+
+    A mutation and its log record, or a snapshot and the log truncation it
+    covers, happen as one step: a snapshot never holds a mutation whose log
+    record is appended (and replayed) after it.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._state_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class TradingState: 
     _instance = None
     _lock = threading.Lock()
@@ -123,18 +305,40 @@ class TradingState:
     def __init__(self):
         if self._initialized:
             return
-        self._file_lock = threading.Lock()
+        self._state_lock = threading.RLock()
+        self._path = TRADING_STATE_FILE
+        self._log_path = TRADING_STATE_LOG_FILE
+        self._write_behind = TRADING_STATE_PERSIST_MODE == "write_behind"
+        self._log_fh = None
+        self._log_records = 0
+        self._seq = 0
+        self._dirty = False
+        self._last_snapshot = time.monotonic()
+        self.write_stats = {"snapshots": 0, "log_records": 0}
         self._state = self._load_state()
+        if self._replay_log():
+            self._save_state()
+        self._rebuild_indexes()
+        if self._write_behind:
+            atexit.register(self.flush)
+        # Persist normalized schema on startup so new fields (e.g. closed_trades)
+        # are written to disk without requiring a later state mutation.
+        try:
+            self._save_state()
+        except Exception:
+            pass
         self._initialized = True
+
     def _default_state(self) -> dict:
         """Default/required schema for the trading state file."""
         return {
-            "version": "1.0.0",
+            "schema_version": STATE_SCHEMA_VERSION,
             "last_updated": datetime.utcnow().isoformat(),
-            "order_intents": {},
+            "intents": {},
+            "positions": {},
             "cooldowns": [],
-            "position_metadata": {},
-            "trailing_stops": {}
+            "trailing_stops": {},
+            "closed_trades": []
         }
 
     def _normalize_state(self, state: Any) -> dict:
@@ -147,49 +351,229 @@ class TradingState:
             if k not in state:
                 state[k] = v
 
-        if not isinstance(state.get("order_intents"), dict):
-            state["order_intents"] = {}
-        if not isinstance(state.get("position_metadata"), dict):
-            state["position_metadata"] = {}
+        if not isinstance(state.get("intents"), dict):
+            state["intents"] = {}
+        if not isinstance(state.get("positions"), dict):
+            state["positions"] = {}
         if not isinstance(state.get("trailing_stops"), dict):
             state["trailing_stops"] = {}
         if not isinstance(state.get("cooldowns"), list):
             state["cooldowns"] = []
+        if not isinstance(state.get("closed_trades"), list):
+            state["closed_trades"] = []
 
         return state
 
 
     def _load_state(self) -> dict:
         try: 
-            if os.path.exists(TRADING_STATE_FILE):
-                with open(TRADING_STATE_FILE, 'r') as f:
-                    return json.load(f)
+            if os.path.exists(self._path):
+                with open(self._path, 'rb') as f:
+                    return self._normalize_state(_migrate_state(_loads(f.read())))
         except Exception as e:
             print(f"⚠️ Error loading trading state: {e}")
-        return {"intents": {}, "positions": {}, "cooldowns": [], "trailing_stops": {}}
+        return self._default_state()
+
+    def _replay_log(self) -> int:
+        """Apply mutation-log records newer than the snapshot (crash recovery). Returns records applied."""
+        snapshot_seq = self._state.get("log_seq", 0)
+        self._seq = snapshot_seq if isinstance(snapshot_seq, int) else 0
+        applied = 0
+        try:
+            if not os.path.exists(self._log_path):
+                return 0
+            with open(self._log_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = _loads(line)
+                    except ValueError:
+                        break  # torn last line of a crashed append
+                    if record.get("seq", 0) <= self._seq:
+                        continue  # already in the snapshot
+                    for op in record.get("ops", []):
+                        _apply_mutation(self._state, op)
+                    self._seq = record["seq"]
+                    applied += 1
+        except Exception as e:
+            print(f"⚠️ Error replaying trading state log: {e}")
+        if applied:
+            print(f"♻️ Replayed {applied} trading state mutation(s) from {self._log_path}")
+        return applied
 
+    @_locked
     def _save_state(self):
-        with self._file_lock:
-            try:
-                os.makedirs(os.path.dirname(TRADING_STATE_FILE), exist_ok=True)
-                with open(TRADING_STATE_FILE, 'w') as f:
-                    json.dump(self._state, f, indent=2)
-            except Exception as e:
-                print(f"⚠️ Error saving trading state: {e}")
+        """Atomic full snapshot (temp file + rename); truncates the mutation log it covers."""
+        try:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            self._state["log_seq"] = self._seq
+            tmp_path = f"{self._path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(_dumps(self._state, indent=True))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path)
+            if self._log_fh is not None and not self._log_fh.closed:
+                self._log_fh.seek(0)
+                self._log_fh.truncate()
+            elif os.path.exists(self._log_path) and os.path.getsize(self._log_path):
+                open(self._log_path, 'w').close()
+            self._log_records = 0
+            self._dirty = False
+            self._last_snapshot = time.monotonic()
+            self.write_stats["snapshots"] += 1
+        except Exception as e:
+            print(f"⚠️ Error saving trading state: {e}")
+
+    @_locked
+    def _commit(self, *ops: dict):
+        """Persist mutations already applied to self._state (snapshot now, or log + deferred snapshot).
+
+        Called by the mutation methods with the state lock held.
+        """
+        if not self._write_behind:
+            self._save_state()
+            return
+        try:
+            if self._log_fh is None or self._log_fh.closed:
+                os.makedirs(os.path.dirname(self._log_path) or ".", exist_ok=True)
+                self._log_fh = open(self._log_path, 'ab')
+            self._seq += 1
+            self._log_fh.write(_dumps({"seq": self._seq, "ops": list(ops)}) + b"\n")
+            self._log_fh.flush()
+            self._log_records += 1
+            self.write_stats["log_records"] += 1
+        except Exception as e:
+            print(f"⚠️ Error logging trading state mutation: {e}")
+        self._dirty = True
+        if self._log_records >= TRADING_STATE_LOG_MAX_RECORDS:
+            self._save_state()
+        else:
+            self.flush_if_due()
+
+    @_locked
+    def flush_if_due(self):
+        """Write-behind: snapshot pending mutations once TRADING_STATE_SNAPSHOT_SEC has elapsed."""
+        if self._dirty and time.monotonic() - self._last_snapshot >= TRADING_STATE_SNAPSHOT_SEC:
+            self._save_state()
+
+    @_locked
+    def flush(self):
+        """Snapshot pending mutations now (shutdown, tests)."""
+        if self._dirty:
+            self._save_state()
+
+    # --- Secondary Indexes ---
+    # Rebuilt on load and kept in sync by the mutation methods below. Queries
+    # re-check the primary dicts, so entries removed behind our back are skipped.
+    def _rebuild_indexes(self):
+        self._intent_index: Dict[tuple, set] = {}  # (status, entry_type) -> intent ids
+        self._intents_by_symbol: Dict[str, set] = {}
+        self._positions_by_symbol: Dict[str, set] = {}
+        self._position_expiry: List[tuple] = []  # min-heap of (deadline, key, opened_at, limit)
+        self._cooldown_until: Dict[tuple, float] = {}  # (symbol, side) -> latest expiry
+        self._cooldown_expiry: List[float] = []  # min-heap of expiries
+        intents = self._state.get("intents")
+        for intent_id, data in (intents.items() if isinstance(intents, dict) else []):
+            self._index_intent(intent_id, data)
+        positions = self._state.get("positions")
+        for key, data in (positions.items() if isinstance(positions, dict) else []):
+            self._index_position(key, data)
+        cooldowns = self._state.get("cooldowns")
+        for cd_data in (cooldowns if isinstance(cooldowns, list) else []):
+            self._index_cooldown(cd_data)
+
+    @staticmethod
+    def _intent_key(data: dict) -> tuple:
+        status = data.get("status")
+        status = status.value if isinstance(status, OrderStatus) else status
+        return status, data.get("entry_type") or "MARKET"
+
+    def _index_intent(self, intent_id: str, data: dict):
+        self._intent_index.setdefault(self._intent_key(data), set()).add(intent_id)
+        self._intents_by_symbol.setdefault(data.get("symbol"), set()).add(intent_id)
+
+    def _unindex_intent(self, intent_id: str, data: dict):
+        self._intent_index.get(self._intent_key(data), set()).discard(intent_id)
+        self._intents_by_symbol.get(data.get("symbol"), set()).discard(intent_id)
+
+    def _index_position(self, key: str, data: dict):
+        self._positions_by_symbol.setdefault(data.get("symbol"), set()).add(key)
+        deadline = _position_deadline(data)
+        if deadline is not None:
+            heapq.heappush(self._position_expiry,
+                           (deadline, key, data.get("opened_at"), data.get("time_in_trade_limit_sec")))
+            # Re-saved positions leave stale heap entries behind; compact when they pile up
+            if len(self._position_expiry) > 2 * len(self._state["positions"]) + 64:
+                self._position_expiry = [e for e in self._position_expiry
+                                         if self._state["positions"].get(e[1]) is not None
+                                         and _position_deadline(self._state["positions"][e[1]]) == e[0]]
+                heapq.heapify(self._position_expiry)
+
+    def _unindex_position(self, key: str, data: dict):
+        self._positions_by_symbol.get(data.get("symbol"), set()).discard(key)
+
+    def _index_cooldown(self, cd_data: dict):
+        try:
+            until = datetime.fromisoformat(cd_data["expires_at"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return
+        key = (cd_data.get("symbol"), cd_data.get("side"))
+        if until > self._cooldown_until.get(key, float("-inf")):
+            self._cooldown_until[key] = until
+        heapq.heappush(self._cooldown_expiry, until)
 
     # --- Intent Management ---
+    @_locked
     def add_intent(self, intent: OrderIntent):
+        previous = self._state["intents"].get(intent.intent_id)
+        if previous:
+            self._unindex_intent(intent.intent_id, previous)
         self._state["intents"][intent.intent_id] = intent.to_dict()
-        self._save_state()
+        self._index_intent(intent.intent_id, self._state["intents"][intent.intent_id])
+        self._commit({"op": "set", "section": "intents", "key": intent.intent_id,
+                      "value": self._state["intents"][intent.intent_id]})
 
     def get_intent(self, intent_id:  str) -> Optional[OrderIntent]:
         data = self._state["intents"].get(intent_id)
         return OrderIntent.from_dict(data) if data else None
 
+    @_locked
+    def get_intents(self, status: Optional[OrderStatus] = None, entry_type: Optional[str] = None,
+                    symbol: Optional[str] = None) -> List[OrderIntent]:
+        """Intents matching all given filters, oldest first, in O(matches) via the indexes."""
+        status_value = status.value if isinstance(status, OrderStatus) else status
+        candidates = None
+        if status is not None or entry_type is not None:
+            candidates = set()
+            for (st, et), members in self._intent_index.items():
+                if (status is None or st == status_value) and (entry_type is None or et == entry_type):
+                    candidates |= members
+        if symbol is not None:
+            by_symbol = self._intents_by_symbol.get(symbol, set())
+            candidates = by_symbol if candidates is None else candidates & by_symbol
+        if candidates is None:
+            candidates = self._state["intents"].keys()
+
+        result = []
+        for intent_id in candidates:
+            data = self._state["intents"].get(intent_id)
+            if not data:
+                continue
+            st, et = self._intent_key(data)
+            if ((status is None or st == status_value)
+                    and (entry_type is None or et == entry_type)
+                    and (symbol is None or data.get("symbol") == symbol)):
+                result.append(OrderIntent.from_dict(data))
+        result.sort(key=lambda i: i.created_at or "")
+        return result
+
+    @_locked
     def update_intent_status(self, intent_id: str, status: OrderStatus, 
                             error_message: Optional[str] = None,
-                            exchange_order_id: Optional[str] = None):
+                            exchange_order_id: Optional[str] = None,
+                            exchange_order_link_id: Optional[str] = None):
         if intent_id in self._state["intents"]:
+            self._unindex_intent(intent_id, self._state["intents"][intent_id])
             self._state["intents"][intent_id]["status"] = status.value
             if status == OrderStatus.EXECUTED:
                 self._state["intents"][intent_id]["executed_at"] = datetime.now().isoformat()
@@ -197,8 +581,13 @@ class TradingState:
                 self._state["intents"][intent_id]["error_message"] = error_message
             if exchange_order_id:
                 self._state["intents"][intent_id]["exchange_order_id"] = exchange_order_id
-            self._save_state()
+            if exchange_order_link_id:
+                self._state["intents"][intent_id]["exchange_order_link_id"] = exchange_order_link_id
+            self._index_intent(intent_id, self._state["intents"][intent_id])
+            self._commit({"op": "set", "section": "intents", "key": intent_id,
+                          "value": self._state["intents"][intent_id]})
 
+    @_locked
     def cleanup_old_intents(self, days: float = 1.0):
         cutoff = datetime.now() - timedelta(days=days)
         to_remove = []
@@ -207,73 +596,159 @@ class TradingState:
             if created < cutoff: 
                 to_remove.append(intent_id)
         for intent_id in to_remove:
-            del self._state["intents"][intent_id]
+            self._unindex_intent(intent_id, self._state["intents"].pop(intent_id))
         if to_remove:
-            self._save_state()
+            self._commit(*[{"op": "del", "section": "intents", "key": intent_id} for intent_id in to_remove])
 
     # --- Position Management ---
+    @_locked
     def add_position(self, position: PositionMetadata):
         key = f"{position.symbol}_{position.side}"
+        previous = self._state["positions"].get(key)
+        if previous:
+            self._unindex_position(key, previous)
         self._state["positions"][key] = position.to_dict()
-        self._save_state()
+        self._index_position(key, self._state["positions"][key])
+        self._commit({"op": "set", "section": "positions", "key": key, "value": self._state["positions"][key]})
 
     def get_position(self, symbol: str, side: str) -> Optional[PositionMetadata]:
         key = f"{symbol}_{side}"
         data = self._state["positions"].get(key)
         return PositionMetadata.from_dict(data) if data else None
 
+    @_locked
     def remove_position(self, symbol: str, side: str):
         key = f"{symbol}_{side}"
         if key in self._state["positions"]:
-            del self._state["positions"][key]
-            self._save_state()
+            self._unindex_position(key, self._state["positions"].pop(key))
+            self._commit({"op": "del", "section": "positions", "key": key})
+
+    @_locked
+    def get_positions_for_symbol(self, symbol: str) -> List[PositionMetadata]:
+        """Positions of one symbol (both sides) via the symbol index."""
+        return [PositionMetadata.from_dict(self._state["positions"][key])
+                for key in sorted(self._positions_by_symbol.get(symbol, ()))
+                if key in self._state["positions"]]
 
+    @_locked
     def get_expired_positions(self) -> List[PositionMetadata]: 
-        expired = []
-        for key, data in self._state["positions"].items():
-            pos = PositionMetadata.from_dict(data)
-            if pos.is_expired():
-                expired.append(pos)
+        """Positions past their time-in-trade limit, soonest deadline first (expiry heap, O(k log n))."""
+        now = datetime.now().timestamp()
+        heap = self._position_expiry
+        expired, still_open, seen = [], [], set()
+        while heap and heap[0][0] < now:
+            entry = heapq.heappop(heap)
+            _, key, opened_at, limit = entry
+            data = self._state["positions"].get(key)
+            if (key in seen or not data or data.get("opened_at") != opened_at
+                    or data.get("time_in_trade_limit_sec") != limit):
+                continue  # removed or re-saved since it was indexed
+            seen.add(key)
+            still_open.append(entry)
+            expired.append(PositionMetadata.from_dict(data))
+        # Expired positions stay in state until closed: keep them indexed
+        for entry in still_open:
+            heapq.heappush(heap, entry)
         return expired
 
+    @_locked
+    def prune_positions(self, active_keys: set) -> dict:
+        """Remove positions from state that are not currently active on the exchange.
+
+        active_keys must contain entries like 'ETHUSDT_long' or 'ETHUSDT_short'.
+        Returns dict with: {"removed_keys": [...], "removed_positions": [...]}
+        where removed_positions are dict snapshots of PositionMetadata.
+        """
+        removed_keys: List[str] = []
+        removed_positions: List[dict] = []
+        positions = self._state.get("positions", {})
+        if not isinstance(positions, dict):
+            return {"removed_keys": [], "removed_positions": []}
+        for k in list(positions.keys()):
+            if k not in active_keys:
+                removed_keys.append(k)
+                # Store position data before removing
+                removed_positions.append(dict(positions[k]))
+                self._unindex_position(k, positions.pop(k))
+                # also prune trailing stop state for stale positions
+                ts = self._state.get("trailing_stops", {})
+                if isinstance(ts, dict) and k in ts:
+                    del ts[k]
+        if removed_keys:
+            self._state["positions"] = positions
+            self._commit(*[{"op": "del", "section": section, "key": k}
+                           for k in removed_keys for section in ("positions", "trailing_stops")])
+        return {"removed_keys": removed_keys, "removed_positions": removed_positions}
+
     # --- Cooldown Management ---
+    @_locked
     def add_cooldown(self, cooldown: Cooldown):
         self._state["cooldowns"].append(cooldown.to_dict())
-        self._save_state()
+        self._index_cooldown(self._state["cooldowns"][-1])
+        self._commit({"op": "append", "section": "cooldowns", "value": self._state["cooldowns"][-1]})
 
     def is_in_cooldown(self, symbol:  str, side: str) -> bool:
-        for cd_data in self._state["cooldowns"]: 
-            cd = Cooldown.from_dict(cd_data)
-            if cd.symbol == symbol and cd.side == side:
-                if not cd.is_expired():
-                    return True
-        return False
+        until = self._cooldown_until.get((symbol, side))
+        return until is not None and datetime.now().timestamp() <= until
 
+    @_locked
     def cleanup_expired_cooldowns(self):
+        if not self._cooldown_expiry or self._cooldown_expiry[0] >= datetime.now().timestamp():
+            return  # earliest expiry still ahead: nothing to remove
         valid = []
         for cd_data in self._state["cooldowns"]:
             cd = Cooldown.from_dict(cd_data)
             if not cd.is_expired():
                 valid.append(cd_data)
+        self._cooldown_until, self._cooldown_expiry = {}, []
+        for cd_data in valid:
+            self._index_cooldown(cd_data)
         if len(valid) != len(self._state["cooldowns"]):
             self._state["cooldowns"] = valid
-            self._save_state()
+            self._commit({"op": "replace", "section": "cooldowns", "value": valid})
 
     # --- Trailing Stop Management ---
+    @_locked
     def set_trailing_stop(self, symbol: str, side: str, data: dict):
         key = f"{symbol}_{side}"
         self._state["trailing_stops"][key] = data
-        self._save_state()
+        self._commit({"op": "set", "section": "trailing_stops", "key": key, "value": data})
 
     def get_trailing_stop(self, symbol: str, side: str) -> Optional[dict]:
         key = f"{symbol}_{side}"
         return self._state["trailing_stops"].get(key)
 
+    @_locked
     def remove_trailing_stop(self, symbol: str, side: str):
         key = f"{symbol}_{side}"
         if key in self._state["trailing_stops"]: 
             del self._state["trailing_stops"][key]
-            self._save_state()
+            self._commit({"op": "del", "section": "trailing_stops", "key": key})
+
+    # --- Closed Trades Management ---
+    @_locked
+    def add_closed_trade(self, record: dict, keep_last: int = 500):
+        """Add a closed trade record to the closed_trades array.
+        
+        Keeps only the last `keep_last` records to prevent unbounded growth.
+        """
+        if not isinstance(self._state.get("closed_trades"), list):
+            self._state["closed_trades"] = []
+        
+        self._state["closed_trades"].append(record)
+        
+        # Trim to keep_last records
+        if len(self._state["closed_trades"]) > keep_last:
+            self._state["closed_trades"] = self._state["closed_trades"][-keep_last:]
+        
+        self._commit({"op": "append", "section": "closed_trades", "value": record, "keep_last": keep_last})
+
+    def get_closed_trades(self) -> List[dict]:
+        """Retrieve all closed trade records."""
+        closed_trades = self._state.get("closed_trades", [])
+        if not isinstance(closed_trades, list):
+            return []
+        return closed_trades
 
 def get_trading_state() -> TradingState:
     return TradingState()
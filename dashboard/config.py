@@ -13,7 +13,8 @@ CLOSED_POSITIONS_FILE = os.path.join(DATA_DIR, 'closed_positions.json')
 
 # Shared data directory (cross-container data)
 SHARED_DATA_DIR = '/data'
-AI_DECISIONS_FILE = os.path.join(SHARED_DATA_DIR, 'ai_decisions.json')
+AI_DECISIONS_FILE = os.path.join(SHARED_DATA_DIR, 'ai_decisions.json')  # legacy, read-only fallback
+AI_DECISIONS_JOURNAL_DIR = os.getenv('AI_DECISIONS_JOURNAL_DIR', os.path.join(SHARED_DATA_DIR, 'ai_decisions'))
 
 # Starting values for performance calculations
 STARTING_DATE = "2025-12-18"
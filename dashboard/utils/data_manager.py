@@ -1,7 +1,14 @@
 import json
 import os
+from collections import deque
 from datetime import datetime
-from config import DATA_DIR, EQUITY_HISTORY_FILE, CLOSED_POSITIONS_FILE, AI_DECISIONS_FILE, STARTING_DATE, STARTING_BALANCE, SHARED_DATA_DIR
+from config import DATA_DIR, EQUITY_HISTORY_FILE, CLOSED_POSITIONS_FILE, AI_DECISIONS_FILE, AI_DECISIONS_JOURNAL_DIR, STARTING_DATE, STARTING_BALANCE, SHARED_DATA_DIR
+from shared.decision_journal import DecisionJournal
+
+decision_journal = DecisionJournal(AI_DECISIONS_JOURNAL_DIR)
+# Incremental read state: survives Streamlit reruns (module is imported once)
+_decisions_cache = deque(maxlen=500)
+_decisions_cursor = None
 
 def ensure_data_dir():
     """Crea la directory data se non esiste"""
@@ -102,16 +109,21 @@ def update_closed_positions(new_positions):
     save_json(CLOSED_POSITIONS_FILE, existing)
 
 def get_ai_decisions():
-    """Ottiene le decisioni dell'AI"""
+    """Ottiene le decisioni dell'AI (legge solo le righe nuove del journal)"""
+    global _decisions_cursor
+    try:
+        new_events, _decisions_cursor = decision_journal.read_since(_decisions_cursor)
+        _decisions_cache.extend(new_events)
+    except OSError:
+        pass
+    if _decisions_cache:
+        return list(_decisions_cache)
+    # Journal vuoto: storico pre-journal
     return load_json(AI_DECISIONS_FILE, [])
 
 def add_ai_decision(decision_data):
     """Aggiunge una decisione AI"""
-    decisions = load_json(AI_DECISIONS_FILE, [])
-    decisions.append({
+    decision_journal.append({
         'timestamp': datetime.now().isoformat(),
         **decision_data
     })
-    # Mantieni solo le ultime 100
-    decisions = decisions[-100:]
-    save_json(AI_DECISIONS_FILE, decisions)
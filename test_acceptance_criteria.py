@@ -13,6 +13,7 @@ import json
 
 # Setup path and env
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
 os.environ['DEEPSEEK_API_KEY'] = 'test-key-for-testing'
 
 import main as master_ai
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Test the async DeepSeek client (agents/04_master_ai_agent/llm_client.py)
+against a local stub chat-completions server.
+
+Validates:
+1. Successful call returns content + token usage
+2. 503 / 429 are retried with backoff, 400 is not
+3. Per-request timeout is enforced and retried
+4. In-flight requests are bounded by max_concurrency
+5. /analyze_wyckoff no longer blocks the event loop while the LLM thinks
+6. The Master AI image no longer ships the blocking OpenAI SDK
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+from llm_client import AsyncLLMClient, LLMError
+
+
+class StubLLMServer:
+    """OpenAI-compatible /chat/completions stub; `script` is a list of (status, delay) per request"""
+
+    def __init__(self, content='{"ok": true}', delay=0.0):
+        self.content = content
+        self.delay = delay
+        self.script = []
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    status, delay = stub.script.pop(0) if stub.script else (200, stub.delay)
+                try:
+                    time.sleep(delay)
+                    if status == 200:
+                        payload = {"choices": [{"message": {"content": stub.content}}],
+                                   "usage": {"prompt_tokens": len(body.get("messages", [])), "completion_tokens": 7}}
+                    else:
+                        payload = {"error": {"message": f"stub {status}"}}
+                    data = json.dumps(payload).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    if status == 429:
+                        self.send_header("Retry-After", "0")
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_client(stub, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return AsyncLLMClient(api_key="test", base_url=stub.url, **kwargs)
+
+
+def test_success_and_retries():
+    """Content and usage returned; retryable statuses retried, 400 not"""
+    print("\n" + "="*80)
+    print("TEST 1: Success, retry and non-retryable errors")
+    print("="*80)
+
+    stub = StubLLMServer()
+
+    async def scenario():
+        client = make_client(stub, max_retries=2)
+        try:
+            resp = await client.chat_json([{"role": "user", "content": "hi"}])
+            assert resp.content == '{"ok": true}' and resp.prompt_tokens == 1 and resp.completion_tokens == 7
+            print("✓ Content and token usage returned")
+
+            stub.script = [(503, 0), (429, 0)]
+            resp = await client.chat_json([{"role": "user", "content": "hi"}])
+            assert resp.attempts == 3 and client.stats["retries"] == 2
+            print("✓ 503 and 429 retried, third attempt succeeded")
+
+            stub.script = [(400, 0)]
+            before = stub.requests
+            try:
+                await client.chat_json([{"role": "user", "content": "hi"}])
+                raise AssertionError("400 should raise")
+            except LLMError as e:
+                assert e.status_code == 400 and stub.requests == before + 1
+            print("✓ 400 raised immediately without retry")
+        finally:
+            await client.aclose()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        stub.close()
+
+
+def test_timeout_and_concurrency():
+    """Slow responses time out; in-flight requests never exceed the bound"""
+    print("\n" + "="*80)
+    print("TEST 2: Timeout and bounded concurrency")
+    print("="*80)
+
+    stub = StubLLMServer(delay=0.2)
+
+    async def scenario():
+        client = make_client(stub, max_retries=1, max_concurrency=2)
+        try:
+            stub.script = [(200, 1.0), (200, 1.0)]
+            try:
+                await client.chat_json([{"role": "user", "content": "slow"}], timeout=0.2)
+                raise AssertionError("should time out")
+            except LLMError as e:
+                assert "timeout" in str(e)
+            print("✓ Per-request timeout enforced (and retried once)")
+
+            await asyncio.sleep(1.0)  # let the abandoned slow handlers finish
+            stub.max_in_flight = 0
+            results = await asyncio.gather(*[
+                client.chat_json([{"role": "user", "content": str(i)}]) for i in range(6)
+            ])
+            assert len(results) == 6 and stub.max_in_flight <= 2, stub.max_in_flight
+            print(f"✓ 6 requests, max in flight at server: {stub.max_in_flight}")
+        finally:
+            await client.aclose()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        stub.close()
+
+
+def test_wyckoff_endpoint_does_not_block_loop():
+    """Event loop keeps ticking while /analyze_wyckoff waits on the LLM"""
+    print("\n" + "="*80)
+    print("TEST 3: /analyze_wyckoff is non-blocking")
+    print("="*80)
+
+    content = json.dumps({"market_phase": "MARKUP", "phase_confidence": 70,
+                          "trade_proposal": {"direction": "LONG", "reasoning": "stub"}})
+    stub = StubLLMServer(content=content, delay=0.5)
+    master = load_module_from_path(
+        'master_ai_async',
+        os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent', 'main.py')
+    )
+    master.llm = make_client(stub)
+    master.log_api_call = lambda *a: None
+    master.save_ai_decision = lambda *a: None
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.05)
+                ticks += 1
+
+        t = asyncio.create_task(ticker())
+        req = master.WyckoffRequest(symbol="BTCUSDT", ohlcv_summary={"close": 1}, trading_journal=[])
+        result = await master.analyze_wyckoff(req)
+        t.cancel()
+        await master.llm.aclose()
+        return result, ticks
+
+    try:
+        result, ticks = asyncio.run(scenario())
+    finally:
+        stub.close()
+
+    assert result["market_phase"] == "MARKUP" and result["trade_proposal"]["direction"] == "LONG"
+    assert ticks >= 5, f"event loop was blocked (ticks={ticks})"
+    print(f"✓ Loop ticked {ticks}x during a 0.5s LLM call")
+
+    agent_dir = os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent')
+    with open(os.path.join(agent_dir, 'requirements.txt')) as f:
+        assert "openai" not in f.read()
+    assert not hasattr(master, "OpenAI")
+    print("✓ openai dropped from requirements; main.py no longer imports it")
+
+
+def run_all_tests():
+    test_success_and_retries()
+    test_timeout_and_concurrency()
+    test_wyckoff_endpoint_does_not_block_loop()
+    print("\n✅ All async LLM client tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
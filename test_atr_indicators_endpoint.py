@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test the lightweight /indicators endpoint and the position manager ATR cache.
+
+Validates:
+1. Technical analyzer computes only the requested fields on one timeframe
+2. Values match the multi-timeframe analysis for the same timeframe
+3. Position manager serves ATR from a TTL cache (no repeated requests)
+4. Position manager falls back from 4h to 15m ATR
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_df(periods=300):
+    rng = np.random.default_rng(3)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    return pd.DataFrame({
+        "ts": [str(1_700_000_000_000 + i * 900_000) for i in range(periods)],
+        "open": close, "high": close * 1.004, "low": close * 0.996, "close": close,
+        "volume": rng.uniform(100, 200, periods),
+    })
+
+
+def test_indicators_endpoint_single_timeframe():
+    """Only the requested timeframe is fetched and only requested fields returned"""
+    print("\n" + "="*80)
+    print("TEST 1: /indicators single timeframe")
+    print("="*80)
+
+    tech_main = load_module_from_path(
+        'tech_main_indicators',
+        os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer', 'main.py')
+    )
+    df = synthetic_df()
+    fetched = []
+
+    def fake_fetch(symbol, interval, limit=200):
+        fetched.append(interval)
+        return df.copy()
+
+    tech_main.analyzer.fetch_ohlcv = fake_fetch
+    resp = tech_main.indicators_endpoint(tech_main.IndicatorsRequest(symbol="BTCUSDT", timeframe="4h", fields=["atr"]))
+
+    assert fetched == ["4h"], f"expected a single 4h fetch, got {fetched}"
+    assert set(resp) == {"symbol", "timeframe", "price", "atr"}
+    print(f"✓ One kline fetch, fields: {sorted(resp)}")
+
+    full = tech_main.analyzer.get_multi_tf_analysis("BTCUSDT")["timeframes"]["4h"]
+    assert resp["atr"] == full["atr"] and resp["price"] == full["price"]
+    print("✓ ATR matches /analyze_multi_tf")
+
+    bad = tech_main.indicators_endpoint(tech_main.IndicatorsRequest(symbol="BTCUSDT", timeframe="3m"))
+    assert bad.get("error")
+    print("✓ Unsupported timeframe returns error")
+
+
+def test_position_manager_atr_cache():
+    """ATR is cached per symbol for ATR_CACHE_TTL_SEC, with 15m fallback"""
+    print("\n" + "="*80)
+    print("TEST 2: Position manager ATR TTL cache")
+    print("="*80)
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager'))
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
+    pm_main = load_module_from_path(
+        'pm_main_atr',
+        os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager', 'main.py')
+    )
+    calls = []
+
+    def fake_fetch_indicators(symbol, timeframe, fields, timeout=5.0):
+        calls.append((symbol, timeframe))
+        if timeframe == "4h" and symbol == "ETHUSDT":
+            return {}
+        return {"atr": 12.5, "price": 2500.0}
+
+    pm_main.fetch_indicators = fake_fetch_indicators
+    pm_main._atr_cache.clear()
+
+    assert pm_main.get_atr_for_symbol("BTC/USDT:USDT") == (12.5, 2500.0)
+    assert pm_main.get_atr_for_symbol("BTCUSDT") == (12.5, 2500.0)
+    assert calls == [("BTCUSDT", "4h")], f"second call should hit cache, got {calls}"
+    print("✓ Second lookup served from cache")
+
+    calls.clear()
+    assert pm_main.get_atr_for_symbol("ETHUSDT") == (12.5, 2500.0)
+    assert calls == [("ETHUSDT", "4h"), ("ETHUSDT", "15m")]
+    print("✓ Falls back to 15m when 4h ATR is missing")
+
+    pm_main._atr_cache["BTCUSDT"] = (0.0, 1.0, 1.0)  # expired entry
+    calls.clear()
+    pm_main.get_atr_for_symbol("BTCUSDT")
+    assert calls == [("BTCUSDT", "4h")]
+    print("✓ Expired entry is refreshed")
+
+
+def run_all_tests():
+    test_indicators_endpoint_single_timeframe()
+    test_position_manager_atr_cache()
+    print("\n✅ All ATR/indicators tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Test suite for the technical analyzer candle store.
+
+Tests:
+- First request seeds the ring buffer with a full kline fetch
+- Later requests only fetch bars from the live bar onwards
+- Live bar is replaced, new bars are appended, capacity is respected
+- Refresh throttling serves repeated requests from memory
+- fetch_ohlcv keeps its DataFrame contract (oldest-first, float columns)
+- Backfilled history persists to disk; a restart only fetches missed bars
+- Multi-TF analysis backfills enough history to warm EMA200
+- An incremental fetch or a disk cache with missing bars triggers a full reseed
+"""
+
+import sys
+import os
+import json
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer'))
+
+from candle_store import CandleStore
+
+MIN = 60_000
+T0 = 1_700_000_000_000 - (1_700_000_000_000 % (15 * MIN))
+
+
+def make_row(ts, close):
+    return [str(ts), str(close), str(close + 1), str(close - 1), str(close), "10", "100"]
+
+
+class FakeExchange:
+    """Serves 15m klines up to `now`, newest-first, recording every request."""
+
+    def __init__(self, n_bars):
+        self.now_ms = T0 + n_bars * 15 * MIN - 1
+        self.calls = []
+
+    def bars(self):
+        out = []
+        ts = T0
+        while ts <= self.now_ms:
+            out.append(make_row(ts, 100 + (ts - T0) // (15 * MIN)))
+            ts += 15 * MIN
+        return out
+
+    def fetch(self, symbol, interval, limit, start=None):
+        self.calls.append({"limit": limit, "start": start})
+        rows = self.bars()
+        if start is not None:
+            rows = [r for r in rows if int(r[0]) >= start]
+        return list(reversed(rows[-limit:]))
+
+    def clock(self):
+        return self.now_ms / 1000.0
+
+
+def test_seed_then_incremental():
+    """Second call only fetches the live bar plus newly opened bars"""
+    print("\n" + "="*80)
+    print("TEST: Seed then incremental refresh")
+    print("="*80)
+
+    ex = FakeExchange(n_bars=300)
+    store = CandleStore(ex.fetch, capacity=500, refresh_seconds=0, clock=ex.clock)
+
+    rows = store.get_rows("BTCUSDT", "15", 200)
+    assert len(rows) == 200
+    assert ex.calls[0] == {"limit": 200, "start": None}
+    assert int(rows[0][0]) < int(rows[-1][0]), "rows must be oldest-first"
+    print("✓ Seeded with one full fetch")
+
+    live_ts = int(rows[-1][0])
+    ex.now_ms += 2 * 15 * MIN  # two new bars opened
+    rows = store.get_rows("BTCUSDT", "15", 200)
+    last_call = ex.calls[-1]
+    assert last_call["start"] == live_ts
+    assert last_call["limit"] <= 5, f"incremental fetch too large: {last_call}"
+    assert int(rows[-1][0]) == live_ts + 2 * 15 * MIN
+    print(f"✓ Incremental fetch requested {last_call['limit']} bars from the live bar")
+
+    expected = ex.bars()[-200:]
+    assert rows == expected, "merged buffer must equal a fresh full fetch"
+    print("✓ Merged buffer matches a fresh full fetch")
+
+
+def test_refresh_throttle_and_capacity():
+    """Calls within refresh window hit memory; buffer never exceeds capacity"""
+    print("\n" + "="*80)
+    print("TEST: Refresh throttle and capacity")
+    print("="*80)
+
+    ex = FakeExchange(n_bars=100)
+    store = CandleStore(ex.fetch, capacity=120, refresh_seconds=30, clock=ex.clock)
+
+    store.get_rows("ETHUSDT", "15", 100)
+    store.get_rows("ETHUSDT", "15", 100)
+    assert len(ex.calls) == 1, "second call inside refresh window must not fetch"
+    print("✓ Throttled refresh served from memory")
+
+    for _ in range(40):
+        ex.now_ms += 15 * MIN
+        store.get_rows("ETHUSDT", "15", 100)
+    assert store.get_stats()["ETHUSDT:15"] == 120
+    print("✓ Ring buffer capped at capacity")
+
+
+def test_fetch_ohlcv_dataframe_contract():
+    """fetch_ohlcv returns oldest-first float OHLCV served from the store"""
+    print("\n" + "="*80)
+    print("TEST: fetch_ohlcv DataFrame contract")
+    print("="*80)
+
+    from indicators import CryptoTechnicalAnalysisBybit
+
+    ex = FakeExchange(n_bars=150)
+    analyzer = CryptoTechnicalAnalysisBybit()
+    analyzer.candle_store = CandleStore(ex.fetch, refresh_seconds=0, clock=ex.clock)
+
+    df = analyzer.fetch_ohlcv("BTC", "15m", limit=100)
+    assert len(df) == 100
+    assert list(df.columns) == ['ts', 'open', 'high', 'low', 'close', 'volume', 'turnover', 'timestamp']
+    assert df['close'].dtype == float
+    assert df['timestamp'].is_monotonic_increasing
+    print("✓ DataFrame columns, dtypes and ordering preserved")
+
+    ex.fetch = lambda *a, **k: None
+    analyzer.candle_store.fetch_fn = ex.fetch
+    ex.now_ms += 15 * MIN
+    df = analyzer.fetch_ohlcv("BTC", "15m", limit=100)
+    assert len(df) == 100, "failed refresh should serve cached bars"
+    print("✓ Failed refresh falls back to cached bars")
+
+
+def test_persisted_backfill_survives_restart():
+    """A new store instance resumes from disk and only fetches missed bars"""
+    print("\n" + "="*80)
+    print("TEST: Persisted backfill survives restart")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ex = FakeExchange(n_bars=1200)
+        store = CandleStore(ex.fetch, capacity=1000, refresh_seconds=0, clock=ex.clock, cache_dir=cache_dir)
+        store.get_rows("BTCUSDT", "15", 1000)
+        assert ex.calls[-1] == {"limit": 1000, "start": None}
+        assert os.path.exists(os.path.join(cache_dir, "BTCUSDT_15.json"))
+        print("✓ Backfill written to disk")
+
+        ex.now_ms += 3 * 15 * MIN
+        ex.calls.clear()
+        restarted = CandleStore(ex.fetch, capacity=1000, refresh_seconds=0, clock=ex.clock, cache_dir=cache_dir)
+        rows = restarted.get_rows("BTCUSDT", "15", 1000)
+        assert len(ex.calls) == 1 and ex.calls[0]["start"] is not None, f"expected one incremental fetch, got {ex.calls}"
+        assert ex.calls[0]["limit"] <= 5
+        assert rows == ex.bars()[-1000:]
+        print(f"✓ Restart fetched only {ex.calls[0]['limit']} bars")
+
+
+def test_multi_tf_warms_ema200():
+    """Indicator timeframes request enough history for a warmed EMA200"""
+    print("\n" + "="*80)
+    print("TEST: EMA200 warm-up")
+    print("="*80)
+
+    from indicators import CryptoTechnicalAnalysisBybit, INDICATOR_HISTORY_BARS
+
+    ex = FakeExchange(n_bars=1500)
+    analyzer = CryptoTechnicalAnalysisBybit()
+    analyzer.candle_store = CandleStore(ex.fetch, refresh_seconds=0, clock=ex.clock, cache_dir=None)
+    result = analyzer.get_multi_tf_analysis("BTC")
+
+    assert INDICATOR_HISTORY_BARS >= 600
+    ema_200 = result["timeframes"]["15m"]["ema_200"]
+    assert ema_200 == ema_200, "ema_200 must not be NaN"
+    print(f"✓ ema_200 warmed on {INDICATOR_HISTORY_BARS} bars: {ema_200}")
+
+
+def test_gapped_rows_reseed():
+    """Bars that do not continue from the last stored one are never merged"""
+    print("\n" + "="*80)
+    print("TEST: Gapped refresh reseeds")
+    print("="*80)
+
+    class GappyExchange(FakeExchange):
+        """Incremental requests lose bars 3..5 after the live one, full fetches are complete"""
+
+        def fetch(self, symbol, interval, limit, start=None):
+            rows = super().fetch(symbol, interval, limit, start)
+            if start is not None:
+                rows = [r for r in rows if not start < int(r[0]) < start + 4 * 15 * MIN]
+            return rows
+
+    ex = GappyExchange(n_bars=100)
+    store = CandleStore(ex.fetch, capacity=200, refresh_seconds=0, clock=ex.clock, cache_dir=None)
+    store.get_rows("BTCUSDT", "15", 100)
+    ex.now_ms += 8 * 15 * MIN
+    ex.calls.clear()
+    rows = store.get_rows("BTCUSDT", "15", 100)
+    assert [c["start"] is None for c in ex.calls] == [False, True], ex.calls
+    assert rows == ex.bars()[-100:]
+    print("✓ Incremental fetch with missing bars discarded, full reseed served contiguous bars")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        ex = FakeExchange(n_bars=50)
+        bars = ex.bars()
+        with open(os.path.join(cache_dir, "BTCUSDT_15.json"), "w") as f:
+            json.dump({"rows": bars[:20] + bars[30:], "exhausted": True}, f)
+        ex.calls.clear()
+        restarted = CandleStore(ex.fetch, capacity=1000, refresh_seconds=0, clock=ex.clock, cache_dir=cache_dir)
+        assert restarted.get_rows("BTCUSDT", "15", 50) == bars
+        assert ex.calls == [{"limit": 50, "start": None}]
+    print("✓ Disk cache persisted with a gap is ignored and reseeded")
+
+
+def run_all_tests():
+    test_seed_then_incremental()
+    test_refresh_throttle_and_capacity()
+    test_fetch_ohlcv_dataframe_contract()
+    test_persisted_backfill_survives_restart()
+    test_multi_tf_warms_ema200()
+    test_gapped_rows_reseed()
+    print("\n✅ All candle store tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
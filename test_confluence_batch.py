@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test vectorized batch confluence scoring (agents/orchestrator/confluence.py).
+
+Validates:
+1. Batch scores equal calculate_confluence_both for random payloads
+2. Missing / malformed / NaN fields behave like the per-symbol function
+3. One batch pass over 200 symbols is faster than the per-symbol loop
+4. Orchestrator scan scores all fetched symbols with the batch API
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'orchestrator'))
+
+from confluence import (build_confluence_columns, calculate_confluence_both,
+                        calculate_confluence_both_batch, confluence_row)
+
+FIB_NAMES = ("0.0", "0.236", "0.382", "0.5", "0.618", "0.786", "1.0")
+
+
+def random_payload(rng: random.Random):
+    """Realistic /analyze_multi_tf_full + /analyze_fib pair around a random price"""
+    price = rng.choice([0.00001234, 0.52, 3.1, 140.0, 2650.0, 97000.0]) * rng.uniform(0.9, 1.1)
+    atr = price * rng.uniform(0.001, 0.02)
+
+    def near(scale):
+        return round(price + rng.uniform(-scale, scale) * atr, 8)
+
+    def trend():
+        return rng.choice(["BULLISH", "BEARISH", "bullish", "NEUTRAL", None])
+
+    tech = {
+        "timeframes": {
+            "15m": {"price": price, "trend": trend(), "ema_20": near(3), "ema_50": near(6), "atr": atr,
+                    "macd": rng.choice(["POSITIVE", "NEGATIVE", None]),
+                    "macd_momentum": rng.choice(["RISING", "FALLING", None]),
+                    "volume_spike_15m": rng.choice([None, 0, round(rng.uniform(0, 3), 2)]),
+                    "volume_zscore": rng.choice([None, round(rng.uniform(-2, 3), 2)])},
+            "1h": {"trend": trend(), "rsi": rng.choice([None, round(rng.uniform(10, 90), 2)]),
+                   "adx": rng.choice([None, 0, round(rng.uniform(5, 50), 2)]),
+                   "volume_zscore": rng.choice([None, round(rng.uniform(-2, 3), 2)])},
+            "4h": {"trend": trend(), "adx": rng.choice([None, round(rng.uniform(5, 50), 2)])},
+            "1d": {"trend": trend()},
+        },
+        "summary": {"volume_spike_5m": rng.choice([None, 0, round(rng.uniform(0, 3), 2)])},
+    }
+    fib = {"fib_levels": {name: round(price * (1 + rng.uniform(-0.008, 0.008)), 8)
+                          for name in FIB_NAMES if rng.random() < 0.8}}
+    return tech, fib
+
+
+def assert_batch_matches(techs, fibs):
+    long_b, short_b = calculate_confluence_both_batch(build_confluence_columns(techs, fibs))
+    for i, (tech, fib) in enumerate(zip(techs, fibs)):
+        long_ref, short_ref = calculate_confluence_both(tech, fib)
+        assert confluence_row(long_b, i, "long") == long_ref, (i, confluence_row(long_b, i, "long"), long_ref)
+        assert confluence_row(short_b, i, "short") == short_ref, (i, confluence_row(short_b, i, "short"), short_ref)
+
+
+def test_random_parity():
+    """Batch == per-symbol on random payloads"""
+    print("\n" + "="*80)
+    print("TEST 1: Parity with calculate_confluence_both")
+    print("="*80)
+
+    rng = random.Random(7)
+    pairs = [random_payload(rng) for _ in range(5000)]
+    assert_batch_matches([t for t, _ in pairs], [f for _, f in pairs])
+    print("✓ 5000 random symbols: all 5 dimensions and totals identical in both directions")
+
+
+def test_edge_cases():
+    """Missing, malformed and NaN inputs"""
+    print("\n" + "="*80)
+    print("TEST 2: Edge cases")
+    print("="*80)
+
+    rng = random.Random(3)
+    base_tech, base_fib = random_payload(rng)
+    nan = float("nan")
+    techs = [
+        {"timeframes": {}},
+        {"timeframes": {"15m": {"price": "123.5", "atr": "1.2", "ema_20": "123.0"}}},
+        {"timeframes": {**base_tech["timeframes"], "1h": {"adx": nan, "trend": "BULLISH", "rsi": nan}}},
+        {"timeframes": {**base_tech["timeframes"],
+                        "15m": {**base_tech["timeframes"]["15m"], "price": nan}}},
+        {"timeframes": {**base_tech["timeframes"],
+                        "15m": {**base_tech["timeframes"]["15m"], "atr": nan, "volume_spike_15m": nan}}},
+        {"timeframes": {**base_tech["timeframes"], "5m": {"volume_spike_5m": 1.7}}, "summary": {}},
+        base_tech,
+    ]
+    fibs = [None, {}, base_fib, base_fib, {"fib_levels": {"0.5": nan, "custom": 1.0}}, {"fib_levels": None},
+            {"fib_levels": {"0.618": "bad", **base_fib["fib_levels"]}}]
+    assert_batch_matches(techs, fibs)
+    print(f"✓ {len(techs)} malformed payloads (empty, strings, NaN, unknown fib names) identical")
+
+    assert_batch_matches([], [])
+    print("✓ Empty batch")
+
+
+def test_batch_speed():
+    """200 symbols: batch vs per-symbol loop"""
+    print("\n" + "="*80)
+    print("TEST 3: Speed")
+    print("="*80)
+
+    rng = random.Random(11)
+    pairs = [random_payload(rng) for _ in range(200)]
+    techs, fibs = [t for t, _ in pairs], [f for _, f in pairs]
+
+    start = time.perf_counter()
+    for _ in range(20):
+        for tech, fib in pairs:
+            calculate_confluence_both(tech, fib)
+    scalar = (time.perf_counter() - start) / 20
+
+    columns = build_confluence_columns(techs, fibs)
+    start = time.perf_counter()
+    for _ in range(20):
+        calculate_confluence_both_batch(columns)
+    batch = (time.perf_counter() - start) / 20
+
+    print(f"✓ 200 symbols: per-symbol {scalar * 1000:.2f}ms, batch scoring {batch * 1000:.2f}ms")
+    assert batch < scalar, "batch scoring should beat the per-symbol loop"
+
+
+def test_orchestrator_uses_batch():
+    """Scan collects payloads and scores them in one pass"""
+    print("\n" + "="*80)
+    print("TEST 4: Orchestrator integration")
+    print("="*80)
+
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'main.py')) as f:
+        code = f.read()
+    assert "calculate_confluence_both_batch(columns)" in code
+    assert "calculate_confluence_both(" not in code
+    print("✓ Orchestrator scan uses calculate_confluence_both_batch")
+
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'requirements.txt')) as f:
+        assert "numpy" in f.read()
+    print("✓ numpy in orchestrator requirements")
+
+
+def run_all_tests():
+    test_random_parity()
+    test_edge_cases()
+    test_batch_speed()
+    test_orchestrator_uses_batch()
+    print("\n✅ All batch confluence tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
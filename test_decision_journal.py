@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Test the append-only AI decision journal (agents/shared/decision_journal.py).
+
+Validates:
+1. Appends, tail and time-range reads
+2. Segment rotation with bounded retention
+3. Incremental read_since cursor (dashboard) across rotations and torn writes
+4. Concurrent appends from several processes never lose or corrupt events
+5. Single source (no copies, images ship agents/shared); Master AI and dashboard use the journal
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'shared'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+from decision_journal import DecisionJournal
+from test_trading_state_persistence import check_shared_wiring
+
+
+
+def test_append_tail_and_range():
+    """Events come back in order; tail and range filter work"""
+    print("\n" + "="*80)
+    print("TEST 1: Append / tail / range")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        j = DecisionJournal(d)
+        assert j.tail(10) == [] and j.read_since(None)[0] == []
+        for i in range(5):
+            j.append({"i": i, "timestamp": f"2026-01-0{i + 1}T00:00:00"})
+        j.append({"i": 5})  # timestamp added automatically
+
+        assert [e["i"] for e in j.tail(3)] == [3, 4, 5]
+        assert "timestamp" in j.tail(1)[0]
+        assert [e["i"] for e in j.read_range("2026-01-02", "2026-01-04")] == [1, 2]
+        print("✓ tail(3) and read_range return the expected events")
+
+
+def test_rotation_and_retention():
+    """Segments rotate at the size limit and only the newest N are kept"""
+    print("\n" + "="*80)
+    print("TEST 2: Rotation and retention")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        j = DecisionJournal(d, segment_max_bytes=200, retain_segments=3)
+        for i in range(60):
+            j.append({"i": i, "pad": "x" * 40})
+        segs = j.segments()
+        assert len(segs) == 3 and segs[-1] > 3, segs
+        events, _ = j.read_since(None)
+        assert events[-1]["i"] == 59 and events[0]["i"] > 0
+        assert [e["i"] for e in events] == list(range(events[0]["i"], 60))
+        assert [e["i"] for e in j.tail(5)] == list(range(55, 60))
+        print(f"✓ {len(segs)} segments kept ({segs[0]}..{segs[-1]}), {len(events)} events contiguous")
+
+
+def test_incremental_cursor():
+    """read_since returns only new events, survives rotation and skips torn lines"""
+    print("\n" + "="*80)
+    print("TEST 3: Incremental cursor")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        j = DecisionJournal(d, segment_max_bytes=300, retain_segments=10)
+        j.append({"i": 0})
+        events, cursor = j.read_since(None)
+        assert [e["i"] for e in events] == [0]
+
+        for i in range(1, 20):
+            j.append({"i": i, "pad": "y" * 30})
+        events, cursor = j.read_since(cursor)
+        assert [e["i"] for e in events] == list(range(1, 20)) and len(j.segments()) > 1
+        print("✓ New events read across segment rotation")
+
+        # A writer crashed mid-line: the partial line is not consumed...
+        active = j._segment_path(j.segments()[-1])
+        with open(active, "ab") as f:
+            f.write(b'{"i": 20, "par')
+        events, cursor2 = j.read_since(cursor)
+        assert events == [] and cursor2 == cursor
+        # ...the next append seals it onto its own line, which readers skip
+        j.append({"i": 21})
+        events, _ = j.read_since(cursor2)
+        assert [e["i"] for e in events] == [21]
+        assert j.tail(1)[0]["i"] == 21
+        print("✓ Torn write is skipped, later events still readable")
+
+
+def _writer(directory, worker, count):
+    j = DecisionJournal(directory, segment_max_bytes=4000, retain_segments=1000)
+    for i in range(count):
+        j.append({"worker": worker, "i": i, "rationale": "r" * 50})
+
+
+def test_concurrent_process_appends():
+    """Several processes (containers) append concurrently without loss"""
+    print("\n" + "="*80)
+    print("TEST 4: Concurrent process appends")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=_writer, args=(d, w, 150)) for w in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=60)
+        events, _ = DecisionJournal(d).read_since(None)
+        assert len(events) == 600, len(events)
+        for w in range(4):
+            assert [e["i"] for e in events if e["worker"] == w] == list(range(150))
+        print(f"✓ 600 events from 4 processes, {len(DecisionJournal(d).segments())} segments, none lost")
+
+
+def test_single_source_and_integrations():
+    """No per-container copies; Master AI and dashboard go through the journal"""
+    print("\n" + "="*80)
+    print("TEST 5: Single source and integrations")
+    print("="*80)
+
+    importers = {"orchestrator": "agents/orchestrator/main.py",
+                 "04_master_ai_agent": "agents/04_master_ai_agent/main.py",
+                 "07_position_manager": "agents/07_position_manager/main.py",
+                 "dashboard": "dashboard/utils/data_manager.py"}
+    check_shared_wiring("decision_journal", importers)
+    print(f"✓ Only agents/shared/decision_journal.py; {len(importers)} images copy it in as shared/")
+
+    with tempfile.TemporaryDirectory() as d:
+        os.environ["AI_DECISIONS_JOURNAL_DIR"] = d
+        try:
+            sys.path.insert(0, os.path.join(ROOT, 'agents', '04_master_ai_agent'))
+            master = load_module_from_path(
+                'master_ai_journal', os.path.join(ROOT, 'agents', '04_master_ai_agent', 'main.py'))
+            master.save_ai_decision({"source": "wyckoff_analysis", "symbol": "BTCUSDT", "direction": "LONG"})
+
+            sys.path.insert(0, os.path.join(ROOT, 'dashboard'))
+            dm = load_module_from_path('dashboard_data_manager', os.path.join(ROOT, 'dashboard', 'utils', 'data_manager.py'))
+            first = dm.get_ai_decisions()
+            assert [e["symbol"] for e in first] == ["BTCUSDT"]
+            dm.add_ai_decision({"symbol": "ETHUSDT", "action": "HOLD"})
+            assert [e["symbol"] for e in dm.get_ai_decisions()] == ["BTCUSDT", "ETHUSDT"]
+            print("✓ Master AI writes and the dashboard reads incrementally")
+        finally:
+            del os.environ["AI_DECISIONS_JOURNAL_DIR"]
+
+
+def run_all_tests():
+    test_append_tail_and_range()
+    test_rotation_and_retention()
+    test_incremental_cursor()
+    test_concurrent_process_appends()
+    test_single_source_and_integrations()
+    print("\n✅ All decision journal tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -14,6 +14,7 @@ os.environ['DEEPSEEK_API_KEY'] = 'dummy_key_for_testing'
 
 # Add agents directory to path
 sys.path.insert(0, str(Path(__file__).parent / 'agents' / '04_master_ai_agent'))
+sys.path.insert(0, str(Path(__file__).parent / 'agents'))
 
 from main import normalize_blocker_value, normalize_blocker_list, Decision
 
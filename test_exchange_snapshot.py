@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test the position manager per-tick exchange snapshot.
+
+Validates:
+1. One monitor tick fetches positions/balance/open orders once for all checks
+2. Read endpoints reuse a snapshot within EXCHANGE_SNAPSHOT_TTL_SEC
+3. max_age=0 and invalidate_exchange_snapshot() force a refresh
+4. Open LIMIT entry orders can be looked up in the snapshot by orderLinkId
+"""
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeExchange:
+    """Counts every private call the snapshot makes"""
+
+    def __init__(self, open_orders=None):
+        self.calls = Counter()
+        self.open_orders = open_orders or []
+
+    def fetch_positions(self, symbols=None, params=None):
+        self.calls["fetch_positions"] += 1
+        return [{
+            "symbol": "BTC/USDT:USDT", "side": "long", "contracts": 0.01,
+            "entryPrice": 60000.0, "markPrice": 60100.0, "leverage": 5,
+            "unrealizedPnl": 1.0, "info": {"positionIdx": 0},
+        }]
+
+    def fetch_balance(self, params=None):
+        self.calls["fetch_balance"] += 1
+        return {"USDT": {"total": 1000.0, "free": 900.0}, "info": {}}
+
+    def private_get_v5_order_realtime(self, params=None):
+        self.calls["order_realtime"] += 1
+        return {"retCode": 0, "result": {"list": list(self.open_orders)}}
+
+
+def load_pm():
+    return load_module_from_path(
+        'pm_main_snapshot',
+        os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager', 'main.py')
+    )
+
+
+def test_snapshot_shared_and_ttl():
+    """One fetch per tick, reused by endpoints within the TTL"""
+    print("\n" + "="*80)
+    print("TEST 1: Snapshot fetch count and TTL")
+    print("="*80)
+
+    pm_main = load_pm()
+    fake = FakeExchange()
+    pm_main.exchange = fake
+    pm_main.invalidate_exchange_snapshot()
+
+    snap = pm_main.get_exchange_snapshot(max_age=0)
+    assert snap is not None and len(snap.positions_for("BTCUSDT")) == 1
+    assert fake.calls == Counter(fetch_positions=1, fetch_balance=1, order_realtime=1)
+    print("✓ Snapshot fetched positions, balance and open orders once")
+
+    again = pm_main.get_exchange_snapshot()
+    assert again is snap and fake.calls["fetch_positions"] == 1
+    print("✓ Second lookup within TTL served from snapshot")
+
+    pm_main.get_exchange_snapshot(max_age=0)
+    assert fake.calls["fetch_positions"] == 2
+    pm_main.invalidate_exchange_snapshot()
+    pm_main.get_exchange_snapshot()
+    assert fake.calls["fetch_positions"] == 3
+    print("✓ max_age=0 and invalidate force a refresh")
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("rate limited")
+
+    fake.fetch_positions = broken
+    assert pm_main.get_exchange_snapshot(max_age=0) is None
+    print("✓ Fetch failure returns None (callers fall back to direct calls)")
+
+
+def test_pending_intent_resolved_from_snapshot():
+    """A still-open LIMIT order is found in the snapshot by its orderLinkId"""
+    print("\n" + "="*80)
+    print("TEST 2: Pending LIMIT intent read from snapshot")
+    print("="*80)
+
+    pm_main = load_pm()
+    fake = FakeExchange(open_orders=[{
+        "orderLinkId": "intent-abc", "orderId": "1", "orderStatus": "New",
+        "symbol": "BTCUSDT", "cumExecQty": "0",
+    }])
+    pm_main.exchange = fake
+    pm_main.invalidate_exchange_snapshot()
+    snap = pm_main.get_exchange_snapshot(max_age=0)
+
+    assert snap.open_order_by_link_id("intent-abc")["orderId"] == "1"
+    assert snap.open_order_by_link_id("missing") is None
+    print("✓ Open order looked up by orderLinkId")
+
+
+def run_all_tests():
+    test_snapshot_shared_and_ttl()
+    test_pending_intent_resolved_from_snapshot()
+    print("\n✅ All exchange snapshot tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -11,6 +11,7 @@ from datetime import datetime
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
 
 # Set required env vars for testing
 os.environ['DEEPSEEK_API_KEY'] = 'test-key-for-testing'
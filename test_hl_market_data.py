@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Test async Hyperliquid market data (agents/orchestrator/hl_market_data.py).
+
+Validates:
+1. Result shape and values (order book, funding, OI, mark price)
+2. metaAndAssetCtxs / allMids fetched once per TTL, shared across coins and callers
+3. Batched coins fetch their L2 books concurrently without blocking the event loop
+4. Per-coin and universe failures degrade to neutral values
+5. Orchestrator uses the async fetch
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'orchestrator'))
+
+import hyperliquid.info
+
+
+class FakeInfo:
+    """SDK Info stand-in: blocking calls with a fixed latency, call counters"""
+
+    latency = 0.05
+    coins = [f"C{i}" for i in range(200)] + ["BTC", "ETH"]
+
+    def __init__(self, *args, **kwargs):
+        self.calls = {"l2_snapshot": 0, "meta_and_asset_ctxs": 0, "all_mids": 0}
+        self.fail_coins = set()
+        self.fail_meta = False
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] += 1
+        time.sleep(self.latency)
+
+    def l2_snapshot(self, coin):
+        self._count("l2_snapshot")
+        if coin in self.fail_coins:
+            raise ConnectionError(f"{coin} book unavailable")
+        bids = [{"px": str(100 - i), "sz": "2.0", "n": 1} for i in range(25)]
+        asks = [{"px": str(101 + i), "sz": "1.0", "n": 1} for i in range(25)]
+        return {"coin": coin, "levels": [bids, asks]}
+
+    def meta_and_asset_ctxs(self):
+        self._count("meta_and_asset_ctxs")
+        if self.fail_meta:
+            raise ConnectionError("meta unavailable")
+        universe = [{"name": c} for c in self.coins]
+        ctxs = [{"funding": str(0.0001 * i), "openInterest": str(1000 + i)} for i in range(len(self.coins))]
+        return [{"universe": universe}, ctxs]
+
+    def all_mids(self):
+        self._count("all_mids")
+        return {c: str(10 + i) for i, c in enumerate(self.coins)}
+
+    def meta(self):
+        return {"universe": [{"name": c} for c in self.coins]}
+
+
+# The real SDK contacts the API on construction; the tests swap in the fake
+hyperliquid.info.Info = FakeInfo
+import hl_market_data as hl
+
+
+def reset(ttl=10.0):
+    hl.info = FakeInfo()
+    hl.HL_AVAILABLE = True
+    hl._universe_ctx = hl._UniverseContext(ttl)
+    return hl.info
+
+
+def test_result_shape():
+    """Same payload as the synchronous version"""
+    print("\n" + "="*80)
+    print("TEST 1: Result shape")
+    print("="*80)
+
+    reset()
+    data = asyncio.run(hl.get_wyckoff_data("ETHUSDT"))
+    assert data["order_book"]["bid_depth"] == 40.0 and data["order_book"]["ask_depth"] == 20.0
+    assert data["order_book"]["imbalance"] == round(40 / 60, 4) and len(data["order_book"]["bids"]) == 10
+    assert data["funding_rate"] == 0.0001 * 201 and data["open_interest"] == 1201.0
+    assert data["mark_price"] == 211.0
+    print("✓ Top-20 depth, top-10 levels, funding / OI / mid of the right coin (last in a 202-coin universe)")
+
+    hl.HL_AVAILABLE = False
+    assert asyncio.run(hl.get_wyckoff_data("ETHUSDT")) == hl._empty_result()
+    print("✓ Neutral result without the SDK")
+
+
+def test_shared_universe_cache():
+    """Universe-wide calls once per TTL"""
+    print("\n" + "="*80)
+    print("TEST 2: Shared meta / mids cache")
+    print("="*80)
+
+    fake = reset(ttl=0.5)
+
+    async def cycle():
+        await asyncio.gather(hl.get_wyckoff_data("BTCUSDT"), hl.get_wyckoff_data("ETHUSDT"),
+                             hl.get_wyckoff_data_batch(["C1USDT", "C2USDT"]))
+        await hl.get_wyckoff_data("C3USDT")
+
+    asyncio.run(cycle())
+    assert fake.calls["meta_and_asset_ctxs"] == 1 and fake.calls["all_mids"] == 1
+    assert fake.calls["l2_snapshot"] == 5
+    print("✓ 5 coins from 3 concurrent callers + 1 later call: 1 meta, 1 mids, 5 books")
+
+    time.sleep(0.6)
+    asyncio.run(hl.get_wyckoff_data("BTCUSDT"))
+    assert fake.calls["meta_and_asset_ctxs"] == 2
+    print("✓ Refreshed after the TTL (new event loop handled)")
+
+
+def test_batch_concurrency():
+    """L2 books fetched in parallel, loop stays responsive"""
+    print("\n" + "="*80)
+    print("TEST 3: Batched fetch")
+    print("="*80)
+
+    reset()
+    symbols = [f"C{i}USDT" for i in range(8)]
+    ticks = []
+
+    async def heartbeat(stop):
+        while not stop.is_set():
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.005)
+
+    async def run():
+        stop = asyncio.Event()
+        beat = asyncio.create_task(heartbeat(stop))
+        start = time.perf_counter()
+        result = await hl.get_wyckoff_data_batch(symbols)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await beat
+        return result, elapsed
+
+    result, elapsed = asyncio.run(run())
+    assert list(result) == symbols and result["C7USDT"]["mark_price"] == 17.0
+    sequential = (len(symbols) + 2) * FakeInfo.latency
+    assert elapsed < sequential / 2, (elapsed, sequential)
+    assert len(ticks) >= 5, "event loop blocked during the fetch"
+    print(f"✓ 8 coins in {elapsed * 1000:.0f}ms (sequential {sequential * 1000:.0f}ms), "
+          f"{len(ticks)} heartbeats during the fetch")
+
+
+def test_failures():
+    """Failures stay local"""
+    print("\n" + "="*80)
+    print("TEST 4: Failures")
+    print("="*80)
+
+    fake = reset()
+    fake.fail_coins = {"C1"}
+    result = asyncio.run(hl.get_wyckoff_data_batch(["C0USDT", "C1USDT"]))
+    assert result["C1USDT"] == hl._empty_result() and result["C0USDT"]["order_book"]["bids"]
+    print("✓ One failing book only empties that coin")
+
+    fake = reset()
+    fake.fail_meta = True
+    data = asyncio.run(hl.get_wyckoff_data("BTCUSDT"))
+    assert data["order_book"]["bid_depth"] == 40.0 and data["funding_rate"] == 0.0 and data["mark_price"] == 0.0
+    print("✓ Universe failure keeps the order book, zeros for funding / OI / mid")
+
+
+def test_orchestrator_awaits():
+    """analysis_cycle uses the async fetch"""
+    print("\n" + "="*80)
+    print("TEST 5: Orchestrator wiring")
+    print("="*80)
+
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'main.py')) as f:
+        code = f.read()
+    assert "get_wyckoff_data_batch" in code and " = get_wyckoff_data(" not in code
+    print("✓ Orchestrator uses the async batch fetch")
+
+
+def run_all_tests():
+    test_result_shape()
+    test_shared_universe_cache()
+    test_batch_concurrency()
+    test_failures()
+    test_orchestrator_awaits()
+    print("\n✅ All Hyperliquid market data tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Parity tests for the incremental indicator engine (technical analyzer).
+
+Validates:
+1. EMA/MACD/RSI/ATR/ADX match the `ta` based calculate_* methods bar by bar
+2. Live-candle ticks (same timestamp) do not corrupt the committed state
+3. IndicatorEngine.sync only feeds new bars and rebuilds on gaps
+4. get_multi_tf_analysis output is unchanged versus the full `ta` recomputation
+5. reseed_on_evict keeps exact parity with `ta` on the frame once the seed bar is evicted
+6. Per-key locks: a slow sync of one symbol does not block another
+"""
+
+import sys
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer'))
+
+from indicators import CryptoTechnicalAnalysisBybit
+from incremental import IncrementalIndicators, IndicatorEngine
+
+MIN15 = 15 * 60_000
+
+
+def create_ohlcv(periods: int = 300, seed: int = 7) -> pd.DataFrame:
+    """Random-walk OHLCV with Bybit-style ts column"""
+    rng = np.random.default_rng(seed)
+    close = 50000.0 * np.exp(np.cumsum(rng.normal(0, 0.01, periods)))
+    high = close * (1 + np.abs(rng.normal(0, 0.005, periods)))
+    low = close * (1 - np.abs(rng.normal(0, 0.005, periods)))
+    return pd.DataFrame({
+        "ts": [str(1_700_000_000_000 + i * MIN15) for i in range(periods)],
+        "open": close, "high": high, "low": low, "close": close,
+        "volume": rng.uniform(100, 200, periods),
+    })
+
+
+def ta_reference(df: pd.DataFrame) -> dict:
+    analyzer = CryptoTechnicalAnalysisBybit()
+    macd_line, macd_sig, macd_hist = analyzer.calculate_macd(df["close"])
+    return {
+        "ema_20": analyzer.calculate_ema(df["close"], 20),
+        "ema_50": analyzer.calculate_ema(df["close"], 50),
+        "ema_200": analyzer.calculate_ema(df["close"], 200),
+        "macd_line": macd_line,
+        "macd_signal": macd_sig,
+        "macd_hist": macd_hist,
+        "rsi_14": analyzer.calculate_rsi(df["close"], 14),
+        "atr_14": analyzer.calculate_atr(df["high"], df["low"], df["close"], 14),
+        "adx_14": analyzer.calculate_adx(df["high"], df["low"], df["close"], 14),
+    }
+
+
+def assert_close(name, got, expected, idx):
+    if np.isnan(expected):
+        assert np.isnan(got), f"{name}[{idx}]: expected NaN, got {got}"
+    else:
+        assert np.isclose(got, expected, rtol=1e-9, atol=1e-9), f"{name}[{idx}]: {got} != {expected}"
+
+
+def test_parity_with_ta_bar_by_bar():
+    """Every bar (including warm-up) matches ta, with intra-bar ticks in between"""
+    print("\n" + "="*80)
+    print("TEST 1: Bar-by-bar parity with ta")
+    print("="*80)
+
+    df = create_ohlcv(300)
+    ref = ta_reference(df)
+    engine = IncrementalIndicators()
+
+    for i in range(len(df)):
+        row = df.iloc[i]
+        # Live candle ticks before it settles on its final values
+        engine.update(i, row["high"] * 0.999, row["low"] * 1.001, row["close"] * 1.0005)
+        values = engine.update(i, row["high"], row["low"], row["close"])
+        for name, series in ref.items():
+            assert_close(name, values[name], series.iloc[i], i)
+
+    print(f"✓ {len(ref)} indicators match ta on all {len(df)} bars")
+
+
+def test_engine_sync_incremental_and_gap():
+    """sync() appends only new bars and rebuilds when history no longer overlaps"""
+    print("\n" + "="*80)
+    print("TEST 2: IndicatorEngine.sync incremental + gap rebuild")
+    print("="*80)
+
+    full = create_ohlcv(260)
+    engine = IndicatorEngine()
+
+    engine.sync("BTCUSDT", "15m", full.iloc[:250].reset_index(drop=True))
+    series = engine._series[("BTCUSDT", "15m")]
+    fed = []
+    original_update = series.update
+    series.update = lambda *a: (fed.append(a[0]), original_update(*a))[1]
+
+    values = engine.sync("BTCUSDT", "15m", full.iloc[10:255].reset_index(drop=True))
+    assert len(fed) == 6, f"expected live bar + 5 new bars, fed {len(fed)}"
+    ref = ta_reference(full.iloc[:255])
+    for name in ("ema_200", "macd_signal", "rsi_14", "atr_14", "adx_14"):
+        assert_close(name, values[name], ref[name].iloc[-1], 254)
+    print("✓ Sliding window fed only 6 bars and matches ta over the full history")
+
+    values = engine.sync("BTCUSDT", "15m", full.iloc[258:].reset_index(drop=True))
+    assert np.isnan(values["ema_20"]), "gap must rebuild from the (short) new frame"
+    print("✓ Gap in history triggers a rebuild")
+
+
+def test_multi_tf_analysis_unchanged():
+    """get_multi_tf_analysis returns the same numbers as the full ta recomputation"""
+    print("\n" + "="*80)
+    print("TEST 3: get_multi_tf_analysis parity")
+    print("="*80)
+
+    df = create_ohlcv(100)
+    analyzer = CryptoTechnicalAnalysisBybit()
+    analyzer.fetch_ohlcv = lambda symbol, interval, limit=200: df.copy()
+    result = analyzer.get_multi_tf_analysis("BTCUSDT")
+
+    ref = ta_reference(df)
+    tf = result["timeframes"]["15m"]
+    assert tf["rsi"] == round(float(ref["rsi_14"].iloc[-1]), 2)
+    assert tf["ema_50"] == round(float(ref["ema_50"].iloc[-1]), 2)
+    assert tf["atr"] == round(float(ref["atr_14"].iloc[-1]), 4)
+    assert tf["adx"] == round(float(ref["adx_14"].iloc[-1]), 2)
+    expected_momentum = "RISING" if ref["macd_hist"].iloc[-1] > ref["macd_hist"].iloc[-3] else "FALLING"
+    assert tf["macd_momentum"] == expected_momentum
+    print("✓ Multi-TF output matches ta values")
+
+
+def test_reseed_on_evict():
+    """Buffer wrap: default carries history, reseed_on_evict matches ta on the frame"""
+    print("\n" + "="*80)
+    print("TEST 4: Re-seed on eviction")
+    print("="*80)
+
+    full = create_ohlcv(460)
+    carried, reseeded = IndicatorEngine(), IndicatorEngine(reseed_on_evict=True)
+    for engine in (carried, reseeded):
+        engine.sync("BTCUSDT", "15m", full.iloc[:250].reset_index(drop=True))
+    frame = full.iloc[210:460].reset_index(drop=True)  # 250-bar ring buffer after 210 evictions
+    frame_ref = ta_reference(frame)
+
+    values = reseeded.sync("BTCUSDT", "15m", frame)
+    for name in frame_ref:
+        assert_close(name, values[name], frame_ref[name].iloc[-1], len(frame) - 1)
+    values = reseeded.sync("BTCUSDT", "15m", frame)  # same frame: no rebuild needed
+    assert_close("ema_200", values["ema_200"], frame_ref["ema_200"].iloc[-1], len(frame) - 1)
+
+    drift = carried.sync("BTCUSDT", "15m", frame)["ema_200"] - frame_ref["ema_200"].iloc[-1]
+    assert_close("ema_200", carried._series[("BTCUSDT", "15m")].values["ema_200"],
+                 ta_reference(full)["ema_200"].iloc[-1], len(full) - 1)
+    assert drift != 0
+    print(f"✓ reseed_on_evict matches ta on the 250-bar frame; default keeps the full history "
+          f"(EMA200 {drift:+.2f} vs ta on the frame)")
+
+
+def test_per_key_locks():
+    """Different keys sync in parallel, the same key is serialized"""
+    print("\n" + "="*80)
+    print("TEST 5: Per-key locks")
+    print("="*80)
+
+    df = create_ohlcv(50)
+    engine = IndicatorEngine()
+    engine.sync("SLOWUSDT", "15m", df)
+    slow = engine._series[("SLOWUSDT", "15m")]
+    original_update = slow.update
+
+    def slow_update(*args):
+        time.sleep(0.3)
+        return original_update(*args)
+
+    slow.update = slow_update
+    more = create_ohlcv(51)
+    t = threading.Thread(target=engine.sync, args=("SLOWUSDT", "15m", more))
+    t.start()
+    time.sleep(0.05)
+    start = time.perf_counter()
+    engine.sync("FASTUSDT", "15m", df)
+    elapsed = time.perf_counter() - start
+    t.join()
+    assert elapsed < 0.2, f"FASTUSDT waited {elapsed:.2f}s on SLOWUSDT"
+    assert engine._key_lock(("SLOWUSDT", "15m")) is engine._key_lock(("SLOWUSDT", "15m"))
+    print(f"✓ FASTUSDT synced in {elapsed * 1000:.0f}ms while SLOWUSDT held its own lock")
+
+
+def run_all_tests():
+    test_parity_with_ta_bar_by_bar()
+    test_engine_sync_incremental_and_gap()
+    test_multi_tf_analysis_unchanged()
+    test_reseed_on_evict()
+    test_per_key_locks()
+    print("\n✅ All incremental indicator tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Test the backtest kline history (agents/10_learning_agent/kline_history.py).
+
+Validates:
+1. Paginated backfill: 1000-bar pages walked backwards with `end`, closed bars only, oldest-first load
+2. Incremental backfill: only missing bars are requested, the file is only ever appended to
+3. Torn lines and exchange errors: stored history survives, a failed backfill stops after one request
+4. Minimum span: the warm-up covers the 1d EMA50 and the 200 x 4h Fibonacci swing; the learning agent
+   replays the kline history, masking entries inside the warm-up
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', '10_learning_agent'))
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+
+import backtester as bt
+from kline_history import DAY_MS, PAGE_LIMIT, KlineHistory
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+LISTED_MS = 1_704_067_200_000  # 2024-01-01 00:00 UTC
+
+
+class FakeBybit:
+    """/v5/market/kline stand-in: newest-first string rows, start/end/limit honoured, forming bar included"""
+
+    def __init__(self, listed_ms=LISTED_MS, fail=False):
+        self.listed_ms = listed_ms
+        self.now_ms = listed_ms
+        self.fail = fail
+        self.calls = []
+
+    def bar(self, ts):
+        price = 100.0 + (ts - self.listed_ms) / bt.BAR_MS * 0.01
+        return [str(ts), str(price), str(price + 1), str(price - 1), str(price + 0.5), "10.0", "1000.0"]
+
+    def fetch_page(self, symbol, interval, start_ms, end_ms, limit):
+        self.calls.append((symbol, start_ms, end_ms))
+        if self.fail:
+            return None
+        forming = (self.now_ms // bt.BAR_MS) * bt.BAR_MS
+        end = min(end_ms, forming)
+        start = max(start_ms, self.listed_ms)
+        ts = np.arange(start, end + 1, bt.BAR_MS)[::-1][:limit]
+        return [self.bar(int(t)) for t in ts]
+
+
+def test_paginated_backfill():
+    """First backfill pages backwards"""
+    print("\n" + "="*80)
+    print("TEST 1: Paginated backfill")
+    print("="*80)
+
+    fake = FakeBybit()
+    fake.now_ms = LISTED_MS + 40 * DAY_MS + 7 * 60_000  # 7 minutes into a bar
+    with tempfile.TemporaryDirectory() as d:
+        history = KlineHistory(d, fetch_page=fake.fetch_page)
+        appended = history.backfill("BTCUSDT", days=30, now_ms=fake.now_ms)
+        assert appended == 30 * 96 and len(fake.calls) == 3
+        assert all(end < prev_end for (_, _, end), (_, _, prev_end) in zip(fake.calls[1:], fake.calls))
+        data = history.load()["BTCUSDT"]
+        newest_closed = LISTED_MS + 40 * DAY_MS - bt.BAR_MS
+        assert data["ts"][-1] == newest_closed and data["ts"][0] == LISTED_MS + 10 * DAY_MS
+        assert np.all(np.diff(data["ts"]) == bt.BAR_MS)
+        assert data["close"][-1] == float(fake.bar(newest_closed)[4])
+        assert history.span("BTCUSDT") == (int(data["ts"][0]), newest_closed)
+    print(f"✓ 30 days = {appended} bars in {len(fake.calls)} requests of up to {PAGE_LIMIT}, "
+          "forming bar left out, contiguous and oldest first on load")
+
+
+def test_incremental_backfill():
+    """Only missing ranges are fetched; file is append-only"""
+    print("\n" + "="*80)
+    print("TEST 2: Incremental backfill")
+    print("="*80)
+
+    fake = FakeBybit()
+    fake.now_ms = LISTED_MS + 40 * DAY_MS
+    with tempfile.TemporaryDirectory() as d:
+        history = KlineHistory(d, fetch_page=fake.fetch_page)
+        history.backfill("ETHUSDT", days=20, now_ms=fake.now_ms)
+        with open(history.path("ETHUSDT"), "rb") as f:
+            before = f.read()
+
+        fake.calls.clear()
+        assert history.backfill("ETHUSDT", days=20, now_ms=fake.now_ms) == 0 and fake.calls == []
+        print("✓ Up to date: no request")
+
+        fake.now_ms += 3 * 60 * 60_000
+        assert history.backfill("ETHUSDT", days=20, now_ms=fake.now_ms) == 12 and len(fake.calls) == 1
+        fake.calls.clear()
+        assert history.backfill("ETHUSDT", days=35, now_ms=fake.now_ms) == 15 * 96 - 12
+        assert len(fake.calls) == 2
+        print("✓ 3h later: one request for 12 bars; span 20d -> 35d: only the older bars requested")
+
+        assert history.backfill("ETHUSDT", days=60, now_ms=fake.now_ms) > 0
+        fake.calls.clear()
+        assert history.backfill("ETHUSDT", days=60, now_ms=fake.now_ms) == 0 and len(fake.calls) == 1
+        print("✓ Span before the listing date: stops at the first bar, later backfills probe it once")
+
+        with open(history.path("ETHUSDT"), "rb") as f:
+            after = f.read()
+        assert after.startswith(before)
+        data = KlineHistory(d).load()["ETHUSDT"]
+        assert data["ts"][0] == LISTED_MS and np.all(np.diff(data["ts"]) == bt.BAR_MS)
+    print("✓ Existing bytes never rewritten; reopened store sees one contiguous series")
+
+
+def test_torn_lines_and_errors():
+    """Crash mid-append, exchange down"""
+    print("\n" + "="*80)
+    print("TEST 3: Torn lines and errors")
+    print("="*80)
+
+    fake = FakeBybit()
+    fake.now_ms = LISTED_MS + 5 * DAY_MS
+    with tempfile.TemporaryDirectory() as d:
+        history = KlineHistory(d, fetch_page=fake.fetch_page)
+        history.backfill("SOLUSDT", days=5, now_ms=fake.now_ms)
+        with open(history.path("SOLUSDT"), "a") as f:
+            f.write(f"{fake.now_ms},1.0,2.0")
+        reopened = KlineHistory(d, fetch_page=fake.fetch_page)
+        assert len(reopened.load()["SOLUSDT"]["ts"]) == 5 * 96
+        print("✓ Torn last line skipped on load")
+
+        fake.fail = True
+        fake.now_ms += DAY_MS
+        fake.calls.clear()
+        assert reopened.backfill("SOLUSDT", days=5, now_ms=fake.now_ms) == 0 and len(fake.calls) == 1
+        assert len(reopened.load()["SOLUSDT"]["ts"]) == 5 * 96
+        assert KlineHistory(os.path.join(d, "missing")).load() == {}
+        print("✓ Exchange error: one failed request, stored history untouched; empty store loads as {}")
+
+
+def test_min_span_and_replay():
+    """Warm-up span and the learning agent wiring"""
+    print("\n" + "="*80)
+    print("TEST 4: Minimum span")
+    print("="*80)
+
+    assert bt.WARMUP_MS >= 50 * bt.TF_MS["1d"] and bt.WARMUP_MS >= bt.FIB_SWING_BARS * bt.TF_MS["4h"]
+    print(f"✓ Warm-up {bt.WARMUP_MS / DAY_MS:.0f} days ({bt.WARMUP_BARS} x 15m): "
+          f"1d EMA50 and {bt.FIB_SWING_BARS} x 4h swing ({bt.FIB_SWING_BARS * bt.TF_MS['4h'] / DAY_MS:.1f}d)")
+
+    learning = load_module_from_path(
+        'learning_agent_kline_history', os.path.join(ROOT, 'agents', '10_learning_agent', 'main.py'))
+    fake = FakeBybit(listed_ms=(int(time.time() * 1000) // DAY_MS - 150) * DAY_MS)
+    fake.now_ms = int(time.time() * 1000) + 60 * 60_000  # exchange clock ahead of ours: still closed bars only
+    with tempfile.TemporaryDirectory() as d:
+        learning.CANDLE_CACHE_DIR = os.path.join(d, "candle_cache")
+        learning.KLINE_HISTORY_DIR = os.path.join(d, "kline_history")
+        learning.EVOLVED_PARAMS_FILE = os.path.join(d, "evolved_params.json")
+        learning.BACKTEST_SYMBOLS = ["BTCUSDT", "ETHUSDT"]
+        learning.get_kline_history()._fetch_page = fake.fetch_page
+
+        assert learning.replay_backtest(dict(learning.DEFAULT_PARAMS)) is None
+        appended = learning.backfill_klines()
+        assert appended >= 2 * learning.BACKTEST_MIN_BARS
+        assert {c[0] for c in fake.calls} == {"BTCUSDT", "ETHUSDT"}
+
+        ohlcv = learning.load_backtest_ohlcv()
+        assert sorted(ohlcv) == ["BTCUSDT", "ETHUSDT"]
+        assert all(len(v["ts"]) == learning.BACKTEST_MIN_BARS for v in ohlcv.values())
+        result = learning.replay_backtest(dict(learning.DEFAULT_PARAMS))
+        assert result["method"] == "replay" and result["bars"] == learning.BACKTEST_MIN_BARS
+
+        market = bt.ReplayMarket(ohlcv, warmup_ms=bt.WARMUP_MS)
+        assert not market.available[:, :bt.WARMUP_BARS].any() and market.available[:, bt.WARMUP_BARS:].all()
+        warm = bt.ReplayMarket(ohlcv)
+        assert warm.available[:, :bt.WARMUP_BARS].all()
+        print(f"✓ Learning agent: {appended} bars backfilled for 2 symbols, replay over {result['bars']} bars "
+              f"({result['total_trades']} trades), no entries in the first {bt.WARMUP_BARS} bars")
+
+
+def run_all_tests():
+    test_paginated_backfill()
+    test_incremental_backfill()
+    test_torn_lines_and_errors()
+    test_min_span_and_replay()
+    print("\n✅ All kline history tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -22,7 +22,7 @@ def test_order_intent_model():
     print("TEST: OrderIntent Data Model")
     print("=" * 60)
     
-    sys.path.insert(0, '/home/runner/work/trading-agent-system/trading-agent-system/agents/07_position_manager')
+    sys.path.insert(0, '/home/runner/work/trading-agent-system/trading-agent-system/agents')
     from shared.trading_state import OrderIntent, OrderStatus
     
     # Test MARKET order intent (backward compatibility)
@@ -86,7 +86,7 @@ def test_order_request_model():
     print("=" * 60)
     
     try:
-        sys.path.insert(0, '/home/runner/work/trading-agent-system/trading-agent-system/agents/07_position_manager')
+        sys.path.insert(0, '/home/runner/work/trading-agent-system/trading-agent-system/agents')
         from main import OrderRequest
     except ModuleNotFoundError as e:
         print(f"⚠️ Skipping test due to missing dependencies: {e}")
@@ -153,7 +153,7 @@ def test_trading_state_update():
     print("TEST: TradingState exchange_order_link_id Update")
     print("=" * 60)
     
-    sys.path.insert(0, '/home/runner/work/trading-agent-system/trading-agent-system/agents/07_position_manager')
+    sys.path.insert(0, '/home/runner/work/trading-agent-system/trading-agent-system/agents')
     from shared.trading_state import get_trading_state, OrderIntent, OrderStatus
     
     trading_state = get_trading_state()
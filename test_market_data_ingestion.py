@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Test the market data ingestion service (agents/02_market_data) offline,
+driving it with a recorded/replayed Bybit v5 stream.
+
+Validates:
+1. Kline messages build candles (live bar replaced, new bars appended)
+2. Ticker snapshot + delta are merged
+3. Order book snapshot + delta produce the right top-of-book
+4. /klines returns Bybit REST-compatible rows (plus freshness) and refuses uncovered ranges
+5. MessageRecorder output replays to the same store state
+6. The technical analyzer falls back to REST when the stream's klines are stale
+7. A replay with a dropped stretch of bars never serves the gapped series, to the store's
+   callers or to the analyzer's candle store
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '02_market_data'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+from feeds import MessageRecorder, ReplayFeed
+from market_store import MarketDataStore
+
+MIN15 = 15 * 60_000
+T0 = 1_700_000_100_000 - (1_700_000_100_000 % MIN15)
+
+
+def kline_msg(start, close, confirm):
+    return {
+        "topic": "kline.15.BTCUSDT", "type": "snapshot", "ts": start + 1000,
+        "data": [{"start": start, "end": start + MIN15 - 1, "interval": "15",
+                  "open": "100", "high": str(close + 1), "low": "99", "close": str(close),
+                  "volume": "5", "turnover": "500", "confirm": confirm, "timestamp": start + 1000}],
+    }
+
+
+def recorded_session():
+    msgs = [{"success": True, "op": "subscribe"}]  # ack, must be ignored
+    for i in range(5):
+        start = T0 + i * MIN15
+        msgs.append(kline_msg(start, 100 + i, False))
+        msgs.append(kline_msg(start, 100.5 + i, i < 4))  # last bar still live
+    msgs.append({"topic": "tickers.BTCUSDT", "type": "snapshot", "ts": 1,
+                 "data": {"symbol": "BTCUSDT", "lastPrice": "104.5", "markPrice": "104.4", "fundingRate": "0.0001"}})
+    msgs.append({"topic": "tickers.BTCUSDT", "type": "delta", "ts": 2,
+                 "data": {"symbol": "BTCUSDT", "lastPrice": "104.6"}})
+    msgs.append({"topic": "orderbook.50.BTCUSDT", "type": "snapshot", "ts": 3,
+                 "data": {"s": "BTCUSDT", "b": [["104.4", "1"], ["104.3", "2"]], "a": [["104.6", "1"], ["104.7", "3"]], "u": 1}})
+    msgs.append({"topic": "orderbook.50.BTCUSDT", "type": "delta", "ts": 4,
+                 "data": {"s": "BTCUSDT", "b": [["104.4", "0"]], "a": [["104.5", "0.5"]], "u": 2}})
+    return msgs
+
+
+def write_recording(path, msgs):
+    with open(path, "w") as f:
+        for i, m in enumerate(msgs):
+            f.write(json.dumps({"recv_ts": 1000.0 + i * 0.01, "msg": m}) + "\n")
+
+
+def test_replay_builds_store():
+    """Replayed stream builds candles, ticker and top-of-book"""
+    print("\n" + "="*80)
+    print("TEST 1: Replay feed builds market store")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "session.jsonl")
+        write_recording(path, recorded_session())
+        store = MarketDataStore()
+        delivered = ReplayFeed(path).run(store.apply)
+
+    assert delivered == len(recorded_session())
+    rows, updated_at = store.get_klines("BTCUSDT", "15", limit=5)
+    assert updated_at <= time.time()
+    assert len(rows) == 5 and int(rows[0][0]) == T0 + 4 * MIN15, "rows must be newest-first"
+    assert rows[0][4] == "104.5" and rows[-1][4] == "100.5"
+    print("✓ 5 candles, live bar replaced by latest update")
+
+    ticker = store.get_ticker("BTCUSDT")
+    assert ticker["lastPrice"] == "104.6" and ticker["fundingRate"] == "0.0001"
+    print("✓ Ticker delta merged into snapshot")
+
+    tob = store.get_top_of_book("BTCUSDT")
+    assert tob["bid"] == 104.3 and tob["ask"] == 104.5 and tob["ask_size"] == 0.5
+    print(f"✓ Top of book: {tob['bid']} / {tob['ask']}")
+
+
+def test_klines_endpoint_coverage():
+    """Endpoint serves covered ranges and signals REST fallback otherwise"""
+    print("\n" + "="*80)
+    print("TEST 2: /klines coverage")
+    print("="*80)
+
+    md_main = load_module_from_path(
+        'market_data_main',
+        os.path.join(os.path.dirname(__file__), 'agents', '02_market_data', 'main.py')
+    )
+    for m in recorded_session():
+        md_main.store.apply(m)
+
+    resp = md_main.klines("btcusdt", "15", limit=10, start=T0 + 3 * MIN15)
+    assert resp["retCode"] == 0 and len(resp["result"]["list"]) == 2
+    assert 0 <= resp["result"]["ageMs"] < 5000 and resp["result"]["updatedAt"] > 0
+    print("✓ Incremental range (start=) served from stream, with updatedAt / ageMs")
+
+    assert md_main.klines("BTCUSDT", "15", limit=200)["retCode"] != 0
+    assert md_main.klines("BTCUSDT", "15", limit=5, start=T0 - MIN15)["retCode"] != 0
+    assert md_main.klines("ETHUSDT", "15", limit=5)["retCode"] != 0
+    print("✓ Uncovered requests return non-zero retCode (caller falls back to REST)")
+
+    assert md_main.orderbook("BTCUSDT")["ask"] == 104.5
+    assert md_main.health()["messages"] >= len(recorded_session()) - 1
+
+
+def test_recorder_roundtrip():
+    """Recorded live messages replay to an identical store"""
+    print("\n" + "="*80)
+    print("TEST 3: Recorder round-trip")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "rec.jsonl")
+        live = MarketDataStore()
+        recorder = MessageRecorder(live.apply, path)
+        for m in recorded_session():
+            recorder(m)
+
+        replayed = MarketDataStore()
+        ReplayFeed(path).run(replayed.apply)
+
+    assert replayed.get_klines("BTCUSDT", "15", 5)[0] == live.get_klines("BTCUSDT", "15", 5)[0]
+    assert replayed.get_top_of_book("BTCUSDT")["bid"] == live.get_top_of_book("BTCUSDT")["bid"]
+    print("✓ Replay reproduces the live store state")
+
+
+def test_analyzer_rejects_stale_stream():
+    """Stream-first kline fetch falls back to REST on a stalled feed"""
+    print("\n" + "="*80)
+    print("TEST 4: Stale stream fallback")
+    print("="*80)
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer'))
+    import indicators
+
+    now_ms = int(time.time() * 1000)
+    live_start = now_ms - now_ms % MIN15
+    stream = {}
+
+    class Resp:
+        def __init__(self, body):
+            self.body = body
+
+        def json(self):
+            return self.body
+
+    def fake_get(url, params=None, timeout=None):
+        return Resp({"retCode": 0, "result": {"list": [[str(stream["start"]), "1", "1", "1", "1", "1", "1"]],
+                                              "ageMs": stream["age_ms"]}})
+
+    rest_calls = []
+    analyzer = indicators.CryptoTechnicalAnalysisBybit()
+    analyzer.session.get_kline = lambda **params: (rest_calls.append(params),
+                                                   {"retCode": 0, "result": {"list": [["rest"]]}})[1]
+    real_get, real_url = indicators.requests.get, indicators.MARKET_DATA_URL
+    indicators.requests.get, indicators.MARKET_DATA_URL = fake_get, "http://md"
+    try:
+        stream.update(start=live_start, age_ms=800)
+        assert analyzer._fetch_kline_rows("BTCUSDT", "15", 1)[0][0] == str(live_start) and rest_calls == []
+        print("✓ Current bar, updated 0.8s ago: served from the stream")
+
+        stream.update(start=live_start - 2 * MIN15, age_ms=800)
+        assert analyzer._fetch_kline_rows("BTCUSDT", "15", 1) == [["rest"]] and len(rest_calls) == 1
+        print("✓ Newest bar older than one interval + grace: REST")
+
+        stream.update(start=live_start, age_ms=int(indicators.MARKET_DATA_STALE_GRACE_SEC * 1000) + 1)
+        assert analyzer._fetch_kline_rows("BTCUSDT", "15", 1) == [["rest"]] and len(rest_calls) == 2
+        print("✓ Series not updated within the grace period: REST")
+    finally:
+        indicators.requests.get, indicators.MARKET_DATA_URL = real_get, real_url
+
+
+def test_dropped_bars_not_served():
+    """Bars lost across a reconnect: the stream restarts the series, the candle store reseeds"""
+    print("\n" + "="*80)
+    print("TEST 5: Dropped stretch of bars")
+    print("="*80)
+
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer'))
+    from candle_store import CandleStore
+
+    offsets = [0, 1, 2, 10, 11]  # bars 3..9 lost during a reconnect
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "gap.jsonl")
+        write_recording(path, [kline_msg(T0 + i * MIN15, 100 + i, True) for i in offsets])
+        store = MarketDataStore()
+        ReplayFeed(path).run(store.apply)
+
+    assert store.get_klines("BTCUSDT", "15", limit=5, start=T0 + MIN15) is None
+    assert store.get_klines("BTCUSDT", "15", limit=3) is None
+    rows, _ = store.get_klines("BTCUSDT", "15", limit=5, start=T0 + 10 * MIN15)
+    assert [int(r[0]) for r in rows] == [T0 + 11 * MIN15, T0 + 10 * MIN15]
+    assert store.get_stats()["candle_gaps"] == {"BTCUSDT:15": 1}
+    print("✓ Ranges spanning the gap are refused (REST fallback), bars after it are served")
+
+    now = {"bar": 2}
+    rest_calls = []
+
+    def rest(limit, start):
+        rest_calls.append(start)
+        bars = [kline_msg(T0 + i * MIN15, 100 + i, True)["data"][0] for i in range(now["bar"] + 1)]
+        rows = [[str(b["start"]), b["open"], b["high"], b["low"], b["close"], b["volume"], b["turnover"]]
+                for b in bars if start is None or b["start"] >= start]
+        return list(reversed(rows[-limit:]))
+
+    def stream_first(symbol, interval, limit, start=None):
+        served = store.get_klines(symbol, interval, limit, start)
+        return served[0] if served else rest(limit, start)
+
+    candles = CandleStore(stream_first, capacity=20, refresh_seconds=0,
+                          clock=lambda: (T0 + now["bar"] * MIN15) / 1000.0, cache_dir=None)
+    candles.get_rows("BTCUSDT", "15", 3)
+    now["bar"] = 11
+    rows = candles.get_rows("BTCUSDT", "15", 3)
+    series = list(candles._get_series("BTCUSDT", "15").rows)
+    assert [int(r[0]) for r in series] == [T0 + i * MIN15 for i in range(12)]
+    assert rows == series[-3:] and rest_calls == [None, T0 + 2 * MIN15]
+    print("✓ Analyzer candle store refreshed across the gap from REST: 12 contiguous bars")
+
+
+def run_all_tests():
+    test_replay_builds_store()
+    test_klines_endpoint_coverage()
+    test_recorder_roundtrip()
+    test_analyzer_rejects_stale_stream()
+    test_dropped_bars_not_served()
+    print("\n✅ All market data ingestion tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
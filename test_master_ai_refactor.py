@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
 
 # Set required env vars
 os.environ['DEEPSEEK_API_KEY'] = 'test-key-for-testing'
@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 
 # Add the agents directory to the path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "agents", "07_position_manager"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "agents"))
 
 from shared.trading_state import TradingState, PositionMetadata, OrderIntent, OrderStatus
 
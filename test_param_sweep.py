@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Test the parallel parameter sweep (agents/10_learning_agent/param_sweep.py).
+
+Validates:
+1. Replay trailing stop: disabled by default, exits above the initial SL when enabled
+2. Grid / random / TPE candidate generation
+3. Results cached by params hash + data fingerprint, persisted across runs
+4. Process pool (forkserver workers on memory-mapped arrays, started from a thread)
+   gives the same results as in-process evaluation
+5. Learning agent sweep evolution mode and /run_sweep endpoint
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', '10_learning_agent'))
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+sys.path.insert(0, ROOT)
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+import backtester as bt
+import param_sweep as ps
+from test_vectorized_backtester import make_ohlcv, write_candle_cache
+
+SMALL_SPACE = {
+    "confluence_threshold": [60, 65, 70],
+    "atr_multiplier_sl": [1.0, 1.5, 2.0],
+    "atr_multiplier_tp": [3.0, 4.5],
+    "trailing_activation_raw_pct": [None, 0.005],
+}
+
+
+def small_market(seed=0):
+    return bt.ReplayMarket({f"S{i}USDT": make_ohlcv(3000, seed=seed + i) for i in range(3)})
+
+
+def test_trailing_stop():
+    """Trailing exits in the replay"""
+    print("\n" + "="*80)
+    print("TEST 1: Replay trailing stop")
+    print("="*80)
+
+    market = small_market(seed=20)
+    plain = bt.simulate(market)
+    assert bt.simulate(market, {"trailing_activation_raw_pct": None}) == plain
+    assert all(t["market_conditions"]["closed_by"] != "trailing_stop" for t in plain)
+    print(f"✓ Disabled by default ({len(plain)} trades unchanged)")
+
+    trailing = bt.simulate(market, {"trailing_activation_raw_pct": 0.003, "trailing_distance_raw_pct": 0.01})
+    trailed = [t for t in trailing if t["market_conditions"]["closed_by"] == "trailing_stop"]
+    assert trailed and {t["side"] for t in trailed} == {"long", "short"}
+    for t in trailed:
+        assert t["pnl_pct"] > -t["sl_pct"] * t["leverage"] * 100, "trailing stop sits above the initial SL"
+    print(f"✓ {len(trailed)}/{len(trailing)} trades closed by the trailing stop, all above the initial SL")
+
+
+def test_candidates():
+    """Grid, random and TPE proposals"""
+    print("\n" + "="*80)
+    print("TEST 2: Candidate generation")
+    print("="*80)
+
+    full = ps.grid_candidates(SMALL_SPACE, 1000)
+    assert len(full) == 36 and len({tuple(p.values()) for p in full}) == 36
+    strided = ps.grid_candidates(ps.DEFAULT_SPACE, 50)
+    assert len(strided) == 50 and len({tuple(p.values()) for p in strided}) == 50
+    assert strided[0] == {k: v[0] for k, v in ps.DEFAULT_SPACE.items()}
+    assert strided[-1] == {k: v[-1] for k, v in ps.DEFAULT_SPACE.items()}
+    print("✓ Full grid when it fits, 50 evenly strided points of the 21600-point default grid")
+
+    rng = random.Random(1)
+    sampled = ps.random_candidates(SMALL_SPACE, 100, rng)
+    assert len(sampled) == 36 and len({tuple(p.values()) for p in sampled}) == 36
+    print("✓ Random sampling stops at the space size without repeats")
+
+    space = {"confluence_threshold": list(range(50, 90, 5)), "cooldown_seconds": [0, 900, 1800, 3600]}
+    history = [(p, -abs(p["confluence_threshold"] - 70)) for p in ps.random_candidates(space, 16, rng)]
+    seen = {tuple(p.values()) for p, _ in history}
+    proposed = ps.tpe_candidates(space, history, 8, rng, seen)
+    assert len(proposed) == 8 and not {tuple(p.values()) for p in proposed} & {tuple(p.values()) for p, _ in history}
+    near = np.mean([abs(p["confluence_threshold"] - 70) <= 5 for p in proposed])
+    assert near >= 0.5, f"TPE should favor the good region, got {near:.0%}"
+    print(f"✓ TPE proposes unseen points, {near:.0%} near the optimum")
+
+
+def test_cache():
+    """Cached by params hash and data fingerprint"""
+    print("\n" + "="*80)
+    print("TEST 3: Result cache")
+    print("="*80)
+
+    market = small_market()
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "sweep_cache.json")
+        first = ps.run_sweep(market, space=SMALL_SPACE, method="random", n_candidates=12,
+                             workers=1, cache=ps.SweepCache(path), min_trades=1)
+        assert first["evaluated"] == 12 and first["cache_hits"] == 0
+
+        reloaded = ps.SweepCache(path)
+        assert len(reloaded) == 12
+        second = ps.run_sweep(market, space=SMALL_SPACE, method="random", n_candidates=12,
+                              workers=1, cache=reloaded, min_trades=1)
+        assert second["cache_hits"] == 12 and second["best_params"] == first["best_params"]
+        print("✓ Re-run on the same candles served from the persisted cache")
+
+        other = ps.run_sweep(small_market(seed=50), space=SMALL_SPACE, method="random", n_candidates=12,
+                             workers=1, cache=reloaded, min_trades=1)
+        assert other["cache_hits"] == 0
+        print("✓ Different candles -> different fingerprint, no stale hits")
+
+    params = {"confluence_threshold": 65, "atr_multiplier_sl": 1.5}
+    fp = ps.market_fingerprint(market)
+    assert ps.params_key(params, fp) == ps.params_key({"atr_multiplier_sl": 1.50, "confluence_threshold": 65.0}, fp)
+    print("✓ Key independent of param order and int/float spelling")
+
+
+def test_process_pool():
+    """Pooled workers match in-process evaluation"""
+    print("\n" + "="*80)
+    print("TEST 4: Process pool")
+    print("="*80)
+
+    market = small_market(seed=7)
+    with tempfile.TemporaryDirectory() as d:
+        attached = ps.attach_market(ps.share_market(market, d))
+        assert bt.simulate(attached) == bt.simulate(market)
+        assert isinstance(attached.features["close"], np.memmap)
+    print("✓ Memory-mapped market replays identically")
+
+    serial = ps.run_sweep(market, space=SMALL_SPACE, method="bayes", n_candidates=16, workers=1, min_trades=1)
+
+    # Like /run_sweep: called from a worker thread while another thread holds a lock
+    held = threading.Lock()
+    held.acquire()
+    out = {}
+    worker = threading.Thread(target=lambda: out.update(ps.run_sweep(
+        market, space=SMALL_SPACE, method="bayes", n_candidates=16, workers=2, min_trades=1)))
+    worker.start()
+    worker.join(timeout=120)
+    held.release()
+    pooled = out
+    assert not worker.is_alive() and serial["evaluated"] == pooled["evaluated"] == 16
+    for params, summary, _ in pooled["results"]:
+        assert summary == ps.summarize_trades(bt.simulate(market, bt.config_from_params(params)))
+    assert ps._mp_context().get_start_method() in ("forkserver", "spawn")
+    shm = ps._shm_dir() or tempfile.gettempdir()
+    assert not [n for n in os.listdir(shm) if n.startswith("param_sweep_")], "shared arrays left behind"
+    print(f"✓ 16 Bayesian candidates in 2 {ps._mp_context().get_start_method()} workers from a thread, "
+          f"best score {pooled['best_score']:.2f}; shared arrays removed")
+
+
+def test_learning_agent_sweep():
+    """EVOLUTION_MODE=sweep saves the best replayed params"""
+    print("\n" + "="*80)
+    print("TEST 5: Learning agent sweep mode")
+    print("="*80)
+
+    learning = load_module_from_path(
+        'learning_agent_sweep', os.path.join(ROOT, 'agents', '10_learning_agent', 'main.py'))
+    with tempfile.TemporaryDirectory() as d:
+        cache = os.path.join(d, "candle_cache")
+        os.makedirs(cache)
+        for i, sym in enumerate(("BTCUSDT", "ETHUSDT", "SOLUSDT")):
+            write_candle_cache(cache, sym, make_ohlcv(learning.BACKTEST_MIN_BARS, seed=60 + i))
+        learning.CANDLE_CACHE_DIR = cache
+        learning.KLINE_HISTORY_DIR = os.path.join(d, "kline_history")
+        learning.EVOLVED_PARAMS_FILE = os.path.join(d, "evolved_params.json")
+        learning.EVOLUTION_LOG_FILE = os.path.join(d, "evolution_log.json")
+        learning.STRATEGY_ARCHIVE_DIR = os.path.join(d, "archive")
+        learning.SWEEP_CACHE_FILE = os.path.join(d, "sweep_cache.json")
+        learning.EVOLUTION_MODE = "sweep"
+        learning.SWEEP_CANDIDATES = 20
+        learning.SWEEP_WORKERS = 2
+        learning.SWEEP_MIN_TRADES = 5
+        learning.BACKTEST_IMPROVEMENT_THRESHOLD = -1e9  # accept the best candidate
+        os.makedirs(learning.STRATEGY_ARCHIVE_DIR)
+        learning.get_recent_trades = lambda hours=48: [{"pnl_pct": 1.0, "duration_minutes": 30}] * 10
+
+        async def fail_deepseek(prompt):
+            raise AssertionError("sweep mode must not call DeepSeek")
+        learning.call_deepseek = fail_deepseek
+
+        asyncio.run(learning.profit_evolution_cycle())
+        saved = learning.load_json_file(learning.EVOLVED_PARAMS_FILE, {})
+        assert saved["params"]["rsi_overbought"] == learning.DEFAULT_PARAMS["rsi_overbought"]
+        assert set(ps.DEFAULT_SPACE) <= set(saved["params"])
+        assert "sweep" in saved["mutation_log"]
+        print(f"✓ Evolved params saved: {saved['mutation_log']}")
+
+        resp = asyncio.run(learning.run_sweep_endpoint(method="random", candidates=8))
+        assert resp["status"] == "success" and resp["sweep"]["evaluated"] == 8
+        json.dumps(resp, allow_nan=False)
+        assert asyncio.run(learning.run_sweep_endpoint(method="annealing"))["status"] == "error"
+        print(f"✓ /run_sweep: {resp['sweep']['cache_hits']} of 8 served from the cache, JSON-safe")
+
+
+def run_all_tests():
+    test_trailing_stop()
+    test_candidates()
+    test_cache()
+    test_process_pool()
+    test_learning_agent_sweep()
+    print("\n✅ All parameter sweep tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
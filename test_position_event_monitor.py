@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Test the event-driven position monitor (agents/07_position_manager/position_stream.py).
+
+Validates:
+1. Private position + public ticker messages build fetch_positions()-shaped rows
+2. Only mark moves on symbols with an open position trigger a re-evaluation
+3. Bursts of ticks are coalesced into one run; final orders trigger on_orders
+4. A replayed recording drives the position manager trailing check from the stream
+5. A streamed hard stop closes with an exit reason the close policy allows, once per retry window
+6. Positions open before startup are seeded from REST and watched; polling snapshots drop ghosts
+   whose close was never streamed, without undoing stream updates newer than the REST request
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+from position_stream import EventDrivenMonitor, PositionStreamState, ReplayFeed
+
+
+def position_msg(size="0.01", side="Buy"):
+    return {"topic": "position", "creationTime": 1, "data": [{
+        "positionIdx": 0, "symbol": "BTCUSDT", "side": side, "size": size,
+        "entryPrice": "60000", "markPrice": "60000", "leverage": "10", "stopLoss": "59000",
+    }]}
+
+
+def ticker_msg(symbol, mark):
+    return {"topic": f"tickers.{symbol}", "type": "snapshot", "ts": 1,
+            "data": {"symbol": symbol, "markPrice": str(mark)}}
+
+
+def test_state_from_stream():
+    """Positions are exposed in fetch_positions() shape, marked to the ticker"""
+    print("\n" + "="*80)
+    print("TEST 1: Stream state")
+    print("="*80)
+
+    state = PositionStreamState(symbol_mapper=lambda s: s.replace("USDT", "/USDT:USDT"))
+    assert state.apply({"op": "auth", "success": True}) == set()
+    assert state.apply(ticker_msg("ETHUSDT", 3000)) == set(), "no position, no event"
+    assert state.apply(position_msg()) == {"position"}
+    assert state.apply(ticker_msg("BTCUSDT", 60600)) == {"mark"}
+    assert state.apply(ticker_msg("BTCUSDT", 60600)) == set(), "unchanged mark is ignored"
+
+    (pos,) = state.positions()
+    assert pos["symbol"] == "BTC/USDT:USDT" and pos["side"] == "long"
+    assert pos["markPrice"] == 60600.0 and abs(pos["unrealizedPnl"] - 6.0) < 1e-9
+    assert pos["info"]["positionIdx"] == 0
+    print(f"✓ Position marked to ticker: {pos['markPrice']} pnl={pos['unrealizedPnl']:.2f}")
+
+    state.apply({"topic": "wallet", "data": [{"coin": [{"coin": "USDT", "walletBalance": "1234.5"}]}]})
+    assert state.balance()["USDT"]["total"] == 1234.5
+
+    state.apply(position_msg(size="0", side=""))
+    assert state.positions() == [] and state.apply(ticker_msg("BTCUSDT", 61000)) == set()
+    print("✓ Closed position removed, its ticks no longer trigger")
+
+
+def test_monitor_coalesces_events():
+    """Bursts become one run; final order status schedules on_orders"""
+    print("\n" + "="*80)
+    print("TEST 2: Monitor coalescing")
+    print("="*80)
+
+    calls = []
+    watched = []
+    monitor = EventDrivenMonitor(PositionStreamState(), on_mark=lambda: calls.append("mark"),
+                                 on_orders=lambda: calls.append("orders"), watch_symbol=watched.append)
+    monitor.handle(position_msg())
+    for mark in (60100, 60200, 60300):
+        monitor.handle(ticker_msg("BTCUSDT", mark))
+    monitor.handle({"topic": "order", "data": [{"orderLinkId": "x", "orderStatus": "New"}]})
+    assert watched == ["BTCUSDT"]
+
+    assert monitor.run_pending() == {"mark"} and calls == ["mark"]
+    print("✓ 1 position + 3 ticks evaluated once")
+
+    monitor.handle({"topic": "order", "data": [{"orderLinkId": "x", "orderStatus": "Filled"}]})
+    assert monitor.run_pending() == {"orders"} and calls == ["mark", "orders"]
+    assert monitor.run_pending() == set()
+    print("✓ Filled order triggers pending-order check")
+
+
+def test_replay_drives_trailing_check():
+    """A recorded stream runs the position manager's trailing check with live marks"""
+    print("\n" + "="*80)
+    print("TEST 3: Replay into position manager")
+    print("="*80)
+
+    pm_main = load_module_from_path(
+        'pm_main_events',
+        os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager', 'main.py')
+    )
+    seen = []
+    pm_main.exchange = object()
+    pm_main.check_and_update_trailing_stops = lambda snap: seen.append([p["markPrice"] for p in snap.positions])
+    pm_main.check_smart_reverse = lambda snap, hard_stop_only=False: seen.append(hard_stop_only)
+
+    state = PositionStreamState()
+    pm_main.position_stream_state = state
+    monitor = EventDrivenMonitor(state, on_mark=pm_main.on_stream_mark_change)
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "private.jsonl")
+        with open(path, "w") as f:
+            for m in (position_msg(), ticker_msg("BTCUSDT", 60500)):
+                f.write(json.dumps({"recv_ts": 0, "msg": m}) + "\n")
+        assert ReplayFeed(path).run(monitor.handle) == 2
+
+    monitor.run_pending()
+    assert seen == [[60500.0], True], seen
+    print("✓ Trailing check saw the streamed mark; smart reverse ran hard-stop only")
+
+
+def test_stream_hard_stop():
+    """Hard stop from mark ticks: policy-allowed reason, debounced per symbol"""
+    print("\n" + "="*80)
+    print("TEST 4: Streamed hard stop")
+    print("="*80)
+
+    pm_main = load_module_from_path(
+        'pm_main_hard_stop',
+        os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager', 'main.py')
+    )
+    closes = []
+    policy_close = pm_main.execute_close_position
+    pm_main.exchange = object()
+    pm_main.ENABLE_AI_REVIEW = True
+    pm_main.check_and_update_trailing_stops = lambda snap: None
+    pm_main.execute_close_position = lambda symbol, exit_reason="manual": closes.append((symbol, exit_reason))
+
+    state = PositionStreamState()
+    pm_main.position_stream_state = state
+    state.apply({"topic": "wallet", "data": [{"coin": [{"coin": "USDT", "walletBalance": "1000"}]}]})
+    state.apply(position_msg())
+    for mark in (57000, 56900, 56800):  # 10x long: ROI -50% and worse
+        state.apply(ticker_msg("BTCUSDT", mark))
+        pm_main.on_stream_mark_change()
+    assert closes == [("BTCUSDT", "stop_loss")], closes
+    print("✓ 3 losing ticks -> 1 close with exit_reason=stop_loss")
+
+    pm_main.hard_stop_tracker["BTCUSDT"] -= pm_main.HARD_STOP_RETRY_SEC
+    pm_main.on_stream_mark_change()
+    assert len(closes) == 2
+    print("✓ Close re-sent once the retry window has passed")
+
+    pm_main.exchange = None
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        policy_close("BTCUSDT", exit_reason="stop_loss")
+        policy_close("BTCUSDT")
+    assert out.getvalue().count("CLOSE BLOCKED") == 1 and "exit_reason=manual" in out.getvalue()
+    print("✓ Close policy lets stop_loss through and still blocks the default reason")
+
+
+class FakeExchange:
+    """ccxt stand-in for get_exchange_snapshot: positions carry the raw Bybit row in info"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetch_positions(self, symbols=None, params=None):
+        return [{"symbol": r["symbol"].replace("USDT", "/USDT:USDT"), "side": "long" if r["side"] == "Buy" else "short",
+                 "contracts": float(r["size"]), "info": dict(r)} for r in self.rows]
+
+    def fetch_balance(self, params=None):
+        return {"USDT": {"total": 1000.0, "free": 1000.0}}
+
+    def private_get_v5_order_realtime(self, params):
+        return {"retCode": 0, "result": {"list": []}}
+
+
+def test_seed_and_reconcile_with_rest():
+    """Startup seeding from REST, ghost removal on the polling tick"""
+    print("\n" + "="*80)
+    print("TEST 5: REST seed and reconcile")
+    print("="*80)
+
+    pm_main = load_module_from_path(
+        'pm_main_reconcile',
+        os.path.join(os.path.dirname(__file__), 'agents', '07_position_manager', 'main.py')
+    )
+    watched, seen, closes = [], [], []
+
+    class RecordingFeed(ReplayFeed):
+        def watch_symbol(self, symbol):
+            watched.append(symbol)
+
+    (row,) = position_msg()["data"]
+    fake = FakeExchange([row])
+    pm_main.exchange = fake
+    pm_main.position_stream_state = PositionStreamState()
+    pm_main.PositionReplayFeed = RecordingFeed
+    pm_main.check_and_update_trailing_stops = lambda snap: seen.append([p["symbol"] for p in snap.positions])
+    pm_main.execute_close_position = lambda symbol, exit_reason="manual": closes.append(symbol)
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "empty.jsonl")
+        open(path, "w").close()
+        pm_main.POSITION_EVENT_MODE = "replay"
+        pm_main.POSITION_EVENT_REPLAY_FILE = path
+        pm_main.start_position_event_monitor()
+    try:
+        (pos,) = pm_main.stream_snapshot().positions
+        assert pos["side"] == "long" and pos["contracts"] == 0.01
+        assert watched == ["BTCUSDT"]
+        print("✓ Position open before startup: in stream_snapshot() with no stream message, ticker watched")
+
+        fake.rows = []
+        pm_main.reconcile_position_stream(pm_main.get_exchange_snapshot(max_age=0))
+        assert pm_main.stream_snapshot().positions == []
+        pm_main.position_stream_state.apply(ticker_msg("BTCUSDT", 50000))  # would be a -160% ROI hard stop
+        pm_main.on_stream_mark_change()
+        assert seen == [[]] and closes == [], (seen, closes)
+        print("✓ Close missed by the stream: ghost dropped on the next poll, no trailing or hard-stop close")
+
+        fake.rows = [row]
+        pm_main.reconcile_position_stream(pm_main.get_exchange_snapshot(max_age=0))
+        assert len(pm_main.stream_snapshot().positions) == 1 and watched == ["BTCUSDT", "BTCUSDT"]
+        print("✓ Open reported by REST only: added back and watched")
+
+        stale = pm_main.get_exchange_snapshot(max_age=0)  # requested before the close below
+        pm_main.position_stream_state.apply(position_msg(size="0", side=""))
+        pm_main.reconcile_position_stream(stale)
+        assert pm_main.stream_snapshot().positions == []
+        print("✓ Snapshot requested before a streamed close does not resurrect the position")
+    finally:
+        pm_main.position_event_monitor.stop()
+
+
+def run_all_tests():
+    test_state_from_stream()
+    test_monitor_coalesces_events()
+    test_replay_drives_trailing_check()
+    test_stream_hard_stop()
+    test_seed_and_reconcile_with_rest()
+    print("\n✅ All event-driven position monitor tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
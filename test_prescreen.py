@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Test the two-stage scan pre-screen (agents/orchestrator/prescreen.py).
+
+Validates:
+1. Universe filters: USDT perps, venue-tradable, turnover, spread, exclusions
+2. Ranking by turnover / 24h move / 5m return with a spread penalty
+3. 5m return from cross-cycle ticker snapshots
+4. One bulk request ranks 400 perps; failures fall back to the static list
+5. Orchestrator wiring (env switch, Dockerfile)
+"""
+import asyncio
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'orchestrator'))
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+
+from prescreen import PreScreener, TickerHistory, screen_tickers
+
+
+def ticker(symbol, price=100.0, turnover=50e6, change=0.01, spread_bps=2.0):
+    half = price * spread_bps / 20_000
+    return {"symbol": symbol, "lastPrice": str(price), "turnover24h": str(turnover),
+            "price24hPcnt": str(change), "bid1Price": str(price - half), "ask1Price": str(price + half)}
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeClient:
+    """Async client stand-in serving one tickers payload."""
+
+    def __init__(self, tickers=None, error=None):
+        self.tickers = tickers or []
+        self.error = error
+        self.calls = []
+
+    async def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        if self.error:
+            raise self.error
+        return FakeResponse({"retCode": 0, "result": {"category": "linear", "list": self.tickers}})
+
+
+def test_filters():
+    """Only liquid, tight, tradable USDT perps pass"""
+    print("\n" + "="*80)
+    print("TEST 1: Universe filters")
+    print("="*80)
+
+    tickers = [
+        ticker("BTCUSDT"), ticker("ETHUSDT"), ticker("BTCPERP"), ticker("ZZZUSDT"),
+        ticker("THINUSDT", turnover=1e6), ticker("WIDEUSDT", spread_bps=40),
+        {**ticker("BADUSDT"), "bid1Price": "", "ask1Price": "0"}, ticker("SOLUSDT"),
+    ]
+    tradable = {"BTC", "ETH", "SOL", "THIN", "WIDE", "BAD"}
+    rows = screen_tickers(tickers, tradable=tradable, exclude={"SOLUSDT"},
+                          min_turnover=5e6, max_spread_bps=15)
+    assert sorted(r["symbol"] for r in rows) == ["BTCUSDT", "ETHUSDT"]
+    print("✓ Non-USDT, untradable, thin, wide, malformed and excluded symbols dropped")
+
+    assert len(screen_tickers(tickers, tradable=None, min_turnover=5e6, max_spread_bps=15)) == 4
+    print("✓ No venue filter when the tradable set is unknown")
+
+
+def test_ranking():
+    """Liquid movers first, spread penalized"""
+    print("\n" + "="*80)
+    print("TEST 2: Ranking")
+    print("="*80)
+
+    tickers = [
+        ticker("FLATUSDT", turnover=20e6, change=0.001),
+        ticker("MOVERUSDT", turnover=400e6, change=-0.09),
+        ticker("MIDUSDT", turnover=80e6, change=0.03),
+        ticker("WIDERUSDT", turnover=400e6, change=-0.09, spread_bps=12),
+    ]
+    rows = screen_tickers(tickers, min_turnover=5e6, max_spread_bps=15)
+    order = [r["symbol"] for r in rows]
+    assert order[0] == "MOVERUSDT" and order[-1] == "FLATUSDT", order
+    assert order.index("MOVERUSDT") < order.index("WIDERUSDT"), "same move, wider spread ranks lower"
+    assert all(r["return_5m"] is None for r in rows)
+    print(f"✓ Order: {' > '.join(order)}")
+
+
+def test_five_minute_return():
+    """Snapshots across cycles feed the 5m return"""
+    print("\n" + "="*80)
+    print("TEST 3: 5m return from ticker history")
+    print("="*80)
+
+    history = TickerHistory()
+    t0 = 1_000_000.0
+    for minute in range(7):
+        history.record([ticker("AUSDT", price=100 + minute), ticker("BUSDT", price=100.0)], now=t0 + minute * 60)
+        if minute < 5:
+            assert history.return_over("AUSDT", now=t0 + minute * 60) is None
+    ret = history.return_over("AUSDT", now=t0 + 360)
+    assert abs(ret - (106 / 101 - 1) * 100) < 1e-9, ret
+    print(f"✓ Neutral for the first 5 minutes, then {ret:.2f}% over the last 5 minutes")
+
+    history.record([ticker("AUSDT", price=110)], now=t0 + 3600)
+    assert history.return_over("AUSDT", now=t0 + 3600) is None, "stale snapshots evicted"
+    print("✓ Snapshots older than the window are evicted")
+
+    history = TickerHistory()
+    history.record([ticker("AUSDT", price=100), ticker("BUSDT", price=100)], now=t0)
+    tickers = [ticker("AUSDT", price=103, turnover=30e6), ticker("BUSDT", price=100, turnover=30e6)]
+    history.record(tickers, now=t0 + 300)
+    rows = screen_tickers(tickers, history, now=t0 + 300, min_turnover=5e6, max_spread_bps=15)
+    assert rows[0]["symbol"] == "AUSDT" and rows[0]["return_5m"] > rows[1]["return_5m"] == 0
+    print("✓ Fresh 5m move lifts an otherwise identical symbol")
+
+
+def test_select_bulk_universe():
+    """400 perps ranked from a single request"""
+    print("\n" + "="*80)
+    print("TEST 4: PreScreener.select")
+    print("="*80)
+
+    tickers = [ticker(f"C{i:03d}USDT", turnover=1e6 * (i + 1), change=((i * 37) % 100 - 50) / 1000)
+               for i in range(400)]
+    client = FakeClient(tickers)
+    screener = PreScreener(tradable_fn=lambda: {f"C{i:03d}" for i in range(0, 400, 2)})
+    top = asyncio.run(screener.select(client, top_n=20, exclude={"C398USDT"}))
+    assert len(client.calls) == 1 and client.calls[0][1] == {"category": "linear"}
+    assert len(top) == 20 and all(int(r["symbol"][1:4]) % 2 == 0 for r in top)
+    assert "C398USDT" not in [r["symbol"] for r in top]
+    assert [r["score"] for r in top] == sorted((r["score"] for r in top), reverse=True)
+    assert screener.last_stats["universe"] == 400 and screener.last_stats["selected"] == 20
+    print(f"✓ 1 request: {screener.last_stats['universe']} tickers -> {screener.last_stats['passed']} passed -> top 20")
+
+    assert asyncio.run(PreScreener().select(FakeClient(error=ConnectionError("down")), top_n=5)) is None
+    print("✓ Tickers failure returns None (caller scans the static list)")
+
+
+def test_orchestrator_wiring():
+    """Env switch and container packaging"""
+    print("\n" + "="*80)
+    print("TEST 5: Orchestrator wiring")
+    print("="*80)
+
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'main.py')) as f:
+        code = f.read()
+    assert 'PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED"' in code
+    assert "await prescreener.select(c, PRESCREEN_TOP_N" in code and "universe = SYMBOLS" in code
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'Dockerfile')) as f:
+        assert "COPY orchestrator/prescreen.py ." in f.read()
+    print("✓ PRESCREEN_ENABLED gates stage 1, SYMBOLS stays the fallback, module shipped in the image")
+
+
+def run_all_tests():
+    test_filters()
+    test_ranking()
+    test_five_minute_return()
+    test_select_bulk_universe()
+    test_orchestrator_wiring()
+    print("\n✅ All pre-screen tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Test the rolling correlation engine (agents/orchestrator/correlation.py).
+
+Validates:
+1. Incremental updates match a full np.corrcoef over the window
+2. Missing bars use pairwise-complete observations; min_periods gates pairs
+3. Per-bar update cost does not grow with the window
+4. Candle cache feed: closed bars only, incremental, lagging symbols wait
+5. Portfolio risk score and orchestrator guard wiring
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'orchestrator'))
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+
+import correlation
+from correlation import CandleCacheFeed, RollingCorrelation, compute_correlation_from_returns
+
+BAR_MS = 15 * 60_000
+
+
+def correlated_returns(n_bars, n_symbols, seed=0):
+    """Returns with a shared market factor (different loadings per symbol)"""
+    rng = np.random.default_rng(seed)
+    market = rng.normal(0, 0.004, n_bars)
+    loadings = np.linspace(1.0, -0.5, n_symbols)
+    return market[:, None] * loadings + rng.normal(0, 0.003, (n_bars, n_symbols))
+
+
+def test_matches_full_recompute():
+    """Rolling sums == corrcoef over the last window"""
+    print("\n" + "="*80)
+    print("TEST 1: Incremental vs full recompute")
+    print("="*80)
+
+    data = correlated_returns(1000, 6, seed=1)
+    symbols = [f"S{i}USDT" for i in range(6)]
+    engine = RollingCorrelation(window=200, min_periods=20, recompute_every=10_000)
+    for t, row in enumerate(data):
+        engine.update(dict(zip(symbols, row)), ts=t)
+    expected = np.corrcoef(data[-200:].T)
+    assert np.allclose(engine.matrix(), expected, atol=1e-9)
+    assert abs(engine.correlation("S0USDT", "S5USDT") - expected[0, 5]) < 1e-9
+    print(f"✓ 800 bars rolled out without rebuild, max error {np.abs(engine.matrix() - expected).max():.1e}")
+
+    assert abs(compute_correlation_from_returns(list(data[:, 0]), list(data[:, 1]))
+               - np.corrcoef(data[:, 0], data[:, 1])[0, 1]) < 1e-12
+    assert compute_correlation_from_returns([1.0, 1.0, 1.0], [1.0, 2.0, 3.0]) is None
+    assert compute_correlation_from_returns([1.0], [1.0]) is None
+    print("✓ compute_correlation_from_returns is plain Pearson, None for flat/short series")
+
+
+def test_missing_bars():
+    """Pairwise-complete statistics and late symbols"""
+    print("\n" + "="*80)
+    print("TEST 2: Missing bars")
+    print("="*80)
+
+    data = correlated_returns(300, 3, seed=2)
+    data[::7, 1] = np.nan
+    engine = RollingCorrelation(window=300, min_periods=30)
+    for t, row in enumerate(data):
+        engine.update({s: v for s, v in zip("ABC", row) if not np.isnan(v)})
+    ok = ~np.isnan(data[:, 1])
+    expected = np.corrcoef(data[ok][:, 0], data[ok][:, 1])[0, 1]
+    assert abs(engine.correlation("A", "B") - expected) < 1e-9
+    print("✓ Gaps in one series only drop the affected joint observations")
+
+    engine.update({"A": 0.001, "D": 0.002})
+    assert engine.correlation("A", "D") is None and engine.correlation("A", "ZZZ") is None
+    assert np.isnan(engine.matrix()[0, 3]) and engine.matrix()[3, 3] == 1.0
+    for v in correlated_returns(40, 2, seed=3):
+        engine.update({"A": v[0], "D": v[1]})
+    assert engine.correlation("A", "D") is not None
+    print("✓ New symbol grows the matrix, reports nothing until min_periods joint bars")
+
+
+def test_update_cost():
+    """O(N^2) per bar independent of the window"""
+    print("\n" + "="*80)
+    print("TEST 3: Update cost")
+    print("="*80)
+
+    symbols = [f"S{i}USDT" for i in range(40)]
+    data = correlated_returns(3000, 40, seed=4)
+    timings = {}
+    for window in (100, 2000):
+        engine = RollingCorrelation(window=window, min_periods=10)
+        for row in data[:window]:
+            engine.update(dict(zip(symbols, row)))
+        start = time.perf_counter()
+        for row in data[window:window + 500]:
+            engine.update(dict(zip(symbols, row)))
+        timings[window] = (time.perf_counter() - start) / 500
+    print(f"✓ 40 symbols: {timings[100] * 1e6:.0f}us/bar at window 100, {timings[2000] * 1e6:.0f}us/bar at 2000")
+    assert timings[2000] < timings[100] * 4, "per-bar cost should not scale with the window"
+
+
+def write_series(directory, symbol, closes, start_ts):
+    rows = [[str(start_ts + i * BAR_MS), str(c), str(c), str(c), str(c), "1", "0"] for i, c in enumerate(closes)]
+    with open(os.path.join(directory, f"{symbol}_15.json"), "w") as f:
+        json.dump({"rows": rows, "exhausted": False}, f)
+    os.utime(os.path.join(directory, f"{symbol}_15.json"), ns=(time.time_ns(), time.time_ns() + len(rows)))
+
+
+def test_candle_cache_feed():
+    """Closed bars from the shared candle cache"""
+    print("\n" + "="*80)
+    print("TEST 4: Candle cache feed")
+    print("="*80)
+
+    rets = correlated_returns(401, 3, seed=5)
+    closes = 100 * np.cumprod(1 + rets, axis=0)
+    t0 = 1_700_000_000_000 - 1_700_000_000_000 % BAR_MS
+    symbols = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+    with tempfile.TemporaryDirectory() as d:
+        for i, s in enumerate(symbols):
+            write_series(d, s, closes[:300, i], t0)
+        engine = RollingCorrelation(window=200, min_periods=50)
+        feed = CandleCacheFeed(engine, d, "15")
+        now = t0 + 300 * BAR_MS - 1  # bar 299 still forming
+        applied = feed.sync(symbols + ["NOFILEUSDT"], now_ms=now)
+        assert applied == 200 and engine.last_ts == t0 + 298 * BAR_MS
+        expected = np.corrcoef(rets[99:299].T)
+        assert np.allclose(engine.matrix(), expected, atol=1e-9)
+        print("✓ Bootstrap: one window of closed bars, forming bar skipped, missing file ignored")
+
+        assert feed.sync(symbols, now_ms=now) == 0
+        write_series(d, "BTCUSDT", closes[:301, 0], t0)
+        write_series(d, "ETHUSDT", closes[:301, 1], t0)
+        assert feed.sync(symbols, now_ms=t0 + 301 * BAR_MS) == 0, "SOL not refreshed yet -> wait"
+        write_series(d, "SOLUSDT", closes[:301, 2], t0)
+        assert feed.sync(symbols, now_ms=t0 + 301 * BAR_MS) == 2
+        assert np.allclose(engine.matrix(), np.corrcoef(rets[101:301].T), atol=1e-9)
+        print("✓ Incremental: waits for a symbol one refresh behind, then applies both new bars")
+
+        write_series(d, "BTCUSDT", closes[:401, 0], t0)
+        write_series(d, "ETHUSDT", closes[:401, 1], t0)
+        assert feed.sync(symbols, now_ms=t0 + 401 * BAR_MS) == 100
+        assert engine.correlation("BTCUSDT", "SOLUSDT") is not None
+        k = engine._index
+        assert engine._K[k["BTCUSDT"], k["SOLUSDT"]] == 100, "stale SOL counts as missing"
+        print("✓ A series lagging > 2 bars no longer holds back the others")
+
+
+def test_risk_and_guard():
+    """Portfolio risk score and orchestrator integration"""
+    print("\n" + "="*80)
+    print("TEST 5: Risk score and guard wiring")
+    print("="*80)
+
+    correlation.clear_correlation_cache()
+    engine = correlation.get_correlation_engine()
+    base = correlated_returns(200, 1, seed=6)[:, 0]
+    noise = np.random.default_rng(7).normal(0, 0.004, (200, 2))
+    for t in range(200):
+        engine.update({"BTCUSDT": base[t], "ETHUSDT": base[t] + 0.1 * noise[t, 0], "DOGEUSDT": noise[t, 1]})
+
+    risk, breakdown = correlation.calculate_portfolio_correlation_risk([], "ETHUSDT", "long")
+    assert risk == 0.0 and breakdown["status"] == "computed"
+    positions = [{"symbol": "BTCUSDT", "side": "long"}]
+    risk, breakdown = correlation.calculate_portfolio_correlation_risk(positions, "ETHUSDT", "long")
+    assert risk > 0.9 and breakdown["correlations"][0]["source"] == "rolling"
+    hedged, _ = correlation.calculate_portfolio_correlation_risk(positions, "ETHUSDT", "short")
+    assert hedged == 0.0
+    print(f"✓ ETH long vs BTC long risk {risk:.2f}, opposite side 0.00")
+
+    unknown, breakdown = correlation.calculate_portfolio_correlation_risk(positions, "PEPEUSDT", "long")
+    assert unknown == 0.0 and breakdown["status"] == "insufficient_data"
+    correlation.update_correlation_matrix("PEPEUSDT", "BTCUSDT", 0.5)
+    assert correlation.get_correlation("BTCUSDT", "PEPEUSDT") == 0.5
+    assert correlation.get_correlation_matrix_summary()["total_pairs"] == 4
+    print("✓ Unknown pairs flagged, manual matrix used as fallback")
+
+    start = time.perf_counter()
+    for _ in range(100):
+        correlation.calculate_portfolio_correlation_risk(positions * 10, "ETHUSDT", "long")
+    per_call = (time.perf_counter() - start) / 100
+    assert per_call < 0.01
+    print(f"✓ 10 open positions scored in {per_call * 1e6:.0f}us")
+    correlation.clear_correlation_cache()
+
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'main.py')) as f:
+        code = f.read()
+    assert "refresh_correlations" in code and "calculate_portfolio_correlation_risk(position_details" in code
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'Dockerfile')) as f:
+        assert "COPY orchestrator/correlation.py ." in f.read()
+    print("✓ Orchestrator refreshes the matrix each cycle and guards on it; module shipped in the image")
+
+
+def run_all_tests():
+    test_matches_full_recompute()
+    test_missing_bars()
+    test_update_cost()
+    test_candle_cache_feed()
+    test_risk_and_guard()
+    print("\n✅ All rolling correlation tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Test the orchestrator candidate scan fan-out (scanner.scan_symbols).
+
+Validates:
+1. Concurrency never exceeds the configured semaphore bound
+2. Slow symbols hit the per-symbol deadline without blocking the others
+3. Results are scored as they arrive (fast symbols first)
+4. Failed requests are reported, not raised
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', 'orchestrator'))
+
+from scanner import scan_symbols
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeClient:
+    """Async client stand-in with per-symbol latency."""
+
+    def __init__(self, delays, fail=()):
+        self.delays = delays
+        self.fail = set(fail)
+        self.active = 0
+        self.peak = 0
+
+    async def post(self, url, json=None, timeout=None):
+        sym = json["symbol"]
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delays.get(sym, 0.01))
+            if sym in self.fail and "analyze_multi_tf_full" in url:
+                raise ConnectionError("boom")
+            if "analyze_fib" in url:
+                return FakeResponse({"symbol": sym, "fib": True})
+            return FakeResponse({"symbol": sym, "timeframes": {"15m": {}}})
+        finally:
+            self.active -= 1
+
+
+def test_bounded_fanout_with_deadline():
+    """Semaphore bound, per-symbol deadline and arrival-order scoring"""
+    print("\n" + "="*80)
+    print("TEST: Bounded fan-out with per-symbol deadline")
+    print("="*80)
+
+    symbols = [f"S{i}USDT" for i in range(8)]
+    delays = {s: 0.05 for s in symbols}
+    delays["S0USDT"] = 5.0   # slower than deadline
+    delays["S2USDT"] = 0.0   # fastest in the first wave
+    client = FakeClient(delays)
+    arrivals = []
+
+    start = time.time()
+    stats = asyncio.run(scan_symbols(
+        client, symbols, lambda s, t, f: arrivals.append((s, t, f)),
+        "http://tech", "http://fib", concurrency=3, symbol_timeout=0.3
+    ))
+    elapsed = time.time() - start
+
+    assert client.peak <= 3 * 2, f"peak in-flight requests {client.peak} exceeds 3 symbols"
+    print(f"✓ Peak in-flight requests: {client.peak} (3 symbols x 2 requests)")
+
+    assert stats["timed_out"] == ["S0USDT"]
+    assert len(stats["completed"]) == 7
+    assert elapsed < 2.0, f"slow symbol blocked the scan ({elapsed:.2f}s)"
+    print(f"✓ Slow symbol cut at deadline, scan took {elapsed:.2f}s")
+
+    assert arrivals[0][0] == "S2USDT", "fastest symbol should be scored first"
+    assert arrivals[0][1]["timeframes"] == {"15m": {}} and arrivals[0][2]["fib"] is True
+    print("✓ Results scored in arrival order with tech + fib payloads")
+
+
+def test_failures_are_reported():
+    """A failing tech request yields an empty tech dict instead of raising"""
+    print("\n" + "="*80)
+    print("TEST: Failures reported, not raised")
+    print("="*80)
+
+    client = FakeClient({}, fail={"BADUSDT"})
+    arrivals = {}
+    stats = asyncio.run(scan_symbols(
+        client, ["BTCUSDT", "BADUSDT"], lambda s, t, f: arrivals.__setitem__(s, t),
+        "http://tech", "http://fib", concurrency=2, symbol_timeout=1.0
+    ))
+    assert sorted(stats["completed"]) == ["BADUSDT", "BTCUSDT"]
+    assert arrivals["BADUSDT"] == {}
+    print("✓ Failed request produced empty tech data")
+
+
+def run_all_tests():
+    test_bounded_fanout_with_deadline()
+    test_failures_are_reported()
+    print("\n✅ All scan fan-out tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
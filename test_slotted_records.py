@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Test slotted, frozen record types (TradingState records and telemetry TradeRecord).
+
+Validates:
+1. OrderIntent / PositionMetadata / Cooldown / TradeRecord have no __dict__ and are immutable
+2. to_dict / from_dict contract unchanged (asdict-equal output, unknown fields dropped, status enum)
+3. orjson and stdlib fallback produce the same files; stdlib-written NaN and torn lines handled
+4. Benchmark: memory per record and from_dict / to_dict cost vs the previous dataclasses
+5. Position manager derives copies with replace(); time-exit extensions are persisted
+"""
+import dataclasses
+import json
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+
+from test_trading_state_persistence import SOURCES, fresh_state, load_module_from_path
+from shared import telemetry
+
+
+def modules():
+    return {label: load_module_from_path(f"trading_state_rec_{label.split('/')[0]}", path)
+            for label, path in SOURCES.items()}
+
+
+def sample_records(module):
+    return [
+        module.OrderIntent(intent_id="i1", symbol="ETHUSDT", side="long", leverage=3, size_pct=0.1,
+                           features={"rsi": 55.0, "ema": [1.0, 2.0]}),
+        module.PositionMetadata(symbol="ETHUSDT", side="long", entry_price=100.0, size=1.0, leverage=3,
+                                time_in_trade_limit_sec=600),
+        module.Cooldown(symbol="ETHUSDT", side="short", expires_at=datetime.now().isoformat()),
+    ]
+
+
+def test_slots_and_frozen():
+    """Compact and immutable"""
+    print("\n" + "="*80)
+    print("TEST 1: Slots and immutability")
+    print("="*80)
+
+    trade = telemetry.TradeRecord(timestamp="t", symbol="BTCUSDT", side="long", entry_price=1.0, exit_price=2.0,
+                                  entry_time="a", exit_time="b", pnl_pct_gross=1.0, pnl_pct_net=0.9,
+                                  pnl_dollars=10.0, fees_dollars=0.1, fees_pct=0.01)
+    for label, module in modules().items():
+        for record in sample_records(module) + [trade]:
+            assert not hasattr(record, "__dict__"), type(record).__name__
+            try:
+                record.symbol = "XRPUSDT"
+            except dataclasses.FrozenInstanceError:
+                pass
+            else:
+                raise AssertionError(f"{type(record).__name__} is mutable")
+            assert dataclasses.replace(record, symbol="XRPUSDT").symbol == "XRPUSDT" and record.symbol != "XRPUSDT"
+        print(f"✓ {label}: records slotted and frozen, replace() derives a copy")
+
+
+def test_dict_contract():
+    """to_dict / from_dict as before"""
+    print("\n" + "="*80)
+    print("TEST 2: to_dict / from_dict")
+    print("="*80)
+
+    for label, module in modules().items():
+        for record in sample_records(module):
+            data = record.to_dict()
+            legacy = dataclasses.asdict(record)
+            if "status" in legacy:
+                legacy["status"] = legacy["status"].value
+            assert data == legacy and list(data) == list(legacy)
+            assert type(record).from_dict(dict(data, unknown_field=1)) == record
+        intent = sample_records(module)[0]
+        data = intent.to_dict()
+        data["features"]["ema"].append(3.0)
+        assert intent.features["ema"] == [1.0, 2.0], "to_dict must not alias nested containers"
+        assert data["status"] == "PENDING" and isinstance(data["status"], str)
+        assert module.OrderIntent.from_dict(data).status is module.OrderStatus.PENDING
+        print(f"✓ {label}: same dicts as asdict(), unknown fields dropped, status round-trips")
+
+    trade = telemetry.TradeRecord.from_dict({"timestamp": "t", "symbol": "BTCUSDT", "side": "long",
+                                             "entry_price": 1.0, "exit_price": None, "entry_time": "a",
+                                             "exit_time": None, "pnl_pct_gross": 0.0, "pnl_pct_net": 0.0,
+                                             "pnl_dollars": 0.0, "fees_dollars": 0.0, "fees_pct": 0.0,
+                                             "extra": True})
+    assert trade.to_dict() == dataclasses.asdict(trade)
+    print("✓ TradeRecord: to_dict unchanged, from_dict added")
+
+
+def test_serializer_fallback():
+    """orjson vs stdlib json"""
+    print("\n" + "="*80)
+    print("TEST 3: Serializer")
+    print("="*80)
+
+    module = modules()["agents/shared"]
+    print(f"   orjson installed: {module.orjson is not None}")
+    state = {"intents": {"i1": sample_records(module)[0].to_dict()}, "cooldowns": [], "px": 0.1 + 0.2}
+    fast = module._dumps(state, indent=True)
+    real_orjson, module.orjson = module.orjson, None
+    try:
+        slow = module._dumps(state, indent=True)
+        assert module._loads(fast) == module._loads(slow) == state
+    finally:
+        module.orjson = real_orjson
+    assert module._loads(slow) == state
+    print("✓ Same decoded state with and without orjson")
+
+    with tempfile.TemporaryDirectory() as d:
+        with open(os.path.join(d, "trading_state.json"), "w") as f:
+            json.dump({"intents": {}, "positions": {}, "cooldowns": [], "trailing_stops": {"X_long": {"sl": float("nan")}}}, f)
+        ts = fresh_state(module, d, "write_behind", snapshot_sec=3600)
+        assert math.isnan(ts.get_trailing_stop("X", "long")["sl"])
+        ts.set_trailing_stop("Y", "long", {"sl": 1.0})
+        ts._log_fh.write(b'{"seq": 99, "ops": [{"op"')
+        ts._log_fh.close()
+        ts._dirty = False
+        again = fresh_state(module, d, "sync")
+        assert again.get_trailing_stop("Y", "long") == {"sl": 1.0}
+        print("✓ Legacy snapshot with NaN loads; torn binary log line ignored on replay")
+
+        logger = telemetry.TelemetryLogger(os.path.join(d, "telemetry.jsonl"))
+        record = telemetry.TradeRecord.from_dict({
+            "timestamp": "t", "symbol": "ÉTHUSDT", "side": "long", "entry_price": 1.0, "exit_price": 2.0,
+            "entry_time": "a", "exit_time": "b", "pnl_pct_gross": 1.0, "pnl_pct_net": 0.9, "pnl_dollars": 1.0,
+            "fees_dollars": 0.1, "fees_pct": 0.01})
+        logger.log_trade(record)
+        logger.log_trade(record)
+        with open(logger.filepath, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 2 and "ÉTHUSDT" in lines[0]
+        assert logger.read_recent_trades() == [record.to_dict()] * 2
+        print("✓ Telemetry JSONL: one UTF-8 line per trade, readable by read_recent_trades")
+
+
+def test_benchmark():
+    """Memory and (de)serialization cost"""
+    print("\n" + "="*80)
+    print("TEST 4: Benchmark")
+    print("="*80)
+
+    module = modules()["agents/shared"]
+    # Previous record: plain dataclass, asdict() and a filtered **kwargs rebuild
+    Legacy = dataclasses.make_dataclass("LegacyPositionMetadata", [
+        (f.name, f.type, dataclasses.field(default=f.default, default_factory=f.default_factory))
+        for f in dataclasses.fields(module.PositionMetadata)])
+    valid = {f.name for f in dataclasses.fields(Legacy)}
+    data = module.PositionMetadata(symbol="ETHUSDT", side="long", entry_price=100.0, size=1.0, leverage=3,
+                                   opened_at=datetime.now().isoformat(), time_in_trade_limit_sec=600).to_dict()
+    n = 20000
+
+    def measure(build):
+        tracemalloc.start()
+        kept = [build(i) for i in range(n)]
+        size = tracemalloc.get_traced_memory()[0] / n
+        tracemalloc.stop()
+        del kept
+        return size
+
+    legacy_mem = measure(lambda i: Legacy(**{k: v for k, v in data.items() if k in valid}))
+    slotted_mem = measure(lambda i: module.PositionMetadata.from_dict(data))
+
+    start = time.perf_counter()
+    for _ in range(n):
+        dataclasses.asdict(Legacy(**{k: v for k, v in data.items() if k in valid}))
+    legacy_rt = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for _ in range(n):
+        module.PositionMetadata.from_dict(data).to_dict()
+    slotted_rt = (time.perf_counter() - start) / n
+
+    print(f"✓ Memory per PositionMetadata: {legacy_mem:.0f} B -> {slotted_mem:.0f} B")
+    print(f"✓ from_dict + to_dict: {legacy_rt * 1e6:.1f}us -> {slotted_rt * 1e6:.1f}us")
+    assert slotted_mem < 0.8 * legacy_mem
+    assert slotted_rt < legacy_rt
+
+
+def test_position_manager_wiring():
+    """replace() at the call sites, extensions persisted"""
+    print("\n" + "="*80)
+    print("TEST 5: Position manager wiring")
+    print("="*80)
+
+    module = modules()["agents/shared"]
+    with tempfile.TemporaryDirectory() as d:
+        ts = fresh_state(module, d, "sync")
+        pos = module.PositionMetadata(symbol="ETHUSDT", side="long", entry_price=1.0, size=1.0, leverage=2,
+                                      opened_at=(datetime.now() - timedelta(hours=1)).isoformat(),
+                                      time_in_trade_limit_sec=60)
+        ts.add_position(pos)
+        pos = ts.get_expired_positions()[0]
+        ts.add_position(dataclasses.replace(pos, time_in_trade_limit_sec=7200,
+                                            time_exit_extensions=pos.time_exit_extensions + 1))
+        again = fresh_state(module, d, "sync")
+        assert again.get_position("ETHUSDT", "long").time_exit_extensions == 1
+        assert again.get_expired_positions() == []
+    print("✓ Extended position re-saved via replace(): new limit and extension count survive a restart")
+
+    with open(os.path.join(ROOT, 'agents', '07_position_manager', 'main.py')) as f:
+        code = f.read()
+    assert not re.search(r"\b(pos_metadata|new_intent)\.\w+\s*=[^=]", code)
+    assert "setattr(pos_metadata" not in code and "from dataclasses import replace" in code
+    with open(os.path.join(ROOT, 'agents', '07_position_manager', 'requirements.txt')) as f:
+        assert "orjson" in f.read()
+    print("✓ No attribute assignment on records left in the position manager; orjson in requirements")
+
+
+def run_all_tests():
+    test_slots_and_frozen()
+    test_dict_contract()
+    test_serializer_fallback()
+    test_benchmark()
+    test_position_manager_wiring()
+    print("\n✅ All slotted record tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
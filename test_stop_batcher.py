@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Test per-tick stop-update batching (agents/07_position_manager/stop_batcher.py).
+
+Validates:
+1. Moves below the per-symbol minimum step are dropped; later updates of a position replace earlier ones
+2. trading_stop (no batch endpoint): bounded concurrency, errors counted instead of raised
+3. Position manager tick: constant wall time as positions grow, no requests for no-op moves, trading_stop only
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', '07_position_manager'))
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+
+from stop_batcher import StopUpdate, StopUpdateBatcher
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeBybit:
+    """ccxt bybit stand-in: latency per request, call log, in-flight high-water mark"""
+
+    def __init__(self, latency=0.0, fail_symbols=()):
+        self.latency = latency
+        self.calls = []
+        self.fail_symbols = set(fail_symbols)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _request(self, name, params):
+        with self._lock:
+            self.calls.append((name, params))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+
+    def price_to_precision(self, symbol, price):
+        return f"{price:.2f}"
+
+    def amount_to_precision(self, symbol, qty):
+        return f"{qty:.3f}"
+
+    def market(self, symbol):
+        return {"id": symbol.split("/")[0] + "USDT"}
+
+    def private_post_v5_position_trading_stop(self, params):
+        self._request("trading_stop", params)
+        if params["symbol"] in self.fail_symbols:
+            raise ConnectionError("timeout")
+        return {"retCode": 0, "retMsg": "OK"}
+
+    def count(self, name):
+        return sum(1 for n, _ in self.calls if n == name)
+
+
+def make_batcher(exchange, **kwargs):
+    return StopUpdateBatcher(
+        exchange,
+        min_move=lambda s: 15.0 if s.startswith("BTC") else 0.01,
+        symbol_id=lambda s: s.split("/")[0] + "USDT",
+        **kwargs)
+
+
+def test_min_step_and_dedupe():
+    """No-op moves never reach the exchange"""
+    print("\n" + "="*80)
+    print("TEST 1: Min-step filter")
+    print("="*80)
+
+    ex = FakeBybit()
+    batcher = make_batcher(ex)
+    assert not batcher.add(StopUpdate("BTC/USDT:USDT", "long", 0, stop_loss=60010.0, current_sl=60000.0))
+    assert batcher.add(StopUpdate("BTC/USDT:USDT", "short", 0, stop_loss=59980.0, current_sl=60000.0))
+    assert batcher.add(StopUpdate("ETH/USDT:USDT", "long", 0, stop_loss=3000.0))  # no SL yet
+    assert batcher.add(StopUpdate("ETH/USDT:USDT", "long", 0, stop_loss=3001.0, current_sl=3000.0))
+    assert batcher.add(StopUpdate("SOL/USDT:USDT", "long", 0, stop_loss=100.001, current_sl=100.0,
+                                  take_profit=120.0, current_tp=110.0))
+    assert len(batcher) == 3
+    stats = batcher.flush()
+    stops = {p["symbol"]: p for n, p in ex.calls}
+    assert stats["skipped"] == 1 and stats["queued"] == 3 and stats["requests"] == 3
+    assert stops["ETHUSDT"]["stopLoss"] == "3001.00"
+    assert "stopLoss" not in stops["SOLUSDT"] and stops["SOLUSDT"]["takeProfit"] == "120.00"
+    assert len(batcher) == 0 and batcher.flush()["requests"] == 3
+    print("✓ 10$ BTC move dropped, SL-only / TP-only moves sent, duplicate ETH update collapsed, queue reset")
+
+
+def test_trading_stop_concurrency():
+    """Bounded pool for the non-batchable endpoint"""
+    print("\n" + "="*80)
+    print("TEST 2: trading_stop concurrency")
+    print("="*80)
+
+    ex = FakeBybit(latency=0.03, fail_symbols={"C3USDT"})
+    batcher = make_batcher(ex, max_workers=4)
+    for i in range(12):
+        batcher.add(StopUpdate(f"C{i}/USDT:USDT", "long", 0, stop_loss=10.0 + i))
+    start = time.perf_counter()
+    stats = batcher.flush()
+    elapsed = time.perf_counter() - start
+    assert ex.count("trading_stop") == 12 and ex.max_in_flight <= 4
+    assert stats["failed"] == 1
+    assert elapsed < 12 * ex.latency / 2, elapsed
+    print(f"✓ 12 positions in {elapsed * 1000:.0f}ms (serial {12 * ex.latency * 1000:.0f}ms), "
+          f"max {ex.max_in_flight} in flight, 1 failure logged")
+
+
+def load_position_manager(tmp):
+    pm_main = load_module_from_path(
+        'pm_main_stop_batcher',
+        os.path.join(ROOT, 'agents', '07_position_manager', 'main.py')
+    )
+    pm_main.TRAILING_STATE_FILE = os.path.join(tmp, "trailing_state.json")
+    pm_main.PROFIT_LOCK_STATE_FILE = os.path.join(tmp, "profit_lock_state.json")
+    pm_main.get_trailing_distance_pct = lambda *args, **kwargs: 0.01
+    pm_main.DEBUG_SYMBOLS = []
+    return pm_main
+
+
+def positions(n, mark):
+    return [{"symbol": f"C{i}/USDT:USDT", "contracts": 1.0, "side": "long", "entryPrice": 100.0,
+             "markPrice": mark, "leverage": 5, "info": {"positionIdx": 0}} for i in range(n)]
+
+
+def test_position_manager_tick():
+    """check_and_update_trailing_stops submits once per tick"""
+    print("\n" + "="*80)
+    print("TEST 3: Position manager tick")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        pm_main = load_position_manager(d)
+        pm_main.STOP_UPDATE_MAX_WORKERS = 8
+        timings = {}
+        for n in (4, 32):
+            ex = pm_main.exchange = FakeBybit(latency=0.02)
+            for f in os.listdir(d):
+                os.remove(os.path.join(d, f))
+            start = time.perf_counter()
+            pm_main.check_and_update_trailing_stops(SimpleNamespace(positions=positions(n, 102.0)))
+            timings[n] = time.perf_counter() - start
+            assert ex.count("trading_stop") == n
+
+            ex.calls.clear()
+            pm_main.check_and_update_trailing_stops(SimpleNamespace(positions=positions(n, 102.0)))
+            assert ex.calls == [], "unchanged SL must not be re-sent"
+            pm_main.check_and_update_trailing_stops(SimpleNamespace(positions=positions(n, 103.0)))
+            assert ex.count("trading_stop") == n
+        ex.calls.clear()
+        pm_main.check_and_update_trailing_stops(SimpleNamespace(positions=positions(4, 130.0)))
+        assert ex.calls and {name for name, _ in ex.calls} == {"trading_stop"}
+        print(f"✓ Tick wall time: 4 positions {timings[4] * 1000:.0f}ms, 32 positions {timings[32] * 1000:.0f}ms "
+              f"(serial would be {32 * 0.02 * 1000:.0f}ms); repeat tick at the same mark sends nothing")
+        assert timings[32] < 32 * 0.02 / 2
+
+    with open(os.path.join(ROOT, 'agents', '07_position_manager', 'main.py')) as f:
+        code = f.read()
+    body = code[code.index("def check_and_update_trailing_stops"):code.index("def save_ai_decision")]
+    assert "private_post_v5_position_trading_stop" not in body and "stop_batcher.flush()" in body
+    print("✓ Trailing check queues its SL moves and flushes once")
+
+
+def run_all_tests():
+    test_min_step_and_dedupe()
+    test_trading_stop_concurrency()
+    test_position_manager_tick()
+    print("\n✅ All stop batcher tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
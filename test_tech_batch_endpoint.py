@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test the technical analyzer batch endpoint (/analyze_multi_tf_batch).
+
+Validates:
+1. All requested symbols are analyzed and returned in one response
+2. Symbols are analyzed concurrently in the worker pool
+3. Per-symbol failures return the same error shape as /analyze_multi_tf
+4. Duplicate symbols are analyzed once
+5. Master AI's critical-position check fetches tech data for all positions in one batch call,
+   falling back to per-symbol calls when the batch request fails
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+tech_main = load_module_from_path(
+    'tech_main',
+    os.path.join(os.path.dirname(__file__), 'agents', '01_technical_analyzer', 'main.py')
+)
+
+
+def test_batch_returns_all_symbols_concurrently():
+    """Batch endpoint analyzes every symbol, in parallel"""
+    print("\n" + "="*80)
+    print("TEST: Batch analysis returns all symbols")
+    print("="*80)
+
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def fake_analysis(symbol):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+        if symbol == "BADUSDT":
+            return {}
+        return {"symbol": symbol, "price": float("nan"), "timeframes": {"15m": {"rsi": 50.0}}}
+
+    original = tech_main.analyzer.get_multi_tf_analysis
+    tech_main.analyzer.get_multi_tf_analysis = fake_analysis
+    try:
+        req = tech_main.TechBatchRequest(symbols=["BTCUSDT", "ETHUSDT", "SOLUSDT", "BADUSDT", "BTCUSDT"])
+        resp = tech_main.analyze_batch_endpoint(req)
+    finally:
+        tech_main.analyzer.get_multi_tf_analysis = original
+
+    results = resp["results"]
+    assert resp["count"] == 4
+    assert list(results) == ["BTCUSDT", "ETHUSDT", "SOLUSDT", "BADUSDT"]
+    print("✓ All unique symbols returned in request order")
+
+    assert results["BTCUSDT"]["price"] is None, "NaN must be sanitized"
+    assert results["BADUSDT"] == {"symbol": "BADUSDT", "error": "Multi-TF Analysis Failed", "timeframes": {}}
+    print("✓ Floats sanitized and failures use single-endpoint error shape")
+
+    assert active["peak"] > 1, "symbols should be analyzed concurrently"
+    print(f"✓ Peak concurrency: {active['peak']}")
+
+
+class FakeAsyncClient:
+    """httpx.AsyncClient stand-in routed to the technical analyzer endpoints"""
+
+    def __init__(self, batch_status=200):
+        self.batch_status = batch_status
+        self.urls = []
+
+    async def post(self, url, json=None):
+        self.urls.append(url.rsplit("/", 1)[-1])
+        if url.endswith("/analyze_multi_tf_batch"):
+            if self.batch_status != 200:
+                return FakeResponse({"detail": "Not Found"}, self.batch_status)
+            return FakeResponse(tech_main.analyze_batch_endpoint(tech_main.TechBatchRequest(**json)))
+        return FakeResponse(tech_main.analyze_symbol(json["symbol"]))
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.payload
+
+
+def test_master_ai_uses_batch():
+    """Critical-position tech fan-out is one batch request"""
+    print("\n" + "="*80)
+    print("TEST: Master AI batch caller")
+    print("="*80)
+
+    master = load_module_from_path(
+        'master_ai_tech_batch',
+        os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent', 'main.py')
+    )
+    original = tech_main.analyzer.get_multi_tf_analysis
+    tech_main.analyzer.get_multi_tf_analysis = lambda symbol: (
+        {} if symbol == "BADUSDT" else {"symbol": symbol, "timeframes": {"1h": {"rsi": 25.0}}})
+    try:
+        client = FakeAsyncClient()
+        symbols = ["BTCUSDT", "ETHUSDT", "BADUSDT", "BTCUSDT"]
+        tech = asyncio.run(master.fetch_tech_data_map(client, symbols))
+        assert client.urls == ["analyze_multi_tf_batch"]
+        assert list(tech) == ["BTCUSDT", "ETHUSDT", "BADUSDT"]
+        assert tech["ETHUSDT"]["timeframes"]["1h"]["rsi"] == 25.0 and tech["BADUSDT"]["timeframes"] == {}
+        print(f"✓ {len(tech)} positions analyzed with 1 request")
+
+        old_analyzer = FakeAsyncClient(batch_status=404)
+        assert asyncio.run(master.fetch_tech_data_map(old_analyzer, symbols)) == tech
+        assert old_analyzer.urls == ["analyze_multi_tf_batch"] + ["analyze_multi_tf_full"] * 3
+        assert asyncio.run(master.fetch_tech_data_map(FakeAsyncClient(), [])) == {}
+        print("✓ Batch endpoint missing: same data from per-symbol calls")
+    finally:
+        tech_main.analyzer.get_multi_tf_analysis = original
+
+
+def run_all_tests():
+    test_batch_returns_all_symbols_concurrently()
+    test_master_ai_uses_batch()
+    print("\n✅ All batch endpoint tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
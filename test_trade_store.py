@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Test the SQLite trade store (agents/shared/trade_store.py).
+
+Validates:
+1. Insert + time-range / symbol / side queries through the indexes
+2. One-time migration of the legacy trading_history.json
+3. Learning agent /record_trade and get_recent_trades use the store
+4. Master AI get_journal_for_llm reads the same store
+5. Single source: no copies, the learning agent and Master AI images ship agents/shared
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'shared'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+from trade_store import TradeStore
+from test_trading_state_persistence import check_shared_wiring
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def trade(hours_ago, symbol="BTC", side="long", pnl=1.0, **extra):
+    return {"timestamp": (NOW - timedelta(hours=hours_ago)).isoformat(), "symbol": symbol, "side": side,
+            "entry_price": 100.0, "exit_price": 101.0, "pnl_pct": pnl, "leverage": 3.0, "size_pct": 0.1,
+            "duration_minutes": 30, "market_conditions": {"closed_by": "trailing"}, **extra}
+
+
+def test_queries():
+    """Range, symbol and side filters; round-trip of all fields"""
+    print("\n" + "="*80)
+    print("TEST 1: Store queries")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        store = TradeStore(os.path.join(d, "t.db"))
+        for h, sym, side in [(100, "BTC", "long"), (30, "ETH", "short"), (10, "BTC", "short"), (1, "BTC", "long")]:
+            store.record(trade(h, sym, side, intent_id=f"i{h}"))
+        store.record({**trade(2), "timestamp": "not-a-date"})
+
+        recent = store.recent(48, now=NOW)
+        assert [t["intent_id"] for t in recent] == ["i30", "i10", "i1"]
+        assert recent[0]["market_conditions"] == {"closed_by": "trailing"}
+        print("✓ recent(48h) uses the time index and skips unparseable timestamps")
+
+        assert [t["intent_id"] for t in store.range(symbol="BTC", side="short")] == ["i10"]
+        assert [t["intent_id"] for t in store.range(symbol="BTC", limit=2)] == ["i10", "i1"]
+        assert [t["symbol"] for t in store.latest(2)] == ["BTC", "BTC"] and store.count() == 5
+        print("✓ Symbol / side / limit queries")
+
+        plan = store._conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM trades WHERE symbol = ? AND ts_epoch >= ?", ("BTC", 0)
+        ).fetchall()
+        assert any("idx_trades_symbol_ts" in str(tuple(r)) for r in plan)
+        print("✓ Symbol + time query uses idx_trades_symbol_ts")
+
+
+def test_json_migration():
+    """Legacy JSON is imported exactly once"""
+    print("\n" + "="*80)
+    print("TEST 2: Legacy JSON migration")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        legacy = os.path.join(d, "trading_history.json")
+        with open(legacy, "w") as f:
+            json.dump([trade(5, custom_field="kept"), trade(3, "SOL")], f)
+
+        store = TradeStore(os.path.join(d, "t.db"))
+        assert store.migrate_json(legacy) == 2
+        assert store.migrate_json(legacy) == 0, "second migration must be a no-op"
+        assert store.count() == 2 and store.latest(1, symbol="BTC")[0]["custom_field"] == "kept"
+        print("✓ 2 trades migrated once, unknown fields preserved")
+
+
+def test_learning_and_master_ai_integration():
+    """Learning agent writes through the store, Master AI journal reads it"""
+    print("\n" + "="*80)
+    print("TEST 3: Learning agent + Master AI")
+    print("="*80)
+
+    with tempfile.TemporaryDirectory() as d:
+        db = os.path.join(d, "trading_history.db")
+        legacy = os.path.join(d, "trading_history.json")
+        with open(legacy, "w") as f:
+            json.dump([trade(1, "ETH", pnl=-2.0)], f)
+
+        sys.path.insert(0, os.path.join(ROOT, 'agents', '10_learning_agent'))
+        learning = load_module_from_path(
+            'learning_agent_store', os.path.join(ROOT, 'agents', '10_learning_agent', 'main.py'))
+        learning.TRADING_HISTORY_DB = db
+        learning.TRADING_HISTORY_FILE = legacy
+        learning._trade_store = None
+
+        t = trade(0, "BTC", pnl=3.5)
+        t["timestamp"] = datetime.now().isoformat()
+        resp = asyncio.run(learning.record_trade(learning.TradeRecord(**t)))
+        assert resp["status"] == "success"
+        assert [x["symbol"] for x in learning.get_recent_trades(hours=24 * 365 * 10)] == ["ETH", "BTC"]
+        print("✓ Legacy trade migrated on first use, new trade recorded")
+
+        sys.path.insert(0, os.path.join(ROOT, 'agents', '04_master_ai_agent'))
+        master = load_module_from_path(
+            'master_ai_store', os.path.join(ROOT, 'agents', '04_master_ai_agent', 'main.py'))
+        master.TRADING_HISTORY_DB = db
+        master._trade_store = None
+        journal = master.get_journal_for_llm("BTCUSDT", limit=20)
+        assert len(journal) == 1 and journal[0]["pnl_pct"] == 3.5 and journal[0]["closed_by"] == "trailing"
+        assert [j["symbol"] for j in master.get_journal_for_llm(limit=20)] == ["ETH", "BTC"]
+        print("✓ Master AI journal served from the same DB")
+
+
+def test_single_source():
+    """No per-container copies"""
+    print("\n" + "="*80)
+    print("TEST 4: Single source")
+    print("="*80)
+
+    check_shared_wiring("trade_store", {"10_learning_agent": "agents/10_learning_agent/main.py",
+                                        "04_master_ai_agent": "agents/04_master_ai_agent/main.py"})
+    print("✓ Only agents/shared/trade_store.py; both images built from ./agents with shared/ copied in")
+
+
+def run_all_tests():
+    test_queries()
+    test_json_migration()
+    test_learning_and_master_ai_integration()
+    test_single_source()
+    print("\n✅ All trade store tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Test TradingState secondary indexes (agents/shared/trading_state.py).
+
+Validates:
+1. get_intents (status / entry_type / symbol) matches a full scan through random mutations
+2. Expiry heap: get_expired_positions matches PositionMetadata.is_expired, stale entries dropped
+3. Cooldown index: is_in_cooldown matches a full scan, cleanup skips when nothing expired
+4. Hot queries are O(matches): 20k historical intents vs a handful of pending ones
+5. Indexes rebuilt on load / log replay; position manager uses the index
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from test_trading_state_persistence import SOURCES, fresh_state, load_module_from_path
+
+
+def scan_intents(module, ts, status=None, entry_type=None, symbol=None):
+    """Reference: the pre-index full scan"""
+    out = []
+    for data in ts._state["intents"].values():
+        intent = module.OrderIntent.from_dict(data)
+        if ((status is None or intent.status == status)
+                and (entry_type is None or getattr(intent, "entry_type", "MARKET") == entry_type)
+                and (symbol is None or intent.symbol == symbol)):
+            out.append(intent.intent_id)
+    return sorted(out)
+
+
+def make_intent(module, intent_id, symbol, entry_type, created_at=None):
+    kwargs = {"created_at": created_at} if created_at else {}
+    if "entry_type" in module.OrderIntent.__dataclass_fields__:
+        kwargs["entry_type"] = entry_type
+    return module.OrderIntent(intent_id=intent_id, symbol=symbol, side="long", leverage=3, size_pct=0.1, **kwargs)
+
+
+def test_intent_index():
+    """Index == full scan"""
+    print("\n" + "="*80)
+    print("TEST 1: Intent index")
+    print("="*80)
+
+    for label, path in SOURCES.items():
+        module = load_module_from_path(f"trading_state_idx_{label.split('/')[0]}", path)
+        rng = random.Random(1)
+        symbols = ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+        with tempfile.TemporaryDirectory() as d:
+            ts = fresh_state(module, d, "write_behind", snapshot_sec=3600)
+            old = (datetime.now() - timedelta(days=2)).isoformat()
+            for i in range(600):
+                roll = rng.random()
+                intent_id = f"i{rng.randrange(300)}"
+                if roll < 0.5:
+                    ts.add_intent(make_intent(module, intent_id, rng.choice(symbols), rng.choice(["MARKET", "LIMIT"]),
+                                              created_at=old if rng.random() < 0.2 else None))
+                elif roll < 0.9:
+                    ts.update_intent_status(intent_id, rng.choice(list(module.OrderStatus)))
+                else:
+                    ts.cleanup_old_intents(days=1.0)
+            ts._state["intents"].pop(next(iter(ts._state["intents"])))  # removed behind the index's back
+
+            checked = 0
+            for status in [None] + list(module.OrderStatus):
+                for entry_type in (None, "MARKET", "LIMIT"):
+                    for symbol in [None] + symbols:
+                        got = sorted(i.intent_id for i in ts.get_intents(status, entry_type, symbol))
+                        assert got == scan_intents(module, ts, status, entry_type, symbol), (status, entry_type, symbol)
+                        checked += 1
+            ts._dirty = False
+        print(f"✓ {label}: {checked} filter combinations identical to a full scan after 600 random mutations")
+
+
+def test_expiry_heap():
+    """Expired positions via the min-heap"""
+    print("\n" + "="*80)
+    print("TEST 2: Position expiry heap")
+    print("="*80)
+
+    for label, path in SOURCES.items():
+        module = load_module_from_path(f"trading_state_heap_{label.split('/')[0]}", path)
+        rng = random.Random(2)
+        with tempfile.TemporaryDirectory() as d:
+            ts = fresh_state(module, d, "write_behind", snapshot_sec=3600)
+            now = datetime.now()
+            for i in range(2000):
+                sym = f"S{rng.randrange(150)}USDT"
+                side = rng.choice(["long", "short"])
+                roll = rng.random()
+                if roll < 0.7:
+                    ts.add_position(module.PositionMetadata(
+                        symbol=sym, side=side, entry_price=1.0, size=1.0, leverage=2,
+                        opened_at=(now - timedelta(seconds=rng.randrange(0, 7200))).isoformat(),
+                        time_in_trade_limit_sec=rng.choice([None, 600, 3600, 10800])))
+                elif roll < 0.9:
+                    ts.remove_position(sym, side)
+                elif hasattr(ts, "prune_positions"):
+                    ts.prune_positions({k for k in ts._state["positions"] if rng.random() < 0.9})
+                if i % 100 == 0:
+                    got = sorted(f"{p.symbol}_{p.side}" for p in ts.get_expired_positions())
+                    want = sorted(k for k, v in ts._state["positions"].items()
+                                  if module.PositionMetadata.from_dict(v).is_expired())
+                    assert got == want
+            assert len(ts._position_expiry) <= 2 * len(ts._state["positions"]) + 65
+            assert ts.get_expired_positions() == ts.get_expired_positions(), "queries do not consume the heap"
+            ts._dirty = False
+        print(f"✓ {label}: matches is_expired() through 2000 adds / re-saves / removals, heap stays compact")
+
+
+def test_cooldown_index():
+    """Cooldown lookups"""
+    print("\n" + "="*80)
+    print("TEST 3: Cooldown index")
+    print("="*80)
+
+    for label, path in SOURCES.items():
+        module = load_module_from_path(f"trading_state_cd_{label.split('/')[0]}", path)
+        with tempfile.TemporaryDirectory() as d:
+            ts = fresh_state(module, d, "sync")
+            now = datetime.now()
+            for i, offset in enumerate([-60, 600, -10, 30]):
+                ts.add_cooldown(module.Cooldown(symbol=f"S{i % 2}USDT", side="long",
+                                                expires_at=(now + timedelta(seconds=offset)).isoformat()))
+            for sym in ("S0USDT", "S1USDT", "S2USDT"):
+                for side in ("long", "short"):
+                    want = any(c["symbol"] == sym and c["side"] == side
+                               and not module.Cooldown.from_dict(c).is_expired() for c in ts._state["cooldowns"])
+                    assert ts.is_in_cooldown(sym, side) == want
+
+            ts.cleanup_expired_cooldowns()
+            assert len(ts._state["cooldowns"]) == 2 and ts.is_in_cooldown("S1USDT", "long")
+            snapshots = ts.write_stats["snapshots"]
+            ts.cleanup_expired_cooldowns()
+            assert ts.write_stats["snapshots"] == snapshots
+        print(f"✓ {label}: latest expiry per symbol/side, cleanup skipped while the earliest expiry is ahead")
+
+
+def test_query_cost():
+    """O(k) hot queries"""
+    print("\n" + "="*80)
+    print("TEST 4: Query cost")
+    print("="*80)
+
+    module = load_module_from_path("trading_state_cost", SOURCES["agents/shared"])
+    with tempfile.TemporaryDirectory() as d:
+        ts = fresh_state(module, d, "write_behind", snapshot_sec=3600, max_records=10 ** 6)
+        for i in range(20000):
+            ts.add_intent(make_intent(module, f"h{i}", "BTCUSDT", "LIMIT"))
+            ts.update_intent_status(f"h{i}", module.OrderStatus.EXECUTED)
+        for i in range(3):
+            ts.add_intent(make_intent(module, f"p{i}", "ETHUSDT", "LIMIT"))
+        for i in range(5000):
+            ts.add_cooldown(module.Cooldown(symbol=f"S{i}USDT", side="long",
+                                            expires_at=(datetime.now() + timedelta(hours=1)).isoformat()))
+
+        start = time.perf_counter()
+        for _ in range(5):
+            legacy = [module.OrderIntent.from_dict(v) for v in ts._state["intents"].values()]
+            legacy = [i for i in legacy if i.status == module.OrderStatus.PENDING and i.entry_type == "LIMIT"]
+        scan = (time.perf_counter() - start) / 5
+
+        start = time.perf_counter()
+        for _ in range(5):
+            pending = ts.get_intents(status=module.OrderStatus.PENDING, entry_type="LIMIT")
+        indexed = (time.perf_counter() - start) / 5
+        assert [i.intent_id for i in pending] == [i.intent_id for i in legacy] == ["p0", "p1", "p2"]
+
+        start = time.perf_counter()
+        for _ in range(1000):
+            ts.is_in_cooldown("S4999USDT", "long")
+        cooldown = (time.perf_counter() - start) / 1000
+        ts._dirty = False
+
+    print(f"✓ Pending LIMIT intents among 20k: scan {scan * 1000:.1f}ms, index {indexed * 1e6:.0f}us")
+    print(f"✓ is_in_cooldown with 5000 cooldowns: {cooldown * 1e6:.1f}us")
+    assert indexed * 50 < scan and cooldown < 1e-4
+
+
+def test_rebuild_and_wiring():
+    """Indexes after restart, position manager query"""
+    print("\n" + "="*80)
+    print("TEST 5: Rebuild on load, wiring")
+    print("="*80)
+
+    module = load_module_from_path("trading_state_rebuild", SOURCES["agents/shared"])
+    with tempfile.TemporaryDirectory() as d:
+        ts = fresh_state(module, d, "write_behind", snapshot_sec=3600)
+        ts.add_intent(make_intent(module, "a", "BTCUSDT", "LIMIT"))
+        ts.flush()
+        ts.add_intent(make_intent(module, "b", "ETHUSDT", "LIMIT"))  # only in the log
+        ts.add_position(module.PositionMetadata(symbol="ETHUSDT", side="short", entry_price=1.0, size=1.0,
+                                                leverage=2, opened_at=(datetime.now() - timedelta(hours=2)).isoformat(),
+                                                time_in_trade_limit_sec=60))
+        ts._dirty = False
+        restarted = fresh_state(module, d, "sync")
+        assert [i.intent_id for i in restarted.get_intents(module.OrderStatus.PENDING, "LIMIT")] == ["a", "b"]
+        assert [p.symbol for p in restarted.get_expired_positions()] == ["ETHUSDT"]
+        assert [p.side for p in restarted.get_positions_for_symbol("ETHUSDT")] == ["short"]
+    print("✓ Snapshot + replayed log records are indexed after a restart")
+
+    with open(os.path.join(ROOT, 'agents', '07_position_manager', 'main.py')) as f:
+        code = f.read()
+    assert 'get_intents(status=OrderStatus.PENDING, entry_type="LIMIT")' in code
+    assert 'trading_state._state.get("intents"' not in code
+    print("✓ check_pending_entry_orders queries the index")
+
+
+def run_all_tests():
+    test_intent_index()
+    test_expiry_heap()
+    test_cooldown_index()
+    test_query_cost()
+    test_rebuild_and_wiring()
+    print("\n✅ All TradingState index tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
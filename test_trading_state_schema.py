@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Test the unified, versioned TradingState module.
+
+Validates:
+1. agents/shared/trading_state.py is the single source: no copies, the position manager image ships shared/
+2. New state files are written with the current schema_version
+3. v1 position-manager files ("version": "1.0.0") migrate: new-field defaults, keys preserved, written back
+4. v1 files in the old agents/shared layout (order_intents / position_metadata) migrate into intents / positions
+5. Newer schemas load untouched; incomplete records survive; the mutation log replays after migration
+"""
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+from test_trading_state_persistence import (SOURCES, check_shared_wiring, fresh_state, load_module_from_path,
+                                            read_snapshot)
+
+CANONICAL = SOURCES["agents/shared"]
+
+
+def write_state(directory, state):
+    with open(os.path.join(directory, "trading_state.json"), "w") as f:
+        json.dump(state, f)
+
+
+def test_single_source():
+    """No copies; the position manager builds with agents/shared"""
+    print("\n" + "="*80)
+    print("TEST 1: Single source")
+    print("="*80)
+
+    check_shared_wiring("trading_state", {"07_position_manager": "agents/07_position_manager/main.py"})
+    module = load_module_from_path("trading_state_schema_src", CANONICAL)
+    fields = module.OrderIntent.__dataclass_fields__
+    assert {"exchange_order_link_id", "entry_type", "features"} <= set(fields)
+    assert hasattr(module.TradingState, "prune_positions") and hasattr(module.TradingState, "add_closed_trade")
+    print("✓ Position manager image built from ./agents with shared/ copied in (full record set and API)")
+
+
+def test_new_file_version():
+    """Fresh state carries the schema version"""
+    print("\n" + "="*80)
+    print("TEST 2: New state file")
+    print("="*80)
+
+    module = load_module_from_path("trading_state_schema_new", CANONICAL)
+    with tempfile.TemporaryDirectory() as d:
+        fresh_state(module, d, "sync")
+        snapshot = read_snapshot(d)
+        assert snapshot["schema_version"] == module.STATE_SCHEMA_VERSION and "version" not in snapshot
+        assert {"intents", "positions", "cooldowns", "trailing_stops", "closed_trades"} <= set(snapshot)
+    print(f"✓ schema_version={module.STATE_SCHEMA_VERSION} written on startup")
+
+
+def test_migrate_position_manager_v1():
+    """v1 file from the position manager"""
+    print("\n" + "="*80)
+    print("TEST 3: Migrate v1 (position manager layout)")
+    print("="*80)
+
+    module = load_module_from_path("trading_state_schema_pm", CANONICAL)
+    opened = (datetime.now() - timedelta(hours=3)).isoformat()
+    with tempfile.TemporaryDirectory() as d:
+        write_state(d, {
+            "version": "1.0.0",
+            "intents": {"a": {"intent_id": "a", "symbol": "ETHUSDT", "side": "long", "leverage": 3,
+                              "size_pct": 0.1, "status": "PENDING", "created_at": opened,
+                              "entry_type": "LIMIT", "legacy_note": "kept"}},
+            "positions": {"ETHUSDT_long": {"symbol": "ETHUSDT", "side": "long", "entry_price": 1.0,
+                                           "size": 1.0, "leverage": 3, "opened_at": opened,
+                                           "time_in_trade_limit_sec": 60}},
+            "cooldowns": [{"symbol": "ETHUSDT", "side": "short",
+                           "expires_at": (datetime.now() + timedelta(hours=1)).isoformat()}],
+            "trailing_stops": {"ETHUSDT_long": {"sl": 0.9}},
+            "closed_trades": [{"symbol": "BTCUSDT"}],
+        })
+        ts = fresh_state(module, d, "sync")
+        intent = ts._state["intents"]["a"]
+        assert intent["features"] == {} and intent["exchange_order_link_id"] is None
+        assert intent["entry_type"] == "LIMIT" and intent["legacy_note"] == "kept"
+        assert ts._state["positions"]["ETHUSDT_long"]["time_exit_extensions"] == 0
+        assert [i.intent_id for i in ts.get_intents(module.OrderStatus.PENDING, "LIMIT")] == ["a"]
+        assert [p.symbol for p in ts.get_expired_positions()] == ["ETHUSDT"]
+        assert ts.is_in_cooldown("ETHUSDT", "short") and ts.get_closed_trades() == [{"symbol": "BTCUSDT"}]
+
+        snapshot = read_snapshot(d)
+        assert snapshot["schema_version"] == 2 and "version" not in snapshot
+        assert snapshot["intents"]["a"]["features"] == {}
+    print("✓ Defaults filled, unknown keys kept, indexes built from the migrated records, file rewritten as v2")
+
+
+def test_migrate_shared_layout_v1():
+    """v1 file in the old agents/shared layout"""
+    print("\n" + "="*80)
+    print("TEST 4: Migrate v1 (old agents/shared layout)")
+    print("="*80)
+
+    module = load_module_from_path("trading_state_schema_shared", CANONICAL)
+    with tempfile.TemporaryDirectory() as d:
+        write_state(d, {
+            "version": "1.0.0",
+            "order_intents": {"old": {"intent_id": "old", "symbol": "BTCUSDT", "side": "short", "leverage": 2,
+                                      "size_pct": 0.05, "status": "EXECUTED"}},
+            "position_metadata": {"BTCUSDT_short": {"symbol": "BTCUSDT", "side": "short", "entry_price": 2.0,
+                                                    "size": 1.0, "leverage": 2}},
+            "intents": {"new": {"intent_id": "new", "symbol": "SOLUSDT", "side": "long", "leverage": 2,
+                                "size_pct": 0.05}},
+            "cooldowns": [],
+            "trailing_stops": {},
+        })
+        ts = fresh_state(module, d, "sync")
+        assert sorted(ts._state["intents"]) == ["new", "old"]
+        assert "order_intents" not in ts._state and "position_metadata" not in ts._state
+        assert ts.get_intent("old").status == module.OrderStatus.EXECUTED
+        assert ts.get_intent("old").entry_type == "MARKET"
+        assert [p.side for p in ts.get_positions_for_symbol("BTCUSDT")] == ["short"]
+        assert ts._state["closed_trades"] == []
+    print("✓ order_intents / position_metadata merged into intents / positions")
+
+
+def test_forward_compat_and_log():
+    """Newer files, incomplete records, log replay"""
+    print("\n" + "="*80)
+    print("TEST 5: Edge cases")
+    print("="*80)
+
+    module = load_module_from_path("trading_state_schema_edge", CANONICAL)
+    with tempfile.TemporaryDirectory() as d:
+        future = {"schema_version": module.STATE_SCHEMA_VERSION + 1, "intents": {}, "positions": {},
+                  "cooldowns": [], "trailing_stops": {}, "closed_trades": [], "new_section": {"x": 1}}
+        write_state(d, future)
+        ts = fresh_state(module, d, "sync")
+        assert ts._state["schema_version"] == module.STATE_SCHEMA_VERSION + 1 and ts._state["new_section"] == {"x": 1}
+        print("✓ A newer schema is loaded as-is (no downgrade)")
+
+        write_state(d, {"intents": {}, "positions": {"X_long": {"symbol": "X"}},
+                        "cooldowns": [{"symbol": "X"}], "trailing_stops": {}})
+        ts = fresh_state(module, d, "sync")
+        assert ts._state["positions"]["X_long"] == {"symbol": "X"} and ts._state["cooldowns"] == [{"symbol": "X"}]
+        print("✓ Incomplete records are kept as they are")
+
+        write_state(d, {"version": "1.0.0", "log_seq": 4, "intents": {}, "positions": {},
+                        "cooldowns": [], "trailing_stops": {}})
+        with open(os.path.join(d, "trading_state.mutations.jsonl"), "w") as f:
+            f.write(json.dumps({"seq": 5, "ops": [{"op": "set", "section": "trailing_stops",
+                                                    "key": "ETHUSDT_long", "value": {"sl": 1.5}}]}) + "\n")
+        ts = fresh_state(module, d, "write_behind")
+        assert ts.get_trailing_stop("ETHUSDT", "long") == {"sl": 1.5}
+        assert read_snapshot(d)["schema_version"] == module.STATE_SCHEMA_VERSION
+        ts._dirty = False
+    print("✓ Mutation log replayed on top of the migrated snapshot")
+
+
+def run_all_tests():
+    test_single_source()
+    test_new_file_version()
+    test_migrate_position_manager_v1()
+    test_migrate_shared_layout_v1()
+    test_forward_compat_and_log()
+    print("\n✅ All TradingState schema tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Test the vectorized replay backtester (agents/10_learning_agent/backtester.py).
+
+Validates:
+1. 15m indicators and the previewed 1h/4h bars match the incremental engine
+2. Vectorized confluence / limit prices match orchestrator confluence.py bar by bar
+3. Simulation respects slots, cooldown, crash guard and SL/TP exits
+4. A year of 15m data for 12 symbols replays in seconds
+5. Learning agent backtest_strategy replays candles covering warm-up + evaluation span (rescaling fallback otherwise)
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', '10_learning_agent'))
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+sys.path.insert(0, os.path.join(ROOT, 'agents', '01_technical_analyzer'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+import backtester as bt
+from incremental import IncrementalIndicators
+
+confluence = load_module_from_path('orchestrator_confluence',
+                                   os.path.join(ROOT, 'agents', 'orchestrator', 'confluence.py'))
+
+DAY_MS = 24 * 60 * 60_000
+START_MS = 1_704_067_200_000  # 2024-01-01 00:00 UTC
+
+
+def make_ohlcv(bars: int, seed: int, start_price: float = 100.0) -> dict:
+    """Random-walk 15m OHLCV aligned on UTC days"""
+    rng = np.random.default_rng(seed)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.004, bars)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.002, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.002, bars)))
+    return {"ts": START_MS + np.arange(bars, dtype=np.int64) * bt.BAR_MS, "open": open_, "high": high,
+            "low": low, "close": close, "volume": rng.lognormal(5, 0.5, bars)}
+
+
+def assert_same(name, got, expected, idx):
+    if np.isnan(expected):
+        assert np.isnan(got), f"{name}[{idx}]: expected NaN, got {got}"
+    else:
+        assert got == expected, f"{name}[{idx}]: {got} != {expected}"
+
+
+def test_indicator_parity():
+    """Closed 15m bars and forming 1h/4h bars equal the incremental engine"""
+    print("\n" + "="*80)
+    print("TEST 1: Indicator parity with incremental.py")
+    print("="*80)
+
+    data = make_ohlcv(2500, seed=3)
+    feats = bt.compute_features(data)
+
+    engine = IncrementalIndicators()
+    for i in range(len(data["ts"])):
+        vals = engine.update(int(data["ts"][i]), data["high"][i], data["low"][i], data["close"][i])
+        assert_same("ema_20", feats["ema_20"][i], round(vals["ema_20"], 2), i)
+        assert_same("ema_50", feats["ema_50"][i], round(vals["ema_50"], 2), i)
+        assert_same("atr", feats["atr"][i], round(vals["atr_14"], 4), i)
+        if i >= 2:
+            assert feats["macd_rising"][i] == float(vals["macd_hist"] > vals["macd_hist_prev2"])
+    print("✓ 15m EMA20/EMA50/ATR/MACD momentum identical")
+
+    for tf, fields in (("1h", ("trend_1h", "adx_1h", "rsi_1h")), ("4h", ("trend_4h", "adx_4h", None))):
+        tf_ms = bt.TF_MS[tf]
+        engine = IncrementalIndicators()
+        bucket, high, low = None, 0.0, 0.0
+        for i in range(len(data["ts"])):
+            b = int(data["ts"][i] // tf_ms)
+            if b != bucket:
+                bucket, high, low = b, data["high"][i], data["low"][i]
+            else:
+                high, low = max(high, data["high"][i]), min(low, data["low"][i])
+            vals = engine.update(b, high, low, data["close"][i])  # same ts = forming bar tick
+            trend = 1.0 if data["close"][i] > vals["ema_50"] else -1.0
+            assert feats[fields[0]][i] == trend, (tf, i)
+            assert_same(fields[1], feats[fields[1]][i], round(vals["adx_14"], 2), i)
+            if fields[2]:
+                assert_same(fields[2], feats[fields[2]][i], round(vals["rsi_14"], 2), i)
+        print(f"✓ {tf} forming-bar trend/ADX{'/RSI' if fields[2] else ''} identical")
+
+
+def test_confluence_parity():
+    """Vectorized scores and limit prices equal the scalar orchestrator functions"""
+    print("\n" + "="*80)
+    print("TEST 2: Confluence parity with confluence.py")
+    print("="*80)
+
+    market = bt.ReplayMarket({f"S{i}USDT": make_ohlcv(3000, seed=i) for i in range(3)})
+    rng = np.random.default_rng(11)
+    checked = 0
+    for _ in range(2000):
+        s, b = int(rng.integers(3)), int(rng.integers(market.bars))
+        tech, fib = market.tech_snapshot(s, b)
+        long_ref, short_ref = confluence.calculate_confluence_both(tech, fib)
+        for direction, ref in (("long", long_ref), ("short", short_ref)):
+            got = market.long if direction == "long" else market.short
+            for key in ("trend_alignment", "momentum", "mean_reversion", "volume", "key_levels", "total"):
+                assert got[key][s, b] == ref[key], (direction, key, s, b, got[key][s, b], ref[key])
+            price = tech["timeframes"]["15m"]["price"]
+            expected = confluence.calculate_limit_price(price, direction, tech, fib, 0.0008)
+            one_bar = {k: v[s:s + 1, b] for k, v in market.features.items()}
+            assert bt.calculate_limit_price_arrays(one_bar, direction, 0.0008)[0] == expected
+        checked += 1
+    print(f"✓ {checked} random bars: all 5 dimensions, totals and limit prices identical")
+
+
+def test_simulation_gates():
+    """Slots, per-symbol exclusivity, cooldown, crash guard and exits"""
+    print("\n" + "="*80)
+    print("TEST 3: Simulation gates")
+    print("="*80)
+
+    market = bt.ReplayMarket({f"S{i}USDT": make_ohlcv(6000, seed=20 + i) for i in range(6)})
+    trades = bt.simulate(market)
+    assert trades, "random walk should produce some entries"
+
+    def span(t):
+        start = np.datetime64(t["timestamp"][:19])
+        return start, start + np.timedelta64(t["duration_minutes"], "m")
+
+    by_symbol = {}
+    for t in trades:
+        by_symbol.setdefault(t["symbol"], []).append(span(t))
+        if t["market_conditions"]["closed_by"] == "take_profit":
+            assert t["pnl_pct"] > 0 and abs(t["pnl_pct"] - t["tp_pct"] * t["leverage"] * 100) < 1e-3
+        if t["market_conditions"]["closed_by"] == "stop_loss":
+            assert t["pnl_pct"] <= -t["sl_pct"] * t["leverage"] * 100 + 1e-3
+        assert 2 <= t["leverage"] <= 4 and 0.06 <= t["size_pct"] <= 0.10
+    for spans in by_symbol.values():
+        for (_, end), (start, _) in zip(spans, spans[1:]):
+            assert start >= end, "one position per symbol, next entry after the previous exit + cooldown"
+    print(f"✓ {len(trades)} trades, no overlap per symbol, SL/TP PnL consistent")
+
+    limited = bt.simulate(market, {"max_positions": 1})
+    spans = sorted(span(t) for t in limited)
+    assert all(b[0] >= a[1] for a, b in zip(spans, spans[1:])), "max_positions=1 allows one open trade"
+    print(f"✓ max_positions=1 -> {len(limited)} sequential trades")
+
+    assert bt.simulate(market, {"confluence_threshold": 101}) == []
+    blocked = bt.simulate(market, {"crash_guard_long_block_pct": -1e9, "crash_guard_short_block_pct": -1e9})
+    assert all(t["side"] == "short" for t in blocked) and len(blocked) < len(trades)
+    print("✓ Threshold and crash guard gate entries")
+
+    wide = bt.simulate(market, bt.config_from_params({"atr_multiplier_tp": 20.0}))
+    assert sum(t["market_conditions"]["closed_by"] == "take_profit" for t in wide) < \
+        sum(t["market_conditions"]["closed_by"] == "take_profit" for t in trades)
+    print("✓ Evolved atr_multiplier_tp reaches the replay")
+
+
+def test_year_replay_speed():
+    """12 symbols x 1 year of 15m bars"""
+    print("\n" + "="*80)
+    print("TEST 4: Replay speed")
+    print("="*80)
+
+    bars = 365 * 96
+    data = {f"S{i}USDT": make_ohlcv(bars, seed=100 + i) for i in range(12)}
+    start = time.perf_counter()
+    market = bt.ReplayMarket(data)
+    prepared = time.perf_counter()
+    trades = bt.simulate(market)
+    done = time.perf_counter()
+    print(f"✓ {12 * bars} bars: features+scores {prepared - start:.2f}s, simulation {done - prepared:.2f}s, "
+          f"{len(trades)} trades")
+    assert done - start < 30, f"replay too slow: {done - start:.1f}s"
+
+
+def write_candle_cache(directory, symbol, data):
+    rows = [[str(int(ts)), str(o), str(h), str(l), str(c), str(v), "0"]
+            for ts, o, h, l, c, v in zip(data["ts"], data["open"], data["high"], data["low"],
+                                         data["close"], data["volume"])]
+    with open(os.path.join(directory, f"{symbol}_15.json"), "w") as f:
+        json.dump({"rows": rows, "exhausted": False}, f)
+
+
+def test_learning_agent_backtest():
+    """backtest_strategy replays the candle cache against the current params"""
+    print("\n" + "="*80)
+    print("TEST 5: Learning agent integration")
+    print("="*80)
+
+    learning = load_module_from_path(
+        'learning_agent_backtest', os.path.join(ROOT, 'agents', '10_learning_agent', 'main.py'))
+    with tempfile.TemporaryDirectory() as d:
+        cache = os.path.join(d, "candle_cache")
+        os.makedirs(cache)
+        learning.CANDLE_CACHE_DIR = cache
+        learning.KLINE_HISTORY_DIR = os.path.join(d, "kline_history")
+        learning.EVOLVED_PARAMS_FILE = os.path.join(d, "evolved_params.json")
+
+        trades = [{"pnl_pct": 2.0}, {"pnl_pct": -1.0}]
+        fallback = learning.backtest_strategy(trades, dict(learning.DEFAULT_PARAMS))
+        assert fallback["method"] == "rescale" and fallback["total_pnl"] == 1.0
+        print("✓ No cached candles -> PnL rescaling fallback")
+
+        write_candle_cache(cache, "BTCUSDT", make_ohlcv(1000, seed=39))
+        assert learning.backtest_strategy(trades, dict(learning.DEFAULT_PARAMS))["method"] == "rescale"
+        print(f"✓ A 1000-bar ring buffer is shorter than the {learning.BACKTEST_MIN_BARS}-bar minimum span "
+              f"({bt.WARMUP_MS / DAY_MS:.0f}d warm-up + {learning.BACKTEST_EVAL_DAYS:g}d) -> not replayed")
+
+        bars = learning.BACKTEST_MIN_BARS + 200
+        for i, sym in enumerate(("BTCUSDT", "ETHUSDT", "SOLUSDT")):
+            write_candle_cache(cache, sym, make_ohlcv(bars, seed=40 + i))
+        loaded = learning.load_backtest_ohlcv()
+        assert sorted(loaded) == ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+        assert len(loaded["BTCUSDT"]["ts"]) == learning.BACKTEST_MIN_BARS
+
+        same = learning.backtest_strategy(trades, dict(learning.DEFAULT_PARAMS))
+        assert same["method"] == "replay" and same["symbols"] == 3
+        assert same["total_pnl"] == same["baseline"]["total_pnl"] and same["total_trades"] > 0
+        changed = learning.backtest_strategy(trades, {**learning.DEFAULT_PARAMS, "atr_multiplier_sl": 0.5})
+        assert changed["baseline"] == same["baseline"] and changed["total_pnl"] != same["total_pnl"]
+        print(f"✓ Replay: baseline {same['baseline']['total_pnl']:.2f}% vs tighter SL {changed['total_pnl']:.2f}% "
+              f"over {same['total_trades']} trades")
+
+
+def run_all_tests():
+    test_indicator_parity()
+    test_confluence_parity()
+    test_simulation_gates()
+    test_year_replay_speed()
+    test_learning_agent_backtest()
+    print("\n✅ All vectorized backtester tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
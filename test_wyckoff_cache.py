@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test the Wyckoff response cache (agents/04_master_ai_agent/wyckoff_cache.py).
+
+Validates:
+1. Small jitter in prices / RSI / imbalance maps to the same fingerprint
+2. Material moves (price, RSI, trend, journal) change the fingerprint
+3. TTL expiry and LRU eviction
+4. /analyze_wyckoff serves repeated near-identical requests without an LLM call
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'agents'))
+
+
+def load_module_from_path(name, path):
+    """Load a module from a specific path"""
+    import importlib.util
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+from llm_client import LLMResponse
+from wyckoff_cache import ResponseCache, wyckoff_fingerprint
+
+
+def prompt(price=60000.0, rsi=55.2, imbalance=0.61, trend="bullish", journal=None):
+    return {
+        "symbol": "BTCUSDT",
+        "ohlcv_summary": {"1h": {"trend": trend, "rsi": rsi, "price": price,
+                                 "ema_20": price * 0.998, "atr": 450.0}},
+        "order_book": {"bid_depth": 120.0, "ask_depth": 80.0, "imbalance": imbalance},
+        "funding_rate": 0.0001,
+        "trading_journal": journal or [],
+    }
+
+
+def test_fingerprint_quantization():
+    """Jitter shares a key, material moves do not"""
+    print("\n" + "="*80)
+    print("TEST 1: Fingerprint quantization")
+    print("="*80)
+
+    base = wyckoff_fingerprint(prompt())
+    assert wyckoff_fingerprint(prompt(price=60010.0, rsi=55.6, imbalance=0.62)) == base
+    print("✓ +0.02% price, +0.4 RSI, +0.01 imbalance -> same key")
+
+    assert wyckoff_fingerprint(prompt(price=60600.0)) != base
+    assert wyckoff_fingerprint(prompt(rsi=62.0)) != base
+    assert wyckoff_fingerprint(prompt(trend="bearish")) != base
+    assert wyckoff_fingerprint(prompt(journal=[{"symbol": "BTCUSDT", "pnl": -1.2}])) != base
+    print("✓ Price +1%, RSI +7, trend flip, new journal entry -> new key")
+
+
+def test_ttl_and_lru():
+    """Entries expire after the TTL and the least recently used is evicted"""
+    print("\n" + "="*80)
+    print("TEST 2: TTL and LRU")
+    print("="*80)
+
+    now = [1000.0]
+    cache = ResponseCache(max_entries=2, ttl_seconds=60, clock=lambda: now[0])
+    cache.put("a", {"v": 1}, 100, 20)
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}  # a is now most recent
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None and cache.get("a") is not None
+    print("✓ LRU evicted the least recently used entry")
+
+    now[0] += 61
+    assert cache.get("a") is None
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1 and stats["tokens_saved"] == 240 and stats["entries"] == 1
+    print(f"✓ TTL expiry, stats: {stats}")
+
+
+def test_endpoint_serves_from_cache():
+    """Second near-identical request returns the cached result without calling the LLM"""
+    print("\n" + "="*80)
+    print("TEST 3: /analyze_wyckoff cache hit")
+    print("="*80)
+
+    master = load_module_from_path(
+        'master_ai_wyckoff_cache',
+        os.path.join(os.path.dirname(__file__), 'agents', '04_master_ai_agent', 'main.py')
+    )
+    calls = []
+
+    class FakeLLM:
+        stats = {}
+
+        async def chat_json(self, messages, temperature=0.3, timeout=None):
+            calls.append(messages)
+            content = json.dumps({"market_phase": "MARKUP", "phase_confidence": 72,
+                                  "trade_proposal": {"direction": "LONG", "reasoning": "fake"}})
+            return LLMResponse(content, 900, 150)
+
+    master.llm = FakeLLM()
+    master.log_api_call = lambda *a: None
+    master.save_ai_decision = lambda *a: None
+    master.wyckoff_cache.clear()
+
+    def request(price, rsi):
+        p = prompt(price=price, rsi=rsi)
+        return master.WyckoffRequest(symbol=p["symbol"], ohlcv_summary=p["ohlcv_summary"],
+                                     order_book=p["order_book"], funding_rate=p["funding_rate"],
+                                     trading_journal=[])
+
+    first = asyncio.run(master.analyze_wyckoff(request(60000.0, 55.2)))
+    second = asyncio.run(master.analyze_wyckoff(request(60005.0, 55.4)))
+    assert len(calls) == 1, "second request should be a cache hit"
+    assert second["cached"] is True and "cached" not in first
+    assert second["trade_proposal"]["direction"] == first["trade_proposal"]["direction"] == "LONG"
+    print("✓ Near-identical request served from cache")
+
+    asyncio.run(master.analyze_wyckoff(request(61500.0, 55.2)))
+    assert len(calls) == 2
+    print("✓ Material price move calls the LLM again")
+    print(f"  Cache stats: {master.health()['wyckoff_cache']}")
+
+
+def run_all_tests():
+    test_fingerprint_quantization()
+    test_ttl_and_lru()
+    test_endpoint_serves_from_cache()
+    print("\n✅ All Wyckoff cache tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test speculative Wyckoff prefetch (agents/orchestrator/wyckoff_prefetch.py).
+
+Validates:
+1. One batched market-data fetch for the top-K candidates, started before the gates
+2. Prefetched analyses overlap the gate phase; the winner's result is reused
+3. Losing branches are cancelled without cancelling the shared data fetch
+4. Without start() the winner is fetched and analysed on demand (legacy path)
+5. Orchestrator wiring (env switch, best candidate only, blocked gate holds, Dockerfile)
+"""
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, 'agents', 'orchestrator'))
+sys.path.insert(0, os.path.join(ROOT, 'agents'))
+
+from wyckoff_prefetch import WyckoffPrefetch
+
+
+class FakeBackend:
+    """Market data + LLM stand-ins with fixed latencies and call logs"""
+
+    def __init__(self, data_latency=0.05, llm_latency=0.1):
+        self.data_latency = data_latency
+        self.llm_latency = llm_latency
+        self.batches = []
+        self.analyses = []
+        self.cancelled = []
+
+    async def fetch_batch(self, symbols):
+        self.batches.append(list(symbols))
+        await asyncio.sleep(self.data_latency)
+        return {s: {"mark_price": float(len(s))} for s in symbols}
+
+    async def analyze(self, symbol, data):
+        self.analyses.append(symbol)
+        try:
+            await asyncio.sleep(self.llm_latency)
+        except asyncio.CancelledError:
+            self.cancelled.append(symbol)
+            raise
+        return {"symbol": symbol, "mark_price": data["mark_price"]}
+
+
+def test_batched_data_prefetch():
+    """Top-K market data in one background batch"""
+    print("\n" + "="*80)
+    print("TEST 1: Batched data prefetch")
+    print("="*80)
+
+    backend = FakeBackend()
+
+    async def run():
+        prefetch = WyckoffPrefetch(["BTCUSDT", "ETHUSDT", "SOLUSDT"], backend.fetch_batch, backend.analyze)
+        prefetch.start()
+        prefetch.start()
+        await asyncio.sleep(0.06)  # risk gates
+        start = time.perf_counter()
+        data = await prefetch.data("ETHUSDT")
+        return data, time.perf_counter() - start
+
+    data, wait = asyncio.run(run())
+    assert backend.batches == [["BTCUSDT", "ETHUSDT", "SOLUSDT"]] and data == {"mark_price": 7.0}
+    assert wait < 0.01 and backend.analyses == []
+    print(f"✓ 1 batch for 3 candidates, ready after the gates (waited {wait * 1000:.1f}ms), no LLM calls")
+
+
+def test_analysis_prefetch():
+    """LLM analysis overlaps the gates"""
+    print("\n" + "="*80)
+    print("TEST 2: Analysis prefetch")
+    print("="*80)
+
+    backend = FakeBackend()
+
+    async def run():
+        prefetch = WyckoffPrefetch(["BTCUSDT", "ETHUSDT"], backend.fetch_batch, backend.analyze,
+                                   prefetch_analysis=True)
+        start = time.perf_counter()
+        prefetch.start()
+        await asyncio.sleep(0.1)  # gates
+        result = await prefetch.analysis("BTCUSDT")
+        return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(run())
+    serial = 0.1 + backend.data_latency + backend.llm_latency
+    assert result == {"symbol": "BTCUSDT", "mark_price": 7.0}
+    assert elapsed < serial - 0.05, (elapsed, serial)
+    assert sorted(backend.analyses) == ["BTCUSDT", "ETHUSDT"] and len(backend.batches) == 1
+    print(f"✓ Gates + data + LLM in {elapsed * 1000:.0f}ms (serial {serial * 1000:.0f}ms)")
+
+
+def test_cancel_losers():
+    """Losing branches cancelled, shared batch survives"""
+    print("\n" + "="*80)
+    print("TEST 3: Cancellation")
+    print("="*80)
+
+    backend = FakeBackend(data_latency=0.05, llm_latency=0.2)
+
+    async def run():
+        prefetch = WyckoffPrefetch(["BTCUSDT", "ETHUSDT", "SOLUSDT"], backend.fetch_batch, backend.analyze,
+                                   prefetch_analysis=True)
+        prefetch.start()
+        await asyncio.sleep(0)
+        cancelled = prefetch.cancel(keep="ETHUSDT")  # BTC blocked by a gate, SOL never reached
+        data = await prefetch.data("ETHUSDT")
+        result = await prefetch.analysis("ETHUSDT")
+        await asyncio.sleep(0)
+        return cancelled, data, result
+
+    cancelled, data, result = asyncio.run(run())
+    assert cancelled == 2 and result["symbol"] == "ETHUSDT" and data == {"mark_price": 7.0}
+    assert "ETHUSDT" not in backend.cancelled
+    print("✓ 2 losing branches cancelled while still waiting on the shared data; winner completes")
+
+    backend = FakeBackend()
+
+    async def run_all_blocked():
+        prefetch = WyckoffPrefetch(["BTCUSDT", "ETHUSDT"], backend.fetch_batch, backend.analyze,
+                                   prefetch_analysis=True)
+        prefetch.start()
+        await asyncio.sleep(0.07)  # data done, LLM in flight
+        count = prefetch.cancel()
+        await asyncio.sleep(0)
+        return count, prefetch.cancelled
+
+    count, total = asyncio.run(run_all_blocked())
+    assert count == 2 == total and sorted(backend.cancelled) == ["BTCUSDT", "ETHUSDT"]
+    print("✓ Every gate blocked: all in-flight LLM calls cancelled")
+
+
+def test_on_demand():
+    """Prefetch off: same calls as before"""
+    print("\n" + "="*80)
+    print("TEST 4: On-demand path")
+    print("="*80)
+
+    backend = FakeBackend()
+
+    async def run():
+        prefetch = WyckoffPrefetch(["BTCUSDT", "ETHUSDT"], backend.fetch_batch, backend.analyze)
+        assert prefetch.cancel() == 0
+        data = await prefetch.data("BTCUSDT")
+        return data, await prefetch.analysis("BTCUSDT")
+
+    data, result = asyncio.run(run())
+    assert backend.batches == [["BTCUSDT"], ["BTCUSDT"]] and backend.analyses == ["BTCUSDT"]
+    assert result == {"symbol": "BTCUSDT", "mark_price": 7.0}
+    print("✓ Winner only: single-coin fetch + one LLM call, nothing speculative")
+
+
+def test_orchestrator_wiring():
+    """Env switch, hold on block, packaging"""
+    print("\n" + "="*80)
+    print("TEST 5: Orchestrator wiring")
+    print("="*80)
+
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'main.py')) as f:
+        code = f.read()
+    assert 'WYCKOFF_PREFETCH = os.getenv("WYCKOFF_PREFETCH", "false")' in code
+    assert "WyckoffPrefetch([sym]" in code and "prefetch.start()" in code
+    assert "await prefetch.data(sym)" in code and "await prefetch.analysis(sym)" in code
+    gates = code[code.index("# --- RISK GATE 1: Cooldown ---"):code.index("# --- WYCKOFF ANALYSIS (LLM) ---")]
+    assert "continue" not in gates and gates.count("return") == 2 and gates.count("prefetch.cancel()") == 2
+    with open(os.path.join(ROOT, 'agents', 'orchestrator', 'Dockerfile')) as f:
+        assert "COPY orchestrator/wyckoff_prefetch.py ." in f.read()
+    print("✓ Off by default, best candidate only, a blocked gate cancels the prefetch and holds")
+
+
+def run_all_tests():
+    test_batched_data_prefetch()
+    test_analysis_prefetch()
+    test_cancel_losers()
+    test_on_demand()
+    test_orchestrator_wiring()
+    print("\n✅ All Wyckoff prefetch tests passed")
+
+
+if __name__ == "__main__":
+    run_all_tests()